@@ -0,0 +1,266 @@
+'''
+    #reads the UDP packets of a pcap file (tcpdump -w) without loading it
+
+    #the file is mapped with mmap and walked record by record. for every UDP
+    #packet only a few numbers are kept: the capture time, a flow id (one per
+    #address:port -> address:port direction), the offset of the UDP payload in
+    #the file and its length. they are collected in fixed-size batches, so the
+    #memory use is the same for a capture of 10 MB or of 10 GB. the pages
+    #of the file that have been walked are given back to the kernel with
+    #MADV_DONTNEED, otherwise they stay in the resident size of the process.
+
+    #the payloads are not copied, the batch only says where they are:
+    #   with PcapFile('traces.pcap') as pcap:
+    #       for batch in pcap.udp_batches():
+    #           ... pcap.map[batch.offsets[i]:batch.offsets[i] + 12] ...
+
+    #link types: ethernet (tcpdump -i r2-eth0, with or without VLAN tags),
+    #linux cooked v1/v2 (tcpdump -i any), raw IP and BSD loopback. IPv4 and
+    #IPv6 (without extension headers). pcapng is not supported, convert it
+    #with: editcap -F pcap traces.pcapng traces.pcap
+'''
+
+import mmap
+import os
+from array import array
+from struct import Struct
+
+
+class PcapError(ValueError):
+    pass
+
+
+# magic number of the global header -> byte order, fraction of a second
+MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+PCAPNG_MAGIC = b'\x0a\x0d\x0d\x0a'
+GLOBAL_HEADER_SIZE = 24
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+LINK_TYPES = {
+    LINKTYPE_NULL: 'loopback',
+    LINKTYPE_ETHERNET: 'ethernet',
+    LINKTYPE_RAW: 'raw IP',
+    LINKTYPE_LINUX_SLL: 'linux cooked',
+    LINKTYPE_IPV4: 'raw IPv4',
+    LINKTYPE_IPV6: 'raw IPv6',
+    LINKTYPE_LINUX_SLL2: 'linux cooked v2',
+}
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+PROTO_UDP = 17
+
+BATCH_SIZE = 1 << 15
+
+
+class Batch:
+    '''
+    the UDP packets of one batch, as arrays of the same length:
+      flows    flow id (see PcapFile.flows)
+      seconds  capture time, whole seconds
+      fraction capture time, the rest in units of PcapFile.resolution
+      offsets  offset of the UDP payload in the file
+      lengths  length of the UDP payload (from the UDP header, also if the
+               capture cut the packet short)
+      captured how many bytes of the payload are in the file
+    '''
+
+    def __init__(self):
+        self.flows = array('i')
+        self.seconds = array('I')
+        self.fraction = array('I')
+        self.offsets = array('q')
+        self.lengths = array('i')
+        self.captured = array('i')
+
+    def __len__(self):
+        return len(self.flows)
+
+
+def address_text(raw):
+    if len(raw) == 4:
+        return '.'.join(str(b) for b in raw)
+    import ipaddress
+    return str(ipaddress.IPv6Address(raw))
+
+
+class PcapFile:
+    '''a pcap file mapped into memory. use it as a context manager'''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size < GLOBAL_HEADER_SIZE:
+            self.file.close()
+            raise PcapError(f'{path} is too short for a pcap file')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        magic = self.map[:4]
+        if magic == PCAPNG_MAGIC:
+            self.close()
+            raise PcapError(f'{path} is pcapng, convert it with: editcap -F pcap {path} out.pcap')
+        if magic not in MAGICS:
+            self.close()
+            raise PcapError(f'{path} is not a pcap file')
+        self.byte_order, self.resolution = MAGICS[magic]
+        self.record_struct = Struct(self.byte_order + 'IIII')
+        _, _, _, _, self.snaplen, self.linktype = Struct(self.byte_order + 'HHiIII').unpack_from(self.map, 4)
+        #the upper bits hold the FCS length on some systems
+        self.linktype &= 0x0fffffff
+        if self.linktype not in LINK_TYPES:
+            self.close()
+            raise PcapError(f'link type {self.linktype} is not supported, only {sorted(LINK_TYPES.values())}')
+        self.flows = []         # flow id -> raw addresses and ports
+        self.flow_ids = {}      # raw addresses and ports -> flow id
+        self.records = 0
+        self.udp_packets = 0
+        self.skipped = 0        # records that are not UDP over IP
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+    def flow(self, flow_id):
+        #(source address, source port, destination address, destination port)
+        raw = self.flows[flow_id]
+        n = (len(raw) - 4) // 2
+        return (address_text(raw[:n]), raw[2 * n] << 8 | raw[2 * n + 1],
+                address_text(raw[n:2 * n]), raw[2 * n + 2] << 8 | raw[2 * n + 3])
+
+    def reverse(self, flow_id):
+        #the flow id of the other direction, or None
+        raw = self.flows[flow_id]
+        n = (len(raw) - 4) // 2
+        return self.flow_ids.get(raw[n:2 * n] + raw[:n] + raw[2 * n + 2:] + raw[2 * n:2 * n + 2])
+
+    def release(self, offset):
+        #gives the pages before offset back, they are read again if needed
+        if not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        length = offset - offset % mmap.PAGESIZE
+        if length > 0:
+            self.map.madvise(mmap.MADV_DONTNEED, 0, length)
+
+    def network_offset(self, start, length):
+        #(offset of the IP header, IP version) of the record at start, or None
+        m = self.map
+        linktype = self.linktype
+        if linktype == LINKTYPE_ETHERNET:
+            if length < 14:
+                return None
+            ip = start + 14
+            ethertype = m[start + 12] << 8 | m[start + 13]
+            while ethertype in ETHERTYPE_VLAN and ip + 4 <= start + length:
+                ethertype = m[ip + 2] << 8 | m[ip + 3]
+                ip += 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if length < 16:
+                return None
+            ip = start + 16
+            ethertype = m[start + 14] << 8 | m[start + 15]
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            if length < 20:
+                return None
+            ip = start + 20
+            ethertype = m[start] << 8 | m[start + 1]
+        elif linktype == LINKTYPE_NULL:
+            if length < 4:
+                return None
+            ip = start + 4
+            ethertype = ETHERTYPE_IPV4 if m[ip] >> 4 == 4 else ETHERTYPE_IPV6
+        else:
+            ip = start
+            ethertype = ETHERTYPE_IPV4 if length and m[ip] >> 4 == 4 else ETHERTYPE_IPV6
+        if ethertype == ETHERTYPE_IPV4:
+            return ip, 4
+        if ethertype == ETHERTYPE_IPV6:
+            return ip, 6
+        return None
+
+    def udp_batches(self, batch_size=BATCH_SIZE, ports=None):
+        '''
+        yields a Batch of at most batch_size UDP packets at a time, in the
+        order of the file. with ports only packets from or to one of the
+        ports. a batch is only valid until the next one is asked for
+        '''
+        m = self.map
+        unpack_record = self.record_struct.unpack_from
+        flow_ids = self.flow_ids
+        flows = self.flows
+        ports = set(ports) if ports else None
+        end = self.size
+        position = GLOBAL_HEADER_SIZE
+        batch = Batch()
+        while position + 16 <= end:
+            seconds, fraction, included, _ = unpack_record(m, position)
+            start = position + 16
+            position = start + included
+            if position > end:
+                #the capture was cut off in the middle of a record
+                break
+            self.records += 1
+            network = self.network_offset(start, included)
+            if network is None:
+                self.skipped += 1
+                continue
+            ip, version = network
+            if version == 4:
+                if ip + 20 > position or m[ip + 9] != PROTO_UDP or (m[ip + 6] & 0x1f) | m[ip + 7]:
+                    #not UDP, or a fragment after the first one
+                    self.skipped += 1
+                    continue
+                udp = ip + (m[ip] & 0x0f) * 4
+                if udp == ip + 20:
+                    key = m[ip + 12:ip + 24]
+                else:
+                    key = m[ip + 12:ip + 20] + m[udp:udp + 4]
+            else:
+                if ip + 40 > position or m[ip + 6] != PROTO_UDP:
+                    self.skipped += 1
+                    continue
+                udp = ip + 40
+                key = m[ip + 8:ip + 44]
+            if udp + 8 > position:
+                self.skipped += 1
+                continue
+            if ports is not None:
+                if (m[udp] << 8 | m[udp + 1]) not in ports and (m[udp + 2] << 8 | m[udp + 3]) not in ports:
+                    continue
+            flow_id = flow_ids.get(key)
+            if flow_id is None:
+                flow_id = flow_ids[key] = len(flows)
+                flows.append(key)
+            batch.flows.append(flow_id)
+            batch.seconds.append(seconds)
+            batch.fraction.append(fraction)
+            batch.offsets.append(udp + 8)
+            batch.lengths.append((m[udp + 4] << 8 | m[udp + 5]) - 8)
+            batch.captured.append(position - udp - 8)
+            self.udp_packets += 1
+            if len(batch.flows) >= batch_size:
+                yield batch
+                self.release(position)
+                batch = Batch()
+        if len(batch):
+            yield batch
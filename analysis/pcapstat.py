@@ -0,0 +1,411 @@
+'''
+    #per-flow statistics of the transport in transport/engine.py from a pcap
+
+    #capture on a router of the network (tcpdump -i r2-eth0 -w traces.pcap,
+    #tcpdump -s 96 is enough, only the headers are read) and run:
+    #   python3 pcapstat.py traces.pcap -p 8088
+    #   python3 pcapstat.py traces.pcap -p 8088 -i 0.5 -o series.csv
+
+    #every UDP payload is decoded with the header format of header.py
+    #(!IIHH: seq, ack, flags, receiver window). the file is walked by pcap.py,
+    #and the headers of a batch of packets are decoded together: their 12
+    #bytes are gathered from the mapped file into one numpy array with the
+    #structured dtype of header_format, and retransmissions, reordering and
+    #the byte counts are worked out with array operations per flow.
+
+    #for every direction that sends data (seq > 0, no flags) it reports:
+    #   throughput    all UDP payload bytes of its data packets, per second
+    #   goodput       application bytes of the packets seen for the first
+    #                 time (the header of the negotiated version left out)
+    #   retrans       data packets with a sequence number that was seen before
+    #   reordered     data packets seen for the first time after a higher one.
+    #                 a packet lost before the capture point only shows up
+    #                 once, late, so it counts here and not as a retransmission
+    #   outstanding   highest seq sent - highest ack of the other direction, the
+    #                 packets in flight (in sr mode the acks are not cumulative,
+    #                 so this is a lower bound)
+    #   rwnd          the receiver window in the acks, in packets
+    #and with -o the same per interval of -i seconds as a csv (window evolution).
+
+    #the memory use does not grow with the capture: batches have a fixed size,
+    #every flow keeps the last 65536 sequence numbers it saw in a ring, and
+    #an interval is written out once the capture is past it.
+'''
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'header'))
+
+from codec import ACK, DATA_SIZE, FIN, HEADER_SIZE, SYN, header_format, header_sizes, syn_options_struct
+from pcap import BATCH_SIZE, PcapError, PcapFile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+HEADER_FIELDS = ('seq', 'ack', 'flags', 'win')
+NUMPY_TYPES = {'B': 'u1', 'H': 'u2', 'I': 'u4', 'Q': 'u8'}
+
+# sequence numbers remembered per flow to tell a retransmission from a late packet
+SEEN_SIZE = 1 << 16
+
+SERIES_FIELDS = ('time', 'flow', 'throughput_mbps', 'goodput_mbps', 'packets', 'retransmissions',
+                 'reordered', 'highest_seq', 'highest_ack', 'outstanding', 'rwnd')
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def check_port(val):
+    value = check_positive(val)
+    if value > 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+def header_dtype(fmt=header_format, names=HEADER_FIELDS):
+    #the numpy structured dtype of a struct format, e.g. !IIHH
+    order = '<' if fmt[0] == '<' else '>'
+    return np.dtype([(name, order + NUMPY_TYPES[code]) for name, code in zip(names, fmt.lstrip('!<>=@'))])
+
+
+def per_interval(intervals):
+    #(the intervals, the position of every packet in them)
+    return np.unique(intervals, return_inverse=True)
+
+
+def last_per_interval(inverse):
+    #index of the last packet of every interval
+    reverse = inverse[::-1]
+    _, first = np.unique(reverse, return_index=True)
+    return len(inverse) - 1 - first
+
+
+class Direction:
+    '''what one direction (address:port -> address:port) of a transfer sent'''
+
+    def __init__(self, flow_id):
+        self.flow_id = flow_id
+        self.packets = 0
+        self.first_time = None
+        self.last_time = None
+        #data
+        self.data_packets = 0
+        self.data_bytes = 0         # UDP payload of the data packets
+        self.unique_bytes = 0       # application data seen for the first time
+        self.retransmissions = 0
+        self.reordered = 0
+        self.highest_seq = 0
+        self.first_data = None
+        self.last_data = None
+        self.seen = None            # ring of the last SEEN_SIZE sequence numbers
+        self.header_size = None
+        self.max_outstanding = 0
+        #acks
+        self.acks = 0
+        self.highest_ack = 0
+        self.rwnd = None
+        #handshake
+        self.offered_version = None     # in the SYN of the sender
+        self.version = None             # in the SYN-ACK of the receiver
+        self.wscale = 0
+        self.fin = False
+        #interval -> [packets, bytes, unique bytes, retransmissions, reordered, highest seq, highest ack, rwnd]
+        self.intervals = {}
+        self.series_seq = 0         # highest seq and ack up to the last interval written
+        self.series_ack = 0
+
+    def interval(self, number):
+        row = self.intervals.get(number)
+        if row is None:
+            row = self.intervals[number] = [0, 0, 0, 0, 0, 0, 0, None]
+        return row
+
+
+class Analyzer:
+    '''
+    decodes the batches of a PcapFile and keeps a Direction per flow. the
+    series of every interval is handed to write_row as soon as it is complete
+    '''
+
+    def __init__(self, pcap, interval=1.0, version=1, write_row=None):
+        self.pcap = pcap
+        self.interval = interval
+        self.version = version
+        self.write_row = write_row
+        self.dtype = header_dtype()
+        self.columns = np.arange(self.dtype.itemsize)
+        self.directions = {}
+        self.start = None
+        self.decoded = 0
+        self.not_ours = 0
+
+    def direction(self, flow_id):
+        d = self.directions.get(flow_id)
+        if d is None:
+            d = self.directions[flow_id] = Direction(flow_id)
+        return d
+
+    def reverse(self, direction):
+        flow_id = self.pcap.reverse(direction.flow_id)
+        return None if flow_id is None else self.directions.get(flow_id)
+
+    def analyze(self, batches):
+        data = np.frombuffer(self.pcap.map, np.uint8)
+        try:
+            for batch in batches:
+                self.add_batch(data, batch)
+        finally:
+            #the map can only be closed once no array points into it
+            del data
+        self.flush(None)
+
+    def add_batch(self, data, batch):
+        flows = np.frombuffer(batch.flows, np.int32)
+        offsets = np.frombuffer(batch.offsets, np.int64)
+        lengths = np.frombuffer(batch.lengths, np.int32)
+        captured = np.frombuffer(batch.captured, np.int32)
+        times = np.frombuffer(batch.seconds, np.uint32) + np.frombuffer(batch.fraction, np.uint32) * self.pcap.resolution
+        if self.start is None:
+            self.start = float(times[0])
+        #only payloads that hold a whole header and use nothing but the 4 flag bits
+        keep = captured >= HEADER_SIZE
+        headers = data[offsets[keep, None] + self.columns].view(self.dtype)[:, 0]
+        ours = (headers['flags'] & 0xfff0) == 0
+        index = np.flatnonzero(keep)[ours]
+        headers = headers[ours]
+        self.decoded += len(headers)
+        self.not_ours += len(flows) - len(headers)
+        if not len(headers):
+            return
+        flows, offsets, lengths, captured, times = flows[index], offsets[index], lengths[index], captured[index], times[index]
+        intervals = ((times - self.start) // self.interval).astype(np.int64)
+
+        #one group per flow, in the order of the file
+        order = np.argsort(flows, kind='stable')
+        grouped = flows[order]
+        starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for s, e in zip(starts, ends):
+            i = order[s:e]
+            self.update(self.direction(int(grouped[s])), headers[i], offsets[i], lengths[i], captured[i],
+                        times[i], intervals[i])
+        self.flush(int(intervals.max()))
+
+    def update(self, d, headers, offsets, lengths, captured, times, intervals):
+        flags = headers['flags']
+        d.packets += len(headers)
+        if d.first_time is None:
+            d.first_time = float(times[0])
+        d.last_time = float(times[-1])
+
+        #the handshake: few packets, read one by one
+        for i in np.flatnonzero(flags & SYN):
+            if captured[i] < HEADER_SIZE + syn_options_struct.size:
+                continue
+            version, wscale = syn_options_struct.unpack_from(self.pcap.map, int(offsets[i]) + HEADER_SIZE)
+            if flags[i] & ACK:
+                d.version, d.wscale = version, wscale
+            else:
+                d.offered_version = version
+        if ((flags & (FIN | ACK)) == FIN).any():
+            d.fin = True
+
+        acks = flags == ACK
+        if acks.any():
+            self.update_acks(d, headers[acks], intervals[acks])
+        data = (flags == 0) & (headers['seq'] > 0)
+        if data.any():
+            self.update_data(d, headers['seq'][data].astype(np.int64), lengths[data], times[data], intervals[data])
+
+    def update_acks(self, d, headers, intervals):
+        ack = headers['ack'].astype(np.int64)
+        rwnd = headers['win'].astype(np.int64) << d.wscale
+        d.acks += len(ack)
+        d.highest_ack = max(d.highest_ack, int(ack.max()))
+        d.rwnd = int(rwnd[-1])
+        numbers, inverse = per_interval(intervals)
+        highest = np.zeros(len(numbers), np.int64)
+        np.maximum.at(highest, inverse, ack)
+        last = last_per_interval(inverse)
+        for number, high, window in zip(numbers.tolist(), highest.tolist(), rwnd[last].tolist()):
+            row = d.interval(number)
+            row[6] = max(row[6], high)
+            row[7] = window
+
+    def update_data(self, d, seqs, lengths, times, intervals):
+        if d.header_size is None:
+            d.header_size = self.header_size(d, lengths)
+        if d.seen is None:
+            d.seen = np.zeros(SEEN_SIZE, np.int64)
+            d.first_data = float(times[0])
+        d.last_data = float(times[-1])
+
+        #the highest sequence number before every packet
+        before = np.maximum.accumulate(np.r_[d.highest_seq, seqs])[:-1]
+        slots = seqs % SEEN_SIZE
+        first = np.zeros(len(seqs), bool)
+        first[np.unique(seqs, return_index=True)[1]] = True
+        #seen earlier in this batch, in the ring, or too long ago to still be in it
+        retransmitted = ~first | (d.seen[slots] == seqs) | (seqs + SEEN_SIZE <= before)
+        reordered = ~retransmitted & (seqs < before)
+        d.seen[slots] = seqs
+        d.highest_seq = max(d.highest_seq, int(seqs.max()))
+        size = np.maximum(lengths - d.header_size, 0)
+        unique = np.where(retransmitted, 0, size)
+
+        d.data_packets += len(seqs)
+        d.data_bytes += int(lengths.sum())
+        d.unique_bytes += int(unique.sum())
+        d.retransmissions += int(retransmitted.sum())
+        d.reordered += int(reordered.sum())
+
+        numbers, inverse = per_interval(intervals)
+        count = len(numbers)
+        packets = np.bincount(inverse, minlength=count)
+        nbytes = np.bincount(inverse, weights=lengths, minlength=count)
+        ubytes = np.bincount(inverse, weights=unique, minlength=count)
+        retrans = np.bincount(inverse, weights=retransmitted, minlength=count)
+        late = np.bincount(inverse, weights=reordered, minlength=count)
+        highest = np.zeros(count, np.int64)
+        np.maximum.at(highest, inverse, seqs)
+        for i, number in enumerate(numbers.tolist()):
+            row = d.interval(number)
+            row[0] += int(packets[i])
+            row[1] += int(nbytes[i])
+            row[2] += int(ubytes[i])
+            row[3] += int(retrans[i])
+            row[4] += int(late[i])
+            row[5] = max(row[5], int(highest[i]))
+
+    def header_size(self, d, lengths):
+        #the header of the version in the SYN-ACK, else the one that makes
+        #full packets 1460 bytes of data, else the version of -v
+        reverse = self.reverse(d)
+        if reverse is not None and reverse.version in header_sizes:
+            return header_sizes[reverse.version]
+        for size in sorted(header_sizes.values(), reverse=True):
+            if (lengths == size + DATA_SIZE).any():
+                return size
+        return header_sizes[self.version]
+
+    def flush(self, upto):
+        #hands the intervals before upto (all with None) to write_row
+        for d in list(self.directions.values()):
+            if not d.data_packets:
+                continue
+            reverse = self.reverse(d)
+            numbers = set(n for n in d.intervals if upto is None or n < upto)
+            if reverse is not None:
+                numbers.update(n for n in reverse.intervals if upto is None or n < upto)
+            for number in sorted(numbers):
+                row = d.intervals.pop(number, None) or [0, 0, 0, 0, 0, 0, 0, None]
+                replies = reverse.intervals.pop(number, None) if reverse is not None else None
+                d.series_seq = highest_seq = max(row[5], d.series_seq)
+                rwnd = None
+                if replies is not None:
+                    d.series_ack = max(d.series_ack, replies[6])
+                    rwnd = replies[7]
+                outstanding = max(0, highest_seq - d.series_ack)
+                d.max_outstanding = max(d.max_outstanding, outstanding)
+                if self.write_row is not None:
+                    self.write_row({
+                        'time': round(number * self.interval, 6),
+                        'flow': self.label(d),
+                        'throughput_mbps': round(row[1] * 8 / self.interval / 1e6, 3),
+                        'goodput_mbps': round(row[2] * 8 / self.interval / 1e6, 3),
+                        'packets': row[0],
+                        'retransmissions': row[3],
+                        'reordered': row[4],
+                        'highest_seq': highest_seq,
+                        'highest_ack': d.series_ack,
+                        'outstanding': outstanding,
+                        'rwnd': '' if rwnd is None else rwnd,
+                    })
+        #what is left of the directions without data (e.g. only acks whose
+        #data went another way) is not needed
+        for d in self.directions.values():
+            if not d.data_packets:
+                for number in [n for n in d.intervals if upto is None or n < upto]:
+                    del d.intervals[number]
+
+    def label(self, d):
+        source, sport, destination, dport = self.pcap.flow(d.flow_id)
+        return f'{source}:{sport} > {destination}:{dport}'
+
+    def report(self):
+        print(f'{"flow":44s}{"ver":>4}{"packets":>9}{"retrans":>9}{"reorder":>9}{"seconds":>9}'
+              f'{"Mbps":>9}{"goodput":>9}{"outst.":>8}{"rwnd":>7}')
+        for d in sorted(self.directions.values(), key=lambda d: d.first_time):
+            if not d.data_packets:
+                continue
+            reverse = self.reverse(d)
+            version = reverse.version if reverse is not None and reverse.version else '?'
+            rwnd = reverse.rwnd if reverse is not None and reverse.rwnd is not None else ''
+            seconds = d.last_data - d.first_data
+            throughput = d.data_bytes * 8 / seconds / 1e6 if seconds > 0 else 0.0
+            goodput = d.unique_bytes * 8 / seconds / 1e6 if seconds > 0 else 0.0
+            print(f'{self.label(d):44s}{version:>4}{d.data_packets:>9}{d.retransmissions:>9}{d.reordered:>9}'
+                  f'{seconds:>9.3f}{throughput:>9.2f}{goodput:>9.2f}{d.max_outstanding:>8}{rwnd:>7}')
+            if not d.fin:
+                print(f'{"":44s}no FIN in the capture, the transfer may not be complete')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='per-flow statistics of the UDP transport from a pcap file', epilog='end of help')
+    parser.add_argument('pcap', help='capture from tcpdump -w')
+    parser.add_argument('-p', '--port', type=check_port, action='append', help='only packets from or to this port, can be repeated')
+    parser.add_argument('-i', '--interval', type=float, default=1.0, help='seconds per row of the series')
+    parser.add_argument('-o', '--output', type=str, help='csv file for the series per interval')
+    parser.add_argument('-v', '--version', type=int, choices=sorted(header_sizes), default=1,
+                        help='header version if the capture has no handshake and no full packets')
+    parser.add_argument('-b', '--batch', type=check_positive, default=BATCH_SIZE, help='packets decoded together')
+    args = parser.parse_args()
+
+    if np is None:
+        print('pcapstat.py needs numpy (pip install numpy)')
+        sys.exit(1)
+    if args.interval <= 0:
+        print('the interval must be positive')
+        sys.exit(1)
+
+    try:
+        pcap = PcapFile(args.pcap)
+    except (OSError, PcapError) as e:
+        print(e)
+        sys.exit(1)
+    output = open(args.output, 'w', newline='') if args.output else None
+    write_row = None
+    if output is not None:
+        writer = csv.DictWriter(output, fieldnames=SERIES_FIELDS)
+        writer.writeheader()
+        write_row = writer.writerow
+    started = time.perf_counter()
+    with pcap:
+        analyzer = Analyzer(pcap, args.interval, args.version, write_row)
+        analyzer.analyze(pcap.udp_batches(args.batch, args.port))
+        seconds = time.perf_counter() - started
+        print(f'{pcap.records} records ({pcap.size / 1e6:.1f} MB), {pcap.udp_packets} UDP, '
+              f'{analyzer.decoded} with the header, {len(pcap.flows)} flows, '
+              f'{seconds:.2f} s ({pcap.records / seconds if seconds > 0 else 0:,.0f} records/sec)\n')
+        analyzer.report()
+    if output is not None:
+        output.close()
+        print(f'\nseries in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
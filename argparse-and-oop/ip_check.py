@@ -1,19 +1,44 @@
-import ipaddress
 import argparse
+import os
+import sys
 
+#the parser of the forwarding table checks all addresses at once, it takes what ipaddress.ip_address takes
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import format_address, validate
 
-def check_ip(address):
-    '''check if an address is a valid IPv4 address'''
-    try:
-       val = ipaddress.ip_address(address)
-       print(f"The IP address {val} is valid.")
-    except ValueError:
-       print(f"The IP address is {address} not valid")
+
+def check_ip(addresses, prefixes=False, quiet=False):
+    '''check if the addresses are valid IPv4 addresses (or prefixes like 10.0.0.0/24)'''
+    values, invalid = validate(addresses, prefixes)
+    bad = dict(invalid)
+    kind = 'prefix' if prefixes else 'IP address'
+    valid = iter(values)
+    for i, address in enumerate(addresses):
+        if i in bad:
+            print(f"The {kind} {address.strip()} is not valid")
+            continue
+        val = next(valid)
+        if not quiet:
+            text = f'{format_address(val[0])}/{val[1]}' if prefixes else format_address(val)
+            print(f"The {kind} {text} is valid.")
+    if quiet or len(addresses) > 1:
+        print(f"{len(values)} of {len(addresses)} are valid")
+    return not invalid
 
 
 parser = argparse.ArgumentParser(description="Optional arguments: checking IPv4 address", epilog="end of help")
-parser.add_argument('-I' , '--ip', type=str, required=True)
+parser.add_argument('-I' , '--ip', type=str, nargs='+', default=[], help='one or more addresses')
+parser.add_argument('-f' , '--file', type=str, help='a file with one address per line')
+parser.add_argument('-c' , '--cidr', action='store_true', help='check prefixes like 10.0.0.0/24 instead')
+parser.add_argument('-q' , '--quiet', action='store_true', help='only print the ones that are not valid')
 
 args = parser.parse_args()
 
-check_ip(args.ip)
+addresses = list(args.ip)
+if args.file:
+    with open(args.file) as f:
+        addresses.extend(line for line in f if line.strip())
+if not addresses:
+    parser.error('give an address with -I or a file with -f')
+
+sys.exit(0 if check_ip(addresses, args.cidr, args.quiet) else 1)
@@ -0,0 +1,118 @@
+'''
+    #an asyncio client for asyncserver.py (or any of the upper-case servers)
+
+    #interactive, like thread/tcpclient-multi.py: type lowercase sentences,
+    #exit ends the session.
+
+    #streaming, with -f: the file (or - for stdin) is sent in chunks while the
+    #replies are read at the same time, and written to stdout (or -o). sending
+    #waits for drain(), so the client never buffers more than the write
+    #watermark however fast the file can be read.
+
+    #run it with:
+    #   python3 asyncclient.py
+    #   python3 asyncclient.py -f big.txt -o BIG.txt
+'''
+
+import argparse
+import asyncio
+import sys
+import time
+
+
+def check_port(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if not 1024 <= value <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+async def interactive(reader, writer):
+    loop = asyncio.get_running_loop()
+    while True:
+        #input() blocks, so it runs in a thread and the loop keeps going
+        sentence = await loop.run_in_executor(None, input, 'Input lowercase sentence:')
+        writer.write(sentence.encode())
+        await writer.drain()
+        modifiedSentence = await reader.read(1024)
+        if not modifiedSentence:
+            print('The server has closed the connection')
+            break
+        print('From Server:', modifiedSentence.decode())
+        if sentence == 'exit':
+            break
+
+
+async def send_file(writer, source, chunk):
+    sent = 0
+    while True:
+        data = source.read(chunk)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+        sent += len(data)
+    #no more data: the server sees the end of the stream and closes
+    writer.write_eof()
+    return sent
+
+
+async def receive_file(reader, sink):
+    received = 0
+    while True:
+        data = await reader.read(64 * 1024)
+        if not data:
+            break
+        sink.write(data)
+        received += len(data)
+    return received
+
+
+async def stream(reader, writer, source, sink, chunk):
+    start = time.monotonic()
+    sent, received = await asyncio.gather(send_file(writer, source, chunk), receive_file(reader, sink))
+    elapsed = time.monotonic() - start
+    sink.flush()
+    print(f'sent {sent} bytes, received {received} bytes in {elapsed:.3f} s '
+          f'({received * 8 / max(elapsed, 1e-9) / 1e6:.2f} Mbps)', file=sys.stderr)
+
+
+async def run(args):
+    try:
+        reader, writer = await asyncio.open_connection(args.ip, args.port)
+    except OSError:
+        print('ConnectionError')
+        sys.exit()
+    writer.transport.set_write_buffer_limits(high=args.high)
+    try:
+        if args.file is None:
+            await interactive(reader, writer)
+        else:
+            source = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+            sink = sys.stdout.buffer if args.output is None else open(args.output, 'wb')
+            with source, sink:
+                await stream(reader, writer, source, sink, args.chunk)
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio upper-case echo client', epilog='end of help')
+    parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=check_port, default=12000)
+    parser.add_argument('-f', '--file', type=str, help='stream this file (- for stdin) instead of asking for sentences')
+    parser.add_argument('-o', '--output', type=str, help='write the streamed reply here instead of stdout')
+    parser.add_argument('--chunk', type=int, default=1024, help='bytes per write when streaming')
+    parser.add_argument('--high', type=int, default=64 * 1024, help='write buffer high watermark in bytes')
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+if __name__ == '__main__':
+    main()
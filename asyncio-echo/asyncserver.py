@@ -0,0 +1,135 @@
+'''
+    #the upper-case echo server of tcp-simple/ and thread/ with asyncio
+
+    #one thread and one event loop serve every client: a connection is a
+    #coroutine with a StreamReader and a StreamWriter, not a thread, so tens of
+    #thousands of (mostly idle) clients only cost a few KB each.
+
+    #backpressure: the reply is written and then we wait for drain(). drain()
+    #returns at once while the write buffer of the connection is below the high
+    #watermark, otherwise it waits until the client has read enough to bring it
+    #under the low watermark. while we wait we do not read from the client, its
+    #TCP window closes, and a client that sends without reading is slowed down
+    #instead of making the server buffer everything. per connection the server
+    #holds at most --limit bytes of input and --high bytes of output.
+
+    #run it with:
+    #   python3 asyncserver.py
+    #   python3 asyncserver.py -p 12000 --backlog 1024 --high 65536 --low 16384 -i 5
+'''
+
+import argparse
+import asyncio
+import resource
+import sys
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def raise_file_limit():
+    #every connection is a file descriptor, use as many as we are allowed to
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+class EchoServer:
+
+    def __init__(self, high, low, verbose=False):
+        self.high = high
+        self.low = low
+        self.verbose = verbose
+        self.active = 0
+        self.total = 0
+        self.messages = 0
+        self.paused = 0         # times a reply had to wait for the client
+
+    async def handle_client(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=self.high, low=self.low)
+        addr = writer.get_extra_info('peername')
+        if self.verbose:
+            print('Server connected by ', addr)
+        self.active += 1
+        self.total += 1
+        try:
+            while True:
+                data = await reader.read(1024)
+                #an empty message means the client has closed the connection
+                if not data:
+                    break
+                #the data stays bytes (only a-z are upper-cased): a read may
+                #end inside a UTF-8 character, or the client sends a binary file
+                self.messages += 1
+                writer.write(data.upper())
+                if writer.transport.get_write_buffer_size() > self.high:
+                    self.paused += 1
+                await writer.drain()
+                if data == b'exit':
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+            print(f'active: {self.active}  total: {self.total}  messages: {self.messages}  '
+                  f'paused: {self.paused}  max rss: {rss} MB', flush=True)
+
+
+async def serve(args):
+    echo = EchoServer(args.high, args.low, args.verbose)
+    server = await asyncio.start_server(echo.handle_client, args.ip, args.port,
+                                        backlog=args.backlog, limit=args.limit,
+                                        reuse_address=True)
+    print('The server is ready to receive')
+    if args.interval:
+        asyncio.get_running_loop().create_task(echo.report(args.interval))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio upper-case echo server', epilog='end of help')
+    parser.add_argument('-a', '--ip', type=str, default='', help='address to bind to, default all')
+    parser.add_argument('-p', '--port', type=check_positive, default=12000)
+    parser.add_argument('-b', '--backlog', type=check_positive, default=1024, help='connections waiting to be accepted')
+    parser.add_argument('--high', type=check_positive, default=64 * 1024, help='write buffer high watermark in bytes')
+    parser.add_argument('--low', type=check_positive, default=16 * 1024, help='write buffer low watermark in bytes')
+    parser.add_argument('--limit', type=check_positive, default=64 * 1024, help='read buffer limit in bytes')
+    parser.add_argument('-i', '--interval', type=float, default=0, help='print statistics every interval seconds')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every connection')
+    args = parser.parse_args()
+    if args.low > args.high:
+        parser.error('the low watermark must not be above the high watermark')
+
+    files = raise_file_limit()
+    if files < 2048:
+        print(f'only {files} file descriptors allowed, raise it with ulimit -n')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print('Bind failed. Error : ', e)
+        sys.exit()
+
+
+if __name__ == '__main__':
+    main()
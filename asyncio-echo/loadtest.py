@@ -0,0 +1,191 @@
+'''
+    #compares asyncserver.py with the threaded server of thread/tcpserver-multi.py
+
+    #for every server and every number of clients the test starts the server,
+    #opens all connections (they stay open and idle), then every client sends
+    #--messages sentences one after the other and checks the upper-cased reply.
+    #the clients are coroutines in this process, so 10k of them fit on one
+    #core. when all clients are connected the test reads the resident memory
+    #and the number of threads of the server from /proc (Linux).
+
+    #run it with:
+    #   python3 loadtest.py
+    #   python3 loadtest.py -c 1000 10000 -s async thread pool select -m 5
+'''
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVERS = {
+    'async': [os.path.join(HERE, 'asyncserver.py')],
+    'thread': [os.path.join(HERE, '..', 'thread', 'tcpserver-multi.py'), '--mode', 'thread'],
+    'pool': [os.path.join(HERE, '..', 'thread', 'tcpserver-multi.py'), '--mode', 'pool'],
+    'select': [os.path.join(HERE, '..', 'thread', 'tcpserver-multi.py'), '--mode', 'select'],
+}
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def server_usage(pid):
+    #resident memory in MB and number of threads of a process
+    rss = threads = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+                elif line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, threads
+
+
+def start_server(name, port, backlog):
+    command = [sys.executable] + SERVERS[name] + ['-p', str(port), '-b', str(backlog)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    #wait until it accepts connections
+    for i in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError(f'the {name} server did not start')
+
+
+class Client:
+
+    def __init__(self, number):
+        self.number = number
+        self.reader = self.writer = None
+        self.latencies = []
+        self.error = None
+
+    async def connect(self, port, limit, timeout):
+        async with limit:
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection('127.0.0.1', port), timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.error = f'connect: {type(e).__name__}'
+
+    async def talk(self, messages, timeout):
+        if self.writer is None:
+            return
+        try:
+            for i in range(messages):
+                sentence = f'client {self.number} message {i}'.encode()
+                start = time.perf_counter()
+                self.writer.write(sentence)
+                await self.writer.drain()
+                reply = b''
+                while len(reply) < len(sentence):
+                    data = await asyncio.wait_for(self.reader.read(1024), timeout)
+                    if not data:
+                        raise ConnectionError('closed by the server')
+                    reply += data
+                self.latencies.append(time.perf_counter() - start)
+                if reply != sentence.upper():
+                    self.error = 'wrong reply'
+                    return
+        except (OSError, asyncio.TimeoutError) as e:
+            self.error = f'echo: {type(e).__name__}'
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_clients(count, port, messages, concurrency, timeout, pid):
+    clients = [Client(i) for i in range(count)]
+    #do not open more connections at once than the listen backlog can hold
+    limit = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(c.connect(port, limit, timeout) for c in clients))
+    connect_time = time.perf_counter() - start
+    #every client is connected and idle now
+    await asyncio.sleep(0.5)
+    rss, threads = server_usage(pid)
+    start = time.perf_counter()
+    await asyncio.gather(*(c.talk(messages, timeout) for c in clients))
+    echo_time = time.perf_counter() - start
+    for c in clients:
+        c.close()
+    await asyncio.sleep(0.1)
+    latencies = [l for c in clients for l in c.latencies]
+    errors = [c.error for c in clients if c.error]
+    return {
+        'connected': sum(1 for c in clients if c.writer is not None),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else '',
+        'connect_s': connect_time,
+        'messages_per_s': len(latencies) / echo_time if echo_time else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'server_rss_mb': rss,
+        'server_threads': threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='load test of the upper-case echo servers', epilog='end of help')
+    parser.add_argument('-s', '--servers', nargs='+', choices=SERVERS, default=['async', 'thread'])
+    parser.add_argument('-c', '--clients', nargs='+', type=check_positive, default=[1000, 10000])
+    parser.add_argument('-m', '--messages', type=check_positive, default=5, help='messages per client')
+    parser.add_argument('-p', '--port', type=check_positive, default=12000)
+    parser.add_argument('-b', '--backlog', type=check_positive, default=1024, help='listen backlog of the servers')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds before a connect or reply fails')
+    args = parser.parse_args()
+
+    #this process holds one socket per client
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard < max(args.clients) + 100:
+        print(f'only {hard} file descriptors allowed, raise it with ulimit -n')
+
+    print(f'{"server":8}{"clients":>8}{"connected":>10}{"errors":>8}{"connect s":>10}'
+          f'{"msg/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"rss MB":>8}{"threads":>8}')
+    for name in args.servers:
+        for count in args.clients:
+            server = start_server(name, args.port, args.backlog)
+            try:
+                r = asyncio.run(run_clients(count, args.port, args.messages, args.backlog,
+                                            args.timeout, server.pid))
+            finally:
+                server.kill()
+                server.wait()
+            rss = f'{r["server_rss_mb"]:.1f}' if r['server_rss_mb'] is not None else '-'
+            print(f'{name:8}{count:>8}{r["connected"]:>10}{r["errors"]:>8}{r["connect_s"]:>10.2f}'
+                  f'{r["messages_per_s"]:>10.0f}{r["p50_ms"]:>9.2f}{r["p99_ms"]:>9.2f}'
+                  f'{rss:>8}{r["server_threads"] or "-":>8}', flush=True)
+            if r['first_error']:
+                print(f'    first error: {r["first_error"]}')
+
+
+if __name__ == '__main__':
+    main()
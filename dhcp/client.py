@@ -0,0 +1,368 @@
+'''
+    #a DHCP client, for one interface of a mininet host or as a load
+    #generator for dhcpd.py
+
+    #one interface: DISCOVER, OFFER, REQUEST, ACK on the link, then the
+    #address goes onto the interface and the router of the lease becomes the
+    #default route (-n only prints the lease):
+    #   mininet> h1 python3 dhcp/client.py -i h1-eth0
+    #   leased 10.0.0.2/24 from 10.0.0.1 for 3600 s, router 10.0.0.1
+    #with --renew it stays and renews the lease like a real client: at half
+    #of the lease time with the server (RENEWING), at 7/8 with any server
+    #(REBINDING), and it removes the address when the lease runs out or the
+    #server says NAK:
+    #   mininet> h1 python3 dhcp/client.py -i h1-eth0 --renew > /tmp/h1-dhcp.log 2>&1 &
+    #--background does the same, but it returns once it has the first lease
+    #and renews in a child process, like dhclient.
+
+    #load (--load N): N made-up clients (hardware addresses 02:00:00:00:00:01,
+    #...) lease an address each, --window of them at the same time. the load
+    #client is the relay agent of all of them: it sends from --relay with
+    #giaddr and the subnet selection option set, the server answers to
+    #--relay, so neither needs root. a request without an answer is sent
+    #again after --timeout. it prints how many leases per second the server
+    #gave out in every tenth of the run, from an empty pool to a full one,
+    #and the time from DISCOVER to ACK:
+    #   python3 dhcpd.py --listen 127.0.0.1:6767 --relay-port 6768 -s 10.64.0.1/16 --leases /tmp/load.leases
+    #   python3 client.py --load 20000 --server 127.0.0.1:6767 --relay 127.0.0.1:6768 --subnet 10.64.0.0
+'''
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from message import (ACK, BOOTREPLY, BROADCAST_FLAG, CLIENT_PORT, DISCOVER, HOSTNAME, LEASE_TIME, MESSAGE,
+                     MESSAGE_TYPE, NAK, OFFER, PARAMETERS, REBINDING_TIME, RENEWAL_TIME, REQUEST, REQUESTED_IP,
+                     ROUTER, SERVER_ID, SERVER_PORT, SUBNET_MASK, SUBNET_SELECTION, DhcpError, Message, decode,
+                     encode, pack_address)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import format_address, parse_address
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'loadgen'))
+from histogram import Histogram
+
+
+# the options the client asks for
+WANTED = bytes((SUBNET_MASK, ROUTER, 6, 28, LEASE_TIME))
+PERCENTILES = (50, 90, 99)
+# how often the load client looks for requests without an answer
+CHECK_INTERVAL = 0.05
+# seconds until a client that got no lease with --renew starts again
+RETRY = 10.0
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def check_address(val):
+    host, _, port = val.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected host:port, e.g. 127.0.0.1:6767')
+    if not 0 < port <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return host or '127.0.0.1', port
+
+
+def check_ip(val):
+    value = parse_address(val)
+    if value is None:
+        raise argparse.ArgumentTypeError(f'{val} is not a valid IPv4 address')
+    return value
+
+
+def exchange(sock, message, kinds, server, tries, timeout):
+    #sends message until a reply of one of kinds with the same xid comes
+    data = encode(message)
+    wait = timeout
+    for _ in range(tries):
+        sock.sendto(data, server)
+        deadline = time.monotonic() + wait
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            sock.settimeout(left)
+            try:
+                reply = decode(sock.recv(4096))
+            except socket.timeout:
+                break
+            except DhcpError:
+                continue
+            if reply.op == BOOTREPLY and reply.xid == message.xid and reply.type in kinds:
+                return reply
+        #RFC 2131 4.1: wait twice as long every time
+        wait *= 2
+    return None
+
+
+def client_socket(interface):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    #without an address the packets only go out on the interface it is bound to
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+    sock.bind(('', CLIENT_PORT))
+    return sock
+
+
+def lease(sock, chaddr, tries, timeout, hostname):
+    #DISCOVER, OFFER, REQUEST, ACK; the ACK, or None
+    server = ('255.255.255.255', SERVER_PORT)
+    rng = random.Random()
+    for _ in range(tries):
+        options = {MESSAGE_TYPE: bytes((DISCOVER,)), PARAMETERS: WANTED, HOSTNAME: hostname.encode()}
+        discover = Message(xid=rng.getrandbits(32), chaddr=chaddr, flags=BROADCAST_FLAG, options=options)
+        offer = exchange(sock, discover, (OFFER,), server, tries, timeout)
+        if offer is None:
+            return None
+        options = {MESSAGE_TYPE: bytes((REQUEST,)), PARAMETERS: WANTED, HOSTNAME: hostname.encode(),
+                   REQUESTED_IP: pack_address(offer.yiaddr), SERVER_ID: offer.options[SERVER_ID]}
+        request = Message(xid=discover.xid, chaddr=chaddr, flags=BROADCAST_FLAG, options=options)
+        ack = exchange(sock, request, (ACK, NAK), server, tries, timeout)
+        if ack is not None and ack.type == ACK:
+            return ack
+        if ack is not None:
+            print(f'NAK: {ack.options.get(MESSAGE, b"").decode(errors="replace")}', flush=True)
+    return None
+
+
+def seconds(ack, option, default):
+    value = ack.options.get(option)
+    return int.from_bytes(value, 'big') if value and len(value) == 4 else default
+
+
+def prefix_of(ack):
+    mask = ack.option_address(SUBNET_MASK) or 0xffffff00
+    return f'{format_address(ack.yiaddr)}/{bin(mask).count("1")}'
+
+
+def configure(interface, ack, old=None):
+    if old is not None and old.yiaddr != ack.yiaddr:
+        unconfigure(interface, old)
+    subprocess.run(['ip', 'addr', 'replace', prefix_of(ack), 'dev', interface], check=True)
+    router = ack.option_address(ROUTER)
+    if router:
+        subprocess.run(['ip', 'route', 'replace', 'default', 'via', format_address(router), 'dev', interface], check=True)
+
+
+def unconfigure(interface, ack):
+    subprocess.run(['ip', 'addr', 'del', prefix_of(ack), 'dev', interface], capture_output=True)
+
+
+def print_lease(ack):
+    router = ack.option_address(ROUTER)
+    print(f'leased {prefix_of(ack)} from {format_address(ack.option_address(SERVER_ID))} '
+          f'for {seconds(ack, LEASE_TIME, 0)} s, router {format_address(router) if router else "none"}', flush=True)
+
+
+def renew(sock, chaddr, ack, leased, tries, timeout):
+    #keeps the lease of ack (ACKed at the time leased) as long as a server
+    #extends it. returns the new ACK and its time, or None when it is gone
+    total = seconds(ack, LEASE_TIME, 3600)
+    phases = ((seconds(ack, RENEWAL_TIME, total * 0.5), (format_address(ack.option_address(SERVER_ID)), SERVER_PORT)),
+              (seconds(ack, REBINDING_TIME, total * 0.875), ('255.255.255.255', SERVER_PORT)))
+    request = Message(xid=random.getrandbits(32), chaddr=chaddr, ciaddr=ack.yiaddr,
+                      options={MESSAGE_TYPE: bytes((REQUEST,)), PARAMETERS: WANTED})
+    for start, server in phases:
+        wait = leased + start - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        reply = exchange(sock, request, (ACK, NAK), server, tries, timeout)
+        if reply is not None and reply.type == ACK:
+            return reply, time.monotonic()
+        if reply is not None:
+            return None
+    #nobody extended it, it runs out
+    time.sleep(max(0.0, leased + total - time.monotonic()))
+    return None
+
+
+class LoadClient:
+    '''many clients at once, through one socket, as a relay agent'''
+
+    def __init__(self, server, relay, subnet, count, window, timeout, tries):
+        self.server = server
+        self.subnet = pack_address(subnet)
+        self.count = count
+        self.window = window
+        self.timeout = timeout
+        self.tries = tries
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(relay)
+        self.giaddr = parse_address(socket.gethostbyname(relay[0]))
+        self.pending = {}       # xid -> [client, phase, started, sent, tries, offer]
+        self.next_client = 0
+        self.histogram = Histogram()
+        self.done = []          # time of every ACK
+        self.naks = 0
+        self.failed = 0
+        self.resent = 0
+        self.addresses = set()
+
+    def message(self, client, kind, offer=None):
+        options = {MESSAGE_TYPE: bytes((kind,)), SUBNET_SELECTION: self.subnet}
+        if offer is not None:
+            options[REQUESTED_IP] = pack_address(offer.yiaddr)
+            options[SERVER_ID] = offer.options[SERVER_ID]
+        chaddr = b'\x02' + client.to_bytes(5, 'big')
+        return encode(Message(xid=client, chaddr=chaddr, giaddr=self.giaddr, hops=1, options=options))
+
+    def start(self, now):
+        while len(self.pending) < self.window and self.next_client < self.count:
+            self.next_client += 1
+            client = self.next_client
+            self.pending[client] = [client, DISCOVER, now, now, 1, None]
+            self.sock.sendto(self.message(client, DISCOVER), self.server)
+
+    def on_reply(self, reply, now):
+        state = self.pending.get(reply.xid)
+        if state is None:
+            return
+        if state[1] == DISCOVER and reply.type == OFFER:
+            state[1:] = [REQUEST, state[2], now, 1, reply]
+            self.sock.sendto(self.message(state[0], REQUEST, reply), self.server)
+        elif state[1] == REQUEST and reply.type == ACK:
+            del self.pending[reply.xid]
+            self.histogram.record(int((now - state[2]) * 1e6))
+            self.done.append(now)
+            self.addresses.add(reply.yiaddr)
+        elif state[1] == REQUEST and reply.type == NAK:
+            del self.pending[reply.xid]
+            self.naks += 1
+
+    def check(self, now):
+        #sends again what has not been answered in time
+        for xid, state in list(self.pending.items()):
+            if now - state[3] < self.timeout * 2 ** (state[4] - 1):
+                continue
+            if state[4] >= self.tries:
+                del self.pending[xid]
+                self.failed += 1
+                continue
+            state[3] = now
+            state[4] += 1
+            self.resent += 1
+            self.sock.sendto(self.message(state[0], state[1], state[5]), self.server)
+
+    def run(self):
+        started = time.perf_counter()
+        self.start(started)
+        next_check = started + CHECK_INTERVAL
+        self.sock.settimeout(CHECK_INTERVAL)
+        while self.pending or self.next_client < self.count:
+            try:
+                data = self.sock.recv(4096)
+            except socket.timeout:
+                data = None
+            now = time.perf_counter()
+            if data is not None:
+                try:
+                    self.on_reply(decode(data), now)
+                except DhcpError:
+                    pass
+            if now >= next_check:
+                self.check(now)
+                next_check = now + CHECK_INTERVAL
+            self.start(now)
+        return time.perf_counter() - started, started
+
+    def report(self, elapsed, started):
+        done = len(self.done)
+        print(f'{done} of {self.count} clients leased in {elapsed:.2f} s, {done / elapsed:,.0f} leases/sec, '
+              f'{self.naks} NAKs, {self.failed} without an answer, {self.resent} sent again')
+        if len(self.addresses) != done:
+            print(f'only {len(self.addresses)} different addresses for {done} leases')
+        if done:
+            latencies = ', '.join(f'p{p} {self.histogram.percentile(p) / 1000:.2f}' for p in PERCENTILES)
+            print(f'DISCOVER to ACK (ms): {latencies}, max {self.histogram.max / 1000:.2f}')
+        #the leases per second while the pool fills up, a tenth of them at a time
+        tenth = max(1, done // 10)
+        previous = started
+        rows = []
+        for i in range(tenth - 1, done, tenth):
+            rows.append(f'{(i + 1) / done * 100:4.0f}% {tenth / max(self.done[i] - previous, 1e-9):8,.0f}/s')
+            previous = self.done[i]
+        if rows:
+            print('leases per second by the share of all leases: ' + '  '.join(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DHCP client for one interface, or many made-up ones for load', epilog='end of help')
+    parser.add_argument('-i', '--interface', type=str, help='the interface to lease an address for')
+    parser.add_argument('-n', '--no-config', action='store_true', help='only print the lease, do not configure the interface')
+    parser.add_argument('-r', '--renew', action='store_true', help='stay and renew the lease')
+    parser.add_argument('-b', '--background', action='store_true', help='renew the lease in the background once there is one')
+    parser.add_argument('--hostname', type=str, default=socket.gethostname(), help='the host name the server logs')
+    parser.add_argument('--tries', type=check_positive, default=4, help='times a message is sent without an answer')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds until the first retry, doubled every time')
+    parser.add_argument('--load', type=check_positive, help='this many made-up clients instead of an interface')
+    parser.add_argument('--window', type=check_positive, default=256, help='load: clients that lease at the same time')
+    parser.add_argument('--server', type=check_address, default=('127.0.0.1', 6767), help='load: host:port of the server')
+    parser.add_argument('--relay', type=check_address, default=('127.0.0.1', 6768), help='load: host:port the server answers to')
+    parser.add_argument('--subnet', type=check_ip, default=parse_address('10.64.0.0'), help='load: the subnet to lease in')
+    args = parser.parse_args()
+
+    if args.load:
+        client = LoadClient(args.server, args.relay, args.subnet, args.load, args.window, args.timeout, args.tries)
+        client.report(*client.run())
+        return
+    if not args.interface:
+        parser.error('give an interface with -i, or --load')
+    with open(f'/sys/class/net/{args.interface}/address') as f:
+        chaddr = bytes.fromhex(f.read().strip().replace(':', ''))
+    try:
+        sock = client_socket(args.interface)
+    except PermissionError:
+        print('port 68 and SO_BINDTODEVICE need root')
+        sys.exit(1)
+    forked = False
+    while True:
+        ack = lease(sock, chaddr, args.tries, args.timeout, args.hostname)
+        #in the background it tries again, until then it gives up like without --renew
+        if ack is None and (args.renew or forked):
+            print(f'no lease for {args.interface}, trying again in {RETRY:.0f} s', flush=True)
+            time.sleep(RETRY)
+            continue
+        if ack is None:
+            print(f'no lease for {args.interface}')
+            sys.exit(1)
+        print_lease(ack)
+        if not args.no_config:
+            configure(args.interface, ack)
+        if not (args.renew or args.background):
+            return
+        leased = time.monotonic()
+        if args.background and not forked:
+            forked = True
+            #the child stays in the process group of the host, mininet stops it with the host
+            if os.fork():
+                return
+        while True:
+            renewed = renew(sock, chaddr, ack, leased, args.tries, args.timeout)
+            if renewed is None:
+                break
+            if not args.no_config:
+                configure(args.interface, renewed[0], ack)
+            ack, leased = renewed
+            print(f'renewed {prefix_of(ack)} for {seconds(ack, LEASE_TIME, 0)} s', flush=True)
+        print(f'lost {prefix_of(ack)}', flush=True)
+        if not args.no_config:
+            unconfigure(args.interface, ack)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+'''
+    #a DHCP server for the hosts of a mininet network, instead of
+    #isc-dhcp-server in docs/addressing/dhcp-addressing.md. the protocol is in
+    #server.py, the pools, leases and the lease log in leases.py
+
+    #it gives out addresses on every interface it is started on, in the
+    #subnet of the interface (the address of the router is the default route
+    #of the clients), and on the subnets of -s for requests that come through
+    #a relay agent:
+    #   mininet> r python3 dhcp/dhcpd.py -i r-eth0 r-eth1 --leases /tmp/dhcpd-r.leases &
+    #   mininet> h1 python3 dhcp/client.py -i h1-eth0
+    #or let topology-builder/network.py do it with start_network(topology, dhcp='').
+
+    #the ACKs wait until their leases are written to the log: all leases that
+    #were bound in one round of the event loop (up to --batch of them, at most
+    #--flush ms later) go into the file with one write and one fsync, then
+    #their ACKs go out. the OFFERs and NAKs go out at once.
+
+    #without root and mininet, for client.py --load, it listens on a port of
+    #localhost and the load client acts as the relay agent:
+    #   python3 dhcpd.py --listen 127.0.0.1:6767 --relay-port 6768 -s 10.64.0.1/16 --leases /tmp/load.leases
+    #   python3 client.py --load 20000 --server 127.0.0.1:6767 --relay 127.0.0.1:6768 --subnet 10.64.0.0
+'''
+
+import argparse
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+from leases import BATCH, FLUSH_INTERVAL, LeaseLog, read_log
+from message import BOOTREQUEST, CLIENT_PORT, NAK, SERVER_PORT, DhcpError, decode, encode
+from server import DEFAULT_LEASE_TIME, OFFER_TIME, Server, Subnet, parse_subnet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import parse_address
+#the interfaces of the node, as ripd finds them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dynamic-routing'))
+from ripd import find_interfaces
+
+
+# seconds between two looks at the expired leases
+EXPIRE_INTERVAL = 1.0
+# datagrams read from a socket before the others get their turn
+READ_BATCH = 64
+BROADCAST = '255.255.255.255'
+# bytes of requests the kernel keeps for the server while it writes the log
+RECEIVE_BUFFER = 4 * 1024 * 1024
+
+
+def check_port(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if not 1 <= value <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+def check_positive(val):
+    try:
+        value = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a number')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def check_ip(val):
+    value = parse_address(val)
+    if value is None:
+        raise argparse.ArgumentTypeError(f'{val} is not a valid IPv4 address')
+    return value
+
+
+def check_address(val):
+    host, _, port = val.rpartition(':')
+    return host or '127.0.0.1', check_port(port)
+
+
+def check_subnet(val):
+    try:
+        return parse_subnet(val)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def open_socket(interface, port):
+    #a socket for the requests that come in on one interface, broadcasts included
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+    sock.bind(('', port))
+    sock.setblocking(False)
+    return sock
+
+
+def destination(request, reply, relay_port, client_port):
+    #where a reply goes (RFC 2131 4.1): to the relay agent, to the address
+    #of a client that has one, or to everyone on the link (the client has no
+    #address yet, and the server does not put one into the ARP table)
+    if request.giaddr:
+        return socket.inet_ntoa(request.giaddr.to_bytes(4, 'big')), relay_port
+    if request.ciaddr and reply.type != NAK:
+        return socket.inet_ntoa(request.ciaddr.to_bytes(4, 'big')), client_port
+    return BROADCAST, client_port
+
+
+def send(sock, data, target):
+    try:
+        sock.sendto(data, target)
+        return True
+    except OSError:
+        #the interface is down, or a full buffer
+        return False
+
+
+def report_line(server, log, bad):
+    s = server.statistics()
+    leases = ', '.join(f'{n} {state}' for state, n in sorted(s['leases'].items()))
+    sent = ', '.join(f'{n} {kind}' for kind, n in s['sent'].items())
+    free = ', '.join(f'{subnet} {n}' for subnet, n in s['free'].items())
+    return (f'leases: {leases or "none"} | sent: {sent or "nothing"} | free: {free} | '
+            f'{s["exhausted"]} exhausted, {s["expired"]} expired, {bad} bad | '
+            f'log: {log.written} lines in {log.writes} writes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DHCP server for the hosts of a mininet network', epilog='end of help')
+    parser.add_argument('-i', '--interfaces', nargs='+', default=[], help='the interfaces to give out addresses on')
+    parser.add_argument('-s', '--subnets', type=check_subnet, nargs='+', default=[],
+                        help='more subnets for requests through a relay, e.g. 10.64.0.1/16 (the address of the server in it)')
+    parser.add_argument('-x', '--exclude', type=check_ip, nargs='+', default=[], help='addresses that are not given out (other routers)')
+    parser.add_argument('--dns', type=check_ip, nargs='+', default=[], help='DNS servers for the clients')
+    parser.add_argument('-t', '--lease-time', type=check_positive, default=DEFAULT_LEASE_TIME, help='seconds of a lease')
+    parser.add_argument('--offer-time', type=check_positive, default=OFFER_TIME, help='seconds an offered address is kept')
+    parser.add_argument('--leases', type=str, default='/tmp/dhcpd.leases', help='the lease log')
+    parser.add_argument('--batch', type=int, default=BATCH, help='leases written to the log at once at most')
+    parser.add_argument('--flush', type=check_positive, default=FLUSH_INTERVAL * 1000, help='ms a lease waits at most to be written')
+    parser.add_argument('--no-sync', action='store_true', help='do not fsync the log (a crash may lose leases)')
+    parser.add_argument('-p', '--port', type=check_port, default=SERVER_PORT, help='UDP port of the server')
+    parser.add_argument('--client-port', type=check_port, default=CLIENT_PORT, help='UDP port of the clients')
+    parser.add_argument('--relay-port', type=check_port, default=SERVER_PORT, help='UDP port of the relay agents')
+    parser.add_argument('--listen', type=check_address, help='host:port to listen on instead of the interfaces')
+    parser.add_argument('--interval', type=float, default=10.0, help='seconds between two reports')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report at the end')
+    args = parser.parse_args()
+
+    exclude = args.exclude
+    subnets = []
+    if not args.listen:
+        found = find_interfaces()
+        names = args.interfaces or list(found)
+        missing = [name for name in names if name not in found]
+        if missing:
+            print(f'no IPv4 address on {", ".join(missing)}')
+            sys.exit(1)
+        subnets = [Subnet(str(found[name]), name, exclude=exclude, dns=args.dns) for name in names]
+    subnets += [Subnet(text, exclude=exclude, dns=args.dns) for text in args.subnets]
+    if not subnets:
+        parser.error('no subnet to give out addresses in, give one with -s')
+    server = Server(subnets, args.lease_time, args.offer_time)
+
+    now = time.time()
+    try:
+        restored = server.restore(read_log(args.leases, now), now)
+        log = LeaseLog(args.leases, args.batch, args.flush / 1000, not args.no_sync)
+        #the old lines go, the leases that are still valid stay
+        log.compact(server.table.leases(), now)
+    except OSError as e:
+        print(f'cannot use the lease log {args.leases}: {e}')
+        sys.exit(1)
+
+    selector = selectors.DefaultSelector()
+    try:
+        if args.listen:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            sock.bind(args.listen)
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, None)
+        else:
+            for subnet in subnets:
+                if subnet.interface:
+                    selector.register(open_socket(subnet.interface, args.port), selectors.EVENT_READ, subnet.interface)
+    except PermissionError:
+        print(f'port {args.port} and SO_BINDTODEVICE need root')
+        sys.exit(1)
+
+    print(f'serving {", ".join(f"{s} on {s.interface}" if s.interface else str(s) for s in subnets)}, '
+          f'{restored} leases from {args.leases}', flush=True)
+    #mininet stops the server with SIGTERM, the waiting leases are written on the way out
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    bad = 0
+    next_expire = now + EXPIRE_INTERVAL
+    next_report = now + args.interval
+    try:
+        while True:
+            deadline = min(next_expire, log.deadline() or next_expire)
+            for key, _ in selector.select(max(0.0, deadline - time.time())):
+                sock, interface = key.fileobj, key.data
+                now = time.time()
+                for _ in range(READ_BATCH):
+                    try:
+                        data = sock.recv(4096)
+                    except BlockingIOError:
+                        break
+                    except OSError:
+                        continue
+                    try:
+                        request = decode(data)
+                    except DhcpError:
+                        bad += 1
+                        continue
+                    if request.op != BOOTREQUEST:
+                        continue
+                    reply, line = server.handle(request, interface, now)
+                    if reply is None:
+                        if line is not None:
+                            log.append(line, now)
+                        continue
+                    packet = encode(reply)
+                    target = destination(request, reply, args.relay_port, args.client_port)
+                    if line is None:
+                        send(sock, packet, target)
+                    else:
+                        #the ACK goes out once the lease is on the disk
+                        log.append(line, now, (sock, packet, target))
+            now = time.time()
+            if log.due(now):
+                for sock, packet, target in log.flush():
+                    send(sock, packet, target)
+            if now >= next_expire:
+                server.expire(now)
+                if log.needs_compaction(len(server.table)):
+                    log.compact(server.table.leases(), now)
+                next_expire = now + EXPIRE_INTERVAL
+            if not args.quiet and now >= next_report:
+                print(report_line(server, log, bad), flush=True)
+                next_report = now + args.interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sock, packet, target in log.flush():
+            send(sock, packet, target)
+        log.close()
+        print(report_line(server, log, bad))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+'''
+    #the addresses and leases of the DHCP server in dhcpd.py
+
+    #Pool: the addresses of one subnet as a bitmap, one bit per address
+    #(1: taken), in 64 bit words, 8 KB for a /16. the words that still have a
+    #free bit are on a stack, so allocate() takes the top word and the lowest
+    #0 in it ((~w & (w + 1)).bit_length() - 1) without searching: the last
+    #free address of a full pool is found as fast as the first one. a word
+    #that fills up leaves the stack when allocate() comes across it, a word
+    #that gets a free bit again goes back on it.
+
+    #LeaseTable: the leases by client and by address, and a heap of the
+    #expiry times. a lease that is renewed gets a new entry in the heap, the
+    #old one stays there and is skipped when it comes out (its time is not
+    #the time of the lease anymore). expire() pops what is due.
+
+    #LeaseLog: the bound leases go into a file that is only ever appended to,
+    #one line per change:
+    #   1712345678.12 bind 01:02:00:00:00:00:01 10.64.0.2 1712349278.12 h1
+    #   1712345690.50 free 01:02:00:00:00:00:01 10.64.0.2
+    #the lines are collected and written with one write() and one fsync()
+    #per batch (every --flush ms, or when --batch lines are waiting), and the
+    #ACKs of a batch are sent once it is on the disk, so a lease the client
+    #got survives a crash of the server. at start the log is read back and
+    #written anew with only the leases that are still valid.
+
+    #as a program it compares the pool with a linear search for a free
+    #address while a pool fills up:
+    #   python3 leases.py --prefix 16
+'''
+
+import argparse
+import heapq
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import format_address, parse_address
+
+
+WORD = 64
+FULL = (1 << WORD) - 1
+
+# lines of the log that wait before they are written at once
+BATCH = 256
+# seconds a line waits at most
+FLUSH_INTERVAL = 0.005
+# the log is rewritten when it has this many times more lines than leases
+COMPACT_FACTOR = 4
+COMPACT_MIN = 10000
+
+
+class Pool:
+    '''the free addresses of a subnet, a bitmap with a stack of the words that are not full'''
+
+    def __init__(self, first, last, exclude=()):
+        self.first = first
+        self.last = last
+        self.size = last - first + 1
+        words = -(-self.size // WORD)
+        self.bits = array('Q', bytes(8 * words))
+        #the bits after the last address are taken for good
+        rest = words * WORD - self.size
+        if rest:
+            self.bits[-1] = (FULL << (WORD - rest)) & FULL
+        #the lowest word on top
+        self.stack = array('L', range(words - 1, -1, -1))
+        self.listed = bytearray(b'\x01' * words)
+        self.free = self.size
+        for address in exclude:
+            if address in self:
+                self.take(address)
+
+    def __contains__(self, address):
+        return self.first <= address <= self.last
+
+    def __len__(self):
+        return self.free
+
+    def allocate(self):
+        #the lowest free address of the lowest word that is not full, None if the pool is full
+        stack = self.stack
+        bits = self.bits
+        while stack:
+            i = stack[-1]
+            word = bits[i]
+            if word != FULL:
+                break
+            stack.pop()
+            self.listed[i] = 0
+        else:
+            return None
+        bit = (~word & (word + 1)).bit_length() - 1
+        bits[i] = word | (1 << bit)
+        self.free -= 1
+        return self.first + i * WORD + bit
+
+    def take(self, address):
+        #takes a given address (the one a client asks for), False if it is not free
+        i, bit = divmod(address - self.first, WORD)
+        word = self.bits[i]
+        if word >> bit & 1:
+            return False
+        self.bits[i] = word | (1 << bit)
+        self.free -= 1
+        return True
+
+    def release(self, address):
+        i, bit = divmod(address - self.first, WORD)
+        word = self.bits[i]
+        if not word >> bit & 1:
+            return
+        self.bits[i] = word & ~(1 << bit)
+        self.free += 1
+        if not self.listed[i]:
+            self.stack.append(i)
+            self.listed[i] = 1
+
+    def is_free(self, address):
+        i, bit = divmod(address - self.first, WORD)
+        return not self.bits[i] >> bit & 1
+
+
+class Lease:
+
+    __slots__ = ('client', 'address', 'expires', 'state', 'hostname')
+
+    def __init__(self, client, address, expires, state, hostname=''):
+        self.client = client
+        self.address = address
+        self.expires = expires
+        self.state = state      # 'offered', 'bound' or 'declined'
+        self.hostname = hostname
+
+    def __repr__(self):
+        return f'{format_address(self.address)} {self.state} {self.client.hex(":")} until {self.expires:.0f}'
+
+
+class LeaseTable:
+    '''the leases by client and by address, with a heap of their expiry times'''
+
+    def __init__(self):
+        self.by_client = {}
+        self.by_address = {}
+        self.heap = []          # (expires, address), old entries are skipped
+        self.previous = {}      # client -> the address of its lease that expired
+
+    def __len__(self):
+        return len(self.by_address)
+
+    def add(self, lease):
+        old = self.by_address.get(lease.address)
+        if old is not None and old is not lease:
+            self.remove(old)
+        if lease.client:
+            self.by_client[lease.client] = lease
+        self.by_address[lease.address] = lease
+        heapq.heappush(self.heap, (lease.expires, lease.address))
+
+    def extend(self, lease, expires):
+        lease.expires = expires
+        heapq.heappush(self.heap, (expires, lease.address))
+        if len(self.heap) > 2 * len(self.by_address) + 64:
+            #mostly old entries, build it again from the leases
+            self.heap = [(lease.expires, lease.address) for lease in self.by_address.values()]
+            heapq.heapify(self.heap)
+
+    def remove(self, lease):
+        if self.by_address.get(lease.address) is lease:
+            del self.by_address[lease.address]
+        if lease.client and self.by_client.get(lease.client) is lease:
+            del self.by_client[lease.client]
+            self.previous[lease.client] = lease.address
+
+    def expire(self, now):
+        #removes and returns the leases that have run out
+        expired = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            expires, address = heapq.heappop(heap)
+            lease = self.by_address.get(address)
+            if lease is not None and lease.expires == expires:
+                self.remove(lease)
+                expired.append(lease)
+        return expired
+
+    def next_expiry(self):
+        #the time of the first entry in the heap, it may be an old one
+        return self.heap[0][0] if self.heap else None
+
+    def leases(self):
+        return list(self.by_address.values())
+
+
+def lease_line(now, lease):
+    hostname = f' {lease.hostname}' if lease.hostname else ''
+    return (f'{now:.2f} bind {lease.client.hex(":")} {format_address(lease.address)} '
+            f'{lease.expires:.2f}{hostname}\n')
+
+
+def free_line(now, lease):
+    return f'{now:.2f} free {lease.client.hex(":")} {format_address(lease.address)}\n'
+
+
+class LeaseLog:
+    '''the append-only file of the leases, written in batches'''
+
+    def __init__(self, path, batch=BATCH, interval=FLUSH_INTERVAL, sync=True):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self.sync = sync
+        self.file = open(path, 'a') if path else None
+        self.lines = []
+        self.waiting = []       # what to do once the lines are on the disk
+        self.first = None       # when the oldest waiting line came
+        self.records = 0        # lines in the file
+        self.writes = 0
+        self.written = 0
+
+    def append(self, line, now, then=None):
+        if not self.lines:
+            self.first = now
+        self.lines.append(line)
+        if then is not None:
+            self.waiting.append(then)
+
+    def deadline(self):
+        #when the waiting lines must be written, None if there are none
+        if not self.lines:
+            return None
+        return self.first + self.interval
+
+    def due(self, now):
+        return bool(self.lines) and (len(self.lines) >= self.batch or now >= self.first + self.interval)
+
+    def flush(self):
+        #writes the waiting lines at once and returns what waited for them
+        if self.file is not None and self.lines:
+            self.file.write(''.join(self.lines))
+            self.file.flush()
+            if self.sync:
+                os.fsync(self.file.fileno())
+            self.writes += 1
+        self.records += len(self.lines)
+        self.written += len(self.lines)
+        self.lines = []
+        self.first = None
+        waiting, self.waiting = self.waiting, []
+        return waiting
+
+    def compact(self, leases, now):
+        #writes the file anew with only the bound leases, into a new file
+        #that then replaces the old one, so a crash leaves one of the two
+        if self.file is None:
+            return
+        self.flush()
+        temporary = self.path + '.new'
+        with open(temporary, 'w') as f:
+            f.write(''.join(lease_line(now, lease) for lease in leases if lease.state == 'bound'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.file.close()
+        self.file = open(self.path, 'a')
+        self.records = sum(1 for lease in leases if lease.state == 'bound')
+
+    def needs_compaction(self, leases):
+        return self.records > COMPACT_FACTOR * leases + COMPACT_MIN
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def read_log(path, now):
+    #the bound leases of a log that are still valid: address -> (client, expires, hostname)
+    leases = {}
+    if not path or not os.path.exists(path):
+        return leases
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            try:
+                if fields[1] == 'bind':
+                    hostname = fields[5] if len(fields) > 5 else ''
+                    leases[parse_address(fields[3])] = (bytes.fromhex(fields[2].replace(':', '')),
+                                                        float(fields[4]), hostname)
+                elif fields[1] == 'free':
+                    leases.pop(parse_address(fields[3]), None)
+            except (IndexError, ValueError):
+                #the last line of a crash, written halfway
+                continue
+    return {address: lease for address, lease in leases.items() if lease[1] > now}
+
+
+class LinearPool:
+    '''the free addresses found by trying one after the other, to compare'''
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self.taken = set()
+
+    def allocate(self):
+        for address in range(self.first, self.last + 1):
+            if address not in self.taken:
+                self.taken.add(address)
+                return address
+        return None
+
+
+def benchmark(length, steps, sample):
+    network = parse_address('10.64.0.0')
+    first, last = network + 1, network + (1 << (32 - length)) - 2
+    size = last - first + 1
+    bitmap = Pool(first, last)
+    linear = LinearPool(first, last)
+    print(f'a /{length} pool, {size} addresses, time per allocation while it fills up:')
+    print(f'{"filled":>8} {"bitmap":>12} {"linear":>12}')
+    step = size // steps
+    allocated = 0
+    for i in range(steps):
+        count = step if i < steps - 1 else size - allocated
+        allocate = bitmap.allocate
+        started = time.perf_counter()
+        for _ in range(count):
+            allocate()
+        one = (time.perf_counter() - started) / count
+        #the linear search is too slow to fill a large pool with it, the pool
+        #is filled directly and only a sample is timed
+        n = min(sample, count)
+        linear.taken.update(range(first + allocated, first + allocated + count - n))
+        started = time.perf_counter()
+        for _ in range(n):
+            linear.allocate()
+        other = (time.perf_counter() - started) / n
+        allocated += count
+        print(f'{allocated / size * 100:7.0f}% {one * 1e9:10.0f}ns {other * 1e9:10.0f}ns')
+    if bitmap.allocate() is not None or len(bitmap):
+        print('the full pool still gave out an address')
+        sys.exit(1)
+    #free every other address and take them all again
+    for address in range(first, last + 1, 2):
+        bitmap.release(address)
+    started = time.perf_counter()
+    again = [bitmap.allocate() for _ in range((size + 1) // 2)]
+    refill = (time.perf_counter() - started) / len(again)
+    if sorted(again) != list(range(first, last + 1, 2)):
+        print('the released addresses did not come back')
+        sys.exit(1)
+    print(f'released every other address and allocated them again: {refill * 1e9:.0f} ns each, '
+          f'bitmap {len(bitmap.bits) * 8 / 1024:.1f} KB')
+
+
+def check_prefix(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a prefix length')
+    if not 8 <= value <= 30:
+        raise argparse.ArgumentTypeError('the prefix length must be between 8 and 30')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='allocation from the bitmap pool of the DHCP server', epilog='end of help')
+    parser.add_argument('--prefix', type=check_prefix, default=16, help='length of the prefix of the pool')
+    parser.add_argument('--steps', type=int, default=10, help='rows of the table')
+    parser.add_argument('--sample', type=int, default=50, help='allocations per row that are timed for the linear search')
+    args = parser.parse_args()
+    benchmark(args.prefix, args.steps, args.sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+'''
+    #the DHCP messages of RFC 2131 on the wire
+
+    #a DHCP message is the fixed BOOTP header (236 bytes: the addresses, the
+    #hardware address of the client, the empty sname and file fields), the
+    #magic cookie 99.130.83.99 and then the options, each a code, a length and
+    #the value, until the END option. the type of the message (DISCOVER,
+    #OFFER, REQUEST, ...) is option 53. the addresses are ints here, like in
+    #forwarding/lpm.py, the options a dict of code -> bytes.
+
+    #   message = decode(data)
+    #   message.type == DISCOVER, message.chaddr.hex(':'), message.option_address(REQUESTED_IP)
+    #   offer = message.reply(OFFER, yiaddr, {SERVER_ID: pack_address(server), LEASE_TIME: pack_seconds(3600)})
+    #   sock.sendto(encode(offer), ('255.255.255.255', CLIENT_PORT))
+
+    #an option that is longer than 255 bytes comes as several options with
+    #the same code (RFC 3396), decode() puts them together again. options in
+    #the sname and file fields (option 52, overload) are not read.
+'''
+
+import struct
+
+
+SERVER_PORT = 67
+CLIENT_PORT = 68
+
+HEADER = struct.Struct('!BBBBIHHIIII16s64s128s')
+MAGIC = b'\x63\x82\x53\x63'
+# BOOTP says 300 bytes at least, some clients drop shorter replies
+MIN_SIZE = 300
+
+BOOTREQUEST = 1
+BOOTREPLY = 2
+HTYPE_ETHERNET = 1
+BROADCAST_FLAG = 0x8000
+
+# option 53, the type of the message
+DISCOVER = 1
+OFFER = 2
+REQUEST = 3
+DECLINE = 4
+ACK = 5
+NAK = 6
+RELEASE = 7
+INFORM = 8
+TYPES = {DISCOVER: 'DISCOVER', OFFER: 'OFFER', REQUEST: 'REQUEST', DECLINE: 'DECLINE',
+         ACK: 'ACK', NAK: 'NAK', RELEASE: 'RELEASE', INFORM: 'INFORM'}
+
+# the options
+PAD = 0
+SUBNET_MASK = 1
+ROUTER = 3
+DNS = 6
+HOSTNAME = 12
+BROADCAST_ADDRESS = 28
+REQUESTED_IP = 50
+LEASE_TIME = 51
+MESSAGE_TYPE = 53
+SERVER_ID = 54
+PARAMETERS = 55
+MESSAGE = 56
+MAX_SIZE = 57
+RENEWAL_TIME = 58
+REBINDING_TIME = 59
+CLIENT_ID = 61
+SUBNET_SELECTION = 118      # RFC 3011, the subnet a relay (or the load client) asks for
+END = 255
+
+
+class DhcpError(ValueError):
+    pass
+
+
+def pack_address(address):
+    return address.to_bytes(4, 'big')
+
+
+def pack_seconds(seconds):
+    return int(seconds).to_bytes(4, 'big')
+
+
+class Message:
+    '''one DHCP message, the fields of the header and the options'''
+
+    __slots__ = ('op', 'htype', 'hlen', 'hops', 'xid', 'secs', 'flags', 'ciaddr', 'yiaddr', 'siaddr', 'giaddr',
+                 'chaddr', 'options')
+
+    def __init__(self, op=BOOTREQUEST, xid=0, chaddr=b'', ciaddr=0, yiaddr=0, siaddr=0, giaddr=0, flags=0,
+                 secs=0, hops=0, htype=HTYPE_ETHERNET, options=None):
+        self.op = op
+        self.htype = htype
+        self.hlen = len(chaddr) or 6
+        self.hops = hops
+        self.xid = xid
+        self.secs = secs
+        self.flags = flags
+        self.ciaddr = ciaddr
+        self.yiaddr = yiaddr
+        self.siaddr = siaddr
+        self.giaddr = giaddr
+        self.chaddr = chaddr
+        self.options = options if options is not None else {}
+
+    @property
+    def type(self):
+        value = self.options.get(MESSAGE_TYPE)
+        return value[0] if value else None
+
+    def option_address(self, code):
+        #an option with one address (requested ip, server id), None without it
+        value = self.options.get(code)
+        if value is None or len(value) != 4:
+            return None
+        return int.from_bytes(value, 'big')
+
+    def client_id(self):
+        #the key of the client: its client identifier, or the type and hardware address
+        value = self.options.get(CLIENT_ID)
+        if value:
+            return value
+        return bytes((self.htype,)) + self.chaddr
+
+    def reply(self, kind, yiaddr=0, options=None):
+        #a reply from the server to this request, with the type kind
+        answer = Message(BOOTREPLY, self.xid, self.chaddr, yiaddr=yiaddr, giaddr=self.giaddr, flags=self.flags,
+                         htype=self.htype)
+        answer.options[MESSAGE_TYPE] = bytes((kind,))
+        if options:
+            answer.options.update(options)
+        if kind != NAK and self.type != DISCOVER:
+            #the address of a client that renews stays where it is
+            answer.ciaddr = self.ciaddr
+        return answer
+
+    def __repr__(self):
+        return f'{TYPES.get(self.type, self.type)} xid {self.xid:#010x} from {self.chaddr.hex(":")}'
+
+
+def decode(data):
+    if len(data) < HEADER.size + len(MAGIC):
+        raise DhcpError(f'{len(data)} bytes is too short for a DHCP message')
+    (op, htype, hlen, hops, xid, secs, flags, ciaddr, yiaddr, siaddr, giaddr,
+     chaddr, _, _) = HEADER.unpack_from(data)
+    if data[HEADER.size:HEADER.size + 4] != MAGIC:
+        raise DhcpError('no magic cookie, a BOOTP message')
+    if hlen > 16:
+        raise DhcpError(f'hardware address of {hlen} bytes')
+    options = {}
+    i = HEADER.size + 4
+    end = len(data)
+    while i < end:
+        code = data[i]
+        if code == END:
+            break
+        if code == PAD:
+            i += 1
+            continue
+        if i + 1 >= end or i + 2 + data[i + 1] > end:
+            raise DhcpError(f'option {code} goes past the end of the message')
+        length = data[i + 1]
+        value = data[i + 2:i + 2 + length]
+        #RFC 3396: an option that comes again continues the one before
+        options[code] = options[code] + value if code in options else value
+        i += 2 + length
+    if MESSAGE_TYPE not in options or len(options[MESSAGE_TYPE]) != 1:
+        raise DhcpError('no message type')
+    message = Message(op, xid, chaddr[:hlen], ciaddr, yiaddr, siaddr, giaddr, flags, secs, hops, htype, options)
+    message.hlen = hlen
+    return message
+
+
+def encode(message):
+    parts = [HEADER.pack(message.op, message.htype, message.hlen, message.hops, message.xid, message.secs,
+                         message.flags, message.ciaddr, message.yiaddr, message.siaddr, message.giaddr,
+                         message.chaddr, b'', b''), MAGIC]
+    #the message type first, some clients look for it there
+    items = sorted(message.options.items(), key=lambda item: item[0] != MESSAGE_TYPE)
+    for code, value in items:
+        #longer than 255 bytes: split (RFC 3396)
+        for start in range(0, max(len(value), 1), 255):
+            chunk = value[start:start + 255]
+            parts.append(bytes((code, len(chunk))))
+            parts.append(chunk)
+    parts.append(bytes((END,)))
+    data = b''.join(parts)
+    if len(data) < MIN_SIZE:
+        data += bytes(MIN_SIZE - len(data))
+    return data
@@ -0,0 +1,298 @@
+'''
+    #the DHCP server of RFC 2131 without the sockets, dhcpd.py runs it
+
+    #handle() takes a decoded message, the interface it came in on and the
+    #time, and returns the reply (or None) and the line for the lease log (or
+    #None). a reply with a line is an ACK of a lease: dhcpd.py only sends it
+    #once the line is on the disk.
+
+    #the subnet of a request is the one of option 118 (subnet selection), of
+    #giaddr (the address of a relay agent), or of the interface, found in a
+    #ForwardingTable of forwarding/lpm.py. an address is offered for
+    #OFFER_TIME seconds: a client that asks again in that time gets the same
+    #one, and a client that comes back after its lease expired gets its old
+    #address again if it is still free.
+
+    #   server = Server([Subnet('10.0.0.1/24', interface='r1-eth0')])
+    #   reply, line = server.handle(decode(data), 'r1-eth0', time.time())
+'''
+
+import os
+import sys
+
+from leases import Lease, LeaseTable, Pool, free_line, lease_line
+from message import (ACK, BROADCAST_ADDRESS, DECLINE, DISCOVER, DNS, HOSTNAME, INFORM, LEASE_TIME, MESSAGE,
+                     NAK, OFFER, REBINDING_TIME, RELEASE, RENEWAL_TIME, REQUEST, REQUESTED_IP, ROUTER, SERVER_ID,
+                     SUBNET_MASK, SUBNET_SELECTION, pack_address, pack_seconds)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import ForwardingTable, format_address, parse_address, parse_prefix
+
+
+# seconds of a lease
+DEFAULT_LEASE_TIME = 3600
+# seconds an offered address is kept for the client
+OFFER_TIME = 60
+# seconds an address a client declined (someone else uses it) is not given out
+DECLINE_TIME = 600
+# the client renews after half of the lease, and asks any server after 7/8
+RENEWAL = 0.5
+REBINDING = 0.875
+
+
+class Subnet:
+    '''a subnet the server gives out addresses in, with the options of its clients'''
+
+    def __init__(self, interface_address, interface=None, first=None, last=None, exclude=(), dns=()):
+        #interface_address: the address of the server on the subnet with the
+        #length of the prefix, e.g. 10.0.0.1/24
+        text, _, length = interface_address.partition('/')
+        self.server = parse_address(text)
+        self.length = int(length)
+        self.mask = (0xffffffff << (32 - self.length)) & 0xffffffff
+        self.network = self.server & self.mask
+        self.broadcast = self.network | (~self.mask & 0xffffffff)
+        self.interface = interface
+        first = self.network + 1 if first is None else first
+        last = self.broadcast - 1 if last is None else last
+        if not (self.network < first <= last < self.broadcast):
+            raise ValueError(f'{format_address(first)}-{format_address(last)} is not in {self}')
+        self.pool = Pool(first, last, list(exclude) + [self.server])
+        self.options = {
+            SUBNET_MASK: pack_address(self.mask),
+            ROUTER: pack_address(self.server),
+            BROADCAST_ADDRESS: pack_address(self.broadcast),
+        }
+        if dns:
+            self.options[DNS] = b''.join(pack_address(a) for a in dns)
+
+    def __contains__(self, address):
+        return address & self.mask == self.network
+
+    def __repr__(self):
+        return f'{format_address(self.network)}/{self.length}'
+
+
+class Server:
+
+    def __init__(self, subnets, lease_time=DEFAULT_LEASE_TIME, offer_time=OFFER_TIME, decline_time=DECLINE_TIME):
+        if not subnets:
+            raise ValueError('the server needs a subnet to give out addresses in')
+        self.subnets = list(subnets)
+        self.by_interface = {s.interface: s for s in self.subnets if s.interface}
+        self.routes = ForwardingTable()
+        for subnet in self.subnets:
+            self.routes.insert((subnet.network, subnet.length), subnet)
+        self.own = {s.server for s in self.subnets}
+        self.lease_time = lease_time
+        self.offer_time = offer_time
+        self.decline_time = decline_time
+        self.table = LeaseTable()
+        self.received = {}          # message type -> count
+        self.sent = {}
+        self.exhausted = 0          # DISCOVERs without a free address
+        self.ignored = 0            # requests for another subnet or server
+        self.expired = 0
+
+    def restore(self, leases, now):
+        #the leases of the log (read_log) are bound again
+        restored = 0
+        for address, (client, expires, hostname) in leases.items():
+            subnet = self.routes.lookup(address)
+            if subnet is None or expires <= now or not subnet.pool.take(address):
+                continue
+            self.table.add(Lease(client, address, expires, 'bound', hostname))
+            restored += 1
+        return restored
+
+    def subnet_for(self, message, interface):
+        selection = message.option_address(SUBNET_SELECTION)
+        if selection is not None:
+            return self.routes.lookup(selection)
+        if message.giaddr:
+            return self.routes.lookup(message.giaddr)
+        return self.by_interface.get(interface)
+
+    def handle(self, message, interface, now):
+        kind = message.type
+        self.received[kind] = self.received.get(kind, 0) + 1
+        subnet = self.subnet_for(message, interface)
+        if subnet is None:
+            self.ignored += 1
+            return None, None
+        if kind == DISCOVER:
+            reply, line = self.discover(message, subnet, now), None
+        elif kind == REQUEST:
+            reply, line = self.request(message, subnet, now)
+        elif kind == DECLINE:
+            reply, line = None, self.decline(message, subnet, now)
+        elif kind == RELEASE:
+            reply, line = None, self.release(message, subnet, now)
+        elif kind == INFORM:
+            reply, line = self.inform(message, subnet), None
+        else:
+            reply, line = None, None
+        if reply is not None:
+            sent = reply.type
+            self.sent[sent] = self.sent.get(sent, 0) + 1
+        return reply, line
+
+    def lease_of(self, client, subnet):
+        lease = self.table.by_client.get(client)
+        if lease is not None and lease.address in subnet:
+            return lease
+        return None
+
+    def discover(self, message, subnet, now):
+        client = message.client_id()
+        pool = subnet.pool
+        lease = self.lease_of(client, subnet)
+        if lease is None:
+            #the address the client asks for, its last one, or any free one
+            address = None
+            for wanted in (message.option_address(REQUESTED_IP), self.table.previous.get(client)):
+                if wanted is not None and wanted in pool and pool.take(wanted):
+                    address = wanted
+                    break
+            if address is None:
+                address = pool.allocate()
+                if address is None:
+                    self.exhausted += 1
+                    return None
+            lease = Lease(client, address, now + self.offer_time, 'offered', self.hostname(message))
+            self.table.add(lease)
+        elif lease.state == 'offered':
+            self.table.extend(lease, now + self.offer_time)
+        return message.reply(OFFER, lease.address, self.lease_options(subnet))
+
+    def request(self, message, subnet, now):
+        client = message.client_id()
+        server_id = message.option_address(SERVER_ID)
+        requested = message.option_address(REQUESTED_IP)
+        lease = self.lease_of(client, subnet)
+        if server_id is not None:
+            #SELECTING: the answer to an OFFER
+            if server_id not in self.own:
+                #the client took the offer of another server
+                if lease is not None and lease.state == 'offered':
+                    self.forget(lease, subnet)
+                self.ignored += 1
+                return None, None
+            if lease is None or lease.address != requested:
+                return self.nak(message, 'the offer has expired'), None
+            return self.bind(message, lease, subnet, now)
+        address = requested if requested is not None else message.ciaddr
+        if not address:
+            return self.nak(message, 'no address'), None
+        if address not in subnet:
+            #INIT-REBOOT on another subnet
+            return self.nak(message, 'wrong subnet'), None
+        if lease is not None and lease.address == address:
+            #INIT-REBOOT, RENEWING or REBINDING of a lease the server knows
+            return self.bind(message, lease, subnet, now)
+        #a lease the server does not know (it lost it, or the client was
+        #given it by a server before): it is the client's if it is free
+        if address in subnet.pool and subnet.pool.take(address):
+            if lease is not None:
+                self.forget(lease, subnet)
+            lease = Lease(client, address, now, 'offered', self.hostname(message))
+            self.table.add(lease)
+            return self.bind(message, lease, subnet, now)
+        return self.nak(message, 'the address is not free'), None
+
+    def bind(self, message, lease, subnet, now):
+        lease.state = 'bound'
+        lease.hostname = self.hostname(message) or lease.hostname
+        self.table.extend(lease, now + self.lease_time)
+        return message.reply(ACK, lease.address, self.lease_options(subnet)), lease_line(now, lease)
+
+    def nak(self, message, text):
+        return message.reply(NAK, 0, {SERVER_ID: self.server_id(message), MESSAGE: text.encode()})
+
+    def decline(self, message, subnet, now):
+        #the client found the address in use (ARP), nobody gets it for a while
+        lease = self.lease_of(message.client_id(), subnet)
+        address = message.option_address(REQUESTED_IP)
+        if lease is None or lease.address != address:
+            return None
+        self.table.remove(lease)
+        self.table.previous.pop(lease.client, None)
+        self.table.add(Lease(b'', address, now + self.decline_time, 'declined'))
+        return free_line(now, lease)
+
+    def release(self, message, subnet, now):
+        lease = self.lease_of(message.client_id(), subnet)
+        if lease is None or lease.address != message.ciaddr:
+            return None
+        self.forget(lease, subnet)
+        return free_line(now, lease)
+
+    def forget(self, lease, subnet):
+        self.table.remove(lease)
+        subnet.pool.release(lease.address)
+
+    def inform(self, message, subnet):
+        #the client has an address, it only wants the options
+        options = dict(subnet.options)
+        options[SERVER_ID] = pack_address(subnet.server)
+        return message.reply(ACK, 0, options)
+
+    def lease_options(self, subnet):
+        options = dict(subnet.options)
+        options[SERVER_ID] = pack_address(subnet.server)
+        options[LEASE_TIME] = pack_seconds(self.lease_time)
+        options[RENEWAL_TIME] = pack_seconds(self.lease_time * RENEWAL)
+        options[REBINDING_TIME] = pack_seconds(self.lease_time * REBINDING)
+        return options
+
+    def server_id(self, message):
+        subnet = self.subnet_for(message, None)
+        return pack_address(subnet.server if subnet is not None else min(self.own))
+
+    def hostname(self, message):
+        value = message.options.get(HOSTNAME, b'')
+        #it goes into the log, without spaces
+        return value.decode('ascii', 'replace').replace(' ', '_').replace('\n', '_')
+
+    def expire(self, now):
+        #frees the addresses of the leases (and offers) that have run out
+        expired = self.table.expire(now)
+        for lease in expired:
+            subnet = self.routes.lookup(lease.address)
+            if subnet is not None:
+                subnet.pool.release(lease.address)
+        self.expired += len(expired)
+        return expired
+
+    def next_deadline(self):
+        return self.table.next_expiry()
+
+    def statistics(self):
+        states = {}
+        for lease in self.table.by_address.values():
+            states[lease.state] = states.get(lease.state, 0) + 1
+        return {
+            'leases': states,
+            'free': {str(s): len(s.pool) for s in self.subnets},
+            'received': {name: self.received.get(kind, 0) for kind, name in ((DISCOVER, 'discover'), (REQUEST, 'request'),
+                                                                             (RELEASE, 'release'), (DECLINE, 'decline'),
+                                                                             (INFORM, 'inform')) if kind in self.received},
+            'sent': {name: self.sent.get(kind, 0) for kind, name in ((OFFER, 'offer'), (ACK, 'ack'), (NAK, 'nak'))
+                     if kind in self.sent},
+            'exhausted': self.exhausted,
+            'ignored': self.ignored,
+            'expired': self.expired,
+        }
+
+
+def parse_subnet(text):
+    #'10.0.0.1/24' with the address of the server, or a prefix '10.0.0.0/24'
+    #(the server gets the first address)
+    if parse_prefix(text, strict=False) is None:
+        raise ValueError(f'{text!r} is not an address with a prefix length')
+    address, _, length = text.partition('/')
+    value = parse_address(address)
+    mask = (0xffffffff << (32 - int(length))) & 0xffffffff
+    if value == value & mask:
+        value += 1
+    return f'{format_address(value)}/{length}'
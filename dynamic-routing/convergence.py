@@ -0,0 +1,345 @@
+'''
+    #how long RIP (rip.py) takes to converge after a link fails, on topologies
+    #of growing size: a ring of routers with chords and a host LAN at every
+    #router (random_spec in topology-builder/topology.py), or a spec
+
+    #all routers start at once and the time until every routing table is
+    #right is measured (start). then --failures links between two routers go
+    #down, one at a time: the time from the failure to the last change of a
+    #route is the convergence time, and the tables are checked against the
+    #shortest paths (in hops) of the topology without the link. the link comes
+    #up again (up) before the next one goes down. the triggered packets are the
+    #incremental updates the event caused in the whole network.
+
+    #by default it runs the routers in the discrete-event simulator of
+    #simulator/netsim.py: virtual time with the link delays of the spec, no
+    #root, and the RFC timers cost nothing, so a 64-router network with the
+    #default 30 s updates takes seconds. with --mininet the network is started
+    #in mininet with ripd.py on every router, the links go down with
+    #configLinkStatus, and the times come from the logs of the daemons (use
+    #short timers, the run waits --settle seconds after every event).
+
+    #--detect carrier: the routers see the interface go down (ripd polls the
+    #operstate every second, the simulation tells them at once). --detect
+    #timeout: they do not, the routes through the link time out after --timeout.
+
+    #   python3 convergence.py --sizes 4 8 16 32 64 --failures 5
+    #   python3 convergence.py --sizes 16 --split-horizon none simple poison --no-triggered
+    #   python3 convergence.py --spec ../topology-builder/examples/portfolio.yaml --detect timeout
+    #   sudo python3 convergence.py --mininet --sizes 4 8 --update 5 --timeout 30 --garbage 20
+'''
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from collections import deque
+from functools import partial
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'topology-builder'))
+sys.path.insert(0, os.path.join(HERE, '..', 'simulator'))
+
+import netsim
+import rip
+from ripd import add_rip_arguments, check_seconds, router_options
+from topology import SpecError, Topology, load_spec, random_spec
+
+
+FIELDS = ('topology', 'routers', 'subnets', 'split_horizon', 'triggered', 'detect', 'event',
+          'converged', 'seconds', 'triggered_packets')
+
+
+def hops(topology, source, failed=None):
+    #the number of hops from source to every router it reaches, without subnet failed
+    distance = {source: 0}
+    queue = deque([source])
+    while queue:
+        router = queue.popleft()
+        for _, other, number in topology.adjacency[router]:
+            if number != failed and other not in distance:
+                distance[other] = distance[router] + 1
+                queue.append(other)
+    return distance
+
+
+def expected_metrics(topology, failed=None, attached=False):
+    '''
+    router -> {prefix: metric} of the networks it should reach with RIP when
+    the link of subnet number failed is down. with attached the routers on
+    it still think they are on it (they have not noticed that it is down)
+    '''
+    expected = {}
+    for router in topology.routers:
+        distance = hops(topology, router, failed)
+        table = {}
+        for subnet in topology.subnets:
+            if subnet.number == failed and not attached:
+                continue
+            reached = [distance[n] for n in subnet.nodes if n in distance]
+            #16 is unreachable for RIP, a network more than 15 hops away too
+            if reached and min(reached) + 1 < rip.INFINITY:
+                table[subnet.prefix] = min(reached) + 1
+        expected[router] = table
+    return expected
+
+
+def router_links(topology):
+    #the subnets that are a link between two routers
+    return [s for s in topology.subnets if len(s.nodes) == 2 and all(topology.is_router(n) for n in s.nodes)]
+
+
+class Simulation:
+    '''the routers of a topology, every one a rip.Router, in netsim'''
+
+    def __init__(self, topology, options, seed=1):
+        self.topology = topology
+        self.sim = netsim.Simulator(seed)
+        self.network = netsim.Network(topology, self.sim)
+        self.random = random.Random(seed)
+        self.routers = {}
+        self.timers = {}        # router -> the time of its timer event
+        for name in topology.routers:
+            node = self.network.nodes[name]
+            interfaces = {i.name: i.address for i in node.interfaces}
+            router = rip.Router(name, interfaces, partial(self.send, node), seed=seed, **options)
+            self.routers[name] = router
+            sock = self.network.socket(name, rip.PORT)
+            sock.on_receive = partial(self.receive, node, router)
+
+    def send(self, node, name, data, destination):
+        interface = self.network.interface(node, name)
+        segment = interface.segment
+        if destination is None:
+            #224.0.0.9 reaches the other routers on the link
+            targets = [a for a, member in segment.members.items() if member is not interface and member.node.router]
+        else:
+            targets = [destination]
+        source = int(interface.address.ip)
+        for target in targets:
+            segment.transmit(interface, target, netsim.Packet(source, rip.PORT, target, rip.PORT, data))
+
+    def receive(self, node, router, payload, address):
+        source, port = address
+        if port != rip.PORT:
+            return
+        for interface in node.interfaces:
+            if source & int(interface.address.network.netmask) == int(interface.address.network.network_address):
+                #the router gets it as an event of its own, not inside the send of another one
+                self.sim.at(self.sim.now, self.call, router, router.on_packet, interface.name, source, payload)
+                return
+
+    def call(self, router, method, *args):
+        method(*args, self.sim.now)
+        self.arm(router)
+
+    def arm(self, router):
+        deadline = router.next_deadline()
+        if deadline is not None and deadline < self.timers.get(router.name, float('inf')):
+            self.timers[router.name] = deadline
+            self.sim.at(deadline, self.on_timer, router, deadline)
+
+    def on_timer(self, router, when):
+        if self.timers.get(router.name) != when:
+            return
+        del self.timers[router.name]
+        router.on_timer(self.sim.now)
+        self.arm(router)
+
+    def start(self):
+        #the routers come up within a second, one after the other, like in mininet
+        for router in self.routers.values():
+            self.sim.at(self.sim.now + self.random.uniform(0, 1), self.call, router, router.start)
+
+    def set_link(self, subnet, up, detect):
+        for name in subnet.nodes:
+            interface = self.network.interface(self.network.nodes[name], subnet.interfaces[name])
+            interface.up = up
+            router = self.routers.get(name)
+            if router is not None and detect == 'carrier':
+                method = router.interface_up if up else router.interface_down
+                self.sim.at(self.sim.now, self.call, router, method, interface.name)
+
+    def measure(self, horizon, expected):
+        '''
+        runs horizon seconds from now. returns (converged, seconds from now
+        to the last route change, triggered packets sent)
+        '''
+        start = self.sim.now
+        triggered = sum(r.triggered_sent for r in self.routers.values())
+        self.sim.run(until=start + horizon)
+        changes = [r.last_change for r in self.routers.values() if r.last_change is not None and r.last_change >= start]
+        tables = {name: {prefix: metric for prefix, (metric, _, _) in r.table().items()}
+                  for name, r in self.routers.items()}
+        return (tables == expected, max(changes, default=start) - start,
+                sum(r.triggered_sent for r in self.routers.values()) - triggered)
+
+
+def run_simulated(topology, links, args, split_horizon):
+    options = dict(router_options(args), split_horizon=split_horizon)
+    simulation = Simulation(topology, options, args.seed)
+    horizon = args.horizon or args.timeout + args.garbage + rip.INFINITY * args.update
+    attached = args.detect == 'timeout'
+    simulation.start()
+    events = [('start', *simulation.measure(horizon, expected_metrics(topology)))]
+    for subnet in links:
+        simulation.set_link(subnet, False, args.detect)
+        events.append((f'down {subnet.name}',
+                       *simulation.measure(horizon, expected_metrics(topology, subnet.number, attached))))
+        simulation.set_link(subnet, True, args.detect)
+        events.append((f'up {subnet.name}', *simulation.measure(horizon, expected_metrics(topology))))
+    return events
+
+
+def log_tables(topology, since):
+    '''
+    the tables of the routers from the logs of ripd, without the networks
+    they are on, and the time of the last change after since
+    '''
+    from network import RIPD_LOG
+    tables = {}
+    last = since
+    for router in topology.routers:
+        table = {}
+        try:
+            with open(RIPD_LOG.format(name=router)) as f:
+                lines = f.readlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 3 or fields[1] not in ('replace', 'delete'):
+                continue
+            when = float(fields[0])
+            if fields[1] == 'replace':
+                table[fields[2]] = int(fields[4])
+            else:
+                table.pop(fields[2], None)
+            if when >= since:
+                last = max(last, when)
+        tables[router] = table
+    return tables, last
+
+
+def learned(expected):
+    #the expected tables without the networks the routers are on, like the logs
+    return {router: {str(prefix): metric for prefix, metric in table.items() if metric > 1}
+            for router, table in expected.items()}
+
+
+def run_mininet(topology, links, args, split_horizon):
+    try:
+        from network import start_network
+    except ImportError:
+        print('--mininet needs mininet, run it on the mininet VM')
+        sys.exit(1)
+    arguments = (f'--split-horizon {split_horizon} --update {args.update} --timeout {args.timeout} '
+                 f'--garbage {args.garbage} --detect {args.detect}' + (' --no-triggered' if args.no_triggered else ''))
+    attached = args.detect == 'timeout'
+    events = []
+
+    def measure(name, since, expected):
+        time.sleep(args.settle)
+        tables, last = log_tables(topology, since)
+        events.append((name, tables == learned(expected), last - since, 0))
+
+    since = time.time()
+    net, _ = start_network(topology, rip=arguments)
+    try:
+        measure('start', since, expected_metrics(topology))
+        for subnet in links:
+            a, b = subnet.nodes
+            since = time.time()
+            net.configLinkStatus(a, b, 'down')
+            measure(f'down {subnet.name}', since, expected_metrics(topology, subnet.number, attached))
+            since = time.time()
+            net.configLinkStatus(a, b, 'up')
+            measure(f'up {subnet.name}', since, expected_metrics(topology))
+    finally:
+        net.stop()
+    return events
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='convergence of RIP after link failures', epilog='end of help')
+    parser.add_argument('--sizes', type=check_positive, nargs='+', default=[4, 8, 16, 32, 64],
+                        help='numbers of routers of the generated topologies')
+    parser.add_argument('--spec', type=str, help='a topology spec instead of the generated ones')
+    parser.add_argument('-f', '--failures', type=check_positive, default=3, help='links that go down per topology')
+    add_rip_arguments(parser)
+    parser.add_argument('--split-horizon', choices=rip.SPLIT_HORIZON, nargs='+', default=['poison'],
+                        help='one run per value, e.g. none simple poison')
+    parser.add_argument('--horizon', type=check_seconds, help='simulated seconds per event (default: long enough to count to infinity)')
+    parser.add_argument('--mininet', action='store_true', help='run ripd in mininet instead of the simulation (needs root)')
+    parser.add_argument('--settle', type=check_seconds, default=20.0, help='with --mininet, seconds to wait after every event')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the topologies, the failures and the timers')
+    parser.add_argument('--csv', type=str, help='file to write every event to')
+    args = parser.parse_args()
+
+    if args.mininet and os.geteuid() != 0:
+        print('--mininet needs root: sudo python3 convergence.py --mininet ...')
+        sys.exit(1)
+    try:
+        if args.spec:
+            topologies = [Topology(load_spec(args.spec))]
+        else:
+            topologies = [Topology(random_spec(n, seed=args.seed)) for n in args.sizes]
+    except (OSError, SpecError) as e:
+        print(f'the spec is not valid: {e}')
+        sys.exit(1)
+
+    run = run_mininet if args.mininet else run_simulated
+    rng = random.Random(args.seed)
+    rows = []
+    summary = []
+    for topology in topologies:
+        candidates = router_links(topology)
+        links = rng.sample(candidates, min(args.failures, len(candidates)))
+        for split_horizon in args.split_horizon:
+            started = time.perf_counter()
+            events = run(topology, links, args, split_horizon)
+            seconds = time.perf_counter() - started
+            print(f'{topology.summary()}')
+            print(f'split horizon {split_horizon}, {"periodic" if args.no_triggered else "triggered"} updates, '
+                  f'{args.detect} detection ({seconds:.1f} s to run)')
+            print(f'  {"event":<16}{"converged":>10}{"seconds":>10}{"triggered packets":>19}')
+            for event, converged, took, packets in events:
+                print(f'  {event:<16}{"yes" if converged else "NO":>10}{took:>10.3f}{packets:>19}')
+                rows.append({'topology': topology.name, 'routers': len(topology.routers),
+                             'subnets': len(topology.subnets), 'split_horizon': split_horizon,
+                             'triggered': not args.no_triggered, 'detect': args.detect, 'event': event,
+                             'converged': converged, 'seconds': round(took, 6), 'triggered_packets': packets})
+            print()
+            down = [took for event, _, took, _ in events if event.startswith('down')]
+            packets = [p for event, _, _, p in events if event.startswith('down')]
+            summary.append((len(topology.routers), len(topology.subnets), split_horizon, events[0][2],
+                            sum(down) / len(down) if down else 0.0, max(down, default=0.0),
+                            sum(packets) / len(packets) if packets else 0.0,
+                            all(converged for _, converged, _, _ in events)))
+
+    print(f'{"routers":>7}{"subnets":>8}{"split horizon":>14}{"start s":>9}{"failure s":>10}{"max s":>8}'
+          f'{"packets":>9}{"correct":>8}')
+    for routers, subnets, split_horizon, start, mean, worst, packets, correct in summary:
+        print(f'{routers:>7}{subnets:>8}{split_horizon:>14}{start:>9.2f}{mean:>10.2f}{worst:>8.2f}'
+              f'{packets:>9.0f}{"yes" if correct else "NO":>8}')
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+'''
+    #the protocol of a RIP version 2 router (RFC 2453) without sockets or a
+    #clock, like transport/engine.py: ripd.py runs it over UDP on a mininet
+    #LinuxRouter, convergence.py runs it in simulator/netsim.py
+
+    #   router = Router('r1', {'r1-eth0': ip_interface('10.0.0.1/24'), ...}, send, install)
+    #   router.start(now)
+    #   router.on_packet('r1-eth1', source, data, now)    # a UDP packet from port 520
+    #   router.on_timer(now)                              # when now >= router.next_deadline()
+    #   router.interface_down('r1-eth1', now)             # the link went down
+
+    #send(interface, data, destination) sends a packet out of an interface to
+    #the address destination (an int), or with None to all RIP routers on the
+    #link (224.0.0.9). install(changes) gets what changes for the kernel, a
+    #list of ('replace', prefix, next hop, interface, metric) and
+    #('delete', prefix, None, None, 16), all changes of one call at once.
+
+    #what it does, with the timers of RFC 2453 (all of them can be changed):
+    #  - the metric is the number of hops, 1 for a network the router is on,
+    #    16 is infinity (unreachable)
+    #  - every update_interval (30 s, +-15% so the routers do not get in step)
+    #    the whole table goes out on every interface
+    #  - a route that is not refreshed for timeout (180 s) gets metric 16, and
+    #    is deleted garbage (120 s) later. until then it is sent with 16, so the
+    #    neighbours hear that it is gone
+    #  - triggered updates: a change goes out at once, the changes after it are
+    #    collected for 1-5 s and then sent together. they are incremental, only
+    #    the routes that changed are sent, not the whole table
+    #  - split horizon: a route is not sent back out of the interface it was
+    #    learned from ('simple'), or it is, with metric 16 ('poison', poison
+    #    reverse), which ends a loop between two routers at once instead of
+    #    counting to infinity. 'none' turns it off, to see the difference
+    #  - an interface that goes down makes the routes through it unreachable at
+    #    once, without waiting for the timeout
+'''
+
+import heapq
+import ipaddress
+import itertools
+import random
+from struct import Struct
+
+
+PORT = 520
+GROUP = '224.0.0.9'
+VERSION = 2
+REQUEST = 1
+RESPONSE = 2
+AF_INET = 2
+INFINITY = 16
+MAX_ENTRIES = 25
+
+UPDATE_INTERVAL = 30.0
+TIMEOUT = 180.0
+GARBAGE = 120.0
+TRIGGER_HOLD = (1.0, 5.0)
+SPLIT_HORIZON = ('none', 'simple', 'poison')
+
+# command, version, must be zero
+HEADER = Struct('!BBH')
+# address family, route tag, address, mask, next hop, metric
+ENTRY = Struct('!HHIIII')
+
+# a request for the whole table: one entry with address family 0 and metric 16
+REQUEST_TABLE = HEADER.pack(REQUEST, VERSION, 0) + ENTRY.pack(0, 0, 0, 0, 0, INFINITY)
+
+
+class RipError(ValueError):
+    pass
+
+
+def encode(command, entries):
+    '''
+    the packets for entries of (address, mask, next hop, metric) as
+    integers, at most 25 entries per packet
+    '''
+    header = HEADER.pack(command, VERSION, 0)
+    pack = ENTRY.pack
+    packets = []
+    for i in range(0, len(entries), MAX_ENTRIES):
+        packets.append(header + b''.join([pack(AF_INET, 0, address, mask, next_hop, metric)
+                                          for address, mask, next_hop, metric in entries[i:i + MAX_ENTRIES]]))
+    return packets
+
+
+def decode(data):
+    #(command, [(address family, address, mask, next hop, metric)])
+    if len(data) < HEADER.size or (len(data) - HEADER.size) % ENTRY.size:
+        raise RipError(f'a RIP packet of {len(data)} bytes')
+    command, version, _ = HEADER.unpack_from(data)
+    if command not in (REQUEST, RESPONSE):
+        raise RipError(f'unknown command {command}')
+    if version < VERSION:
+        raise RipError(f'RIP version {version} is not supported')
+    return command, [(family, address, mask, next_hop, metric) for family, _, address, mask, next_hop, metric
+                     in ENTRY.iter_unpack(memoryview(data)[HEADER.size:])]
+
+
+class Route:
+    __slots__ = ('address', 'mask', 'metric', 'next_hop', 'interface', 'connected', 'expires', 'queued')
+
+    def __init__(self, address, mask):
+        self.address = address
+        self.mask = mask
+        self.metric = INFINITY
+        self.next_hop = 0           # 0 for a network the router is on
+        self.interface = None
+        self.connected = False
+        self.expires = None         # the timeout, or the garbage collection after it
+        self.queued = None          # the time of its entry in Router.timers
+
+    def prefix(self):
+        return ipaddress.IPv4Network((self.address, bin(self.mask).count('1')))
+
+
+class Router:
+
+    def __init__(self, name, interfaces, send, install=None, split_horizon='poison', triggered=True,
+                 update_interval=UPDATE_INTERVAL, timeout=TIMEOUT, garbage=GARBAGE,
+                 trigger_hold=TRIGGER_HOLD, seed=None):
+        if split_horizon not in SPLIT_HORIZON:
+            raise ValueError(f'unknown split horizon {split_horizon}, expected one of {SPLIT_HORIZON}')
+        self.name = name
+        #interface -> (address, network, mask) as integers
+        self.interfaces = {}
+        for interface, address in interfaces.items():
+            address = ipaddress.ip_interface(address)
+            self.interfaces[interface] = (int(address.ip), int(address.network.network_address),
+                                          int(address.network.netmask))
+        self.own = {address for address, _, _ in self.interfaces.values()}
+        self.send = send
+        self.install = install
+        self.split_horizon = split_horizon
+        self.triggered = triggered
+        self.update_interval = update_interval
+        self.timeout = timeout
+        self.garbage = garbage
+        self.trigger_hold = trigger_hold
+        self.random = random.Random(f'{seed}-{name}')
+
+        self.up = set()
+        self.routes = {}            # (address, mask) -> Route
+        self.timers = []            # (time, count, Route), stale entries are skipped
+        self.count = itertools.count()
+        self.changed = {}           # the routes for the next triggered update
+        self.pending = []           # the changes for install()
+        self.next_update = None
+        self.trigger_at = None
+        self.hold_until = 0.0
+
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.triggered_sent = 0
+        self.packets_received = 0
+        self.bad_packets = 0
+        self.changes = 0
+        self.last_change = None
+
+    def start(self, now, up=None):
+        #up: the interfaces that are up, all of them by default
+        for interface in self.interfaces if up is None else up:
+            self.interface_up(interface, now)
+        self.next_update = now + self.interval()
+        self.flush(now)
+
+    def interval(self):
+        return self.update_interval * self.random.uniform(0.85, 1.15)
+
+    def next_deadline(self):
+        deadlines = [d for d in (self.next_update, self.trigger_at) if d is not None]
+        if self.timers:
+            deadlines.append(self.timers[0][0])
+        return min(deadlines) if deadlines else None
+
+    def on_timer(self, now):
+        timers = self.timers
+        while timers and timers[0][0] <= now:
+            deadline, _, route = heapq.heappop(timers)
+            if route.queued != deadline:
+                continue
+            route.queued = None
+            if route.expires is None:
+                #a network the router is on again
+                continue
+            if route.expires > now:
+                #refreshed since it was queued
+                self.arm(route, route.expires)
+            elif route.metric < INFINITY:
+                self.invalidate(route, now)
+            elif self.routes.get((route.address, route.mask)) is route:
+                del self.routes[(route.address, route.mask)]
+                self.changed.pop((route.address, route.mask), None)
+        if self.next_update is not None and self.next_update <= now:
+            self.update(now)
+        elif self.trigger_at is not None and self.trigger_at <= now:
+            self.triggered_update(now)
+        self.flush(now)
+
+    def interface_up(self, interface, now):
+        if interface in self.up:
+            return
+        self.up.add(interface)
+        _, network, mask = self.interfaces[interface]
+        route = self.routes.get((network, mask))
+        if route is None:
+            route = self.routes[(network, mask)] = Route(network, mask)
+        elif route.metric < INFINITY and not route.connected:
+            #the kernel has a route of its own for the network now
+            self.pending.append(('delete', route.prefix(), None, None, INFINITY))
+        route.metric = 1
+        route.next_hop = 0
+        route.interface = interface
+        route.connected = True
+        route.expires = None
+        self.mark(route, now)
+        self.transmit(interface, REQUEST_TABLE, None)
+        self.flush(now)
+
+    def interface_down(self, interface, now):
+        if interface not in self.up:
+            return
+        self.up.discard(interface)
+        for route in list(self.routes.values()):
+            if route.interface == interface:
+                self.invalidate(route, now)
+        self.flush(now)
+
+    def on_packet(self, interface, source, data, now):
+        #source is the address the packet came from, as an int
+        if interface not in self.up or source in self.own:
+            return
+        _, network, mask = self.interfaces[interface]
+        if source & mask != network:
+            #not from a neighbour on the link
+            self.bad_packets += 1
+            return
+        try:
+            command, entries = decode(data)
+        except RipError:
+            self.bad_packets += 1
+            return
+        self.packets_received += 1
+        if command == REQUEST:
+            self.answer(interface, source, entries)
+        else:
+            self.learn(interface, source, entries, now)
+        self.flush(now)
+
+    def answer(self, interface, source, entries):
+        if len(entries) == 1 and entries[0][0] == 0 and entries[0][4] == INFINITY:
+            self.advertise(interface, self.routes.values(), source)
+            return
+        #the metrics of the routes that were asked for, without split horizon
+        reply = []
+        for family, address, mask, _, _ in entries:
+            route = self.routes.get((address, mask)) if family == AF_INET else None
+            reply.append((address, mask, 0, route.metric if route else INFINITY))
+        for data in encode(RESPONSE, reply):
+            self.transmit(interface, data, source)
+
+    def learn(self, interface, source, entries, now):
+        _, network, mask = self.interfaces[interface]
+        routes = self.routes
+        for family, address, route_mask, next_hop, metric in entries:
+            if family != AF_INET or not 1 <= metric <= INFINITY or address & ~route_mask & 0xffffffff:
+                continue
+            metric = metric + 1 if metric < INFINITY else INFINITY
+            #a next hop on the link is used as it is, 0 means the sender
+            via = next_hop if next_hop and next_hop & mask == network and next_hop not in self.own else source
+            key = (address, route_mask)
+            route = routes.get(key)
+            if route is None:
+                if metric < INFINITY:
+                    route = routes[key] = Route(address, route_mask)
+                    self.use(route, metric, via, interface, now)
+            elif route.connected:
+                continue
+            elif route.next_hop == via and route.interface == interface:
+                if metric < INFINITY:
+                    if metric != route.metric:
+                        self.use(route, metric, via, interface, now)
+                    else:
+                        self.arm(route, now + self.timeout)
+                elif route.metric < INFINITY:
+                    self.invalidate(route, now)
+            elif metric < route.metric or (metric == route.metric < INFINITY and
+                                           route.expires - now < self.timeout / 2):
+                #a shorter way, or as short when the old one is about to time out
+                self.use(route, metric, via, interface, now)
+
+    def use(self, route, metric, next_hop, interface, now):
+        route.metric = metric
+        route.next_hop = next_hop
+        route.interface = interface
+        self.arm(route, now + self.timeout)
+        self.pending.append(('replace', route.prefix(), ipaddress.IPv4Address(next_hop), interface, metric))
+        self.mark(route, now)
+
+    def invalidate(self, route, now):
+        if route.metric >= INFINITY:
+            return
+        if not route.connected:
+            self.pending.append(('delete', route.prefix(), None, None, INFINITY))
+        route.metric = INFINITY
+        route.connected = False
+        self.arm(route, now + self.garbage)
+        self.mark(route, now)
+
+    def arm(self, route, deadline):
+        #one entry per route in the heap, a later deadline is found when it is popped
+        route.expires = deadline
+        if route.queued is None or deadline < route.queued:
+            route.queued = deadline
+            heapq.heappush(self.timers, (deadline, next(self.count), route))
+
+    def mark(self, route, now):
+        self.changed[(route.address, route.mask)] = route
+        if self.triggered and self.trigger_at is None:
+            self.trigger_at = max(now, self.hold_until)
+
+    def advertise(self, interface, routes, destination=None, triggered=False):
+        entries = []
+        for route in routes:
+            metric = route.metric
+            if route.interface == interface and self.split_horizon != 'none':
+                if route.connected or self.split_horizon == 'simple':
+                    continue
+                metric = INFINITY
+            entries.append((route.address, route.mask, 0, metric))
+        for data in encode(RESPONSE, entries):
+            self.transmit(interface, data, destination)
+            if triggered:
+                self.triggered_sent += 1
+
+    def transmit(self, interface, data, destination):
+        self.packets_sent += 1
+        self.bytes_sent += len(data)
+        self.send(interface, data, destination)
+
+    def update(self, now):
+        #the whole table, it also carries everything a triggered update would
+        for interface in sorted(self.up):
+            self.advertise(interface, self.routes.values())
+        self.changed.clear()
+        self.trigger_at = None
+        self.next_update = now + self.interval()
+
+    def triggered_update(self, now):
+        routes = list(self.changed.values())
+        self.changed.clear()
+        self.trigger_at = None
+        for interface in sorted(self.up):
+            self.advertise(interface, routes, triggered=True)
+        self.hold_until = now + self.random.uniform(*self.trigger_hold)
+
+    def flush(self, now):
+        if not self.pending:
+            return
+        changes, self.pending = self.pending, []
+        self.changes += len(changes)
+        self.last_change = now
+        if self.install is not None:
+            self.install(changes)
+
+    def table(self):
+        #prefix -> (metric, next hop or None, interface) of the usable routes
+        return {route.prefix(): (route.metric, ipaddress.IPv4Address(route.next_hop) if route.next_hop else None,
+                                 route.interface)
+                for route in self.routes.values() if route.metric < INFINITY}
+
+    def statistics(self):
+        return {
+            'routes': sum(1 for r in self.routes.values() if r.metric < INFINITY),
+            'packets_sent': self.packets_sent,
+            'bytes_sent': self.bytes_sent,
+            'triggered_sent': self.triggered_sent,
+            'packets_received': self.packets_received,
+            'bad_packets': self.bad_packets,
+            'changes': self.changes,
+        }
@@ -0,0 +1,253 @@
+'''
+    #a RIP version 2 daemon for the LinuxRouter nodes of a mininet network,
+    #the protocol itself is in rip.py
+
+    #it finds the IPv4 interfaces of the node (ip -o -4 addr show), sends and
+    #receives the updates on UDP port 520 of every interface (to 224.0.0.9,
+    #the RIP routers on the link) and puts the routes it learns into the
+    #kernel with ip route replace, all changes of one event in one ip -batch,
+    #as proto 189 (rip in /etc/iproute2/rt_protos) with metric 120. every second it reads the
+    #operstate of the interfaces, so a link that goes down (link r1 r2 down in
+    #the mininet CLI) is noticed within a second, without waiting 180 s for the
+    #timeout. the routes it added are removed when it stops.
+
+    #every change is written to the log with the time, which is what
+    #convergence.py reads:
+    #   1712345678.123456 replace 10.0.3.0/24 metric 3 via 10.0.9.2 dev r1-eth2
+    #   1712345679.654321 delete 10.0.3.0/24
+
+    #run it on every router (it needs root, like everything in mininet):
+    #   mininet> r1 python3 dynamic-routing/ripd.py --log /tmp/ripd-r1.log &
+    #   mininet> r1 ip route show proto rip
+    #or let topology-builder/network.py start it with start_network(topology, rip='').
+    #the RFC timers are slow for experiments, they can be shortened:
+    #   python3 ripd.py --update 5 --timeout 30 --garbage 20 --split-horizon poison
+'''
+
+import argparse
+import ipaddress
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import rip
+
+
+# RTPROT_RIP, the routes of this daemon in the kernel
+PROTO = 189
+# the kernel metric of the routes, the administrative distance of RIP. the
+# route of a network the node is on has 0, so it wins, and replace never
+# overwrites it when the kernel adds it back after the link comes up
+PRIORITY = 120
+# how often the operstate of the interfaces is read
+POLL_INTERVAL = 1.0
+UP_STATES = ('up', 'unknown')
+
+
+def find_interfaces():
+    #interface -> ip_interface of its first IPv4 address, without lo
+    out = subprocess.run(['ip', '-o', '-4', 'addr', 'show'], capture_output=True, text=True, check=True).stdout
+    interfaces = {}
+    for line in out.splitlines():
+        #2: r1-eth0    inet 10.0.0.1/24 brd 10.0.0.255 scope global r1-eth0 ...
+        fields = line.split()
+        name = fields[1].split('@')[0]
+        if name != 'lo' and fields[2] == 'inet':
+            interfaces.setdefault(name, ipaddress.ip_interface(fields[3]))
+    return interfaces
+
+
+def is_up(interface):
+    try:
+        with open(f'/sys/class/net/{interface}/operstate') as f:
+            return f.read().strip() in UP_STATES
+    except OSError:
+        return False
+
+
+def open_socket(interface, address, port):
+    #a socket for the RIP packets of one interface, in the group 224.0.0.9 on it
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+    sock.bind(('', port))
+    local = socket.inet_aton(str(address.ip))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(rip.GROUP) + local)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, local)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 0)
+    sock.setblocking(False)
+    return sock
+
+
+class Kernel:
+    '''puts the changes of the router into the routing table of the node'''
+
+    def __init__(self, log=None, verbose=False, dry_run=False):
+        self.log = log
+        self.verbose = verbose
+        self.dry_run = dry_run
+        self.errors = 0
+
+    def batch(self, lines):
+        if self.dry_run or not lines:
+            return
+        #-force goes on after an error, e.g. a route the kernel removed with its interface
+        result = subprocess.run(['ip', '-force', '-batch', '-'], input='\n'.join(lines) + '\n',
+                                capture_output=True, text=True)
+        if result.returncode:
+            self.errors += 1
+
+    def install(self, changes):
+        now = time.time()
+        lines = []
+        for action, prefix, via, interface, metric in changes:
+            if action == 'replace':
+                lines.append(f'route replace {prefix} via {via} dev {interface} proto {PROTO} metric {PRIORITY}')
+                text = f'{now:.6f} replace {prefix} metric {metric} via {via} dev {interface}'
+            else:
+                lines.append(f'route del {prefix} proto {PROTO} metric {PRIORITY}')
+                text = f'{now:.6f} delete {prefix}'
+            self.write(text)
+        self.batch(lines)
+
+    def write(self, text):
+        if self.log is not None:
+            self.log.write(text + '\n')
+            self.log.flush()
+        if self.verbose:
+            print(text)
+
+    def flush(self):
+        #removes every route of the daemon
+        if not self.dry_run:
+            subprocess.run(['ip', 'route', 'flush', 'proto', str(PROTO)], capture_output=True)
+
+
+def check_port(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if not 1 <= value <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+def check_seconds(val):
+    try:
+        value = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a number of seconds')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def add_rip_arguments(parser):
+    #the options of the protocol but split horizon, convergence.py has them too
+    parser.add_argument('--no-triggered', action='store_true', help='only send the periodic updates')
+    parser.add_argument('--update', type=check_seconds, default=rip.UPDATE_INTERVAL, help='seconds between the periodic updates')
+    parser.add_argument('--timeout', type=check_seconds, default=rip.TIMEOUT, help='seconds until a route that is not refreshed is unreachable')
+    parser.add_argument('--garbage', type=check_seconds, default=rip.GARBAGE, help='seconds until an unreachable route is deleted')
+    parser.add_argument('--detect', choices=('carrier', 'timeout'), default='carrier',
+                        help='carrier: an interface that goes down makes its routes unreachable at once, timeout: only the timeout does')
+
+
+def router_options(args):
+    return {
+        'triggered': not args.no_triggered,
+        'update_interval': args.update,
+        'timeout': args.timeout,
+        'garbage': args.garbage,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RIP version 2 daemon for a mininet router', epilog='end of help')
+    parser.add_argument('-i', '--interfaces', nargs='+', help='the interfaces to run RIP on, all but lo by default')
+    parser.add_argument('-p', '--port', type=check_port, default=rip.PORT, help='UDP port of RIP')
+    parser.add_argument('--split-horizon', choices=rip.SPLIT_HORIZON, default='poison',
+                        help='poison: with poison reverse, simple: leave the routes out, none: off')
+    add_rip_arguments(parser)
+    parser.add_argument('--log', type=str, help='file to write the route changes to, with the time')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the route changes')
+    parser.add_argument('--dry-run', action='store_true', help='do not change the routing table')
+    args = parser.parse_args()
+
+    found = find_interfaces()
+    if args.interfaces:
+        missing = [name for name in args.interfaces if name not in found]
+        if missing:
+            print(f'no IPv4 address on {", ".join(missing)}')
+            sys.exit(1)
+        found = {name: found[name] for name in args.interfaces}
+    if not found:
+        print('no interface to run RIP on')
+        sys.exit(1)
+
+    log = open(args.log, 'a') if args.log else None
+    kernel = Kernel(log, args.verbose, args.dry_run)
+    try:
+        sockets = {name: open_socket(name, address, args.port) for name, address in found.items()}
+    except PermissionError:
+        print(f'port {args.port} and SO_BINDTODEVICE need root')
+        sys.exit(1)
+    selector = selectors.DefaultSelector()
+    for name, sock in sockets.items():
+        selector.register(sock, selectors.EVENT_READ, name)
+
+    def send(interface, data, destination):
+        address = rip.GROUP if destination is None else str(ipaddress.IPv4Address(destination))
+        try:
+            sockets[interface].sendto(data, (address, args.port))
+        except OSError:
+            #the interface is down
+            pass
+
+    router = rip.Router(socket.gethostname(), found, send, kernel.install, args.split_horizon, **router_options(args))
+    #mininet stops the daemon with SIGTERM, the routes are removed on the way out
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    kernel.flush()
+    now = time.monotonic()
+    router.start(now, [name for name in found if is_up(name)])
+    kernel.write(f'{time.time():.6f} start {" ".join(f"{n}={a}" for n, a in found.items())}')
+    next_poll = now + POLL_INTERVAL
+    try:
+        while True:
+            timeout = max(0.0, min(router.next_deadline(), next_poll) - time.monotonic())
+            for key, _ in selector.select(timeout):
+                sock = key.fileobj
+                while True:
+                    try:
+                        data, (source, port) = sock.recvfrom(4096)
+                    except BlockingIOError:
+                        break
+                    #the updates come from the RIP port of a neighbour
+                    if port == args.port:
+                        router.on_packet(key.data, int(ipaddress.IPv4Address(source)), data, time.monotonic())
+            now = time.monotonic()
+            if now >= next_poll:
+                if args.detect == 'carrier':
+                    for name in found:
+                        if is_up(name):
+                            router.interface_up(name, now)
+                        else:
+                            router.interface_down(name, now)
+                next_poll = now + POLL_INTERVAL
+            if router.next_deadline() <= now:
+                router.on_timer(now)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        kernel.write(f'{time.time():.6f} stop {router.statistics()}')
+        kernel.flush()
+        if log is not None:
+            log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+'''
+    #parameter sweeps over a topology spec (see topology-builder/)
+
+    #the sweep file names a spec, a grid of link parameters, the two hosts and
+    #the tool. every combination of the grid (times repeat) is one point: the
+    #spec gets the parameters of the point, the network is built and started,
+    #the tool runs from client to server while ping measures the RTT and the
+    #loss next to it, the network is stopped, and the point is one row of the
+    #results csv.
+
+    #   spec: ../topology-builder/examples/portfolio.yaml
+    #   client: h1
+    #   server: h9
+    #   tool: iperf                 # or transport (transport/application.py)
+    #   duration: 10
+    #   repeat: 2
+    #   grid:
+    #     G.bw: [10, 20]            # subnet G of the spec, TCLink bw
+    #     G.max_queue_size: [33, 100]
+    #     "*.loss": [0, 1]          # every link that has parameters
+
+    #with tool: transport, a transport: block sets size, window, mode, cc and
+    #the timestamps, checksum and pace flags of application.py. a transfer
+    #that takes TIMEOUT_FACTOR times as long as size takes at the smallest bw
+    #of the spec (transport: timeout: seconds sets it) is stopped, and its
+    #row gets an error, so one stuck transfer does not hang the sweep.
+
+    #the csv is written as the points finish, and a sweep that is started again
+    #skips the points that are already in it (the id of a point is a hash of
+    #its parameters and repeat). with -j N, N points run at the same time: every
+    #network runs in its own namespaces and its node names get a prefix (x1h1,
+    #x2h1, ...) so they do not collide. use at most one point per core or
+    #the numbers get worse.
+
+    #run it with:
+    #   python3 sweep.py portfolio-sweep.yaml --dry-run
+    #   sudo python3 sweep.py portfolio-sweep.yaml -o results.csv -j 4
+'''
+
+import argparse
+import copy
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+BUILDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topology-builder')
+TRANSPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transport')
+sys.path.insert(0, BUILDER)
+
+from topology import LINK_PARAMS, SpecError, Topology, load_spec
+
+
+TOOLS = ('iperf', 'transport')
+# a transfer is stopped after this many times the time it needs at the
+# smallest bw, but not before MIN_TIMEOUT seconds
+TIMEOUT_FACTOR = 10
+MIN_TIMEOUT = 30
+RESULT_FIELDS = ('throughput_mbps', 'rtt_min_ms', 'rtt_avg_ms', 'rtt_max_ms', 'ping_loss_pct',
+                 'retransmissions', 'bringup_s', 'elapsed_s', 'error')
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def grid_points(grid, repeat=1):
+    #every combination of the grid, repeat times: (id, parameters, repeat)
+    keys = list(grid)
+    points = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        for r in range(repeat):
+            key = json.dumps(params, sort_keys=True) + f'#{r}'
+            points.append((hashlib.sha1(key.encode()).hexdigest()[:12], params, r))
+    return points
+
+
+def apply_params(spec, params):
+    #a copy of the spec with the link parameters of a point. a key is
+    #subnet.param, or *.param for every subnet that already has link parameters
+    spec = copy.deepcopy(spec)
+    subnets = {str(s.get('name', i)): s for i, s in enumerate(spec['subnets'])}
+    for key, value in params.items():
+        name, _, param = key.rpartition('.')
+        if param not in LINK_PARAMS:
+            raise SpecError(f'{key}: {param} is not one of {LINK_PARAMS}')
+        if name == '*':
+            targets = [s for s in subnets.values() if any(p in s for p in LINK_PARAMS)]
+        elif name in subnets:
+            targets = [subnets[name]]
+        else:
+            raise SpecError(f'{key}: there is no subnet {name} in the spec')
+        for subnet in targets:
+            subnet[param] = value
+    return spec
+
+
+def prefixed(spec, prefix):
+    #the spec with prefix in front of every node and switch name, so that
+    #networks of points that run at the same time do not share names
+    if not prefix:
+        return spec
+    spec = copy.deepcopy(spec)
+    spec['routers'] = [prefix + n for n in spec.get('routers', [])]
+    spec['hosts'] = [prefix + n for n in spec.get('hosts', [])]
+    for i, subnet in enumerate(spec['subnets']):
+        subnet['nodes'] = [prefix + n for n in subnet['nodes']]
+        if subnet.get('switch'):
+            subnet['switch'] = prefix + subnet['switch']
+        elif len(subnet['nodes']) > 2:
+            #the switch topology.py would pick (s1, s2, ...) is the same in every network
+            subnet['switch'] = f'{prefix}s{100 + i}'
+    return spec
+
+
+def parse_ping(output):
+    #rtt min/avg/max and loss from the summary of ping
+    result = {}
+    m = re.search(r'([\d.]+)% packet loss', output)
+    if m:
+        result['ping_loss_pct'] = float(m.group(1))
+    m = re.search(r'= ([\d.]+)/([\d.]+)/([\d.]+)', output)
+    if m:
+        result['rtt_min_ms'], result['rtt_avg_ms'], result['rtt_max_ms'] = map(float, m.groups())
+    return result
+
+
+def parse_iperf(output):
+    #iperf -y C: the last field of the last line is the rate in bits/sec
+    lines = [l for l in output.strip().splitlines() if l.count(',') >= 8]
+    if not lines:
+        raise RuntimeError(f'no iperf result: {output.strip()[-200:]}')
+    return {'throughput_mbps': int(lines[-1].split(',')[-1]) / 1e6}
+
+
+def parse_transport(output):
+    #the statistics printed by transport/application.py
+    result = {}
+    for key in ('throughput_mbps', 'retransmissions', 'srtt'):
+        m = re.search(rf'^\s*{key}\s+([\d.]+)', output, re.M)
+        if m:
+            result[key] = float(m.group(1))
+    if 'throughput_mbps' not in result:
+        raise RuntimeError(f'no transport result: {output.strip()[-200:]}')
+    srtt = result.pop('srtt', None)
+    if srtt is not None:
+        result.setdefault('rtt_transport_ms', srtt * 1000)
+    return result
+
+
+def transfer_timeout(spec, size, options):
+    #seconds the transport may take for size bytes
+    if options.get('timeout'):
+        return float(options['timeout'])
+    rates = [float(s['bw']) for s in spec['subnets'] if s.get('bw')]
+    expected = size * 8 / (min(rates) * 1e6) if rates else 0
+    return max(MIN_TIMEOUT, TIMEOUT_FACTOR * expected)
+
+
+def start_ping(client, address, duration):
+    client.sendCmd(f'ping -i 0.2 -w {int(duration)} {address}')
+
+
+def run_iperf(config, client, server):
+    address = server.IP()
+    server.cmd('iperf -s -p 5001 > /dev/null 2>&1 &')
+    time.sleep(0.5)
+    #ping runs on the server back to the client, so the shell of the client
+    #is free for iperf
+    start_ping(server, client.IP(), config['duration'])
+    output = client.cmd(f'iperf -c {address} -p 5001 -t {config["duration"]} -y C')
+    result = parse_iperf(output)
+    result.update(parse_ping(server.waitOutput()))
+    server.cmd('kill %iperf')
+    return result
+
+
+def run_transport(config, client, server, prefix, spec):
+    options = config.get('transport', {})
+    address = server.IP()
+    size = int(options.get('size', 10_000_000))
+    source = f'/tmp/sweep-{prefix or "x"}-{os.getpid()}.bin'
+    target = source + '.received'
+    client.cmd(f'head -c {size} /dev/urandom > {source}')
+    common = f'-w {options.get("window", 64)} -m {options.get("mode", "sr")}'
+    application = os.path.join(TRANSPORT, 'application.py')
+    server.cmd(f'{sys.executable} {application} -s -i {address} -p 8088 -o {target} {common} > /dev/null 2>&1 &')
+    time.sleep(0.5)
+    flags = ''.join(f' --{flag}' for flag in ('timestamps', 'checksum', 'pace') if options.get(flag))
+    if options.get('cc'):
+        flags += f' --cc {options["cc"]}'
+    start_ping(server, client.IP(), config['duration'])
+    limit = transfer_timeout(spec, size, options)
+    #timeout exits with 124 when it had to stop the client
+    output = client.cmd(f'timeout -k 5 {limit:.0f} {sys.executable} {application} -c -i {address} -p 8088 '
+                        f'-f {source} {common}{flags}; echo "exit status $?"')
+    status = re.search(r'^exit status (\d+)', output, re.M)
+    try:
+        if status and int(status.group(1)) in (124, 137):
+            result = {'error': f'TimeoutError: no result after {limit:.0f} s'}
+        else:
+            result = parse_transport(output)
+        result.update(parse_ping(server.waitOutput()))
+    finally:
+        client.cmd(f'rm -f {source} {target}')
+    return result
+
+
+def run_point(job):
+    '''
+    builds the network of one point, measures, and returns its csv row. runs
+    in a worker process, the network is always stopped
+    '''
+    config, spec, point_id, params, repeat = job
+    prefix = f'x{SLOT}' if SLOT else ''
+    row = {'point': point_id, 'repeat': repeat, **params, 'tool': config['tool']}
+    start = time.perf_counter()
+    net = None
+    try:
+        from network import start_network
+        spec = apply_params(spec, params)
+        topology = Topology(prefixed(spec, prefix), config.get('metric', 'hops'))
+        net, bringup = start_network(topology)
+        row['bringup_s'] = round(sum(bringup.timings.values()), 3)
+        client, server = net[prefix + config['client']], net[prefix + config['server']]
+        if config['tool'] == 'iperf':
+            row.update(run_iperf(config, client, server))
+        else:
+            row.update(run_transport(config, client, server, prefix, spec))
+    except Exception as e:
+        row['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        if net is not None:
+            net.stop()
+    row['elapsed_s'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+# the number of the worker process, for the name prefix (0 without -j)
+SLOT = 0
+
+
+def init_worker(slots):
+    global SLOT
+    SLOT = slots.get()
+
+
+def finished_points(path):
+    #ids of the points that are in the results without an error
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {row.get('point') for row in csv.DictReader(f) if not row.get('error')}
+
+
+class ResultsFile:
+    '''the results csv, one row appended (and flushed) per point'''
+
+    def __init__(self, path, fields):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            #a resumed sweep keeps the columns of the file
+            with open(path, newline='') as f:
+                fields = next(csv.reader(f))
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=fields, extrasaction='ignore')
+        if not exists:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def write_parquet(csv_path, parquet_path):
+    #the whole results csv as one parquet file, if pyarrow is installed
+    try:
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        print('parquet output needs pyarrow (pip install pyarrow), the results are in', csv_path)
+        return
+    pyarrow.parquet.write_table(pyarrow.csv.read_csv(csv_path), parquet_path)
+    print(f'wrote {parquet_path}')
+
+
+def load_config(path):
+    config = load_spec(path)
+    for key in ('spec', 'client', 'server', 'grid'):
+        if key not in config:
+            raise SpecError(f'the sweep needs {key}')
+    config.setdefault('tool', 'iperf')
+    config.setdefault('duration', 10)
+    config.setdefault('repeat', 1)
+    if config['tool'] not in TOOLS:
+        raise SpecError(f'unknown tool {config["tool"]}, expected one of {TOOLS}')
+    #the spec is relative to the sweep file
+    config['spec'] = os.path.join(os.path.dirname(os.path.abspath(path)), config['spec'])
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parameter sweep over link bandwidth, delay, loss and queue size', epilog='end of help')
+    parser.add_argument('sweep', help='the sweep file, .json or .yaml')
+    parser.add_argument('-o', '--output', type=str, default='results.csv', help='results csv, appended to and resumed from')
+    parser.add_argument('-j', '--jobs', type=check_positive, default=1, help='points that run at the same time')
+    parser.add_argument('--parquet', type=str, help='also write the results as a parquet file at the end')
+    parser.add_argument('--dry-run', action='store_true', help='only list the points that would run')
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.sweep)
+        spec = load_spec(config['spec'])
+        points = grid_points(config['grid'], config['repeat'])
+        #every point must make a valid topology before anything runs
+        for point_id, params, repeat in points:
+            Topology(apply_params(spec, params))
+    except (OSError, SpecError, KeyError) as e:
+        print(f'the sweep is not valid: {e}')
+        sys.exit(1)
+
+    done = finished_points(args.output)
+    todo = [p for p in points if p[0] not in done]
+    print(f'{len(points)} points, {len(points) - len(todo)} already in {args.output}, {len(todo)} to run')
+    if args.dry_run:
+        for point_id, params, repeat in todo:
+            print(f'  {point_id}  repeat {repeat}  ' + '  '.join(f'{k}={v}' for k, v in params.items()))
+        return
+    if not todo:
+        return
+    cores = os.cpu_count() or 1
+    if args.jobs > cores:
+        print(f'only {cores} cores, running {cores} points at a time')
+        args.jobs = cores
+
+    fields = ['point', 'repeat'] + list(config['grid']) + ['tool'] + list(RESULT_FIELDS) + ['rtt_transport_ms']
+    results = ResultsFile(args.output, fields)
+    jobs = [(config, spec, point_id, params, repeat) for point_id, params, repeat in todo]
+    started = time.perf_counter()
+    try:
+        if args.jobs == 1:
+            rows = map(run_point, jobs)
+        else:
+            slots = multiprocessing.Queue()
+            for slot in range(1, args.jobs + 1):
+                slots.put(slot)
+            pool = multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(slots,))
+            rows = pool.imap_unordered(run_point, jobs)
+        for i, row in enumerate(rows, 1):
+            results.write(row)
+            status = row.get('error') or f'{row.get("throughput_mbps", 0):.2f} Mbps, rtt {row.get("rtt_avg_ms", "-")} ms'
+            print(f'[{i}/{len(jobs)}] {row["point"]}: {status}', flush=True)
+    except KeyboardInterrupt:
+        print('interrupted, run the same command again to resume')
+    finally:
+        results.close()
+    print(f'{time.perf_counter() - started:.1f} s')
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+'''
+    #a forwarding table with longest-prefix match on IPv4 addresses as integers
+
+    #the prefixes are kept in a multibit trie with strides of 16, 4, 4, 4 and
+    #4 bits: the first 16 bits of an address pick one of 65536 slots, then
+    #every 4 bits pick a slot in a block of 16 below the one before. a prefix
+    #is written into every slot it covers on the level its length ends in (a
+    #/18 into 4 slots of a block on the second level), so a lookup reads at
+    #most five slots, however many prefixes there are. the levels are flat
+    #arrays of ints, not objects. the blocks are small because most of them
+    #hold a single prefix: with blocks of 256 (strides 16, 8, 8) 100000
+    #random prefixes took 121 MB, with blocks of 16 they take about 20 MB,
+    #for one or two more reads per lookup. the slots remember the length of
+    #the prefix in them, a longer prefix is never overwritten by a shorter
+    #one, and delete() puts back the next shorter prefix that covers the slots.
+
+    #   table = ForwardingTable()
+    #   table.insert('10.0.0.0/8', 'r1-eth0')
+    #   table.insert('10.0.3.0/24', '10.0.1.2 dev r1-eth1')
+    #   table.lookup('10.0.3.7')                  # '10.0.1.2 dev r1-eth1'
+    #   table.lookup_many(['10.0.3.7', '10.9.9.9', '192.168.1.1'])
+    #                                             # ['10.0.1.2 dev r1-eth1', 'r1-eth0', None]
+    #   table.delete('10.0.3.0/24')
+
+    #lookup_many() takes many addresses (strings, ints or an array of uint32)
+    #and looks all of them up in one call. with numpy every level is one
+    #vectorised read for all addresses at once, without it they are looked up
+    #one by one.
+
+    #parse_address() and parse_prefix() are the parsers the table uses, and
+    #validate() checks many addresses or prefixes at once with them (see
+    #argparse-and-oop/ip_check.py). they accept what ipaddress accepts for
+    #IPv4: four decimal numbers from 0 to 255 without leading zeros.
+
+    #as a program it looks addresses up in a table of routes (a prefix and the
+    #next hop per line, or the output of ip route), or compares the trie with a
+    #linear scan over ipaddress.ip_network objects:
+    #   python3 lpm.py -r routes.txt 10.0.3.7 10.0.9.1
+    #   python3 lpm.py --benchmark 100000 -n 1000000
+'''
+
+import argparse
+import random
+import sys
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# the bits of the address every level of the trie uses, and the last bit of every level
+STRIDES = (16, 4, 4, 4, 4)
+ENDS = tuple(sum(STRIDES[:i + 1]) for i in range(len(STRIDES)))
+LEVELS = len(STRIDES)
+# how far an address is shifted right for the slot on the levels below the first
+SHIFTS = tuple(32 - end for end in ENDS[1:])
+ROOT_BITS = STRIDES[0]
+BLOCK_BITS = 4
+BLOCK_SIZE = 1 << BLOCK_BITS
+NO_HOP = -1
+
+# '0' ... '255' -> the number, anything else (leading zeros, signs, spaces) is not in it
+OCTETS = {str(i): i for i in range(256)}
+LENGTHS = {str(i): i for i in range(33)}
+MASKS = [(0xffffffff << (32 - length)) & 0xffffffff for length in range(33)]
+
+
+def parse_address(text):
+    '''the IPv4 address in text as an int, or None if it is not one'''
+    parts = text.split('.')
+    if len(parts) != 4:
+        return None
+    a = OCTETS.get(parts[0])
+    b = OCTETS.get(parts[1])
+    c = OCTETS.get(parts[2])
+    d = OCTETS.get(parts[3])
+    if a is None or b is None or c is None or d is None:
+        return None
+    return a << 24 | b << 16 | c << 8 | d
+
+
+def parse_prefix(text, strict=True):
+    '''
+    (network, length) of a prefix like 10.0.3.0/24 (an address alone is a
+    /32), or None. with strict, like ipaddress.ip_network, the bits after
+    the length must be zero, otherwise they are cleared
+    '''
+    address, slash, length = text.partition('/')
+    value = parse_address(address)
+    if not slash:
+        length = 32
+    elif length.isascii() and length.isdigit():
+        #ipaddress takes leading zeros in the length, 10.0.0.0/08
+        length = LENGTHS.get(length.lstrip('0') or '0')
+    else:
+        length = None
+    if value is None or length is None:
+        return None
+    network = value & MASKS[length]
+    if strict and network != value:
+        return None
+    return network, length
+
+
+def format_address(value):
+    return f'{value >> 24}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}'
+
+
+def validate(texts, prefixes=False, strict=True):
+    '''
+    checks many addresses (or prefixes) at once. returns the parsed values
+    (ints, or (network, length) for prefixes) and the (index, text) of the
+    ones that are not valid
+    '''
+    values = []
+    invalid = []
+    for i, text in enumerate(texts):
+        text = text.strip()
+        value = parse_prefix(text, strict) if prefixes else parse_address(text)
+        if value is None:
+            invalid.append((i, text))
+        else:
+            values.append(value)
+    return values, invalid
+
+
+def as_prefix(prefix):
+    #(network, length) of a string or a (network, length) tuple
+    if isinstance(prefix, str):
+        parsed = parse_prefix(prefix)
+        if parsed is None:
+            raise ValueError(f'{prefix!r} is not an IPv4 prefix')
+        return parsed
+    network, length = prefix
+    if not 0 <= length <= 32 or network & ~MASKS[length] & 0xffffffff:
+        raise ValueError(f'{format_address(network)}/{length} is not an IPv4 prefix')
+    return network, length
+
+
+def as_address(address):
+    if isinstance(address, str):
+        value = parse_address(address)
+        if value is None:
+            raise ValueError(f'{address!r} is not an IPv4 address')
+        return value
+    return address
+
+
+class ForwardingTable:
+
+    def __init__(self):
+        self.prefixes = {}          # (network, length) -> next hop
+        self.next_hops = []         # next hop id -> next hop
+        self.hop_ids = {}           # next hop -> id
+        #per level, for every slot: the id of the next hop (or -1), the
+        #length of the prefix it is from, and the block below it (or -1)
+        #(the last level has no blocks below it)
+        self.hops = [array('i', [NO_HOP]) * (1 << ROOT_BITS)] + [array('i') for _ in STRIDES[1:]]
+        self.lengths = [array('b', [-1]) * (1 << ROOT_BITS)] + [array('b') for _ in STRIDES[1:]]
+        self.children = [array('i', [-1]) * (1 << ROOT_BITS)] + [array('i') for _ in STRIDES[1:-1]]
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    def __contains__(self, prefix):
+        return as_prefix(prefix) in self.prefixes
+
+    def items(self):
+        #(prefix as text, next hop), sorted by address and length
+        return [(f'{format_address(network)}/{length}', hop) for (network, length), hop in sorted(self.prefixes.items())]
+
+    def hop_id(self, next_hop):
+        hop = self.hop_ids.get(next_hop)
+        if hop is None:
+            hop = self.hop_ids[next_hop] = len(self.next_hops)
+            self.next_hops.append(next_hop)
+        return hop
+
+    def child(self, level, slot, create):
+        #the block below a slot of level, a new one if create
+        block = self.children[level][slot]
+        if block < 0 and create:
+            block = len(self.hops[level + 1]) // BLOCK_SIZE
+            self.hops[level + 1].extend(array('i', [NO_HOP]) * BLOCK_SIZE)
+            self.lengths[level + 1].extend(array('b', [-1]) * BLOCK_SIZE)
+            if level + 1 < len(self.children):
+                self.children[level + 1].extend(array('i', [-1]) * BLOCK_SIZE)
+            self.children[level][slot] = block
+        return block
+
+    def slots(self, network, length, create=True):
+        #(level, first slot, number of slots) of the slots a prefix covers
+        slot = network >> (32 - ROOT_BITS)
+        for level, end in enumerate(ENDS):
+            if length <= end:
+                return level, slot, 1 << (end - length)
+            block = self.child(level, slot, create)
+            if block < 0:
+                return None
+            slot = block << BLOCK_BITS | (network >> (32 - ENDS[level + 1]) & (BLOCK_SIZE - 1))
+
+    def insert(self, prefix, next_hop):
+        '''adds a prefix, or changes its next hop'''
+        network, length = as_prefix(prefix)
+        self.prefixes[(network, length)] = next_hop
+        hop = self.hop_id(next_hop)
+        level, first, count = self.slots(network, length)
+        hops = self.hops[level]
+        lengths = self.lengths[level]
+        for slot in range(first, first + count):
+            if lengths[slot] <= length:
+                hops[slot] = hop
+                lengths[slot] = length
+
+    def delete(self, prefix):
+        '''removes a prefix, KeyError if it is not in the table'''
+        network, length = as_prefix(prefix)
+        if (network, length) not in self.prefixes:
+            raise KeyError(f'{format_address(network)}/{length} is not in the table')
+        del self.prefixes[(network, length)]
+        level, first, count = self.slots(network, length, create=False)
+        #the longest prefix on the same level that covers it takes its slots
+        #back, a shorter one on a level above is found by the lookup anyway
+        lowest = ENDS[level - 1] + 1 if level else 0
+        hop, cover = NO_HOP, -1
+        for shorter in range(length - 1, lowest - 1, -1):
+            key = (network & MASKS[shorter], shorter)
+            if key in self.prefixes:
+                hop, cover = self.hop_ids[self.prefixes[key]], shorter
+                break
+        hops = self.hops[level]
+        lengths = self.lengths[level]
+        for slot in range(first, first + count):
+            if lengths[slot] == length:
+                hops[slot] = hop
+                lengths[slot] = cover
+
+    def lookup_id(self, address):
+        #the id of the next hop of an address (an int), or -1
+        hops = self.hops
+        children = self.children
+        slot = address >> (32 - ROOT_BITS)
+        hop = hops[0][slot]
+        for level in range(1, LEVELS):
+            block = children[level - 1][slot]
+            if block < 0:
+                break
+            slot = block << BLOCK_BITS | (address >> SHIFTS[level - 1] & (BLOCK_SIZE - 1))
+            found = hops[level][slot]
+            if found >= 0:
+                hop = found
+        return hop
+
+    def lookup(self, address):
+        '''the next hop of the longest prefix that matches address, or None'''
+        hop = self.lookup_id(as_address(address))
+        return self.next_hops[hop] if hop >= 0 else None
+
+    def lookup_ids(self, addresses):
+        '''
+        the next hop ids of many addresses (-1 for no route), as a numpy
+        array with numpy and as an array('i') without
+        '''
+        if np is None:
+            lookup_id = self.lookup_id
+            return array('i', [lookup_id(as_address(a)) for a in addresses])
+        if isinstance(addresses, np.ndarray):
+            values = addresses.astype(np.uint32, copy=False)
+        elif len(addresses) and isinstance(addresses[0], str):
+            values = np.array([as_address(a) for a in addresses], dtype=np.uint32)
+        else:
+            values = np.asarray(addresses, dtype=np.uint32)
+        #views of the levels, they are only valid until the next insert
+        hops = [np.frombuffer(h, dtype=np.int32) for h in self.hops]
+        children = [np.frombuffer(c, dtype=np.int32) for c in self.children]
+        slots = values >> (32 - ROOT_BITS)
+        result = hops[0][slots]
+        #the positions of the addresses that go on to the next level
+        below = np.arange(len(values))
+        for level in range(1, LEVELS):
+            blocks = children[level - 1][slots]
+            deeper = blocks >= 0
+            below = below[deeper]
+            if not len(below):
+                break
+            slots = blocks[deeper].astype(np.int64) << BLOCK_BITS | (values[below] >> SHIFTS[level - 1] & (BLOCK_SIZE - 1))
+            found = hops[level][slots]
+            result[below] = np.where(found >= 0, found, result[below])
+        return result
+
+    def lookup_many(self, addresses):
+        '''the next hops of many addresses in one call, None for no route'''
+        next_hops = self.next_hops
+        return [next_hops[hop] if hop >= 0 else None for hop in self.lookup_ids(addresses).tolist()]
+
+    def statistics(self):
+        return {
+            'prefixes': len(self.prefixes),
+            'next_hops': len(self.next_hops),
+            'blocks': [len(h) // BLOCK_SIZE for h in self.hops[1:]],
+            'bytes': sum(a.buffer_info()[1] * a.itemsize for a in self.hops + self.lengths + self.children),
+        }
+
+
+def load_routes(path):
+    '''
+    a ForwardingTable from a file with a prefix and the next hop on every
+    line, like the output of ip route (default is 0.0.0.0/0)
+    '''
+    table = ForwardingTable()
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.split(None, 1)
+            if not fields or fields[0].startswith('#'):
+                continue
+            prefix = '0.0.0.0/0' if fields[0] == 'default' else fields[0]
+            try:
+                table.insert(prefix, fields[1].strip() if len(fields) > 1 else '')
+            except ValueError as e:
+                raise ValueError(f'{path} line {number}: {e}')
+    return table
+
+
+def random_prefixes(count, rng):
+    #prefixes with lengths roughly like a BGP table: most /24, some shorter, a few longer
+    lengths = [8] * 1 + [16] * 6 + [18, 19, 20, 21, 22, 23] * 3 + [24] * 60 + [28, 32] * 2
+    prefixes = set()
+    while len(prefixes) < count:
+        length = rng.choice(lengths)
+        prefixes.add((rng.getrandbits(32) & MASKS[length], length))
+    return sorted(prefixes)
+
+
+def benchmark(count, lookups, seed):
+    import ipaddress
+    rng = random.Random(seed)
+    prefixes = random_prefixes(count, rng)
+    hops = [f'10.255.{i // 256}.{i % 256}' for i in range(64)]
+    routes = [(network, length, rng.choice(hops)) for network, length in prefixes]
+    #addresses in the prefixes, and some anywhere
+    addresses = [network | rng.getrandbits(32 - length) if length < 32 and rng.random() < 0.8 else rng.getrandbits(32)
+                 for network, length, _ in (rng.choice(routes) for _ in range(lookups))]
+
+    started = time.perf_counter()
+    table = ForwardingTable()
+    for network, length, hop in routes:
+        table.insert((network, length), hop)
+    build = time.perf_counter() - started
+    stats = table.statistics()
+    print(f'{count} prefixes, {stats["next_hops"]} next hops: built in {build:.2f} s, '
+          f'{stats["bytes"] / 1e6:.1f} MB, blocks per level {stats["blocks"]}')
+
+    started = time.perf_counter()
+    lookup_id = table.lookup_id
+    single = [lookup_id(a) for a in addresses]
+    one = time.perf_counter() - started
+    started = time.perf_counter()
+    many = table.lookup_ids(addresses)
+    bulk = time.perf_counter() - started
+    if list(many) != single:
+        print('lookup_ids and lookup_id do not agree')
+        sys.exit(1)
+    print(f'  lookup one by one   {one / lookups * 1e9:10.0f} ns per address')
+    print(f'  lookup_ids          {bulk / lookups * 1e9:10.0f} ns per address'
+          f'{"" if np is not None else "  (without numpy, pip install numpy)"}')
+
+    #the linear scan is too slow for all of them, a sample shows the cost
+    networks = [(ipaddress.ip_network((network, length)), hop) for network, length, hop in routes]
+    sample = addresses[:max(1, min(200, 2_000_000 // count))]
+    started = time.perf_counter()
+    for address, expected in zip(sample, single):
+        ip = ipaddress.ip_address(address)
+        best = None
+        for network, hop in networks:
+            if ip in network and (best is None or network.prefixlen > best[0].prefixlen):
+                best = (network, hop)
+        if (best[1] if best else None) != (table.next_hops[expected] if expected >= 0 else None):
+            print(f'{format_address(address)}: the linear scan gives {best}')
+            sys.exit(1)
+    scan = time.perf_counter() - started
+    print(f'  linear scan         {scan / len(sample) * 1e9:10.0f} ns per address ({len(sample)} addresses, same next hops)')
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='longest-prefix match in a forwarding table', epilog='end of help')
+    parser.add_argument('addresses', nargs='*', help='addresses to look up')
+    parser.add_argument('-r', '--routes', type=str, help='file with a prefix and a next hop per line (e.g. ip route)')
+    parser.add_argument('-f', '--file', type=str, help='file with addresses to look up, one per line')
+    parser.add_argument('--benchmark', type=check_positive, help='compare with a linear scan over this many random prefixes')
+    parser.add_argument('-n', '--lookups', type=check_positive, default=100000, help='addresses to look up in the benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.lookups, args.seed)
+        return
+    if not args.routes:
+        parser.error('give a table with -r, or --benchmark')
+    try:
+        table = load_routes(args.routes)
+    except (OSError, ValueError) as e:
+        print(f'cannot read the routes: {e}')
+        sys.exit(1)
+    texts = list(args.addresses)
+    if args.file:
+        with open(args.file) as f:
+            texts.extend(line.strip() for line in f if line.strip())
+    values, invalid = validate(texts)
+    for _, text in invalid:
+        print(f'{text} is not a valid IPv4 address')
+    for value, hop in zip(values, table.lookup_many(values)):
+        print(f'{format_address(value):15s} {hop if hop is not None else "no route"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+    #benchmark: packets/sec for create_packet()/parse_header() in header.py
+    #compared with the zero-copy codec in codec.py
+
+    #run it with:  python3 codec-benchmark.py -n 200000 -b 64
+'''
+
+import argparse
+import contextlib
+import os
+import time
+
+import header
+import codec
+
+
+def rate(count, elapsed):
+    return count / elapsed if elapsed > 0 else float('inf')
+
+
+def bench_create_packet(count, data):
+    #the current function: pack + header + data + print for every packet
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for seq in range(count):
+            header.create_packet(seq, 0, 0, 0, data)
+        return time.perf_counter() - start
+
+
+def bench_parse_header(count, packet):
+    start = time.perf_counter()
+    for _ in range(count):
+        seq, ack, flags, win = header.parse_header(packet[:12])
+        header.parse_flags(flags)
+    return time.perf_counter() - start
+
+
+def bench_pool(count, batch, data):
+    #the codec: headers written into a pool of preallocated slots, batch by batch
+    pool = codec.PacketPool(batch)
+    pack = pool.pack
+    start = time.perf_counter()
+    seq = 0
+    while seq < count:
+        #the last batch may be a partial one, exactly count packets are timed
+        for slot in range(min(batch, count - seq)):
+            pack(slot, seq, 0, 0, 0, data)
+            seq += 1
+    return time.perf_counter() - start
+
+
+def bench_pool_header_only(count, batch):
+    #the data is already in place in the slots (e.g. read with readinto),
+    #so only the 12 byte header is written per packet
+    pool = codec.PacketPool(batch)
+    pack_into = codec.header_struct.pack_into
+    slots = pool.slots
+    start = time.perf_counter()
+    seq = 0
+    while seq < count:
+        for slot in range(min(batch, count - seq)):
+            pack_into(slots[slot], 0, seq, 0, 0, 0)
+            seq += 1
+    return time.perf_counter() - start
+
+
+def bench_parse_from(count, packet):
+    view = memoryview(packet)
+    parse_header_from = codec.parse_header_from
+    parse_flags = codec.parse_flags
+    start = time.perf_counter()
+    for _ in range(count):
+        seq, ack, flags, win = parse_header_from(view)
+        parse_flags(flags)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='packets/sec: header.py vs codec.py')
+    parser.add_argument('-n', '--packets', type=int, default=200000, help='number of packets per test')
+    parser.add_argument('-b', '--batch', type=int, default=64, help='number of slots in the buffer pool')
+    args = parser.parse_args()
+
+    data = b'0' * codec.DATA_SIZE
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        packet = header.create_packet(1, 0, 0, 0, data)
+
+    results = [
+        ('header.create_packet', bench_create_packet(args.packets, data)),
+        ('codec.PacketPool.pack', bench_pool(args.packets, args.batch, data)),
+        ('codec pack_into (header only)', bench_pool_header_only(args.packets, args.batch)),
+        ('header.parse_header', bench_parse_header(args.packets, packet)),
+        ('codec.parse_header_from', bench_parse_from(args.packets, packet)),
+    ]
+
+    print(f'{args.packets} packets of {codec.PACKET_SIZE} bytes, pool of {args.batch} slots')
+    for name, elapsed in results:
+        print(f'{name:32s} {rate(args.packets, elapsed):14,.0f} packets/sec')
+
+
+if __name__ == '__main__':
+    main()
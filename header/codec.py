@@ -0,0 +1,218 @@
+'''
+    #A zero-copy version of the utility functions in header.py. The header layout
+    #is the same (!IIHH: sequence number, acknowledgement number, flags and
+    #receiver window), but:
+    #  1) the format is compiled once with struct.Struct instead of on every call,
+    #  2) headers are written with pack_into straight into a preallocated buffer,
+    #     so the 1460 bytes of application data are never copied by header + data,
+    #  3) headers are read with unpack_from at an offset of a memoryview, so we
+    #     never slice the received packet to get the first 12 bytes.
+
+    #import it with:  from codec import *
+'''
+
+import zlib
+from struct import Struct
+
+
+header_format = '!IIHH'
+
+# compiled once and reused for every packet
+header_struct = Struct(header_format)
+flags_struct = Struct('!H')
+
+HEADER_SIZE = header_struct.size    # 12 bytes
+DATA_SIZE = 1460                    # application data per packet
+PACKET_SIZE = HEADER_SIZE + DATA_SIZE
+
+# the last 4 bits of the flags field:  S A F R
+SYN = 1 << 3
+ACK = 1 << 2
+FIN = 1 << 1
+RST = 1 << 0
+
+# offset of the flags field inside the header (after seq and ack)
+FLAGS_OFFSET = 8
+
+# versioned variants of the header. every version starts with the 12 bytes of
+# header_format and only appends fields, so the flags (e.g. of a SYN) can be
+# read the same way whatever version the packet has.
+#   1: header_format
+#   2: + timestamp and timestamp echo (microseconds, 32 bits)
+#   3: + timestamps and a CRC32 of the header and the application data
+header_formats = {
+    1: header_format,
+    2: header_format + 'II',
+    3: header_format + 'III',
+}
+header_structs = {version: Struct(fmt) for version, fmt in header_formats.items()}
+header_sizes = {version: hs.size for version, hs in header_structs.items()}
+timestamp_struct = Struct('!II')
+MAX_PACKET_SIZE = max(header_sizes.values()) + DATA_SIZE
+
+# where the CRC32 is in the versions that have one
+checksum_offsets = {3: 20}
+checksum_struct = Struct('!I')
+
+# the SYN carries the highest header version the sender can use and its window
+# scale (the receiver window in the header is shifted left by it), the SYN-ACK
+# the version the receiver picked and the receiver's window scale. an old
+# sender only sends the version, or nothing at all (version 1, no scaling)
+syn_options_struct = Struct('!BB')
+MAX_WINDOW_SCALE = 14
+
+
+def pack_header_into(buffer, offset, seq, ack, flags, win):
+    #writes a 12 byte header into a bytearray/memoryview at offset
+    #and returns the offset where the application data starts
+    header_struct.pack_into(buffer, offset, seq, ack, flags, win)
+    return offset + HEADER_SIZE
+
+
+def create_packet_into(buffer, offset, seq, ack, flags, win, data=b''):
+    #same as create_packet() in header.py, but the packet is built in place
+    #inside buffer. data is copied once, directly into its final position.
+    #returns the length of the packet
+    start = pack_header_into(buffer, offset, seq, ack, flags, win)
+    size = len(data)
+    if size:
+        buffer[start:start + size] = data
+    return HEADER_SIZE + size
+
+
+def parse_header_from(packet, offset=0):
+    #zero-copy counterpart of parse_header(): reads the header from a
+    #bytes/bytearray/memoryview at offset without slicing it first
+    return header_struct.unpack_from(packet, offset)
+
+
+def parse_flags(flags):
+    #same return values as parse_flags() in header.py
+    return flags & SYN, flags & ACK, flags & FIN
+
+
+def parse_flags_from(packet, offset=0):
+    #reads only the flags field of the header at offset and parses it
+    flags, = flags_struct.unpack_from(packet, offset + FLAGS_OFFSET)
+    return flags & SYN, flags & ACK, flags & FIN
+
+
+def parse_timestamps_from(packet, offset=0):
+    #timestamp and timestamp echo of a version 2 header
+    return timestamp_struct.unpack_from(packet, offset + HEADER_SIZE)
+
+
+def timestamp(now):
+    #a time in seconds as the 32 bit microsecond value of the timestamp field
+    return int(now * 1000000) & 0xffffffff
+
+
+def timestamp_age(now, echo):
+    #seconds from a timestamp until now, across the 32 bit wrap around
+    return ((timestamp(now) - echo) & 0xffffffff) / 1000000
+
+
+def checksum(packet, length, version=3):
+    #CRC32 of a packet without its checksum field
+    position = checksum_offsets[version]
+    view = packet if isinstance(packet, memoryview) else memoryview(packet)
+    crc = zlib.crc32(view[:position])
+    return zlib.crc32(view[position + checksum_struct.size:length], crc)
+
+
+def verify_checksum(packet, version=3):
+    #True if the CRC32 in the header matches the packet
+    if len(packet) < header_sizes[version]:
+        return False
+    expected, = checksum_struct.unpack_from(packet, checksum_offsets[version])
+    return checksum(packet, len(packet), version) == expected
+
+
+def window_scale(window):
+    #the smallest shift that makes window fit in the 16 bit win field
+    scale = 0
+    while window >> scale > 0xffff and scale < MAX_WINDOW_SCALE:
+        scale += 1
+    return scale
+
+
+def payload(packet, length, offset=0):
+    #returns a memoryview of the application data of a packet (no copy)
+    view = packet if isinstance(packet, memoryview) else memoryview(packet)
+    return view[offset + HEADER_SIZE:offset + length]
+
+
+class PacketPool:
+    '''
+    one preallocated bytearray split into fixed-size slots. every slot holds
+    one packet (header + data). slots are reused, so sending a batch of
+    packets does not allocate new bytes objects. version selects the header
+    variant (see header_formats), its extra fields are passed as extra. the
+    checksum of a version that has one is filled in by the pool.
+    '''
+
+    def __init__(self, slots=64, packet_size=None, version=1):
+        self.version = version
+        self.header = header_structs[version]
+        self.header_size = self.header.size
+        self.checksum_offset = checksum_offsets.get(version)
+        #placeholder for the checksum while the header is packed
+        self.checksum_field = () if self.checksum_offset is None else (0,)
+        if packet_size is None:
+            packet_size = self.header_size + DATA_SIZE
+        self.packet_size = packet_size
+        self.buffer = bytearray(slots * packet_size)
+        self.view = memoryview(self.buffer)
+        #one memoryview per slot, created once
+        self.slots = [self.view[i * packet_size:(i + 1) * packet_size] for i in range(slots)]
+        self.lengths = [0] * slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def pack(self, slot, seq, ack, flags, win, data=b'', extra=()):
+        #builds a packet in the given slot and returns a memoryview of it
+        view = self.slots[slot]
+        self.header.pack_into(view, 0, seq, ack, flags, win, *extra, *self.checksum_field)
+        length = self.header_size + len(data)
+        if data:
+            view[self.header_size:length] = data
+        if self.checksum_offset is not None:
+            checksum_struct.pack_into(view, self.checksum_offset, checksum(view, length, self.version))
+        self.lengths[slot] = length
+        return view[:length]
+
+    def pack_batch(self, headers, payloads=None):
+        #builds one packet per header tuple (seq, ack, flags, win and the extra
+        #fields of the version) in consecutive slots, and returns the
+        #memoryviews of the packets
+        packets = []
+        pack_into = self.header.pack_into
+        start = self.header_size
+        for slot, fields in enumerate(headers):
+            view = self.slots[slot]
+            pack_into(view, 0, *fields, *self.checksum_field)
+            length = start
+            if payloads is not None:
+                data = payloads[slot]
+                length += len(data)
+                view[start:length] = data
+            if self.checksum_offset is not None:
+                checksum_struct.pack_into(view, self.checksum_offset, checksum(view, length, self.version))
+            self.lengths[slot] = length
+            packets.append(view[:length])
+        return packets
+
+    def packet(self, slot):
+        #the last packet written to slot
+        return self.slots[slot][:self.lengths[slot]]
+
+    def parse(self, slot):
+        #header of the packet in slot, read in place
+        return self.header.unpack_from(self.buffer, slot * self.packet_size)
+
+    def parse_batch(self, count):
+        #headers of the first count slots, read in place
+        unpack_from = self.header.unpack_from
+        size = self.packet_size
+        return [unpack_from(self.buffer, slot * size) for slot in range(count)]
@@ -0,0 +1,222 @@
+'''
+    #what netem does to packets, without the kernel: delay, jitter, loss,
+    #reordering and a rate limit, for one direction of a relay (see proxy.py)
+
+    #   Link(delay=0.05, jitter=0.01, loss=GilbertElliott(0.01, 0.3), rate=2.5e6)
+    #   release = link.schedule(now, len(data), queued)  # None: dropped
+
+    #the parameters mean the same as for netem (docs/netem/mininet-tc-delay.md):
+    #   delay, jitter   every packet waits delay plus a random jitter, uniform
+    #                   in [-jitter, jitter] or normal with sigma jitter
+    #   loss            Bernoulli(p): every packet is lost with probability p.
+    #                   GilbertElliott(p, r, h, k): a good and a bad state,
+    #                   good -> bad with probability p and bad -> good with r
+    #                   per packet; in the bad state a packet is lost with
+    #                   probability 1 - h, in the good state with 1 - k (netem:
+    #                   loss gemodel p r 1-h 1-k). bursts of loss, like a
+    #                   wireless link or a full queue somewhere else
+    #   reorder         a packet is sent at once without the delay with this
+    #                   probability, so it overtakes the ones before it
+    #   rate, burst     a token bucket of rate bytes/sec that holds burst bytes,
+    #                   packets wait in it for their tokens (before the delay)
+    #   limit           at most this many packets wait in the link, the next
+    #                   one is dropped
+
+    #the random decisions of a packet (lost, jitter, reordered) come from a
+    #random.Random of its own seed, one per direction, so the same seed gives
+    #the same decisions for the n-th packet whatever the timing. they can also
+    #be written to a trace and read back from it (Trace) to replay a run.
+'''
+
+import csv
+import random
+
+
+class Bernoulli:
+    '''every packet is lost with probability p, independent of the others'''
+
+    name = 'bernoulli'
+
+    def __init__(self, p):
+        self.p = p
+
+    def lost(self, rng):
+        return rng.random() < self.p
+
+
+class GilbertElliott:
+    '''
+    two-state loss: p good -> bad, r bad -> good, h and k the probability
+    that a packet gets through in the bad and the good state
+    '''
+
+    name = 'gilbert-elliott'
+
+    def __init__(self, p, r, h=0.0, k=1.0):
+        self.p = p
+        self.r = r
+        self.h = h
+        self.k = k
+        self.bad = False
+
+    def lost(self, rng):
+        #the state changes before every packet
+        if self.bad:
+            if rng.random() < self.r:
+                self.bad = False
+        elif rng.random() < self.p:
+            self.bad = True
+        keep = self.h if self.bad else self.k
+        return keep < 1.0 and rng.random() >= keep
+
+    def mean_loss(self):
+        #the long-run loss rate
+        if self.p + self.r == 0:
+            return 1 - self.k
+        bad = self.p / (self.p + self.r)
+        return bad * (1 - self.h) + (1 - bad) * (1 - self.k)
+
+
+class Trace:
+    '''
+    the random decisions of every packet, as a csv of
+    direction, packet, lost, jitter (seconds), reordered
+    '''
+
+    FIELDS = ('direction', 'packet', 'lost', 'jitter', 'reordered')
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.file = open(path, mode, newline='')
+        self.decisions = {}
+        self.writer = None
+        if mode == 'r':
+            for row in csv.DictReader(self.file):
+                self.decisions[(row['direction'], int(row['packet']))] = (
+                    row['lost'] == '1', float(row['jitter']), row['reordered'] == '1')
+            self.file.close()
+        else:
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.FIELDS)
+
+    def get(self, direction, packet):
+        return self.decisions.get((direction, packet))
+
+    def record(self, direction, packet, decision):
+        lost, jitter, reordered = decision
+        self.writer.writerow((direction, packet, int(lost), f'{jitter:.9f}', int(reordered)))
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class Link:
+    '''one direction of the relay: decides when (or if) a packet is released'''
+
+    def __init__(self, name, delay=0.0, jitter=0.0, distribution='uniform', loss=None, reorder=0.0,
+                 rate=None, burst=None, limit=1000, seed=1, replay=None, record=None):
+        self.name = name
+        self.delay = delay
+        self.jitter = jitter
+        self.distribution = distribution
+        self.loss = loss
+        self.reorder = reorder
+        self.rate = rate
+        #at least one large packet fits in the bucket
+        self.burst = max(burst or 0, 65536) if rate else 0
+        self.tokens = self.burst
+        self.last = None
+        self.limit = limit
+        #a string seed is hashed the same way in every run
+        self.random = random.Random(f'{seed}-{name}')
+        self.replay = replay
+        self.record = record
+
+        self.packets = 0
+        self.lost = 0
+        self.overflow = 0
+        self.reordered = 0
+        self.replayed = 0
+        self.delay_sum = 0.0
+
+    def decide(self):
+        #(lost, jitter, reordered) of the next packet
+        number = self.packets
+        if self.replay is not None:
+            decision = self.replay.get(self.name, number)
+            if decision is not None:
+                self.replayed += 1
+                return decision
+            return (False, 0.0, False)
+        rng = self.random
+        lost = self.loss is not None and self.loss.lost(rng)
+        jitter = 0.0
+        if self.jitter:
+            if self.distribution == 'normal':
+                jitter = rng.gauss(0.0, self.jitter)
+            else:
+                jitter = rng.uniform(-self.jitter, self.jitter)
+        reordered = bool(self.reorder) and rng.random() < self.reorder
+        decision = (lost, jitter, reordered)
+        if self.record is not None:
+            self.record.record(self.name, number, decision)
+        return decision
+
+    def wait_for_tokens(self, now, size):
+        #when the token bucket lets a packet of size bytes go. the tokens go
+        #below zero while packets wait, the next one waits for them too
+        if not self.rate:
+            return now
+        if self.last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= size
+        if self.tokens >= 0:
+            return now
+        return now - self.tokens / self.rate
+
+    def schedule(self, now, size, queued=0):
+        '''
+        the time a packet that arrives now is released, or None if it is
+        dropped. queued is the number of packets of this link waiting
+        '''
+        lost, jitter, reordered = self.decide()
+        self.packets += 1
+        if lost:
+            self.lost += 1
+            return None
+        if queued >= self.limit:
+            self.overflow += 1
+            return None
+        ready = self.wait_for_tokens(now, size)
+        if reordered and self.delay:
+            self.reordered += 1
+            release = ready
+        else:
+            release = ready + max(0.0, self.delay + jitter)
+        self.delay_sum += release - now
+        return release
+
+    def schedule_stream(self, now, size, previous=0.0):
+        '''
+        the same for a chunk of a TCP stream: nothing is lost or reordered,
+        a chunk is never released before the one before it (at previous)
+        '''
+        _, jitter, _ = self.decide()
+        self.packets += 1
+        ready = self.wait_for_tokens(now, size)
+        release = max(ready + max(0.0, self.delay + jitter), previous)
+        self.delay_sum += release - now
+        return release
+
+    def statistics(self):
+        passed = self.packets - self.lost - self.overflow
+        return {
+            'packets': self.packets,
+            'lost': self.lost,
+            'overflow': self.overflow,
+            'reordered': self.reordered,
+            'replayed': self.replayed,
+            'mean_delay_ms': self.delay_sum / passed * 1000 if passed else 0.0,
+        }
@@ -0,0 +1,433 @@
+'''
+    #a relay between a client and a server that delays, drops, reorders and
+    #rate-limits the packets like netem, without root or mininet
+
+    #the client talks to the proxy instead of the server:
+    #   python3 proxy.py -l 127.0.0.1:13000 -t 127.0.0.1:12000 --delay 50 --jitter 10 --loss 2
+    #   python3 ../udp/udpserver.py                 (port 12000)
+    #   python3 ../udp/udpclient.py                 (with serverPort = 13000)
+    #the transport with bursty loss, reordering and a 10 Mbit/s bottleneck:
+    #   python3 proxy.py -l 127.0.0.1:9088 -t 127.0.0.1:8088 --delay 20 --gemodel 1 30 --reorder 5 --rate 10
+    #   python3 ../transport/application.py -s -p 8088 -o received.bin -m sr -w 32
+    #   python3 ../transport/application.py -c -p 9088 -f big.bin -m sr -w 32
+    #TCP (only delay, jitter and the rate, the stream itself is never changed):
+    #   python3 proxy.py -P tcp -l 127.0.0.1:13000 -t 127.0.0.1:12000 --delay 100 --rate 1
+
+    #UDP: every client gets its own socket towards the server, so the replies
+    #find their way back. the impairments of impairments.py are applied in
+    #both directions (or only one with --direction), each direction with its
+    #own random generator. a packet that has to wait goes into one heap
+    #ordered by release time; there is only ever one timer, for the first
+    #packet in the heap, and when it fires every packet that is due is sent.
+    #the event loop waits in steps of 1 ms, --precise waits the last
+    #millisecond in a busy loop for sub-millisecond release times. the
+    #impairments and the heap cost about 3.5 us per packet (close to 300k
+    #packets/sec), the rest is the recvfrom and sendto of every packet.
+
+    #--record trace.csv writes down what happened to every packet (lost,
+    #jitter, reordered) and --replay trace.csv applies exactly that again,
+    #e.g. to rerun a failure. the same --seed also gives the same decisions.
+'''
+
+import argparse
+import asyncio
+import heapq
+import sys
+from socket import *
+
+from impairments import Bernoulli, GilbertElliott, Link, Trace
+
+
+# packets due within this many seconds of the timer are sent together
+SLACK = 0.0002
+# how early the timer fires with --precise, the rest is a busy wait
+PRECISION = 0.0015
+# datagrams read in one go when a socket is readable
+READ_BATCH = 64
+# chunks of a TCP direction that may wait before the proxy stops reading
+STREAM_QUEUE = 64
+
+
+def check_address(val):
+    host, _, port = val.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected host:port, e.g. 127.0.0.1:12000')
+    if not 0 < port <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return host or '127.0.0.1', port
+
+
+def check_percent(val):
+    try:
+        value = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a percentage')
+    if not 0 <= value <= 100:
+        raise argparse.ArgumentTypeError('a percentage is between 0 and 100')
+    return value
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+class Scheduler:
+    '''
+    the packets that wait for their release time, in a heap, and the one
+    timer of the earliest of them
+    '''
+
+    def __init__(self, loop, precise=False):
+        self.loop = loop
+        self.precise = precise
+        self.heap = []
+        self.count = 0
+        self.timer = None
+        self.timer_at = None
+        self.queued = {}        # link name -> packets in the heap
+        self.sent = 0
+        self.errors = 0
+        self.late_sum = 0.0
+        self.late_max = 0.0
+
+    def add(self, when, link, sock, data, address):
+        self.count += 1
+        heapq.heappush(self.heap, (when, self.count, link, sock, data, address))
+        self.queued[link] = self.queued.get(link, 0) + 1
+        if self.timer_at is None or when < self.timer_at:
+            self.arm(when)
+
+    def arm(self, when):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer_at = when
+        self.timer = self.loop.call_at(when - PRECISION if self.precise else when, self.release)
+
+    def release(self):
+        self.timer = None
+        self.timer_at = None
+        heap = self.heap
+        clock = self.loop.time
+        now = clock()
+        if self.precise and heap and heap[0][0] > now:
+            #the event loop woke up early on purpose, wait the rest here
+            while clock() < heap[0][0]:
+                pass
+            now = clock()
+        queued = self.queued
+        pop = heapq.heappop
+        while heap and heap[0][0] <= now + SLACK:
+            when, _, link, sock, data, address = pop(heap)
+            queued[link] -= 1
+            late = now - when
+            if late > 0:
+                self.late_sum += late
+                if late > self.late_max:
+                    self.late_max = late
+            try:
+                sock.sendto(data, address)
+                self.sent += 1
+            except OSError:
+                #a full socket buffer, or nobody listens on the other side
+                self.errors += 1
+        if heap:
+            self.arm(heap[0][0])
+
+    def statistics(self):
+        return {
+            'waiting': len(self.heap),
+            'released': self.sent,
+            'send_errors': self.errors,
+            'mean_late_ms': self.late_sum / self.sent * 1000 if self.sent else 0.0,
+            'max_late_ms': self.late_max * 1000,
+        }
+
+
+class UdpRelay:
+    '''
+    relays UDP between clients and the server, one upstream socket per client
+    '''
+
+    def __init__(self, loop, listen, target, up, down, scheduler, idle=60.0):
+        self.loop = loop
+        self.target = target
+        self.up = up
+        self.down = down
+        self.scheduler = scheduler
+        self.idle = idle
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.bind(listen)
+        self.sock.setblocking(False)
+        self.sessions = {}      # client address -> [upstream socket, last packet time]
+        self.direct = 0         # packets forwarded without waiting
+        loop.add_reader(self.sock.fileno(), self.from_clients)
+
+    def open(self, client):
+        upstream = socket(AF_INET, SOCK_DGRAM)
+        upstream.setblocking(False)
+        upstream.connect(self.target)
+        session = self.sessions[client] = [upstream, 0.0]
+        self.loop.add_reader(upstream.fileno(), self.from_server, client, upstream)
+        return session
+
+    def from_clients(self):
+        recvfrom = self.sock.recvfrom
+        now = self.loop.time()
+        for _ in range(READ_BATCH):
+            try:
+                data, client = recvfrom(65535)
+            except BlockingIOError:
+                return
+            except OSError:
+                continue
+            session = self.sessions.get(client) or self.open(client)
+            session[1] = now
+            self.forward(self.up, data, session[0], self.target, now)
+
+    def from_server(self, client, upstream):
+        recv = upstream.recv
+        now = self.loop.time()
+        for _ in range(READ_BATCH):
+            try:
+                data = recv(65535)
+            except BlockingIOError:
+                return
+            except OSError:
+                #e.g. ICMP port unreachable from the server
+                continue
+            self.forward(self.down, data, self.sock, client, now)
+
+    def forward(self, link, data, sock, address, now):
+        if link is None:
+            try:
+                sock.sendto(data, address)
+            except OSError:
+                pass
+            return
+        scheduler = self.scheduler
+        release = link.schedule(now, len(data), scheduler.queued.get(link.name, 0))
+        if release is None:
+            return
+        if release <= now:
+            self.direct += 1
+            try:
+                sock.sendto(data, address)
+            except OSError:
+                scheduler.errors += 1
+            return
+        scheduler.add(release, link.name, sock, data, address)
+
+    def expire(self):
+        #forgets the clients that have been quiet for idle seconds
+        now = self.loop.time()
+        for client, (upstream, last) in list(self.sessions.items()):
+            if now - last > self.idle:
+                self.loop.remove_reader(upstream.fileno())
+                upstream.close()
+                del self.sessions[client]
+
+    def close(self):
+        for upstream, _ in self.sessions.values():
+            self.loop.remove_reader(upstream.fileno())
+            upstream.close()
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+class TcpRelay:
+    '''relays TCP connections, with the delay and rate of the links applied to the chunks read'''
+
+    def __init__(self, loop, target, up, down):
+        self.loop = loop
+        self.target = target
+        self.up = up
+        self.down = down
+        self.active = 0
+        self.total = 0
+
+    async def handle(self, reader, writer):
+        try:
+            up_reader, up_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            writer.close()
+            return
+        self.active += 1
+        self.total += 1
+        try:
+            await asyncio.gather(self.pipe(reader, up_writer, self.up), self.pipe(up_reader, writer, self.down))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.active -= 1
+            for w in (writer, up_writer):
+                w.close()
+
+    async def pipe(self, reader, writer, link):
+        #one direction: read, hold every chunk until its release time, write
+        queue = asyncio.Queue(STREAM_QUEUE)
+
+        async def send():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                when, data = item
+                wait = when - self.loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+
+        async def receive():
+            previous = 0.0
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if link is not None:
+                    previous = link.schedule_stream(self.loop.time(), len(data), previous)
+                #a full queue stops the reading, and TCP slows the sender down
+                await queue.put((previous, data))
+            await queue.put(None)
+
+        sender = asyncio.create_task(send())
+        receiver = asyncio.create_task(receive())
+        try:
+            #if one side fails the other is cancelled: a reader waiting in
+            #queue.put() for a sender that is gone would wait forever
+            await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            receiver.cancel()
+            sender.cancel()
+        for result in await asyncio.gather(receiver, sender, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+
+def make_links(args):
+    #(client -> server, server -> client), None for a direction without impairments
+    replay = Trace(args.replay) if args.replay else None
+    record = Trace(args.record, 'w') if args.record else None
+    links = []
+    for name in ('up', 'down'):
+        if args.direction not in (name, 'both'):
+            links.append(None)
+            continue
+        if args.gemodel:
+            p, r, *rest = [v / 100 for v in args.gemodel]
+            #netem: loss gemodel p r 1-h 1-k
+            h = 1 - rest[0] if len(rest) > 0 else 0.0
+            k = 1 - rest[1] if len(rest) > 1 else 1.0
+            loss = GilbertElliott(p, r, h, k)
+        elif args.loss:
+            loss = Bernoulli(args.loss / 100)
+        else:
+            loss = None
+        links.append(Link(name, delay=args.delay / 1000, jitter=args.jitter / 1000, distribution=args.distribution,
+                          loss=loss, reorder=args.reorder / 100, rate=args.rate * 1e6 / 8 if args.rate else None,
+                          burst=args.burst, limit=args.limit, seed=args.seed, replay=replay, record=record))
+    return links, record
+
+
+def report_line(links, scheduler, relay):
+    parts = []
+    for link in links:
+        if link is None:
+            continue
+        s = link.statistics()
+        parts.append(f'{link.name}: {s["packets"]} in, {s["lost"]} lost, {s["overflow"]} overflow, '
+                     f'{s["reordered"]} reordered, {s["mean_delay_ms"]:.2f} ms')
+    if scheduler is not None:
+        s = scheduler.statistics()
+        parts.append(f'waiting {s["waiting"]}, late {s["mean_late_ms"]:.3f}/{s["max_late_ms"]:.3f} ms')
+    if isinstance(relay, UdpRelay):
+        parts.append(f'{len(relay.sessions)} clients')
+    else:
+        parts.append(f'{relay.active} connections')
+    return ' | '.join(parts)
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    links, record = make_links(args)
+    up, down = links
+    scheduler = None
+    if args.protocol == 'udp':
+        scheduler = Scheduler(loop, args.precise)
+        relay = UdpRelay(loop, args.listen, args.target, up, down, scheduler)
+        server = None
+    else:
+        relay = TcpRelay(loop, args.target, up, down)
+        server = await asyncio.start_server(relay.handle, *args.listen)
+    print(f'relaying {args.protocol} {args.listen[0]}:{args.listen[1]} -> {args.target[0]}:{args.target[1]}', flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.interval)
+            if not args.quiet:
+                print(report_line(links, scheduler, relay), flush=True)
+            if isinstance(relay, UdpRelay):
+                relay.expire()
+    finally:
+        if server is not None:
+            server.close()
+        else:
+            relay.close()
+        if record is not None:
+            record.close()
+        print(report_line(links, scheduler, relay))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP/TCP relay with netem-like delay, jitter, loss, reordering and rate', epilog='end of help')
+    parser.add_argument('-P', '--protocol', choices=('udp', 'tcp'), default='udp')
+    parser.add_argument('-l', '--listen', type=check_address, default=('127.0.0.1', 13000), help='host:port the clients send to')
+    parser.add_argument('-t', '--target', type=check_address, default=('127.0.0.1', 12000), help='host:port of the server')
+    parser.add_argument('--direction', choices=('both', 'up', 'down'), default='both',
+                        help='impair client -> server (up), server -> client (down) or both')
+    parser.add_argument('--delay', type=float, default=0.0, help='delay in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='jitter in ms')
+    parser.add_argument('--distribution', choices=('uniform', 'normal'), default='uniform', help='of the jitter')
+    parser.add_argument('--loss', type=check_percent, default=0.0, help='random (Bernoulli) loss in percent')
+    parser.add_argument('--gemodel', type=check_percent, nargs='+', metavar='PERCENT',
+                        help='Gilbert-Elliott loss like netem: p r [1-h [1-k]] in percent')
+    parser.add_argument('--reorder', type=check_percent, default=0.0, help='percent of the packets sent without the delay')
+    parser.add_argument('--rate', type=float, help='rate limit in Mbit/s')
+    parser.add_argument('--burst', type=check_positive, help='bytes the rate limit lets through at once')
+    parser.add_argument('--limit', type=check_positive, default=1000, help='packets that may wait per direction')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random decisions')
+    parser.add_argument('--record', type=str, help='write the decision for every packet to this csv')
+    parser.add_argument('--replay', type=str, help='apply the decisions of a recorded csv instead of random ones')
+    parser.add_argument('--precise', action='store_true', help='busy-wait the last ms before a release (uses a core)')
+    parser.add_argument('-i', '--interval', type=float, default=5.0, help='seconds between the reports')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report at the end')
+    args = parser.parse_args()
+
+    if args.gemodel and len(args.gemodel) not in (2, 3, 4):
+        print('--gemodel takes p r, p r 1-h or p r 1-h 1-k')
+        sys.exit(1)
+    if args.protocol == 'tcp' and (args.loss or args.gemodel or args.reorder):
+        print('a TCP stream cannot lose or reorder bytes, only --delay, --jitter and --rate apply')
+    if args.replay and args.record:
+        print('--record and --replay cannot be used together')
+        sys.exit(1)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
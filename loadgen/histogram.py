@@ -0,0 +1,99 @@
+'''
+    #a log-bucketed latency histogram in the style of HdrHistogram
+
+    #values (integers, e.g. microseconds) below 2**bits are counted exactly,
+    #above that every power of two is split into 2**(bits-1) buckets, so a
+    #bucket is never wider than 1/2**(bits-1) of its value (0.8% with the
+    #default bits=8). the number of buckets only depends on the largest value
+    #that can be recorded, not on how many values are recorded, so a histogram
+    #of a billion requests takes the same few KB as one of ten, and the
+    #histograms of many processes are merged by adding up the counts.
+
+    #import it with:  from histogram import Histogram
+'''
+
+
+class Histogram:
+
+    def __init__(self, bits=8, max_value=2 ** 36):
+        self.bits = bits
+        self.exact = 1 << bits          # values below are their own bucket
+        self.half = self.exact >> 1     # buckets per power of two above
+        self.max_value = max_value
+        self.counts = [0] * (self.index(max_value) + 1)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def index(self, value):
+        if value < self.exact:
+            return value
+        shift = value.bit_length() - self.bits
+        return self.exact + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def lowest(self, index):
+        #the smallest value that lands in bucket index
+        if index < self.exact:
+            return index
+        shift, offset = divmod(index - self.exact, self.half)
+        return (offset + self.half) << (shift + 1)
+
+    def highest(self, index):
+        #the largest value that lands in bucket index
+        return self.lowest(index + 1) - 1
+
+    def record(self, value, count=1):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self.index(value)] += count
+        self.total += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.counts) != len(self.counts):
+            raise ValueError('histograms with different bits or max_value')
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total += other.total
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        #the value below which p percent of the recorded values are
+        #(the upper end of its bucket, but never more than the maximum)
+        if not self.total:
+            return None
+        rank = max(1, -(-self.total * p // 100))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.highest(i), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else None
+
+    def to_dict(self):
+        #only the buckets that have values, as {index: count}
+        return {
+            'bits': self.bits, 'max_value': self.max_value, 'total': self.total,
+            'sum': self.sum, 'min': self.min, 'max': self.max,
+            'counts': {i: c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls(d['bits'], d['max_value'])
+        for i, c in d['counts'].items():
+            h.counts[int(i)] = c
+        h.total, h.sum, h.min, h.max = d['total'], d['sum'], d['min'], d['max']
+        return h
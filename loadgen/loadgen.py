@@ -0,0 +1,387 @@
+'''
+    #load generator for the upper-case servers (udp/, tcp-simple/, thread/,
+    #asyncio-echo/)
+
+    #closed loop (-m closed): -c clients each keep one request outstanding and
+    #send the next one as soon as the reply is there. the load adapts to the
+    #server, this measures its capacity.
+
+    #open loop (-m open): requests arrive at a fixed rate (-r, per second, in
+    #total) whether the server keeps up or not, evenly spaced or as a Poisson
+    #process (--poisson). TCP requests wait for a free connection of the -c
+    #connections; the latency is measured from the time the request should
+    #have been sent, so a server that falls behind shows up in the latency
+    #instead of silently lowering the load (coordinated omission).
+
+    #the load is spread over -j processes. every process records the latencies
+    #in microseconds in a Histogram (histogram.py), the histograms are merged
+    #at the end. a UDP request without a reply within --timeout is lost.
+
+    #run it with:
+    #   python3 loadgen.py -P udp -p 12000 -m closed -c 64 -j 2 -d 10
+    #   python3 loadgen.py -P tcp --framed -m open -r 20000 -c 200 -o results.csv --label select
+'''
+
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from histogram import Histogram
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'thread'))
+from framing import frame, length_struct, LENGTH_SIZE
+
+
+PROTOCOLS = ('tcp', 'udp')
+MODES = ('closed', 'open')
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def check_port(val):
+    value = check_positive(val)
+    if not 1024 <= value <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+def message(seq, size):
+    #lowercase so the server has something to do, the sequence number in
+    #digits survives upper() so UDP replies can be matched to requests
+    head = b'%016d' % seq
+    return head + (b'abcdefghijklmnopqrstuvwxyz' * (size // 26 + 1))[:max(0, size - len(head))]
+
+
+class Stats:
+
+    def __init__(self, warmup_until):
+        self.histogram = Histogram()
+        self.warmup_until = warmup_until
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.lost = 0
+
+    def request(self, intended):
+        if intended >= self.warmup_until:
+            self.sent += 1
+
+    def done(self, intended, now):
+        #a reply to a request that was (meant to be) sent at intended
+        if intended >= self.warmup_until:
+            self.completed += 1
+            self.histogram.record((now - intended) * 1e6)
+
+    def to_dict(self):
+        return {'sent': self.sent, 'completed': self.completed, 'errors': self.errors,
+                'lost': self.lost, 'histogram': self.histogram.to_dict()}
+
+
+class TcpClient:
+    '''one connection, one request at a time'''
+
+    def __init__(self, args):
+        self.args = args
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.args.ip, self.args.port)
+
+    async def request(self, data):
+        if self.args.framed:
+            self.writer.write(frame(data))
+            length, = length_struct.unpack(await self.reader.readexactly(LENGTH_SIZE))
+            reply = await self.reader.readexactly(length)
+        else:
+            #without framing the reply can still arrive in pieces
+            self.writer.write(data)
+            reply = b''
+            while len(reply) < len(data):
+                chunk = await self.reader.read(65536)
+                if not chunk:
+                    raise ConnectionError('closed by the server')
+                reply += chunk
+        if reply != data.upper():
+            raise ValueError('wrong reply')
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class UdpClient(asyncio.DatagramProtocol):
+    '''one socket, any number of requests outstanding, matched by sequence number'''
+
+    def __init__(self, stats, timeout):
+        self.stats = stats
+        self.timeout = timeout
+        self.outstanding = {}       # seq -> (intended send time, future or None)
+        self.transport = None
+
+    async def connect(self, args):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, remote_addr=(args.ip, args.port))
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            seq = int(data[:16])
+        except ValueError:
+            self.stats.errors += 1
+            return
+        entry = self.outstanding.pop(seq, None)
+        if entry is None:
+            return      # too late, already counted as lost
+        intended, future = entry
+        self.stats.done(intended, time.perf_counter())
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def error_received(self, exc):
+        self.stats.errors += 1
+
+    def send(self, seq, data, intended, future=None):
+        self.outstanding[seq] = (intended, future)
+        self.transport.sendto(data)
+        self.stats.request(intended)
+
+    def expire(self, now):
+        for seq, (intended, future) in list(self.outstanding.items()):
+            if now - intended > self.timeout:
+                del self.outstanding[seq]
+                self.stats.lost += 1
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+    async def expire_loop(self):
+        while True:
+            await asyncio.sleep(self.timeout / 4)
+            self.expire(time.perf_counter())
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def tcp_closed(args, stats, seqs, deadline):
+    client = TcpClient(args)
+    try:
+        await client.connect()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            stats.request(start)
+            await client.request(message(next(seqs), args.size))
+            stats.done(start, time.perf_counter())
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        stats.errors += 1
+    finally:
+        client.close()
+
+
+async def udp_closed(args, stats, seqs, deadline):
+    client = UdpClient(stats, args.timeout)
+    await client.connect(args)
+    loop = asyncio.get_running_loop()
+    try:
+        while time.perf_counter() < deadline:
+            future = loop.create_future()
+            start = time.perf_counter()
+            client.send(seq := next(seqs), message(seq, args.size), start, future)
+            try:
+                await asyncio.wait_for(future, args.timeout)
+            except asyncio.TimeoutError:
+                if client.outstanding.pop(seq, None) is not None:
+                    stats.lost += 1
+    finally:
+        client.close()
+
+
+async def arrivals(rate, deadline, poisson):
+    #yields the times at which the requests should be sent
+    now = time.perf_counter()
+    next_time = now
+    while next_time < deadline:
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield next_time
+        next_time += random.expovariate(rate) if poisson else 1 / rate
+
+
+async def tcp_open(args, stats, rate, seqs, deadline):
+    clients = [TcpClient(args) for i in range(args.clients)]
+    idle = asyncio.Queue()
+    for client in clients:
+        try:
+            await client.connect()
+            idle.put_nowait(client)
+        except OSError:
+            stats.errors += 1
+    if idle.empty():
+        return
+
+    async def one(intended, seq):
+        stats.request(intended)
+        client = await idle.get()
+        try:
+            await client.request(message(seq, args.size))
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            client.close()
+            return
+        stats.done(intended, time.perf_counter())
+        idle.put_nowait(client)
+
+    tasks = set()
+    async for intended in arrivals(rate, deadline, args.poisson):
+        task = asyncio.ensure_future(one(intended, next(seqs)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    #requests still waiting for a connection at the end are unanswered
+    if tasks:
+        await asyncio.wait(tasks, timeout=args.timeout)
+    for task in tasks:
+        task.cancel()
+    for client in clients:
+        client.close()
+
+
+async def udp_open(args, stats, rate, seqs, deadline):
+    client = UdpClient(stats, args.timeout)
+    await client.connect(args)
+    expiry = asyncio.ensure_future(client.expire_loop())
+    async for intended in arrivals(rate, deadline, args.poisson):
+        seq = next(seqs)
+        client.send(seq, message(seq, args.size), intended)
+    await asyncio.sleep(min(args.timeout, 1.0))
+    client.expire(time.perf_counter() + args.timeout)
+    expiry.cancel()
+    client.close()
+
+
+async def run_worker(args, number, clients, rate):
+    start = time.perf_counter()
+    stats = Stats(start + args.warmup)
+    deadline = start + args.warmup + args.duration
+    #sequence numbers are unique across processes
+    seqs = iter(range(number, 10 ** 15, args.processes))
+    if args.mode == 'closed':
+        run = tcp_closed if args.protocol == 'tcp' else udp_closed
+        await asyncio.gather(*(run(args, stats, seqs, deadline) for i in range(clients)))
+    else:
+        run = tcp_open if args.protocol == 'tcp' else udp_open
+        await run(args, stats, rate, seqs, deadline)
+    return stats
+
+
+def worker(job):
+    args, number, clients, rate = job
+    return asyncio.run(run_worker(args, number, clients, rate)).to_dict()
+
+
+def summarize(args, results):
+    histogram = Histogram()
+    totals = {'sent': 0, 'completed': 0, 'errors': 0, 'lost': 0}
+    for r in results:
+        histogram.merge(Histogram.from_dict(r['histogram']))
+        for key in totals:
+            totals[key] += r[key]
+    row = {
+        'label': args.label, 'protocol': args.protocol, 'framed': args.framed,
+        'mode': args.mode, 'processes': args.processes, 'clients': args.clients,
+        'rate': args.rate if args.mode == 'open' else '', 'size': args.size,
+        'duration': args.duration, **totals,
+        #sent during the measurement but no reply, error or timeout by the end
+        'unanswered': totals['sent'] - totals['completed'] - totals['errors'] - totals['lost'],
+        'throughput': totals['completed'] / args.duration,
+        'mean_us': histogram.mean(),
+    }
+    for p in PERCENTILES:
+        row[f'p{p}_us'] = histogram.percentile(p)
+    row['max_us'] = histogram.max
+    return row, histogram
+
+
+def write_results(path, row, histogram):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump({**row, 'histogram': histogram.to_dict()}, f, indent=2)
+        return
+    #csv: one row per run, appended, so runs against different servers
+    #end up in one table
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=list(row))
+        if new:
+            w.writeheader()
+        w.writerow(row)
+
+
+def print_results(row):
+    def ms(v):
+        return '-' if v is None else f'{v / 1000:.3f}'
+    print(f'{row["label"] or row["protocol"]}: {row["mode"]} loop, {row["completed"]} replies in '
+          f'{row["duration"]} s, {row["throughput"]:.0f} requests/sec')
+    print(f'  sent {row["sent"]}  errors {row["errors"]}  lost {row["lost"]}  unanswered {row["unanswered"]}')
+    print('  latency ms: ' + '  '.join(f'p{p} {ms(row[f"p{p}_us"])}' for p in PERCENTILES)
+          + f'  max {ms(row["max_us"])}  mean {ms(row["mean_us"])}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='closed- and open-loop load generator for the upper-case servers', epilog='end of help')
+    parser.add_argument('-P', '--protocol', choices=PROTOCOLS, default='tcp')
+    parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=check_port, default=12000)
+    parser.add_argument('-f', '--framed', action='store_true', help='length-prefixed TCP messages (tcpserver-multi.py --framed)')
+    parser.add_argument('-m', '--mode', choices=MODES, default='closed')
+    parser.add_argument('-c', '--clients', type=check_positive, default=16, help='concurrent clients (closed) or TCP connections (open), in total')
+    parser.add_argument('-r', '--rate', type=float, default=1000, help='requests per second in total (open loop)')
+    parser.add_argument('--poisson', action='store_true', help='exponential instead of even spacing of the requests (open loop)')
+    parser.add_argument('-j', '--processes', type=check_positive, default=1)
+    parser.add_argument('-d', '--duration', type=float, default=10, help='seconds to measure')
+    parser.add_argument('-w', '--warmup', type=float, default=1, help='seconds before the measurement starts')
+    parser.add_argument('-s', '--size', type=check_positive, default=64, help='bytes per request')
+    parser.add_argument('-t', '--timeout', type=float, default=1.0, help='seconds before a UDP request is lost')
+    parser.add_argument('-o', '--output', type=str, help='append the results to a .csv file, or write a .json file')
+    parser.add_argument('-l', '--label', type=str, default='', help='name of the run in the output, e.g. the server variant')
+    args = parser.parse_args()
+    if args.processes > args.clients and (args.mode == 'closed' or args.protocol == 'tcp'):
+        parser.error('need at least one client per process')
+    if not args.framed and args.protocol == 'tcp' and args.size > 1024:
+        print('the unframed servers read 1024 bytes at a time, larger requests may come back in pieces')
+
+    jobs = []
+    for number in range(args.processes):
+        #split the clients and the rate over the processes
+        clients = args.clients // args.processes + (number < args.clients % args.processes)
+        jobs.append((args, number, clients, args.rate / args.processes))
+    if args.processes == 1:
+        results = [worker(jobs[0])]
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.map(worker, jobs)
+    row, histogram = summarize(args, results)
+    print_results(row)
+    if args.output:
+        write_results(args.output, row, histogram)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+'''
+    #the metrics of a Registry (registry.py) out of the program while it runs
+
+    #serve() answers on a small HTTP server in a thread of its own:
+    #   GET /metrics         the Prometheus text format
+    #   GET /metrics.json    the same as JSON
+    #   curl -s localhost:9100/metrics
+    #Snapshots appends a JSON line with all values to a file every interval
+    #seconds (and once more at the end), for a plot after the run:
+    #   {"time": 1712345678.1, "metrics": {"server_messages_total": 1200, ...}}
+
+    #the programs get the same options for it with add_arguments(parser),
+    #start(args, registry) starts what the options ask for, close() stops it:
+    #   --metrics :9100 --snapshot stats.jsonl --snapshot-interval 1 --profile hot.folded
+    #--profile samples the stacks of the program (profiler.py) and writes
+    #them for a flame graph at the end. a program whose hot loop is not in
+    #the main thread asks for the profiler that looks at all threads with
+    #start(args, registry, threads=True).
+'''
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from profiler import DEFAULT_HZ, SamplingProfiler
+
+
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def check_address(val):
+    host, _, port = val.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected host:port, e.g. :9100 or 127.0.0.1:9100')
+    if not 0 <= port <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return host, port
+
+
+def check_positive(val):
+    try:
+        value = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a number')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def handler_for(registry):
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                body, kind = registry.prometheus().encode(), PROMETHEUS_TYPE
+            elif path == '/metrics.json':
+                body, kind = json.dumps(registry.snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404, 'try /metrics or /metrics.json')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            #a scrape every few seconds is not news
+            pass
+
+    return MetricsHandler
+
+
+def serve(registry, address):
+    '''
+    starts the HTTP server for the metrics in a daemon thread and returns it
+    (server.server_address has the port if it was 0)
+    '''
+    server = ThreadingHTTPServer(address, handler_for(registry))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+class Snapshots:
+    '''a thread that appends the values of the registry to a file as JSON lines'''
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.file = open(path, 'a')
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name='metrics-snapshots', daemon=True)
+        self.thread.start()
+
+    def write(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(json.dumps(self.registry.snapshot()) + '\n')
+            self.file.flush()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def close(self):
+        #the last values, then the file is closed
+        self.stopped.set()
+        self.write()
+        with self.lock:
+            self.file.close()
+            self.file = None
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('metrics')
+    group.add_argument('--metrics', type=check_address, help='host:port of an HTTP endpoint with the metrics, e.g. :9100')
+    group.add_argument('--snapshot', type=str, help='file the metrics are appended to as JSON lines')
+    group.add_argument('--snapshot-interval', type=check_positive, default=5.0, help='seconds between two snapshots')
+    group.add_argument('--profile', type=str, help='sample the stacks and write them collapsed (flamegraph.pl) to this file at the end')
+    group.add_argument('--profile-hz', type=check_positive, default=DEFAULT_HZ, help='stack samples per second')
+    group.add_argument('--profile-idle', action='store_true', help='also count the time waiting (wall time instead of CPU time)')
+
+
+class Exporter:
+    '''what the options of add_arguments ask for, stopped with close()'''
+
+    def __init__(self, registry, metrics=None, snapshot=None, interval=5.0, profile=None, hz=DEFAULT_HZ, idle=False,
+                 threads=False):
+        self.server = serve(registry, metrics) if metrics is not None else None
+        self.snapshots = Snapshots(registry, snapshot, interval) if snapshot else None
+        self.profile = profile
+        self.profiler = SamplingProfiler(hz, idle, threads) if profile else None
+        if self.profiler is not None:
+            self.profiler.start()
+
+    def describe(self):
+        parts = []
+        if self.server is not None:
+            host, port = self.server.server_address[:2]
+            parts.append(f'metrics on http://{host or "0.0.0.0"}:{port}/metrics')
+        if self.snapshots is not None:
+            parts.append(f'snapshots to {self.snapshots.path}')
+        if self.profiler is not None:
+            parts.append(f'profile to {self.profile}')
+        return ', '.join(parts)
+
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+            stacks = self.profiler.dump(self.profile)
+            print(f'{self.profiler.samples} samples, {stacks} stacks in {self.profile}')
+            self.profiler = None
+        if self.snapshots is not None:
+            self.snapshots.close()
+            self.snapshots = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def start(args, registry, threads=False):
+    exporter = Exporter(registry, args.metrics, args.snapshot, args.snapshot_interval,
+                        args.profile, args.profile_hz, args.profile_idle, threads)
+    description = exporter.describe()
+    if description:
+        print(description, flush=True)
+    return exporter
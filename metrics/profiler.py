@@ -0,0 +1,146 @@
+'''
+    #a sampling profiler for the hot loop of a server, for a flame graph
+
+    #the program is not traced, every 1/hz seconds the stack it is in is
+    #counted, so it runs at its normal speed. there are two ways to get the
+    #stacks:
+
+    #signal (the default), for a hot loop in the main thread (select mode,
+    #udpserver.py, the transport): a timer of the kernel (setitimer) sends
+    #SIGPROF after every 1/hz seconds of CPU time the process used, and python
+    #runs the handler in the main thread with the frame it was in. the
+    #samples fall where the CPU time went.
+
+    #threads=True, for hot loops in other threads (thread and pool mode): a
+    #thread looks at the stacks of all other threads (sys._current_frames())
+    #hz times a second, and only counts the threads that used the CPU since
+    #its last look (their CPU clock went on). it needs the GIL to look, so it
+    #sees a busy thread mostly where that thread let go of the GIL, in recv()
+    #or send(), and less of the python code in between.
+
+    #with idle=True the time waiting counts too (wall time): the signal is
+    #SIGALRM of a timer in real time, and the thread counts every thread.
+
+    #dump() writes the stacks collapsed, one line per stack with the frames
+    #from the outside in and the number of samples, as flamegraph.pl and
+    #speedscope read them:
+    #   main (tcpserver-multi.py:256);serveSelect (tcpserver-multi.py:165);flush (tcpserver-multi.py:184) 51
+    #   flamegraph.pl hot.folded > hot.svg
+
+    #   profiler = SamplingProfiler(hz=100)
+    #   profiler.start()
+    #   ...
+    #   profiler.stop()
+    #   profiler.dump('hot.folded')
+'''
+
+import os
+import signal
+import sys
+import threading
+import time
+
+
+DEFAULT_HZ = 100
+# frames above this depth are cut off
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+
+    def __init__(self, hz=DEFAULT_HZ, idle=False, threads=False):
+        self.interval = 1 / hz
+        self.idle = idle
+        self.threads = threads
+        self.stacks = {}        # tuple of code objects, outside first -> samples
+        self.labels = {}        # code object -> 'function (file:line)'
+        self.cpu = {}           # thread id -> its CPU time at the last sample
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.previous = None    # the handler of the signal before ours
+
+    def start(self):
+        if self.threads:
+            self.thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+            self.thread.start()
+            return
+        #only the main thread can set a signal handler
+        timer, signum = (signal.ITIMER_REAL, signal.SIGALRM) if self.idle else (signal.ITIMER_PROF, signal.SIGPROF)
+        self.previous = signal.signal(signum, self.on_signal)
+        signal.setitimer(timer, self.interval, self.interval)
+
+    def stop(self):
+        if self.threads:
+            self.stopped.set()
+            if self.thread is not None:
+                self.thread.join()
+                self.thread = None
+            return
+        timer, signum = (signal.ITIMER_REAL, signal.SIGALRM) if self.idle else (signal.ITIMER_PROF, signal.SIGPROF)
+        signal.setitimer(timer, 0)
+        if self.previous is not None:
+            signal.signal(signum, self.previous)
+            self.previous = None
+
+    def count(self, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        key = tuple(stack)
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def on_signal(self, signum, frame):
+        self.count(frame)
+
+    def ran(self, ident):
+        #True if the thread used the CPU since the last look
+        try:
+            now = time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (OSError, AttributeError):
+            #the thread has ended, or there are no CPU clocks per thread here
+            return True
+        before = self.cpu.get(ident)
+        self.cpu[ident] = now
+        return before is None or now > before
+
+    def sample(self):
+        me = threading.get_ident()
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident != me and (self.idle or self.ran(ident)):
+                self.count(frame)
+        #forget the threads that are gone
+        if len(self.cpu) > len(frames):
+            self.cpu = {ident: t for ident, t in self.cpu.items() if ident in frames}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            #the first line of the function, so all samples of a function are one frame
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            #';' separates the frames
+            label = label.replace(';', ':')
+            self.labels[code] = label
+        return label
+
+    def collapsed(self):
+        #'frame;frame;frame count' lines, the most frequent first
+        lines = {}
+        for stack, count in list(self.stacks.items()):
+            line = ';'.join(self.label(code) for code in stack)
+            lines[line] = lines.get(line, 0) + count
+        return [f'{line} {count}' for line, count in sorted(lines.items(), key=lambda item: -item[1])]
+
+    def dump(self, path):
+        lines = self.collapsed()
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + ('\n' if lines else ''))
+        return len(lines)
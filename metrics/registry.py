@@ -0,0 +1,371 @@
+'''
+    #counters, gauges and latency histograms for the hot loops of the servers
+    #and the transport, read by exporter.py (Prometheus text over HTTP and
+    #JSON snapshots)
+
+    #a print() per message is a system call and a lock on stdout for every
+    #message, which is more work than the message itself. a metric here is
+    #only a number in memory: every thread adds to a cell of its own (through
+    #a threading.local), so inc() takes no lock and two threads never write
+    #the same object. the cells are only added up when the metrics are read.
+    #the cell of a thread that ends is added to the total of the metric, so a
+    #server with a thread per client does not collect a cell per client.
+
+    #   registry = Registry()
+    #   messages = registry.counter('server_messages_total', 'messages received')
+    #   latency = registry.histogram('server_message_seconds', 'time to answer a message')
+    #   messages.inc()
+    #   latency.observe(time.perf_counter() - started)
+    #   print(registry.prometheus())
+
+    #a value that an object keeps anyway (the packets a Sender has sent, the
+    #length of a queue) is not counted twice: function= reads it when the
+    #metrics are read, the hot loop does nothing for it:
+    #   registry.gauge('transport_cwnd_packets', 'congestion window', function=lambda: sender.cc.cwnd)
+
+    #a histogram is the log-bucketed Histogram of loadgen/histogram.py, one
+    #per thread, merged when it is read. it is exported with the buckets of
+    #bounds (seconds by default) and the percentiles in the JSON snapshot.
+
+    #as a program it compares the cost of inc() and observe() with a print():
+    #   python3 registry.py
+'''
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'loadgen'))
+from histogram import Histogram
+
+
+# the bucket bounds of a latency histogram in seconds, as in the Prometheus clients
+LATENCY_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# the percentiles of a histogram in a snapshot
+PERCENTILES = (50, 90, 99)
+NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*$')
+
+
+class _Owner:
+    '''lives in the threading.local of a thread, its end tells the metric that the thread is gone'''
+
+    __slots__ = ('__weakref__',)
+
+
+class _PerThread:
+    '''a metric with a cell per thread, the cells are added up when it is read'''
+
+    kind = None
+
+    def __init__(self, name, help='', labels=None):
+        if not NAME.match(name):
+            raise ValueError(f'{name!r} is not a valid metric name')
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self.local = threading.local()
+        self.cells = {}         # id(cell) -> cell, of the threads that are alive
+        #reentrant: a thread may end (and its cell be retired) by the garbage
+        #collector while the same thread reads the metric
+        self.lock = threading.RLock()
+
+    def cell(self):
+        #the cell of the calling thread
+        try:
+            return self.local.cell
+        except AttributeError:
+            pass
+        cell = self.new_cell()
+        owner = _Owner()
+        self.local.cell = cell
+        self.local.owner = owner
+        with self.lock:
+            self.cells[id(cell)] = cell
+        weakref.finalize(owner, self.retire, cell)
+        return cell
+
+    def retire(self, cell):
+        with self.lock:
+            if self.cells.pop(id(cell), None) is not None:
+                self.fold(cell)
+
+    def new_cell(self):
+        raise NotImplementedError
+
+    def fold(self, cell):
+        raise NotImplementedError
+
+
+class Counter(_PerThread):
+    '''a number that only goes up: messages, bytes, retransmissions'''
+
+    kind = 'counter'
+
+    def __init__(self, name, help='', labels=None, function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+        self.retired = 0
+
+    def new_cell(self):
+        return [0]
+
+    def fold(self, cell):
+        self.retired += cell[0]
+
+    def inc(self, amount=1):
+        try:
+            self.local.cell[0] += amount
+        except AttributeError:
+            self.cell()[0] += amount
+
+    def value(self):
+        if self.function is not None:
+            return self.function()
+        with self.lock:
+            return self.retired + sum(cell[0] for cell in self.cells.values())
+
+
+class Gauge(Counter):
+    '''a number that goes up and down: active connections, cwnd, RTO.
+    set() is for a value one thread owns, inc() and dec() for one that
+    several threads change (they add up like a counter)'''
+
+    kind = 'gauge'
+
+    def __init__(self, name, help='', labels=None, function=None):
+        super().__init__(name, help, labels, function)
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def value(self):
+        if self.function is not None:
+            return self.function()
+        return self.current + super().value()
+
+
+class LatencyHistogram(_PerThread):
+    '''the distribution of a time (or any value), recorded in units of unit
+    (microseconds by default) and exported in bounds of the base unit'''
+
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=None, bounds=LATENCY_BOUNDS, unit=1e-6):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(bounds))
+        self.unit = unit
+        self.scale = 1 / unit
+        self.retired = Histogram()
+
+    def new_cell(self):
+        return Histogram()
+
+    def fold(self, cell):
+        self.retired.merge(cell)
+
+    def observe(self, value):
+        try:
+            self.local.cell.record(value * self.scale)
+        except AttributeError:
+            self.cell().record(value * self.scale)
+
+    def merged(self):
+        total = Histogram()
+        with self.lock:
+            total.merge(self.retired)
+            for cell in list(self.cells.values()):
+                total.merge(cell)
+        return total
+
+    def buckets(self, histogram):
+        #(bound, values up to the bound) for every bound, the counts of the
+        #log buckets that end below it (a log bucket is <1% wide)
+        result = []
+        seen = 0
+        i = 0
+        counts = histogram.counts
+        for bound in self.bounds:
+            limit = bound * self.scale
+            while i < len(counts) and histogram.highest(i) <= limit:
+                seen += counts[i]
+                i += 1
+            result.append((bound, seen))
+        return result
+
+    def value(self):
+        histogram = self.merged()
+        summary = {'count': histogram.total, 'sum': histogram.sum * self.unit}
+        for p in PERCENTILES:
+            value = histogram.percentile(p)
+            summary[f'p{p}'] = value * self.unit if value is not None else None
+        summary['max'] = histogram.max * self.unit if histogram.max is not None else None
+        return summary
+
+
+def format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+               for k, v in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Registry:
+    '''the metrics of one program, by name and labels'''
+
+    def __init__(self):
+        self.metrics = {}       # (name, labels) -> metric, in the order they were made
+        self.lock = threading.Lock()
+
+    def add(self, cls, name, help, labels, **kwargs):
+        #the metric with this name and these labels, made the first time
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = cls(name, help, labels, **kwargs)
+                for (other, _), m in self.metrics.items():
+                    if other == name and m.kind != metric.kind:
+                        raise ValueError(f'{name} is a {m.kind} already')
+                self.metrics[key] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f'{name} is a {metric.kind} already')
+        return metric
+
+    def counter(self, name, help='', labels=None, function=None):
+        return self.add(Counter, name, help, labels, function=function)
+
+    def gauge(self, name, help='', labels=None, function=None):
+        return self.add(Gauge, name, help, labels, function=function)
+
+    def histogram(self, name, help='', labels=None, bounds=LATENCY_BOUNDS, unit=1e-6):
+        return self.add(LatencyHistogram, name, help, labels, bounds=bounds, unit=unit)
+
+    def families(self):
+        #name -> the metrics with that name
+        families = {}
+        with self.lock:
+            for (name, _), metric in self.metrics.items():
+                families.setdefault(name, []).append(metric)
+        return families
+
+    def prometheus(self):
+        #the text format of Prometheus (version 0.0.4)
+        lines = []
+        for name, metrics in self.families().items():
+            first = metrics[0]
+            if first.help:
+                lines.append(f'# HELP {name} {first.help}'.replace('\n', ' '))
+            lines.append(f'# TYPE {name} {first.kind}')
+            for metric in metrics:
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{format_labels(metric.labels)} {format_value(metric.value())}')
+                    continue
+                histogram = metric.merged()
+                for bound, count in metric.buckets(histogram):
+                    lines.append(f'{name}_bucket{format_labels(metric.labels, {"le": format_value(bound)})} {count}')
+                lines.append(f'{name}_bucket{format_labels(metric.labels, {"le": "+Inf"})} {histogram.total}')
+                lines.append(f'{name}_sum{format_labels(metric.labels)} {format_value(histogram.sum * metric.unit)}')
+                lines.append(f'{name}_count{format_labels(metric.labels)} {histogram.total}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self, now=None):
+        #all values as a dict for json, a histogram as count, sum and percentiles
+        values = {}
+        for name, metrics in self.families().items():
+            for metric in metrics:
+                values[name + format_labels(metric.labels)] = metric.value()
+        return {'time': time.time() if now is None else now, 'metrics': values}
+
+
+def benchmark(count, threads):
+    registry = Registry()
+    counter = registry.counter('bench_total')
+    histogram = registry.histogram('bench_seconds')
+    devnull = open(os.devnull, 'w')
+
+    def timed(function):
+        started = time.perf_counter()
+        function()
+        return (time.perf_counter() - started) / count * 1e9
+
+    def loop_inc():
+        inc = counter.inc
+        for _ in range(count):
+            inc()
+
+    def loop_observe():
+        observe = histogram.observe
+        for _ in range(count):
+            observe(0.000123)
+
+    def loop_print():
+        for _ in range(count):
+            print('received  message = ', 'a sentence', file=devnull, flush=True)
+
+    def loop_empty():
+        for _ in range(count):
+            pass
+
+    empty = timed(loop_empty)
+    print(f'per call, {count} calls, without the empty loop ({empty:.0f} ns):')
+    for label, function in (('counter inc()', loop_inc), ('histogram observe()', loop_observe),
+                            ('print() to /dev/null', loop_print)):
+        print(f'  {label:22s} {timed(function) - empty:8.0f} ns')
+    #the same counter from several threads at once: every thread has its own
+    #cell, nothing is lost
+    before = counter.value()
+    workers = [threading.Thread(target=loop_inc) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    added = counter.value() - before
+    print(f'{threads} threads, {count} inc() each: {added} counted of {threads * count} '
+          f'in {elapsed:.2f} s, {len(counter.cells)} cells of live threads left')
+    if added != threads * count:
+        sys.exit(1)
+    devnull.close()
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='the cost of a metric compared with a print', epilog='end of help')
+    parser.add_argument('-n', '--count', type=check_positive, default=200000, help='calls per measurement')
+    parser.add_argument('-t', '--threads', type=check_positive, default=4, help='threads that count at once')
+    args = parser.parse_args()
+    benchmark(args.count, args.threads)
+
+
+if __name__ == '__main__':
+    main()
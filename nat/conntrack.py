@@ -0,0 +1,395 @@
+'''
+    #the connection tracking table of the NAT in natd.py: which inside
+    #address:port talks to which remote address:port through which external
+    #address:port
+
+    #every flow (protocol, source, source port, destination, destination port)
+    #that goes out gets an external port, and the table holds the flow twice:
+    #under the 5-tuple of its packets going out (the original direction) and
+    #under the 5-tuple of the replies as they come back (remote -> external).
+    #both are keys of a dict, so a packet in either direction is one lookup,
+    #however many flows there are. the keys are tuples of ints (the addresses
+    #too): packing the 5-tuple into one 104 bit int would take less memory,
+    #but the shifts make every lookup about half again as slow.
+    #a new flow gets a new mapping even if the same inside port had one to
+    #another destination (like conntrack: address and port dependent), and a
+    #reply is only let in from the address:port the flow went to.
+
+    #the free ports of every external address are a ring of 16 bit numbers:
+    #allocate() takes the port at the head, release() puts a port back at the
+    #tail, so a port that was just freed is the last one to be given out again
+    #(late packets of the old flow do not end up in a new one). an inside host
+    #always gets the same external address while its pool has free ports.
+
+    #the flows are removed after they have been idle for a while, with the
+    #TimerWheel of transport/rtt.py. a packet only writes its time into the
+    #entry, it does not move the timer: when the timer fires and the flow has
+    #been used since, it is scheduled again for the rest of its time. so
+    #the timers cost nothing per packet, only once per timeout.
+
+    #the timeouts are the ones of Linux conntrack and the NAT RFCs: UDP 30 s
+    #until there has been a reply, then 120 s (RFC 4787 REQ-5), TCP 120 s
+    #until the handshake is done, then 2 h 4 min (RFC 5382 REQ-5), 240 s
+    #after a FIN (2 MSL) and 10 s after a RST.
+
+    #   table = ConnTrack(['10.0.1.100'])
+    #   entry = table.outbound(UDP, h1, 40000, h2, 12000, now)
+    #   entry.external, entry.external_port          # e.g. 10.0.1.100, 1024
+    #   table.inbound(UDP, h2, 12000, entry.external, entry.external_port, now).inside
+    #   table.expire(now + 300)                      # the idle flows
+
+    #as a program it fills the table with random flows and measures it:
+    #   python3 conntrack.py -n 200000
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transport'))
+from rtt import TimerWheel
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forwarding'))
+from lpm import format_address, parse_address
+
+
+TCP = 6
+UDP = 17
+PROTOCOLS = {TCP: 'tcp', UDP: 'udp'}
+
+# the flags of the TCP header the table looks at
+FIN = 0x01
+SYN = 0x02
+RST = 0x04
+ACK = 0x10
+
+# the external ports, the ones below 1024 are left alone
+PORTS = (1024, 65535)
+
+# idle timeout in seconds of every state
+TIMEOUTS = {
+    'udp': 30.0,            # nothing came back yet
+    'udp_stream': 120.0,    # there has been a reply
+    'syn': 120.0,
+    'established': 7440.0,
+    'closing': 240.0,
+    'close': 10.0,
+}
+
+# seconds per slot of the timer wheel, a flow is removed up to a tick late
+TICK = 1.0
+
+
+class PortPool:
+    '''
+    the free ports of one external address, a ring of 16 bit numbers: the
+    port that was freed first is given out first
+    '''
+
+    def __init__(self, low=PORTS[0], high=PORTS[1]):
+        self.low = low
+        self.high = high
+        self.size = high - low + 1
+        self.ring = array('H', range(low, high + 1))
+        self.head = 0           # the next port to give out
+        self.free = self.size
+
+    def __len__(self):
+        return self.free
+
+    def allocate(self):
+        if not self.free:
+            return None
+        port = self.ring[self.head]
+        self.head = (self.head + 1) % self.size
+        self.free -= 1
+        return port
+
+    def release(self, port):
+        self.ring[(self.head + self.free) % self.size] = port
+        self.free += 1
+
+
+class Entry:
+    '''one flow through the NAT'''
+
+    __slots__ = ('proto', 'inside', 'inside_port', 'remote', 'remote_port', 'external', 'external_port',
+                 'original', 'reply', 'state', 'timeout', 'last', 'packets', 'data')
+
+    def __init__(self, proto, inside, inside_port, remote, remote_port, external, external_port, state, timeout, now):
+        self.proto = proto
+        self.inside = inside
+        self.inside_port = inside_port
+        self.remote = remote
+        self.remote_port = remote_port
+        self.external = external
+        self.external_port = external_port
+        #the 5-tuples of the packets in both directions, the keys of the table
+        self.original = (proto, inside, inside_port, remote, remote_port)
+        self.reply = (proto, remote, remote_port, external, external_port)
+        self.state = state
+        self.timeout = timeout
+        self.last = now
+        self.packets = 0
+        self.data = None        # whatever the forwarder keeps with the flow (a socket)
+
+    def __repr__(self):
+        return (f'{PROTOCOLS.get(self.proto, self.proto)} {format_address(self.inside)}:{self.inside_port} '
+                f'-> {format_address(self.remote)}:{self.remote_port} as '
+                f'{format_address(self.external)}:{self.external_port} {self.state}')
+
+
+class ConnTrack:
+    '''
+    the flows of the NAT, found by the 5-tuple of a packet in either direction
+    '''
+
+    def __init__(self, external, ports=PORTS, timeouts=None, tick=TICK):
+        if not external:
+            raise ValueError('the NAT needs at least one external address')
+        self.external = [parse_address(a) if isinstance(a, str) else a for a in external]
+        self.pools = [PortPool(*ports) for _ in self.external]
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.originals = {}     # key of the packets going out -> Entry
+        self.replies = {}       # key of the packets coming back -> Entry
+        #the timers are keyed by the original key of the flow
+        self.wheel = TimerWheel(tick, slots=1024)
+        self.created = 0
+        self.evicted = 0
+        self.refused = 0        # new flows without a free port
+        self.dropped = 0        # packets from outside without a flow
+
+    def __len__(self):
+        return len(self.originals)
+
+    def capacity(self):
+        return sum(pool.size for pool in self.pools)
+
+    def outbound(self, proto, src, sport, dst, dport, now, flags=0):
+        #the flow of a packet from inside, a new one if it has none. None if
+        #there is no free port for it: the packet is dropped
+        entry = self.originals.get((proto, src, sport, dst, dport))
+        if entry is None:
+            entry = self.create(proto, src, sport, dst, dport, now, flags)
+            if entry is None:
+                return None
+        entry.last = now
+        entry.packets += 1
+        if flags:
+            self.track(entry, flags, now)
+        return entry
+
+    def inbound(self, proto, src, sport, dst, dport, now, flags=0):
+        #the flow of a packet from outside to an external address:port, None if
+        #it is not a reply to a flow that went out
+        entry = self.replies.get((proto, src, sport, dst, dport))
+        if entry is None:
+            self.dropped += 1
+            return None
+        entry.last = now
+        entry.packets += 1
+        if entry.state == 'udp':
+            self.change(entry, 'udp_stream', now)
+        elif flags:
+            self.track(entry, flags, now, reply=True)
+        return entry
+
+    def create(self, proto, src, sport, dst, dport, now, flags):
+        if proto == TCP:
+            #only a SYN opens a TCP flow, anything else is left over from an
+            #old one (or a scan)
+            if flags & (SYN | ACK | RST) != SYN:
+                self.refused += 1
+                return None
+            state = 'syn'
+        else:
+            state = 'udp'
+        #the same external address for all flows of an inside host, as long as it has ports
+        first = src % len(self.pools)
+        for i in range(len(self.pools)):
+            index = (first + i) % len(self.pools)
+            port = self.pools[index].allocate()
+            if port is not None:
+                break
+        else:
+            self.refused += 1
+            return None
+        timeout = self.timeouts[state]
+        entry = Entry(proto, src, sport, dst, dport, self.external[index], port, state, timeout, now)
+        self.originals[entry.original] = entry
+        self.replies[entry.reply] = entry
+        self.wheel.schedule(entry.original, now + timeout)
+        self.created += 1
+        return entry
+
+    def track(self, entry, flags, now, reply=False):
+        #the TCP states the timeouts depend on, a simplified conntrack
+        if flags & RST:
+            self.change(entry, 'close', now)
+        elif flags & FIN:
+            if entry.state != 'close':
+                self.change(entry, 'closing', now)
+        elif entry.state == 'syn' and reply and flags & ACK:
+            #the SYN-ACK, the handshake is as good as done
+            self.change(entry, 'established', now)
+
+    def change(self, entry, state, now):
+        timeout = self.timeouts[state]
+        entry.state = state
+        if timeout < entry.timeout:
+            #the timer only moves later by itself, an earlier one is set now
+            self.wheel.schedule(entry.original, now + timeout)
+        entry.timeout = timeout
+
+    def remove(self, entry):
+        if self.originals.pop(entry.original, None) is None:
+            return
+        del self.replies[entry.reply]
+        self.wheel.cancel(entry.original)
+        self.pools[self.external.index(entry.external)].release(entry.external_port)
+
+    def expire(self, now):
+        #removes and returns the flows that have been idle for their timeout
+        evicted = []
+        originals = self.originals
+        for key in self.wheel.expire(now):
+            entry = originals[key]
+            deadline = entry.last + entry.timeout
+            if deadline > now:
+                #used since the timer was set
+                self.wheel.schedule(key, deadline)
+                continue
+            self.remove(entry)
+            evicted.append(entry)
+        self.evicted += len(evicted)
+        return evicted
+
+    def next_deadline(self):
+        #when expire() has something to do, None without flows
+        return self.wheel.next_deadline()
+
+    def flows(self):
+        return list(self.originals.values())
+
+    def statistics(self):
+        states = {}
+        for entry in self.originals.values():
+            states[entry.state] = states.get(entry.state, 0) + 1
+        return {
+            'flows': len(self.originals),
+            'free_ports': sum(len(pool) for pool in self.pools),
+            'created': self.created,
+            'evicted': self.evicted,
+            'refused': self.refused,
+            'dropped': self.dropped,
+            'states': states,
+        }
+
+
+def random_flows(count, rng):
+    #5-tuples of hosts in 192.168.0.0/16 to servers anywhere, all different
+    flows = set()
+    while len(flows) < count:
+        proto = UDP if rng.random() < 0.5 else TCP
+        flows.add((proto, 0xC0A80000 | rng.getrandbits(16), rng.randrange(1024, 65536),
+                   rng.getrandbits(32), rng.choice((53, 80, 443, 12000))))
+    return list(flows)
+
+
+def fill(table, flows, now):
+    for proto, src, sport, dst, dport in flows:
+        table.outbound(proto, src, sport, dst, dport, now, SYN if proto == TCP else 0)
+    return table
+
+
+def benchmark(count, lookups, externals, seed):
+    ports = PORTS[1] - PORTS[0] + 1
+    #enough external addresses for all flows, like a pool of public addresses
+    needed = max(externals, -(-count // ports))
+    external = [parse_address('10.0.1.100') + i for i in range(needed)]
+    now = 1000.0
+
+    #the memory of a table on its own, with the ints of the flows in it (the
+    #list of flows is freed again). tracemalloc makes it slow, so the table
+    #that is timed is another one
+    tracemalloc.start()
+    table = fill(ConnTrack(external), random_flows(count, random.Random(seed)), now)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    pools = sum(len(pool.ring) * pool.ring.itemsize for pool in table.pools)
+    del table
+
+    rng = random.Random(seed)
+    flows = random_flows(count, rng)
+    started = time.perf_counter()
+    table = fill(ConnTrack(external), flows, now)
+    setup = time.perf_counter() - started
+    if len(table) != count:
+        print(f'only {len(table)} of {count} flows got a port')
+        sys.exit(1)
+    print(f'{count} flows through {needed} external address{"es" if needed > 1 else ""}: '
+          f'set up in {setup:.2f} s, {count / setup:,.0f} flows/sec')
+    print(f'  memory              {size / 1e6:10.1f} MB, {(size - pools) / count:.0f} bytes per flow '
+          f'(+ {pools / 1e6:.1f} MB of port pools)')
+
+    #packets of random flows in both directions, with the table full
+    sample = [rng.choice(flows) for _ in range(lookups)]
+    replies = [(e.proto, e.remote, e.remote_port, e.external, e.external_port)
+               for e in (table.originals[flow] for flow in sample)]
+    outbound = table.outbound
+    inbound = table.inbound
+    started = time.perf_counter()
+    for proto, src, sport, dst, dport in sample:
+        outbound(proto, src, sport, dst, dport, now)
+    out = time.perf_counter() - started
+    started = time.perf_counter()
+    for proto, src, sport, dst, dport in replies:
+        if inbound(proto, src, sport, dst, dport, now, ACK) is None:
+            print('a reply did not find its flow')
+            sys.exit(1)
+    back = time.perf_counter() - started
+    print(f'  outbound lookups    {lookups / out:14,.0f} /sec, {out / lookups * 1e9:.0f} ns')
+    print(f'  inbound lookups     {lookups / back:14,.0f} /sec, {back / lookups * 1e9:.0f} ns')
+
+    #half of the flows go quiet, the rest keep sending
+    quiet = set(flows[:count // 2])
+    later = now + TIMEOUTS['established']
+    for flow in flows[count // 2:]:
+        outbound(*flow, later)
+    started = time.perf_counter()
+    evicted = len(table.expire(later + 1))
+    evict = time.perf_counter() - started
+    print(f'  idle eviction       {evicted} flows in {evict:.2f} s, {len(table)} left, {table.statistics()["states"]}')
+    if evicted != len(quiet):
+        print(f'expected {len(quiet)} idle flows')
+        sys.exit(1)
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measures the connection tracking table of the NAT', epilog='end of help')
+    parser.add_argument('-n', '--flows', type=check_positive, default=200000, help='concurrent flows in the table')
+    parser.add_argument('-l', '--lookups', type=check_positive, default=1000000, help='packets looked up in each direction')
+    parser.add_argument('-e', '--externals', type=check_positive, default=1,
+                        help='external addresses, more are added if the flows need them')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.flows, args.lookups, args.externals, args.seed)
+
+
+if __name__ == '__main__':
+    main()
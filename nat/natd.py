@@ -0,0 +1,567 @@
+'''
+    #a NAT (NAPT) in userspace, with the connection tracking table of
+    #conntrack.py, so the translation can be watched and measured instead of
+    #happening inside iptables -j MASQUERADE
+
+    #relay mode (no root): the clients send to the NAT instead of the server,
+    #every flow gets its own socket bound to an external address and a port
+    #from the pool, so the server sees the translated address:port:
+    #   python3 ../udp/udpserver.py                      (port 12000)
+    #   python3 natd.py relay -l 127.0.0.1:13000 -t 127.0.0.1:12000 -e 127.0.0.2
+    #   python3 ../udp/udpclient.py                      (with serverPort = 13000)
+    #   python3 natd.py relay -P tcp -l 127.0.0.1:13000 -t 127.0.0.1:12000 -e 127.0.0.2
+
+    #router mode, on the router r of docs/addressing/nat.md instead of the
+    #iptables rule (h1 behind r-eth0, h2 on r-eth1):
+    #   mininet> r python3 nat/natd.py router --inside r-eth0 --outside r-eth1 -e 10.0.1.100 &
+    #   mininet> h2 python3 udp/udpserver.py &
+    #   mininet> h1 python3 udp/udpclient.py             (to h2, which sees 10.0.1.100)
+
+    #the router reads the IPv4 packets of the interfaces with AF_PACKET
+    #sockets. a UDP or TCP packet from inside to an address that is not
+    #inside gets the external address and port of its flow as the source, a
+    #packet to an external address:port gets the address:port of the inside
+    #host as the destination, and both are sent on with a raw socket, the
+    #kernel routes them and fills in the IP checksum. the UDP/TCP checksum is
+    #updated for the changed words only (RFC 1624). the external addresses
+    #belong to the NAT, not to the kernel: the NAT answers ARP for them, and
+    #forwarding is switched off on both interfaces, so the kernel does not
+    #forward the packets as well (or answer them with a RST). ICMP and IP
+    #fragments are not translated. the settings are put back on exit.
+'''
+
+import argparse
+import asyncio
+import signal
+import struct
+import subprocess
+import sys
+from array import array
+from socket import *
+
+from conntrack import ACK, FIN, PORTS, RST, SYN, TCP, TIMEOUTS, UDP, ConnTrack, format_address, parse_address
+
+
+# datagrams read in one go when a socket is readable
+READ_BATCH = 64
+# seconds between two looks at the timer wheel
+EXPIRE_INTERVAL = 1.0
+
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+# the packet was sent to this host (and not by it)
+PACKET_HOST = 0
+SOL_PACKET = 263
+PACKET_AUXDATA = 8
+# the checksum of the packet is left to the network card (a veth of mininet)
+TP_STATUS_CSUMNOTREADY = 0x08
+
+ARP = struct.Struct('!6s6sHHHBBH6s4s6s4s')
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+
+def check_address(val):
+    host, _, port = val.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected host:port, e.g. 127.0.0.1:12000')
+    if not 0 < port <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return host or '127.0.0.1', port
+
+
+def check_ip(val):
+    if parse_address(val) is None:
+        raise argparse.ArgumentTypeError(f'{val} is not a valid IPv4 address')
+    return val
+
+
+def check_ports(val):
+    low, _, high = val.partition('-')
+    try:
+        low, high = int(low), int(high)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a range of ports, e.g. 1024-65535')
+    if not 0 < low <= high <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid range of ports')
+    return low, high
+
+
+def check_seconds(val):
+    try:
+        value = float(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a number of seconds')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def fold(value):
+    while value >> 16:
+        value = (value & 0xffff) + (value >> 16)
+    return value
+
+
+def adjust(checksum, old, new):
+    #the checksum after words that add up to old were replaced by words that
+    #add up to new: HC' = ~(~HC + ~m + m') of RFC 1624
+    return ~fold((~checksum & 0xffff) + (~fold(old) & 0xffff) + fold(new)) & 0xffff
+
+
+def checksum(packet, length, proto):
+    #the UDP/TCP checksum over the whole segment and the pseudo header, with
+    #the checksum field 0
+    segment = bytes(packet[length:])
+    if len(segment) % 2:
+        segment += b'\0'
+    words = array('H', segment)
+    if sys.byteorder == 'little':
+        words.byteswap()
+    pseudo = sum(struct.unpack_from('!4H', packet, 12)) + proto + len(packet) - length
+    return ~fold(sum(words) + pseudo) & 0xffff
+
+
+class Router:
+    '''translates the packets between the inside interfaces and the outside one'''
+
+    def __init__(self, loop, table, inside, outside):
+        self.loop = loop
+        self.table = table
+        self.inside = inside
+        self.outside = outside
+        self.external = set(table.external)
+        self.mac = open(f'/sys/class/net/{outside}/address').read().strip()
+        self.local, self.networks = self.addresses()
+        self.forwarding = {}
+        self.sockets = []
+        self.translated = 0
+        self.skipped = 0        # not UDP or TCP, fragments, TTL exceeded
+        self.arp_replies = 0
+        self.sender = socket(AF_INET, SOCK_RAW, IPPROTO_RAW)
+        for name in inside:
+            self.listen(name, ETH_P_IP, self.from_inside)
+        self.listen(outside, ETH_P_IP, self.from_outside)
+        self.arp = self.listen(outside, ETH_P_ARP, self.answer_arp, SOCK_RAW)
+        #the kernel must not forward what the NAT forwards
+        for name in inside + [outside]:
+            self.forwarding[name] = self.sysctl(name)
+            self.sysctl(name, '0')
+
+    def addresses(self):
+        #the addresses of the node and the networks of the inside interfaces
+        out = subprocess.run(['ip', '-o', '-4', 'addr', 'show'], capture_output=True, text=True, check=True).stdout
+        local, networks = set(), []
+        for line in out.splitlines():
+            fields = line.split()
+            address, _, length = fields[3].partition('/')
+            local.add(parse_address(address))
+            if fields[1].split('@')[0] in self.inside:
+                mask = (0xffffffff << (32 - int(length))) & 0xffffffff
+                networks.append((parse_address(address) & mask, mask))
+        return local, networks
+
+    def sysctl(self, name, value=None):
+        path = f'/proc/sys/net/ipv4/conf/{name}/forwarding'
+        if value is None:
+            with open(path) as f:
+                return f.read().strip()
+        with open(path, 'w') as f:
+            f.write(value)
+
+    def listen(self, name, protocol, callback, kind=SOCK_DGRAM):
+        #SOCK_DGRAM: the packets without the ethernet header
+        sock = socket(AF_PACKET, kind, htons(protocol))
+        sock.bind((name, protocol))
+        sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+        sock.setblocking(False)
+        self.sockets.append(sock)
+        self.loop.add_reader(sock.fileno(), callback, sock)
+        return sock
+
+    def packets(self, sock):
+        #the packets sent to this node, not the ones it sends itself, and if
+        #their checksum is complete
+        for _ in range(READ_BATCH):
+            try:
+                data, ancillary, _, address = sock.recvmsg(65535, CMSG_SPACE(20))
+            except BlockingIOError:
+                return
+            if address[2] != PACKET_HOST or len(data) < 20:
+                continue
+            status = 0
+            for level, kind, value in ancillary:
+                if level == SOL_PACKET and kind == PACKET_AUXDATA:
+                    status = struct.unpack_from('I', value)[0]
+            packet = bytearray(data)
+            #without the padding of a short ethernet frame
+            del packet[packet[2] << 8 | packet[3]:]
+            yield packet, not status & TP_STATUS_CSUMNOTREADY
+
+    def parse(self, packet):
+        #(header length, protocol, source, destination, ports), None for a packet the NAT leaves alone
+        if packet[0] >> 4 != 4:
+            return None
+        length = (packet[0] & 0x0f) * 4
+        proto = packet[9]
+        if proto != UDP and proto != TCP or len(packet) < length + (20 if proto == TCP else 8):
+            return None
+        if (packet[6] << 8 | packet[7]) & 0x3fff:
+            #a fragment, only the first one has the ports
+            return None
+        src = int.from_bytes(packet[12:16], 'big')
+        dst = int.from_bytes(packet[16:20], 'big')
+        sport, dport = struct.unpack_from('!HH', packet, length)
+        return length, proto, src, dst, sport, dport
+
+    def from_inside(self, sock):
+        now = self.loop.time()
+        for packet, ready in self.packets(sock):
+            parsed = self.parse(packet)
+            if parsed is None:
+                self.skipped += 1
+                continue
+            length, proto, src, dst, sport, dport = parsed
+            if dst in self.local or any(dst & mask == network for network, mask in self.networks):
+                #for the node itself, or from one inside network to another
+                continue
+            flags = packet[length + 13] if proto == TCP else 0
+            entry = self.table.outbound(proto, src, sport, dst, dport, now, flags)
+            if entry is not None:
+                self.rewrite(packet, ready, length, proto, 12, src, sport, entry.external, entry.external_port, dst)
+
+    def from_outside(self, sock):
+        now = self.loop.time()
+        for packet, ready in self.packets(sock):
+            parsed = self.parse(packet)
+            if parsed is None or parsed[3] not in self.external:
+                continue
+            length, proto, src, dst, sport, dport = parsed
+            flags = packet[length + 13] if proto == TCP else 0
+            entry = self.table.inbound(proto, src, sport, dst, dport, now, flags)
+            if entry is not None:
+                self.rewrite(packet, ready, length, proto, 16, dst, dport, entry.inside, entry.inside_port, entry.inside)
+
+    def rewrite(self, packet, ready, length, proto, offset, address, port, new_address, new_port, destination):
+        #offset 12: the source is changed, 16: the destination. a checksum
+        #that is not ready holds only the sum of the pseudo header, it is
+        #computed in full
+        if packet[8] <= 1:
+            #a router would send ICMP time exceeded
+            self.skipped += 1
+            return
+        packet[8] -= 1
+        packet[offset:offset + 4] = new_address.to_bytes(4, 'big')
+        struct.pack_into('!H', packet, length + (0 if offset == 12 else 2), new_port)
+        at = length + (16 if proto == TCP else 6)
+        old = packet[at] << 8 | packet[at + 1]
+        if not ready:
+            packet[at:at + 2] = b'\0\0'
+            new = checksum(packet, length, proto)
+        elif proto == UDP and not old:
+            #a UDP checksum of 0 means there is none
+            new = None
+        else:
+            new = adjust(old, (address >> 16) + (address & 0xffff) + port,
+                         (new_address >> 16) + (new_address & 0xffff) + new_port)
+        if new is not None:
+            struct.pack_into('!H', packet, at, 0xffff if proto == UDP and not new else new)
+        try:
+            self.sender.sendto(packet, (format_address(destination), 0))
+            self.translated += 1
+        except OSError:
+            #no route, or a full buffer
+            self.skipped += 1
+
+    def answer_arp(self, sock):
+        #the NAT is the one with the external addresses on the link
+        for _ in range(READ_BATCH):
+            try:
+                frame = sock.recv(65535)
+            except BlockingIOError:
+                return
+            if len(frame) < ARP.size:
+                continue
+            _, sender_mac, _, _, _, _, _, op, sha, spa, _, tpa = ARP.unpack_from(frame)
+            if op != ARP_REQUEST or int.from_bytes(tpa, 'big') not in self.external:
+                continue
+            mac = bytes.fromhex(self.mac.replace(':', ''))
+            reply = ARP.pack(sha, mac, ETH_P_ARP, 1, ETH_P_IP, 6, 4, ARP_REPLY, mac, tpa, sha, spa)
+            try:
+                sock.send(reply)
+                self.arp_replies += 1
+            except OSError:
+                pass
+
+    def expire(self, now):
+        self.table.expire(now)
+
+    def close(self):
+        for sock in self.sockets:
+            self.loop.remove_reader(sock.fileno())
+            sock.close()
+        self.sender.close()
+        for name, value in self.forwarding.items():
+            try:
+                self.sysctl(name, value)
+            except OSError:
+                #the interface is gone
+                pass
+
+    def report(self):
+        return f'{self.translated} translated, {self.skipped} skipped, {self.arp_replies} arp replies'
+
+
+class UdpRelay:
+    '''
+    relays UDP from the clients to the server, every flow through a socket
+    on its external address:port
+    '''
+
+    def __init__(self, loop, table, listen, target):
+        self.loop = loop
+        self.table = table
+        self.target = target
+        self.server = parse_address(gethostbyname(target[0]))
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.bind(listen)
+        self.sock.setblocking(False)
+        self.failed = 0         # ports that could not be bound
+        loop.add_reader(self.sock.fileno(), self.from_clients)
+
+    def open(self, entry, client):
+        upstream = socket(AF_INET, SOCK_DGRAM)
+        try:
+            upstream.bind((format_address(entry.external), entry.external_port))
+        except OSError:
+            #another program has the port
+            upstream.close()
+            self.table.remove(entry)
+            self.failed += 1
+            return None
+        upstream.setblocking(False)
+        upstream.connect(self.target)
+        entry.data = (upstream, client)
+        self.loop.add_reader(upstream.fileno(), self.from_server, entry)
+        return entry.data
+
+    def from_clients(self):
+        recvfrom = self.sock.recvfrom
+        outbound = self.table.outbound
+        server, port = self.server, self.target[1]
+        now = self.loop.time()
+        for _ in range(READ_BATCH):
+            try:
+                data, client = recvfrom(65535)
+            except BlockingIOError:
+                return
+            except OSError:
+                continue
+            entry = outbound(UDP, parse_address(client[0]), client[1], server, port, now)
+            if entry is None:
+                continue
+            flow = entry.data or self.open(entry, client)
+            if flow is not None:
+                try:
+                    flow[0].send(data)
+                except OSError:
+                    pass
+
+    def from_server(self, entry):
+        upstream, client = entry.data
+        inbound = self.table.inbound
+        reply = (UDP, self.server, self.target[1], entry.external, entry.external_port)
+        now = self.loop.time()
+        for _ in range(READ_BATCH):
+            try:
+                data = upstream.recv(65535)
+            except BlockingIOError:
+                return
+            except OSError:
+                #e.g. ICMP port unreachable from the server
+                continue
+            if inbound(*reply, now) is not None:
+                try:
+                    self.sock.sendto(data, client)
+                except OSError:
+                    pass
+
+    def expire(self, now):
+        for entry in self.table.expire(now):
+            self.release(entry)
+
+    def release(self, entry):
+        if entry.data is not None:
+            self.loop.remove_reader(entry.data[0].fileno())
+            entry.data[0].close()
+            entry.data = None
+
+    def close(self):
+        for entry in self.table.flows():
+            self.release(entry)
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+    def report(self):
+        return f'{self.failed} ports in use by others'
+
+
+class TcpRelay:
+    '''relays TCP connections, every one from its external address:port'''
+
+    def __init__(self, loop, table, target):
+        self.loop = loop
+        self.table = table
+        self.target = target
+        self.server = parse_address(gethostbyname(target[0]))
+        self.failed = 0
+
+    async def handle(self, reader, writer):
+        host, port = writer.get_extra_info('peername')[:2]
+        flow = (TCP, parse_address(host), port, self.server, self.target[1])
+        table = self.table
+        entry = table.outbound(*flow, self.loop.time(), SYN)
+        if entry is None:
+            writer.close()
+            return
+        reply = entry.reply
+        upstream = socket(AF_INET, SOCK_STREAM)
+        upstream.setblocking(False)
+        try:
+            #the port may still be in TIME_WAIT from the flow before
+            upstream.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            upstream.bind((format_address(entry.external), entry.external_port))
+            await self.loop.sock_connect(upstream, self.target)
+            up_reader, up_writer = await asyncio.open_connection(sock=upstream)
+        except OSError:
+            upstream.close()
+            writer.close()
+            table.remove(entry)
+            self.failed += 1
+            return
+        table.inbound(*reply, self.loop.time(), SYN | ACK)
+        entry.data = (writer, up_writer)
+        try:
+            await asyncio.gather(self.pipe(reader, up_writer, flow, table.outbound),
+                                 self.pipe(up_reader, writer, reply, table.inbound))
+        except (ConnectionError, OSError):
+            table.outbound(*flow, self.loop.time(), RST)
+        finally:
+            entry.data = None
+            for w in (writer, up_writer):
+                w.close()
+
+    async def pipe(self, reader, writer, key, lookup):
+        #one direction, every chunk is looked up like a packet
+        while True:
+            data = await reader.read(65536)
+            if not data or lookup(*key, self.loop.time(), ACK) is None:
+                break
+            writer.write(data)
+            await writer.drain()
+        lookup(*key, self.loop.time(), FIN | ACK)
+        if writer.can_write_eof():
+            writer.write_eof()
+
+    def expire(self, now):
+        for entry in self.table.expire(now):
+            #idle for longer than the timeout of its state
+            self.release(entry)
+
+    def release(self, entry):
+        if entry.data is not None:
+            for w in entry.data:
+                w.close()
+
+    def close(self):
+        for entry in self.table.flows():
+            self.release(entry)
+
+    def report(self):
+        return f'{self.failed} connections failed'
+
+
+def report_line(table, forwarder):
+    s = table.statistics()
+    states = ', '.join(f'{n} {state}' for state, n in sorted(s['states'].items()))
+    return (f'{s["flows"]} flows ({states or "none"}), {s["created"]} created, {s["evicted"]} evicted, '
+            f'{s["refused"]} refused, {s["dropped"]} dropped, {s["free_ports"]} free ports | {forwarder.report()}')
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    #mininet stops it with SIGTERM, the settings are put back on the way out
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    timeouts = {}
+    if args.udp_timeout:
+        timeouts['udp_stream'] = args.udp_timeout
+        timeouts['udp'] = min(TIMEOUTS['udp'], args.udp_timeout)
+    if args.tcp_timeout:
+        timeouts['established'] = args.tcp_timeout
+    table = ConnTrack(args.external, args.ports, timeouts)
+    server = None
+    if args.mode == 'router':
+        forwarder = Router(loop, table, args.inside, args.outside)
+        print(f'translating {" ".join(args.inside)} -> {args.outside} as {" ".join(args.external)}', flush=True)
+    elif args.protocol == 'udp':
+        forwarder = UdpRelay(loop, table, args.listen, args.target)
+    else:
+        forwarder = TcpRelay(loop, table, args.target)
+        server = await asyncio.start_server(forwarder.handle, *args.listen)
+    if args.mode == 'relay':
+        print(f'relaying {args.protocol} {args.listen[0]}:{args.listen[1]} -> {args.target[0]}:{args.target[1]} '
+              f'as {" ".join(args.external)}', flush=True)
+    last_report = loop.time()
+    try:
+        while True:
+            await asyncio.sleep(EXPIRE_INTERVAL)
+            now = loop.time()
+            forwarder.expire(now)
+            if not args.quiet and now - last_report >= args.interval:
+                print(report_line(table, forwarder), flush=True)
+                last_report = now
+            if args.verbose:
+                for entry in table.flows():
+                    print(f'  {entry}')
+    finally:
+        if server is not None:
+            server.close()
+        forwarder.close()
+        print(report_line(table, forwarder))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='a NAT in userspace with its own connection tracking', epilog='end of help')
+    parser.add_argument('mode', choices=('relay', 'router'), help='relay: in front of a server, router: between interfaces')
+    parser.add_argument('-e', '--external', type=check_ip, nargs='+', help='the external addresses the flows are mapped to')
+    parser.add_argument('--ports', type=check_ports, default=PORTS, help='the external ports, e.g. 1024-65535')
+    parser.add_argument('--udp-timeout', type=check_seconds, help=f'idle seconds of a UDP flow ({TIMEOUTS["udp_stream"]:.0f})')
+    parser.add_argument('--tcp-timeout', type=check_seconds, help=f'idle seconds of a TCP connection ({TIMEOUTS["established"]:.0f})')
+    parser.add_argument('-P', '--protocol', choices=('udp', 'tcp'), default='udp', help='relay: what to relay')
+    parser.add_argument('-l', '--listen', type=check_address, default=('127.0.0.1', 13000), help='relay: host:port the clients send to')
+    parser.add_argument('-t', '--target', type=check_address, default=('127.0.0.1', 12000), help='relay: host:port of the server')
+    parser.add_argument('--inside', nargs='+', help='router: the interfaces of the private networks')
+    parser.add_argument('--outside', type=str, help='router: the interface with the external addresses')
+    parser.add_argument('-i', '--interval', type=float, default=5.0, help='seconds between two reports')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report at the end')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the table every second')
+    args = parser.parse_args()
+
+    if args.mode == 'router':
+        if not args.inside or not args.outside or not args.external:
+            parser.error('the router needs --inside, --outside and --external')
+    elif not args.external:
+        args.external = ['127.0.0.1']
+    try:
+        asyncio.run(run(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except PermissionError:
+        print('the router needs root (AF_PACKET, raw sockets and the forwarding settings)')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
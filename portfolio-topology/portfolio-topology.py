@@ -43,6 +43,11 @@ from mininet.log import setLogLevel, info
 from mininet.cli import CLI
 from mininet.link import TCLink
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topology-builder'))
+from bringup import Bringup
+
 
 class LinuxRouter( Node ):
     """A Node with IP forwarding enabled.
@@ -118,52 +123,38 @@ class PortfolioNetwork2410( Topo ):
 
 topo = PortfolioNetwork2410()
 net = Mininet( topo=topo, link=TCLink )
-net.start()
+#the commands of every node are collected and run as one batch per node, on
+#all nodes at once (see topology-builder/bringup.py); Bringup(net, parallel=False)
+#runs them one by one as before, to compare the bring-up time
+bringup = Bringup(net)
+with bringup.timed('start'):
+    net.start()
 
 #ip route add ipA via ipB dev INTERFACE
 #every packet going to ipA must first go to ipB using INTERFACE
-net["r2"].cmd("ip route add 10.0.0.0/24 via 10.0.1.1 dev r2-eth0")
-net["r2"].cmd("ip route add 10.0.4.0/24 via 10.0.3.2 dev r2-eth2")
-net["r2"].cmd("ip route add 10.0.5.0/24 via 10.0.3.2 dev r2-eth2")
-net["r2"].cmd("ip route add 10.0.6.0/24 via 10.0.3.2 dev r2-eth2")
-net["r2"].cmd("ip route add 10.0.7.0/24 via 10.0.3.2 dev r2-eth2")
-
-net["r3"].cmd("ip route add 10.0.0.0/24 via 10.0.3.1 dev r3-eth0")
-net["r3"].cmd("ip route add 10.0.1.0/24 via 10.0.3.1 dev r3-eth0")
-net["r3"].cmd("ip route add 10.0.2.0/24 via 10.0.3.1 dev r3-eth0")
-net["r3"].cmd("ip route add 10.0.7.0/24 via 10.0.6.2 dev r3-eth3")
-
-
-net["r1"].cmd("ethtool -K r1-eth1 tso off")
-net["r1"].cmd("ethtool -K r1-eth1 gso off")
-net["r1"].cmd("ethtool -K r1-eth1 lro off")
-net["r1"].cmd("ethtool -K r1-eth1 gro off")
-net["r1"].cmd("ethtool -K r1-eth1 ufo off")
-
-
-net["r2"].cmd("ethtool -K r2-eth2 tso off")
-net["r2"].cmd("ethtool -K r2-eth2 gso off")
-net["r2"].cmd("ethtool -K r2-eth2 lro off")
-net["r2"].cmd("ethtool -K r2-eth2 gro off")
-net["r2"].cmd("ethtool -K r2-eth2 ufo off")
-
-
-net["r3"].cmd("ethtool -K r3-eth3 tso off")
-net["r3"].cmd("ethtool -K r3-eth3 gso off")
-net["r3"].cmd("ethtool -K r3-eth3 lro off")
-net["r3"].cmd("ethtool -K r3-eth3 gro off")
-net["r3"].cmd("ethtool -K r3-eth3 ufo off")
+bringup.route("r2", "10.0.0.0/24 via 10.0.1.1 dev r2-eth0")
+bringup.route("r2", "10.0.4.0/24 via 10.0.3.2 dev r2-eth2")
+bringup.route("r2", "10.0.5.0/24 via 10.0.3.2 dev r2-eth2")
+bringup.route("r2", "10.0.6.0/24 via 10.0.3.2 dev r2-eth2")
+bringup.route("r2", "10.0.7.0/24 via 10.0.3.2 dev r2-eth2")
+
+bringup.route("r3", "10.0.0.0/24 via 10.0.3.1 dev r3-eth0")
+bringup.route("r3", "10.0.1.0/24 via 10.0.3.1 dev r3-eth0")
+bringup.route("r3", "10.0.2.0/24 via 10.0.3.1 dev r3-eth0")
+bringup.route("r3", "10.0.7.0/24 via 10.0.6.2 dev r3-eth3")
+
+#tso, gso, lro, gro and ufo off
+bringup.offload("r1", ["r1-eth1"])
+bringup.offload("r2", ["r2-eth2"])
+bringup.offload("r3", ["r3-eth3"])
 
 for i in range (1,10,1):
     node = "h" + str(i)
     iface = node + "-eth0" 
-    net[node].cmd("ethtool -K " + iface + " tso off")
-    net[node].cmd("ethtool -K " + iface + " gso off")
-    net[node].cmd("ethtool -K " + iface + " lro off")
-    net[node].cmd("ethtool -K " + iface + " gro off")
-    net[node].cmd("ethtool -K " + iface + " ufo off")
-
+    bringup.offload(node, [iface])
 
+bringup.run()
+bringup.report()
 
 net.pingAll()
 CLI( net )
@@ -0,0 +1,535 @@
+'''
+    #a discrete-event simulation of a topology-builder network (see
+    #topology-builder/topology.py) that runs the real Sender and Receiver of
+    #transport/engine.py, without mininet, root or wall-clock time
+
+    #the nodes, subnets, addresses and routes come from the Topology of a
+    #spec, the same one mininet is started from, so a transfer from h1 to h9
+    #of the portfolio network crosses r1, r2, r3 and r4 here as well. every
+    #interface has an egress queue built like the one of a mininet TCLink
+    #(netem for delay and loss, htb for bw, max_queue_size as the limit):
+    #   - loss: a packet is dropped with the loss probability when it arrives
+    #   - delay: the packet waits delay (plus up to jitter) in the queue...
+    #   - bw: ...and is then sent at bw Mbit/s, one packet after the other
+    #   - max_queue_size: at most this many packets are in the queue, waiting
+    #     for the delay or for the link, the next one is dropped (drop-tail).
+    #     without it the limit is 1000 packets, like netem
+    #on a subnet with a switch a packet goes through the queue of the sender's
+    #interface and then through the switch port towards the receiver, which
+    #has the parameters of the receiver's link.
+
+    #the engine never reads a clock: the simulator passes its virtual time to
+    #start(), on_packet() and on_timer(), and sends through virtual sockets.
+    #the only events are packet arrivals and timers, a hop without a queue
+    #parameter costs no event at all. the simulated time only depends on
+    #--seed, so a run can be repeated exactly. the cost is per packet, not per
+    #simulated second: one flow of 8 Mbit/s over the portfolio network runs
+    #about 20 times faster than real time, slower flows and idle time faster.
+
+    #run it with:
+    #   python3 netsim.py ../topology-builder/examples/portfolio.yaml -c h1 -s h9 --size 50M -w 64 -m sr --cc reno
+    #   python3 netsim.py ../topology-builder/examples/portfolio.yaml -c h1 -s h9 --size 20M -n 4 --seed 2
+'''
+
+import argparse
+import heapq
+import ipaddress
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'topology-builder'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transport'))
+
+import congestion
+import engine
+import pacing
+from topology import SpecError, Topology, delay_ms, load_spec
+
+
+# IP and UDP header, and the ethernet header for the time on the wire
+UDP_OVERHEAD = 20 + 8
+WIRE_OVERHEAD = UDP_OVERHEAD + 14
+# netem's default limit
+DEFAULT_LIMIT = 1000
+
+
+class Packet:
+    __slots__ = ('source', 'sport', 'destination', 'dport', 'payload', 'size')
+
+    def __init__(self, source, sport, destination, dport, payload):
+        self.source = source
+        self.sport = sport
+        self.destination = destination
+        self.dport = dport
+        self.payload = payload
+        self.size = len(payload) + WIRE_OVERHEAD
+
+
+class Simulator:
+    '''the virtual clock and the events, in time order'''
+
+    def __init__(self, seed=1):
+        self.now = 0.0
+        self.events = []
+        self.count = 0
+        self.processed = 0
+        self.random = random.Random(seed)
+
+    def at(self, when, callback, *args):
+        self.count += 1
+        heapq.heappush(self.events, (when, self.count, callback, args))
+
+    def run(self, until=None, stop=None):
+        '''
+        runs the events in order until there are none left, the virtual time
+        passes until, or stop() is true
+        '''
+        events = self.events
+        pop = heapq.heappop
+        while events:
+            if stop is not None and stop():
+                break
+            when, _, callback, args = events[0]
+            if until is not None and when > until:
+                self.now = until
+                break
+            pop(events)
+            self.now = when
+            self.processed += 1
+            callback(*args)
+        return self.now
+
+
+class LinkQueue:
+    '''
+    the egress queue of an interface (or switch port) with the parameters of
+    a TCLink: bw in Mbit/s, delay and jitter in ms, loss in percent and the
+    limit in packets
+    '''
+
+    def __init__(self, sim, name, bw=None, delay=None, jitter=None, loss=None, max_queue_size=None, **_params):
+        self.sim = sim
+        self.name = name
+        self.rate = bw * 1e6 / 8 if bw else None       # bytes per second
+        self.delay = delay_ms(delay) / 1000
+        self.jitter = delay_ms(jitter) / 1000
+        self.loss = (loss or 0) / 100
+        self.limit = max_queue_size or DEFAULT_LIMIT
+        #a hop without parameters passes packets on at once
+        self.direct = not (self.rate or self.delay or self.jitter or self.loss)
+        self.busy_until = 0.0
+        self.leaving = deque()      # when the packets in the queue leave it, in order
+        self.packets = 0
+        self.drops = 0
+        self.lost = 0
+        self.max_backlog = 0
+
+    def send(self, packet, deliver):
+        #deliver(packet) is called when the packet has left the queue
+        self.packets += 1
+        if self.direct:
+            deliver(packet)
+            return
+        sim = self.sim
+        now = sim.now
+        leaving = self.leaving
+        while leaving and leaving[0] <= now:
+            leaving.popleft()
+        if len(leaving) >= self.limit:
+            self.drops += 1
+            return
+        if self.loss and sim.random.random() < self.loss:
+            self.lost += 1
+            return
+        ready = now + self.delay
+        if self.rate:
+            done = max(ready, self.busy_until) + packet.size / self.rate
+            self.busy_until = done
+        else:
+            done = ready
+        leaving.append(done)
+        if len(leaving) > self.max_backlog:
+            self.max_backlog = len(leaving)
+        if self.jitter:
+            #jitter is added after the queue, so packets can overtake each other
+            done += sim.random.uniform(0, self.jitter)
+        sim.at(done, deliver, packet)
+
+    def statistics(self):
+        return {'packets': self.packets, 'drops': self.drops, 'lost': self.lost, 'max_backlog': self.max_backlog}
+
+
+class Interface:
+
+    def __init__(self, node, name, address, segment, queue):
+        self.node = node
+        self.name = name
+        self.address = address          # ip_interface
+        self.segment = segment
+        self.queue = queue
+        self.up = True          # a link that is down passes nothing
+
+
+class Segment:
+    '''
+    one subnet: the interfaces on it by address, and with a switch a
+    LinkQueue per switch port
+    '''
+
+    def __init__(self, name, switch):
+        self.name = name
+        self.switch = switch
+        self.members = {}       # address (int) -> Interface
+        self.ports = {}         # address (int) -> sends a packet through the switch port to it
+
+    def transmit(self, interface, next_hop, packet):
+        target = self.members.get(next_hop)
+        if target is None or not (interface.up and target.up):
+            #nobody answers ARP for next_hop, or the link is down
+            interface.node.unreachable += 1
+            return
+        if self.switch is None:
+            interface.queue.send(packet, target.node.receive)
+            return
+        interface.queue.send(packet, self.ports[next_hop])
+
+
+class Node:
+    '''a host or router: routes packets, and delivers the ones for it to its sockets'''
+
+    def __init__(self, name, router):
+        self.name = name
+        self.router = router
+        self.interfaces = []
+        self.addresses = set()
+        self.routes = []        # (network, mask, prefix length, next hop or None, Interface)
+        self.cache = {}         # destination -> (Interface, next hop)
+        self.sockets = {}       # port -> VirtualSocket
+        self.received = 0
+        self.forwarded = 0
+        self.unreachable = 0
+        self.no_socket = 0
+
+    def add_route(self, prefix, next_hop, interface):
+        network = ipaddress.ip_network(prefix)
+        self.routes.append((int(network.network_address), int(network.netmask), network.prefixlen,
+                            None if next_hop is None else int(next_hop), interface))
+        #the longest prefix first
+        self.routes.sort(key=lambda r: -r[2])
+        self.cache.clear()
+
+    def lookup(self, destination):
+        route = self.cache.get(destination)
+        if route is None:
+            for network, mask, _, next_hop, interface in self.routes:
+                if destination & mask == network:
+                    route = self.cache[destination] = (interface, destination if next_hop is None else next_hop)
+                    break
+        return route
+
+    def output(self, packet):
+        route = self.lookup(packet.destination)
+        if route is None:
+            self.unreachable += 1
+            return
+        interface, next_hop = route
+        interface.segment.transmit(interface, next_hop, packet)
+
+    def receive(self, packet):
+        if packet.destination in self.addresses:
+            self.received += 1
+            sock = self.sockets.get(packet.dport)
+            if sock is None:
+                self.no_socket += 1
+            else:
+                sock.deliver(packet)
+        elif self.router:
+            self.forwarded += 1
+            self.output(packet)
+
+
+class VirtualSocket:
+    '''a UDP socket of a node in the simulation, bound to port'''
+
+    def __init__(self, node, port):
+        if port in node.sockets:
+            raise OSError(f'port {port} of {node.name} is in use')
+        self.node = node
+        self.port = port
+        self.address = min(node.addresses) if node.addresses else 0
+        self.peer = None
+        self.on_receive = None      # on_receive(payload, (address, port))
+        node.sockets[port] = self
+
+    def connect(self, address):
+        host, port = address
+        self.peer = (int(ipaddress.ip_address(host)) if not isinstance(host, int) else host, port)
+        #the address of the interface the packets leave from, like the kernel picks it
+        route = self.node.lookup(self.peer[0])
+        if route is not None:
+            self.address = int(route[0].address.ip)
+
+    def send(self, data):
+        self.sendto(data, self.peer)
+
+    def sendto(self, data, address):
+        #the engine reuses its buffers, the packet needs its own copy
+        self.node.output(Packet(self.address, self.port, address[0], address[1], bytes(data)))
+
+    def send_many(self, packets):
+        for data in packets:
+            self.sendto(data, self.peer)
+
+    def deliver(self, packet):
+        if self.peer is not None and (packet.source, packet.sport) != self.peer:
+            return
+        if self.on_receive is not None:
+            self.on_receive(packet.payload, (packet.source, packet.sport))
+
+    def close(self):
+        self.node.sockets.pop(self.port, None)
+
+
+class Driver:
+    '''
+    drives a Sender or Receiver over a VirtualSocket on the virtual clock,
+    like engine.run() does over a real socket. a receiver's socket is
+    connected to the first peer that sends to it, like engine.accept()
+    '''
+
+    def __init__(self, sim, sock, endpoint, on_done=None):
+        self.sim = sim
+        self.sock = sock
+        self.endpoint = endpoint
+        self.on_done = on_done
+        self.timer = None       # time of the timer event in the queue
+        self.busy = False       # in a call of the endpoint
+        sock.on_receive = self.on_packet
+
+    def start(self):
+        self.busy = True
+        self.endpoint.start(self.sim.now)
+        self.arm()
+        self.busy = False
+
+    def on_packet(self, payload, address):
+        if self.busy:
+            #over hops without a queue the answer to a packet comes back while
+            #the endpoint is still sending it, it gets the answer after that
+            self.sim.at(self.sim.now, self.on_packet, payload, address)
+            return
+        if self.sock.peer is None:
+            self.sock.connect(address)
+        if len(payload) < engine.HEADER_SIZE:
+            return
+        self.busy = True
+        self.endpoint.on_packet(memoryview(payload), self.sim.now)
+        self.arm()
+        self.busy = False
+
+    def arm(self):
+        endpoint = self.endpoint
+        if endpoint.done:
+            self.sock.close()
+            if self.on_done is not None:
+                on_done, self.on_done = self.on_done, None
+                on_done(self)
+            return
+        deadline = endpoint.next_deadline()
+        if deadline is not None and deadline <= self.sim.now:
+            endpoint.on_timer(self.sim.now)
+            deadline = endpoint.next_deadline()
+        #a timer that moves later keeps its event, which checks again when it fires
+        if deadline is not None and (self.timer is None or deadline < self.timer):
+            self.timer = deadline
+            self.sim.at(deadline, self.on_timer, deadline)
+
+    def on_timer(self, when):
+        if when != self.timer:
+            return
+        self.timer = None
+        self.busy = True
+        deadline = self.endpoint.next_deadline()
+        if deadline is not None and deadline <= self.sim.now:
+            self.endpoint.on_timer(self.sim.now)
+        self.arm()
+        self.busy = False
+
+
+class Network:
+    '''the nodes, interfaces and routes of a Topology, in a Simulator'''
+
+    def __init__(self, topology, sim=None):
+        self.topology = topology
+        self.sim = sim or Simulator()
+        self.nodes = {name: Node(name, topology.is_router(name)) for name in topology.routers + topology.hosts}
+        self.queues = []
+        for subnet in topology.subnets:
+            segment = Segment(subnet.name, subnet.switch)
+            for name in subnet.nodes:
+                node = self.nodes[name]
+                address = subnet.addresses[name]
+                queue = LinkQueue(self.sim, subnet.interfaces[name], **subnet.params)
+                interface = Interface(node, subnet.interfaces[name], address, segment, queue)
+                node.interfaces.append(interface)
+                node.addresses.add(int(address.ip))
+                node.add_route(subnet.prefix, None, interface)
+                segment.members[int(address.ip)] = interface
+                self.queues.append(queue)
+                if subnet.switch is not None:
+                    port = LinkQueue(self.sim, f'{subnet.switch}-{name}', **subnet.params)
+                    segment.ports[int(address.ip)] = self.through(port, node)
+                    self.queues.append(port)
+        for router, table in topology.routes.items():
+            node = self.nodes[router]
+            for prefix, via, dev in table:
+                node.add_route(prefix, via, self.interface(node, dev))
+        for host, (gateway, dev) in topology.gateways.items():
+            node = self.nodes[host]
+            node.add_route('0.0.0.0/0', gateway, self.interface(node, dev))
+
+    @staticmethod
+    def through(port, node):
+        #the switch port in front of node, as a deliver function for the queue before it
+        def deliver(packet):
+            port.send(packet, node.receive)
+        return deliver
+
+    def interface(self, node, name):
+        for interface in node.interfaces:
+            if interface.name == name:
+                return interface
+        raise SpecError(f'{node.name} has no interface {name}')
+
+    def address(self, name):
+        return int(self.topology.address(name).ip)
+
+    def socket(self, name, port):
+        return VirtualSocket(self.nodes[name], port)
+
+    def queue_statistics(self):
+        #the queues that have dropped or held packets
+        return {q.name: q.statistics() for q in self.queues if q.drops or q.lost or q.max_backlog > 1}
+
+
+def transfer(network, client, server, data, port=8088, sender_options=None, receiver_options=None, on_done=None):
+    '''
+    sets up a Receiver on server:port and a Sender of data on client:port
+    and starts the sender. returns (sender, receiver), they run with the
+    simulator. on_done(driver) is called when each of them is done
+    '''
+    sim = network.sim
+    receiver_sock = network.socket(server, port)
+    receiver = engine.Receiver(receiver_sock.send, deliver=lambda data: None, **(receiver_options or {}))
+    Driver(sim, receiver_sock, receiver, on_done)
+    sender_sock = network.socket(client, port)
+    sender_sock.connect((network.address(server), port))
+    sender_options = dict(sender_options or {})
+    if sender_options.get('pacer') is not None:
+        sender_options.setdefault('send_batch', sender_sock.send_many)
+    sender = engine.Sender(sender_sock.send, data, **sender_options)
+    driver = Driver(sim, sender_sock, sender, on_done)
+    sim.at(sim.now, driver.start)
+    return sender, receiver
+
+
+def check_size(val):
+    #a number of bytes, e.g. 1500, 64K, 10M or 1G
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    try:
+        if val[-1:].upper() in units:
+            value = int(float(val[:-1]) * units[val[-1].upper()])
+        else:
+            value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a size, e.g. 500000, 64K, 10M or 1G')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the size must be a positive number')
+    return value
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='discrete-event simulation of the UDP transport over a topology spec', epilog='end of help')
+    parser.add_argument('spec', help='topology spec, .json or .yaml (see topology-builder)')
+    parser.add_argument('-c', '--client', type=str, default='h1', help='host that sends')
+    parser.add_argument('-s', '--server', type=str, default='h9', help='host that receives')
+    parser.add_argument('--size', type=check_size, default=check_size('10M'), help='bytes to send per flow, e.g. 10M')
+    parser.add_argument('-n', '--flows', type=check_positive, default=1, help='transfers at the same time, one port each')
+    parser.add_argument('-w', '--window', type=check_positive, default=5, help='window size in packets')
+    parser.add_argument('-m', '--mode', choices=engine.MODES, default='gbn')
+    parser.add_argument('--cc', choices=('none',) + tuple(congestion.ALGORITHMS), default='none',
+                        help='congestion control, none keeps a fixed window')
+    parser.add_argument('-t', '--timeout', type=float, default=0.5, help='first retransmission timeout in seconds')
+    parser.add_argument('--timestamps', action='store_true', help='use the header with timestamps')
+    parser.add_argument('--checksum', action='store_true', help='use the header with timestamps and a CRC32')
+    parser.add_argument('--pace', action='store_true', help='pace the packets instead of sending bursts')
+    parser.add_argument('--metric', choices=('hops', 'delay'), default='hops', help='what the routes minimise')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random loss and jitter')
+    parser.add_argument('--limit', type=float, default=3600.0, help='stop after this many simulated seconds')
+    args = parser.parse_args()
+
+    try:
+        topology = Topology(load_spec(args.spec), args.metric)
+    except (OSError, SpecError) as e:
+        print(f'the spec is not valid: {e}')
+        sys.exit(1)
+    for host in (args.client, args.server):
+        if host not in topology.hosts:
+            print(f'{host} is not a host of {topology.name}')
+            sys.exit(1)
+
+    network = Network(topology, Simulator(args.seed))
+    data = random.Random(args.seed).randbytes(args.size)
+    version = 3 if args.checksum else 2 if args.timestamps else 1
+    flows = []
+    running = [0]
+
+    def finished(driver):
+        running[0] -= 1
+
+    for i in range(args.flows):
+        cc = None if args.cc == 'none' else congestion.create(args.cc, max_window=args.window)
+        options = {'window': args.window, 'mode': args.mode, 'timeout': args.timeout, 'cc': cc, 'version': version}
+        #bbr sends at its pacing rate, without a pacer it sends cwnd in bursts
+        if args.pace or (cc is not None and cc.paced):
+            options['pacer'] = pacing.Pacer()
+        flows.append(transfer(network, args.client, args.server, data, 8088 + i, options,
+                              {'window': args.window, 'mode': args.mode}, finished))
+        running[0] += 2
+
+    started = time.perf_counter()
+    simulated = network.sim.run(until=args.limit, stop=lambda: running[0] == 0)
+    seconds = time.perf_counter() - started
+
+    print(f'{topology.summary()}')
+    print(f'{args.flows} x {args.size} bytes {args.client} -> {args.server}: {simulated:.3f} simulated seconds in '
+          f'{seconds:.2f} s ({simulated / seconds if seconds > 0 else 0:.1f}x real time), '
+          f'{network.sim.processed} events\n')
+    print(f'{"flow":>4}{"done":>6}{"seconds":>10}{"Mbps":>9}{"retrans":>9}{"srtt ms":>9}{"rto ms":>8}')
+    for i, (sender, receiver) in enumerate(flows):
+        stats = sender.statistics(simulated)
+        srtt = stats.get('srtt')
+        print(f'{i:>4}{"yes" if sender.done else "no":>6}{stats["elapsed"]:>10.3f}{stats["throughput_mbps"]:>9.2f}'
+              f'{stats["retransmissions"]:>9}{"" if srtt is None else f"{srtt * 1000:.1f}":>9}{stats["rto"] * 1000:>8.0f}')
+    queues = network.queue_statistics()
+    if queues:
+        print(f'\n{"queue":>14}{"packets":>10}{"drops":>8}{"lost":>7}{"max backlog":>13}')
+        for name, stats in queues.items():
+            print(f'{name:>14}{stats["packets"]:>10}{stats["drops"]:>8}{stats["lost"]:>7}{stats["max_backlog"]:>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Client for fileserver.py: asks for a file and receives it straight
+into its final place. The output file is created with the size the
+server announced and mapped into memory (mmap), and recv_into()
+writes the data from the socket directly into the mapping, so there
+is no buffer in between and nothing to copy. With --discard the data
+goes into one reusable buffer and is thrown away, to measure only
+the network.
+
+The file is saved as <name>.received by default. An output file
+that exists is only overwritten with --force, and never when it is
+the requested file itself: the hosts of a mininet network share one
+filesystem, and truncating it would zero the file the server is
+about to send.
+
+	python3 fileclient.py -i 10.0.1.2 -f big.bin -o copy.bin
+	python3 fileclient.py -i 10.0.1.2 -f big.bin --discard
+"""
+from socket import *
+import argparse
+import mmap
+import os
+import sys
+import time
+from fileserver import reply_struct, OK, check_port, report
+
+def recv_exactly(client_sd, size):
+	data = b''
+	while len(data) < size:
+		chunk = client_sd.recv(size - len(data))
+		if not chunk:
+			raise ConnectionError('the server closed the connection')
+		data += chunk
+	return data
+
+def recv_into_view(client_sd, view):
+	"""
+	fills the memoryview from the socket, returns the bytes received
+	"""
+	received = 0
+	size = len(view)
+	while received < size:
+		n = client_sd.recv_into(view[received:])
+		if not n:
+			break
+		received += n
+	return received
+
+def receive_mmap(client_sd, path, size, overwrite=False):
+	"""
+	receives size bytes into a file of that size mapped into memory.
+	the file must not exist unless overwrite is True
+	"""
+	with open(path, 'w+b' if overwrite else 'x+b') as f:
+		f.truncate(size)
+		if size == 0:
+			return 0
+		with mmap.mmap(f.fileno(), size) as m:
+			view = memoryview(m)
+			try:
+				return recv_into_view(client_sd, view)
+			finally:
+				view.release()
+
+def receive_discard(client_sd, size, chunk=256 * 1024):
+	"""
+	receives size bytes into one reusable buffer
+	"""
+	view = memoryview(bytearray(chunk))
+	received = 0
+	while received < size:
+		n = client_sd.recv_into(view[:min(chunk, size - received)])
+		if not n:
+			break
+		received += n
+	return received
+
+def main():
+	parser = argparse.ArgumentParser(description='client for fileserver.py', epilog='end of help')
+	parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+	parser.add_argument('-p', '--port', type=check_port, default=12000)
+	parser.add_argument('-f', '--file', type=str, required=True, help='name of the file on the server')
+	parser.add_argument('-o', '--output', type=str, help='where to save it, default <name>.received')
+	parser.add_argument('--force', action='store_true', help='overwrite the output file if it exists')
+	parser.add_argument('--discard', action='store_true', help='do not save the file, only measure')
+	args = parser.parse_args()
+	output = args.output or os.path.basename(args.file) + '.received'
+	if not args.discard and os.path.exists(output):
+		if os.path.exists(args.file) and os.path.samefile(output, args.file):
+			print(f'{output} is the file that is requested, save it under another name')
+			sys.exit(1)
+		if not args.force:
+			print(f'{output} exists, use --force to overwrite it')
+			sys.exit(1)
+
+	client_sd = socket(AF_INET, SOCK_STREAM)
+	try:
+		client_sd.connect((args.ip, args.port))
+	except OSError:
+		print("ConnectionError")
+		sys.exit()
+	start = time.perf_counter()
+	client_sd.sendall(args.file.encode() + b'\n')
+	status, size = reply_struct.unpack(recv_exactly(client_sd, reply_struct.size))
+	if status != OK:
+		print(f'{args.file} was not found on the server')
+		sys.exit(1)
+	if args.discard:
+		received = receive_discard(client_sd, size)
+	else:
+		received = receive_mmap(client_sd, output, size, args.force)
+	elapsed = time.perf_counter() - start
+	client_sd.close()
+	if received < size:
+		print(f'the connection was closed after {received} of {size} bytes')
+		sys.exit(1)
+	report(args.file, size, elapsed)
+
+if __name__ == '__main__':
+	main()
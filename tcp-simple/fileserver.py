@@ -0,0 +1,121 @@
+"""
+A file server for moving large files between hosts (e.g. h1 and h3
+in mininet), the bulk-transfer version of tcpserver.py.
+
+The client sends the name of a file in the server's directory, the
+server answers with a status byte and the size of the file (8 bytes)
+and then the file with socket.sendfile(): the kernel copies the file
+straight from the page cache to the socket, the data never passes
+through Python. --mode copy reads and sends it in chunks instead,
+to compare the two.
+
+	python3 fileserver.py -d /tmp/files
+	python3 fileclient.py -f big.bin -o copy.bin
+"""
+from socket import *
+import argparse
+import os
+import threading
+import time
+from struct import Struct
+
+# status byte and file size in front of the file
+reply_struct = Struct('!BQ')
+OK = 0
+NOT_FOUND = 1
+MAX_NAME = 1024
+
+def check_port(val):
+	try:
+		value = int(val)
+	except ValueError:
+		raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+	if not 1024 <= value <= 65535:
+		raise argparse.ArgumentTypeError('it is not a valid port')
+	return value
+
+def report(name, size, seconds):
+	"""
+	prints the throughput of one transfer
+	"""
+	mbps = size * 8 / seconds / 1e6 if seconds > 0 else float('inf')
+	print(f'{name}: {size} bytes in {seconds:.3f} s = {mbps:.2f} Mbps', flush=True)
+
+def read_name(conn_sd):
+	"""
+	the requested file name, one line
+	"""
+	name = b''
+	while not name.endswith(b'\n'):
+		data = conn_sd.recv(MAX_NAME)
+		if not data or len(name) > MAX_NAME:
+			return None
+		name += data
+	return name.decode().strip()
+
+def send_copy(conn_sd, f, chunk=64 * 1024):
+	"""
+	the user-space way: read into one buffer and send it
+	"""
+	buffer = bytearray(chunk)
+	view = memoryview(buffer)
+	while True:
+		n = f.readinto(buffer)
+		if not n:
+			break
+		conn_sd.sendall(view[:n])
+
+def handle_client(conn_sd, addr, directory, mode):
+	"""
+	serves one request
+	"""
+	with conn_sd:
+		name = read_name(conn_sd)
+		if name is None:
+			return
+		#only files in the directory, no paths
+		path = os.path.join(directory, os.path.basename(name))
+		if not os.path.isfile(path):
+			print(f'{addr}: {name} not found')
+			conn_sd.sendall(reply_struct.pack(NOT_FOUND, 0))
+			return
+		with open(path, 'rb') as f:
+			size = os.fstat(f.fileno()).st_size
+			conn_sd.sendall(reply_struct.pack(OK, size))
+			start = time.perf_counter()
+			try:
+				if mode == 'sendfile':
+					conn_sd.sendfile(f)
+				else:
+					send_copy(conn_sd, f)
+			except OSError as e:
+				print(f'{addr}: transfer of {name} failed: {e}')
+				return
+			#the last bytes may still be in the socket buffer, the
+			#client's number is the one that counts
+			report(f'{addr} {name} ({mode})', size, time.perf_counter() - start)
+
+def main():
+	parser = argparse.ArgumentParser(description='TCP file server with sendfile()', epilog='end of help')
+	parser.add_argument('-b', '--bind', type=str, default='', help='address to bind to, default all')
+	parser.add_argument('-p', '--port', type=check_port, default=12000)
+	parser.add_argument('-d', '--directory', type=str, default='.', help='directory with the files to serve')
+	parser.add_argument('-m', '--mode', choices=('sendfile', 'copy'), default='sendfile')
+	args = parser.parse_args()
+
+	#create a tcp socket with SOCK_STREAM
+	server_sd = socket(AF_INET, SOCK_STREAM)
+	server_sd.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+	server_sd.bind((args.bind, args.port))
+	server_sd.listen(16)
+	print(f'The server is ready to serve {os.path.abspath(args.directory)}')
+	try:
+		while True:
+			conn_sd, addr = server_sd.accept()
+			threading.Thread(target=handle_client, args=(conn_sd, addr, args.directory, args.mode), daemon=True).start()
+	except KeyboardInterrupt:
+		pass
+	server_sd.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,144 @@
+"""
+Message framing for the TCP servers and clients: TCP is a byte
+stream, one send() can arrive as two recv()s and two send()s as
+one, so every message goes out with a 4 byte length in front of it.
+
+FrameReader receives with recv_into into one reusable buffer and
+hands out the messages as memoryviews of that buffer, so a message
+is never sliced or copied on the way in. A view is only valid until
+the next next_message() (or messages(), read_message()) or fill() of
+the reader: both may move the rest of the data to the front of the
+buffer, over the messages handed out before. Use a view before asking
+for the next one, or keep a copy (bytes(view)).
+
+	from framing import *
+	send_message(sock, b'hello')
+	reader = FrameReader(sock)
+	message = reader.read_message()
+"""
+from struct import Struct
+
+length_struct = Struct('!I')
+LENGTH_SIZE = length_struct.size
+MAX_MESSAGE = 16 * 1024 * 1024
+
+class FramingError(Exception):
+	"""
+	the stream does not hold valid frames
+	"""
+
+def frame(message):
+	"""
+	returns the length prefix and the message as one bytes object
+	"""
+	return length_struct.pack(len(message)) + message
+
+def send_message(sock, message):
+	"""
+	sends one message; the prefix and the message go down in one
+	sendmsg() without joining them first
+	"""
+	prefix = length_struct.pack(len(message))
+	sent = sock.sendmsg([prefix, message])
+	if sent < LENGTH_SIZE + len(message):
+		#a blocking socket only sends part of it if the buffer is full
+		rest = memoryview(prefix + bytes(message))[sent:]
+		sock.sendall(rest)
+
+def send_messages(sock, messages):
+	"""
+	sends many messages with as few system calls as possible
+	"""
+	sock.sendall(b''.join(frame(m) for m in messages))
+
+class FrameReader:
+	"""
+	reads length-prefixed messages from a socket. the buffer grows
+	if a message does not fit, up to max_message bytes
+	"""
+
+	def __init__(self, sock, size=64 * 1024, max_message=MAX_MESSAGE):
+		self.sock = sock
+		self.buffer = bytearray(size)
+		self.view = memoryview(self.buffer)
+		self.start = 0		# first byte not handed out yet
+		self.end = 0		# end of the received data
+		self.max_message = max_message
+
+	def pending(self):
+		"""
+		bytes received but not handed out as messages
+		"""
+		return self.end - self.start
+
+	def make_room(self, needed):
+		#moves the incomplete message at the end to the front of the buffer,
+		#or grows the buffer if it cannot hold needed bytes at all
+		pending = self.end - self.start
+		if needed > len(self.buffer):
+			#a new buffer, messages handed out before stay valid in the old one
+			buffer = bytearray(needed)
+			buffer[:pending] = self.view[self.start:self.end]
+			self.buffer = buffer
+			self.view = memoryview(buffer)
+		elif self.start:
+			self.buffer[:pending] = self.view[self.start:self.end]
+		self.start, self.end = 0, pending
+
+	def fill(self):
+		"""
+		one recv_into into the free part of the buffer. returns the
+		number of bytes received, 0 when the peer has closed the
+		connection (a non-blocking socket raises BlockingIOError)
+		"""
+		if self.end == len(self.buffer):
+			self.make_room(len(self.buffer))
+			if self.end == len(self.buffer):
+				self.make_room(2 * len(self.buffer))
+		n = self.sock.recv_into(self.view[self.end:])
+		self.end += n
+		return n
+
+	def next_message(self):
+		"""
+		the next complete message in the buffer as a memoryview, or
+		None if it has not been received completely yet. the view of
+		the message before may be overwritten by this call
+		"""
+		if self.end - self.start < LENGTH_SIZE:
+			if self.start == self.end:
+				self.start = self.end = 0
+			return None
+		length, = length_struct.unpack_from(self.buffer, self.start)
+		if length > self.max_message:
+			raise FramingError(f'message of {length} bytes is too large')
+		first = self.start + LENGTH_SIZE
+		if self.end - first < length:
+			if first + length > len(self.buffer):
+				self.make_room(LENGTH_SIZE + length)
+			return None
+		self.start = first + length
+		return self.view[first:self.start]
+
+	def messages(self):
+		"""
+		all complete messages in the buffer
+		"""
+		while True:
+			message = self.next_message()
+			if message is None:
+				return
+			yield message
+
+	def read_message(self):
+		"""
+		blocks until a message is there; None at the end of the stream
+		"""
+		while True:
+			message = self.next_message()
+			if message is not None:
+				return message
+			if not self.fill():
+				if self.pending():
+					raise FramingError('connection closed in the middle of a message')
+				return None
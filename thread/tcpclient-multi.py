@@ -1,17 +1,35 @@
 from socket import *
+import argparse
 import sys
-serverName = '127.0.0.1'
-serverPort = 12000
+from framing import FrameReader, send_message
+
+parser = argparse.ArgumentParser(description='client for tcpserver-multi.py', epilog='end of help')
+parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+parser.add_argument('-p', '--port', type=int, default=12000)
+parser.add_argument('-f', '--framed', action='store_true', help='length-prefixed messages, for a server started with --framed')
+args = parser.parse_args()
+
+serverName = args.ip
+serverPort = args.port
 clientSocket = socket(AF_INET, SOCK_STREAM)
 try:
 	clientSocket.connect((serverName,serverPort))
 except:
 	print("ConnectionError")
 	sys.exit()
+reader = FrameReader(clientSocket)
 while True:
 	sentence = input('Input lowercase sentence:')
-	clientSocket.send(sentence.encode())
-	modifiedSentence = clientSocket.recv(1024)
+	if args.framed:
+		#the whole reply, however long it is
+		send_message(clientSocket, sentence.encode())
+		modifiedSentence = reader.read_message()
+		if modifiedSentence is None:
+			break
+		modifiedSentence = modifiedSentence.tobytes()
+	else:
+		clientSocket.send(sentence.encode())
+		modifiedSentence = clientSocket.recv(1024)
 	print ('From Server:', modifiedSentence.decode())
 	if (sentence == "exit"):
 		break
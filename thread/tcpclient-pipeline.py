@@ -0,0 +1,94 @@
+"""
+Pipelining client for tcpserver-multi.py --framed: keeps up to
+--depth length-prefixed messages in flight before it waits for
+their replies, so the round-trip time is paid once per window
+instead of once per message. Every reply is checked against the
+upper-cased message. With --depth 1 it waits for every reply,
+like tcpclient-multi.py.
+
+	python3 tcpserver-multi.py --framed --quiet
+	python3 tcpclient-pipeline.py -n 100000 -d 1 16 128 -s 32 4096
+"""
+from socket import *
+import argparse
+import select
+import sys
+import time
+from framing import FrameReader, frame
+
+def check_positive(val):
+	try:
+		value = int(val)
+	except ValueError:
+		raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+	if value <= 0:
+		raise argparse.ArgumentTypeError('the value must be a positive number')
+	return value
+
+def run(serverName, serverPort, count, depth, size):
+	"""
+	sends count messages of size bytes with depth of them in flight,
+	returns the elapsed time in seconds
+	"""
+	clientSocket = socket(AF_INET, SOCK_STREAM)
+	clientSocket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+	clientSocket.connect((serverName,serverPort))
+	reader = FrameReader(clientSocket)
+	#the messages are prepared up front so only the network is measured
+	body = (b'abcdefghijklmnopqrstuvwxyz' * (size // 26 + 1))[:size]
+	framed = frame(body)
+	expected = body.upper()
+	#unsent bytes; the socket is non-blocking so that a full send
+	#buffer never stops us from reading the replies (if both sides
+	#block in send with full buffers, nobody reads)
+	outgoing = bytearray()
+	clientSocket.setblocking(False)
+	sent = received = 0
+	start = time.perf_counter()
+	while received < count:
+		#fill the pipeline: one send for all messages that fit
+		burst = min(depth - (sent - received), count - sent)
+		if burst > 0:
+			outgoing += framed * burst
+			sent += burst
+		if outgoing:
+			try:
+				n = clientSocket.send(outgoing)
+				del outgoing[:n]
+			except BlockingIOError:
+				pass
+		readable, writable, _ = select.select([clientSocket], [clientSocket] if outgoing else [], [])
+		if not readable:
+			continue
+		if not reader.fill():
+			raise ConnectionError('closed by the server')
+		for message in reader.messages():
+			if message != expected:
+				raise ValueError(f'wrong reply to message {received}')
+			received += 1
+	elapsed = time.perf_counter() - start
+	clientSocket.close()
+	return elapsed
+
+def main():
+	parser = argparse.ArgumentParser(description='pipelining client for tcpserver-multi.py --framed', epilog='end of help')
+	parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+	parser.add_argument('-p', '--port', type=check_positive, default=12000)
+	parser.add_argument('-n', '--count', type=check_positive, default=20000, help='messages per run')
+	parser.add_argument('-d', '--depth', type=check_positive, nargs='+', default=[1, 16, 128], help='messages in flight')
+	parser.add_argument('-s', '--size', type=check_positive, nargs='+', default=[32], help='message size in bytes')
+	args = parser.parse_args()
+
+	print(f'{"size":>8}{"depth":>8}{"msg/s":>12}{"Mbps":>10}{"us/msg":>10}')
+	for size in args.size:
+		for depth in args.depth:
+			try:
+				elapsed = run(args.ip, args.port, args.count, depth, size)
+			except OSError as e:
+				print("ConnectionError", e)
+				sys.exit()
+			rate = args.count / elapsed
+			print(f'{size:>8}{depth:>8}{rate:>12.0f}{rate * size * 8 / 1e6:>10.2f}{elapsed / args.count * 1e6:>10.1f}', flush=True)
+
+if __name__ == '__main__':
+	main()
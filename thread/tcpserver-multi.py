@@ -4,11 +4,53 @@ from a client, and send an echo reply;
 echoes lines until eof when client closes socket; spawns a 
 thread to handle each client connection; threads share global 
 memory space with main thread.
+
+--mode pool hands the connections to a fixed number of worker
+threads through a bounded queue instead, and --mode select
+serves all connections from one thread with a selectors
+(epoll on Linux) event loop.
+
+--framed expects length-prefixed messages (see framing.py) and
+answers every message with one, however TCP splits or merges them.
+a client may send many messages before it reads the replies.
+
+the server counts messages, bytes, connections and the time to
+answer a message (see metrics/registry.py) instead of printing
+every message, -v prints them again. --metrics serves the counts
+for Prometheus, --snapshot writes them to a file as JSON lines and
+--profile samples the stacks for a flame graph (see metrics/).
+
+	python3 tcpserver-multi.py --mode pool --workers 8 --queue 64 --backlog 128
+	python3 tcpserver-multi.py --mode select --framed --quiet --metrics :9100
+	curl -s localhost:9100/metrics
 """
 from socket import *
 import _thread as thread
+import argparse
+import queue
+import selectors
+import threading
 import time
+import os
 import sys 
+from framing import FrameReader, FramingError, frame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'metrics'))
+import exporter
+from registry import Registry
+
+MODES = ('thread', 'pool', 'select')
+verbose = False
+quiet = False
+
+#every thread counts into a cell of its own, the counters take no lock
+registry = Registry()
+messages = registry.counter('server_messages_total', 'messages answered')
+received = registry.counter('server_received_bytes_total', 'bytes received from the clients')
+sent = registry.counter('server_sent_bytes_total', 'bytes sent to the clients')
+accepted = registry.counter('server_connections_total', 'connections accepted')
+active = registry.gauge('server_active_connections', 'connections that are open')
+latency = registry.histogram('server_reply_seconds', 'time from a recv to the end of the send of its replies')
 
 def now():
 	"""
@@ -16,40 +58,277 @@ def now():
 	"""
 	return time.ctime(time.time())
 
+def check_positive(val):
+	try:
+		value = int(val)
+	except ValueError:
+		raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+	if value <= 0:
+		raise argparse.ArgumentTypeError('the value must be a positive number')
+	return value
+
+def handleMessage(data):
+	"""
+	the reply to one message, and True if the client said exit.
+	the message stays bytes: a recv may end in the middle of a
+	UTF-8 character, or the client may send no text at all (only
+	a-z are upper-cased)
+	"""
+	messages.inc()
+	if verbose:
+		print ("received  message = ", data.decode(errors='replace'))
+	return data.upper(), data == b"exit"
+
 def handleClient(connection):
 	"""
 	a client handler function 
 	"""
+	active.inc()
+	try:
+		while True:
+			data = connection.recv(1024)
+			#an empty message means the client has closed the connection
+			if not data:
+				break
+			started = time.perf_counter()
+			received.inc(len(data))
+			reply, done = handleMessage(data)
+			connection.sendall(reply)
+			sent.inc(len(reply))
+			latency.observe(time.perf_counter() - started)
+			if done:
+				break
+	finally:
+		connection.close()
+		active.dec()
+
+def handleFrame(message):
+	"""
+	the reply to one framed message (a memoryview), and True if
+	the client said exit. the message stays bytes, it is never
+	decoded (only a-z are upper-cased)
+	"""
+	messages.inc()
+	if verbose:
+		print ("received  message = ", message.tobytes())
+	return message.tobytes().upper(), message == b"exit"
+
+def handleFrames(reader):
+	"""
+	the framed replies to all complete messages in the reader, and
+	True if the client said exit
+	"""
+	replies = []
+	for message in reader.messages():
+		reply, done = handleFrame(message)
+		replies.append(frame(reply))
+		if done:
+			return b''.join(replies), True
+	return b''.join(replies), False
+
+def handleFramedClient(connection):
+	"""
+	a client handler function for length-prefixed messages. all
+	messages that arrived with one recv are answered with one send
+	"""
+	reader = FrameReader(connection)
+	active.inc()
+	try:
+		while True:
+			n = reader.fill()
+			if not n:
+				break
+			started = time.perf_counter()
+			received.inc(n)
+			replies, done = handleFrames(reader)
+			if replies:
+				connection.sendall(replies)
+				sent.inc(len(replies))
+			latency.observe(time.perf_counter() - started)
+			if done:
+				break
+	except FramingError as e:
+		print('framing error: ', e)
+	finally:
+		connection.close()
+		active.dec()
+
+def poolWorker(connections, handler):
+	"""
+	a worker thread of the pool: serves one client after the other
+	"""
+	while True:
+		connection = connections.get()
+		try:
+			handler(connection)
+		except Exception as e:
+			#one bad client must not take the worker with it
+			print('connection error: ', e)
+			connection.close()
+		finally:
+			connections.task_done()
+
+def serveThreads(serverSocket, handler):
+	"""
+	spawns a new thread whenever a new connection join
+	"""
 	while True:
-		data = connection.recv(1024).decode()
-		print ("received  message = ", data)
-		modified_message= data.upper()
-		connection.send(modified_message.encode())
-		if (data == "exit"):
-			break
-	connection.close()
+		connectionSocket, addr = serverSocket.accept() 
+		accepted.inc()
+		if not quiet:
+			print('Server connected by ', addr) 
+			print('at ', now())
+		thread.start_new_thread(handler, (connectionSocket,)) 
 
+def servePool(serverSocket, handler, workers, size):
+	"""
+	a fixed pool of worker threads. accepted connections wait in a
+	queue of size connections; when it is full the server stops
+	accepting and new clients wait in the listen backlog
+	"""
+	connections = queue.Queue(maxsize=size)
+	registry.gauge('server_queued_connections', 'accepted connections waiting for a worker', function=connections.qsize)
+	for i in range(workers):
+		threading.Thread(target=poolWorker, args=(connections, handler), daemon=True).start()
+	while True:
+		connectionSocket, addr = serverSocket.accept() 
+		accepted.inc()
+		if not quiet:
+			print('Server connected by ', addr) 
+			print('at ', now())
+		connections.put(connectionSocket)
+
+def serveSelect(serverSocket, framed):
+	"""
+	one thread multiplexes the listening socket and all connections.
+	replies that do not fit in the socket buffer are kept per
+	connection and sent when the socket becomes writable again
+	"""
+	selector = selectors.DefaultSelector()
+	serverSocket.setblocking(False)
+	selector.register(serverSocket, selectors.EVENT_READ)
+	#connection -> [bytes still to send, close after sending, FrameReader]
+	pending = {}
+
+	def close(connection):
+		selector.unregister(connection)
+		del pending[connection]
+		connection.close()
+		active.dec()
+
+	def flush(connection):
+		state = pending[connection]
+		try:
+			n = connection.send(state[0])
+		except BlockingIOError:
+			return
+		except OSError:
+			close(connection)
+			return
+		sent.inc(n)
+		state[0] = state[0][n:]
+		if state[0]:
+			selector.modify(connection, selectors.EVENT_WRITE)
+		elif state[1]:
+			close(connection)
+		else:
+			selector.modify(connection, selectors.EVENT_READ)
+
+	while True:
+		for key, events in selector.select():
+			sock = key.fileobj
+			if sock is serverSocket:
+				try:
+					connectionSocket, addr = serverSocket.accept()
+				except BlockingIOError:
+					continue
+				accepted.inc()
+				active.inc()
+				if not quiet:
+					print('Server connected by ', addr) 
+					print('at ', now())
+				connectionSocket.setblocking(False)
+				reader = FrameReader(connectionSocket) if framed else None
+				pending[connectionSocket] = [b'', False, reader]
+				selector.register(connectionSocket, selectors.EVENT_READ)
+			elif events & selectors.EVENT_WRITE:
+				flush(sock)
+			else:
+				state = pending[sock]
+				reader = state[2]
+				try:
+					data = reader.fill() if reader else sock.recv(1024)
+				except BlockingIOError:
+					continue
+				except OSError:
+					data = b''
+				#an empty message means the client has closed the connection
+				if not data:
+					close(sock)
+					continue
+				started = time.perf_counter()
+				received.inc(data if reader else len(data))
+				try:
+					reply, done = handleFrames(reader) if reader else handleMessage(data)
+				except FramingError as e:
+					print('framing error: ', e)
+					close(sock)
+					continue
+				except Exception as e:
+					#one bad client must not take the server with it
+					print('connection error: ', e)
+					close(sock)
+					continue
+				state[0] += reply
+				state[1] = done
+				flush(sock)
+				latency.observe(time.perf_counter() - started)
 
 def main():
 	"""
 	creates a server socket, listens for new connections,
-	and spawns a new thread whenever a new connection join
+	and serves them in the selected mode
 	"""
-	serverPort = 12000
+	parser = argparse.ArgumentParser(description='multi-client TCP upper-case echo server', epilog='end of help')
+	parser.add_argument('-p', '--port', type=check_positive, default=12000)
+	parser.add_argument('-m', '--mode', choices=MODES, default='thread', help='a thread per client, a pool of threads or a select event loop')
+	parser.add_argument('-w', '--workers', type=check_positive, default=8, help='threads in the pool (pool mode)')
+	parser.add_argument('-q', '--queue', type=check_positive, default=64, help='accepted connections waiting for a worker (pool mode)')
+	parser.add_argument('-b', '--backlog', type=check_positive, default=128, help='connections waiting to be accepted')
+	parser.add_argument('-f', '--framed', action='store_true', help='length-prefixed messages, see framing.py')
+	parser.add_argument('-v', '--verbose', action='store_true', help='print every message')
+	parser.add_argument('--quiet', action='store_true', help='do not print the connections either')
+	exporter.add_arguments(parser)
+	args = parser.parse_args()
+	global verbose, quiet
+	verbose = args.verbose
+	quiet = args.quiet
+	handler = handleFramedClient if args.framed else handleClient
+
+	serverPort = args.port
 	serverSocket = socket(AF_INET,SOCK_STREAM)
+	serverSocket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
 	try:
 		serverSocket.bind(('',serverPort))
 		
 	except: 
 		print("Bind failed. Error : ")
 		sys.exit()
-	serverSocket.listen(1)
+	serverSocket.listen(args.backlog)
 	print ('The server is ready to receive')
-	while True:
-		connectionSocket, addr = serverSocket.accept() 
-		print('Server connected by ', addr) 
-		print('at ', now())
-		thread.start_new_thread(handleClient, (connectionSocket,)) 
+	#in thread and pool mode the messages are handled in other threads than the main one
+	metrics = exporter.start(args, registry, threads=args.mode != 'select')
+	try:
+		if args.mode == 'pool':
+			servePool(serverSocket, handler, args.workers, args.queue)
+		elif args.mode == 'select':
+			serveSelect(serverSocket, args.framed)
+		else:
+			serveThreads(serverSocket, handler)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		metrics.close()
 	serverSocket.close()
 
 if __name__ == '__main__':
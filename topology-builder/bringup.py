@@ -0,0 +1,169 @@
+'''
+    #fast configuration of a mininet network after net.start()
+
+    #every net[node].cmd(...) is one round trip to the shell of the node: the
+    #command is written, and mininet waits for the prompt before the next one
+    #can go out. portfolio-topology.py does five ethtool calls per interface
+    #and one ip route add per route like that, one node after the other.
+
+    #Bringup collects the commands of every node and turns them into one
+    #line of shell per node and phase:
+    #  offload: one ethtool -K per interface with all features at once
+    #  routes:  one ip -batch with all routes of the node, from a file
+    #and then starts the line on every node with sendCmd() before it waits for
+    #any of them with waitOutput(), so all nodes work at the same time. the
+    #shell of a node reads from a pty in canonical mode, which cuts a line at
+    #4095 bytes (and waitOutput() then waits forever): the routes and any
+    #other line longer than MAX_LINE go through a file in a temporary
+    #directory, the nodes share the filesystem with this program. the
+    #time of every phase is recorded, parallel=False runs every command on its
+    #own, one after the other, the old way, to compare.
+
+    #   bringup = Bringup(net)
+    #   with bringup.timed('start'):
+    #       net.start()
+    #   bringup.offload('r1', ['r1-eth0', 'r1-eth1'])
+    #   bringup.route('r2', '10.0.0.0/24 via 10.0.1.1 dev r2-eth0')
+    #   bringup.run()
+    #   bringup.report()
+'''
+
+import os
+import shlex
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+OFFLOAD_FEATURES = ('tso', 'gso', 'lro', 'gro', 'ufo')
+PHASES = ('offload', 'routes', 'commands')
+# longer lines are sourced from a file, a pty line holds at most 4095 bytes
+MAX_LINE = 4000
+
+
+def offload_line(interface, features=OFFLOAD_FEATURES):
+    #one ethtool call for all features of an interface. ethtool still changes
+    #the other features if the kernel does not know one of them (e.g. ufo)
+    settings = ' '.join(f'{feature} off' for feature in features)
+    return f'ethtool -K {interface} {settings}'
+
+
+def route_batch(routes):
+    #the file for ip -batch with all routes of a node
+    return ''.join(f'route add {route}\n' for route in routes)
+
+
+class Bringup:
+
+    def __init__(self, net, parallel=True):
+        self.net = net
+        self.parallel = parallel
+        #phase -> node -> the single commands, in order
+        self.commands = {phase: {} for phase in PHASES}
+        self.interfaces = {}    # node -> interfaces to turn the offloads off on
+        self.features = OFFLOAD_FEATURES
+        self.timings = {}
+        self.output = {}        # (phase, node) -> what a node printed
+
+    def offload(self, node, interfaces, features=OFFLOAD_FEATURES):
+        self.features = features
+        self.interfaces.setdefault(node, []).extend(interfaces)
+
+    def route(self, node, route):
+        #route as for ip route add, e.g. '10.0.0.0/24 via 10.0.1.1 dev r2-eth0'
+        self.commands['routes'].setdefault(node, []).append(route)
+
+    def routes(self, node, routes):
+        for route in routes:
+            self.route(node, route)
+
+    def command(self, node, command):
+        #any other command, run after the routes
+        self.commands['commands'].setdefault(node, []).append(command)
+
+    def single_commands(self, phase):
+        #node -> the commands one by one, as portfolio-topology.py ran them
+        if phase == 'offload':
+            return {node: [f'ethtool -K {interface} {feature} off'
+                           for interface in interfaces for feature in self.features]
+                    for node, interfaces in self.interfaces.items()}
+        if phase == 'routes':
+            return {node: [f'ip route add {route}' for route in routes]
+                    for node, routes in self.commands['routes'].items()}
+        return dict(self.commands[phase])
+
+    def scripts(self, phase, directory=None):
+        #node -> one line of shell with everything the node does in the phase.
+        #the routes are read from routes-<node> in directory (see write_files)
+        if phase == 'offload':
+            return {node: '; '.join(offload_line(i, self.features) + ' 2>/dev/null' for i in interfaces)
+                    for node, interfaces in self.interfaces.items()}
+        if phase == 'routes':
+            directory = directory or tempfile.gettempdir()
+            #-force goes on after an error
+            return {node: 'ip -force -batch ' + shlex.quote(os.path.join(directory, f'routes-{node}'))
+                    for node in self.commands['routes']}
+        return {node: '; '.join(commands) for node, commands in self.commands[phase].items()}
+
+    def write_files(self, phase, directory):
+        #writes the route batches and the lines that are too long for the
+        #shell of a node to directory, returns node -> the line to send
+        if phase == 'routes':
+            for node, routes in self.commands['routes'].items():
+                with open(os.path.join(directory, f'routes-{node}'), 'w') as f:
+                    f.write(route_batch(routes))
+        lines = {}
+        for node, script in self.scripts(phase, directory).items():
+            if len(script) > MAX_LINE:
+                path = os.path.join(directory, f'{phase}-{node}.sh')
+                with open(path, 'w') as f:
+                    f.write(script + '\n')
+                #sourced, so it runs in the shell of the node as the line would
+                script = '. ' + shlex.quote(path)
+            lines[node] = script
+        return lines
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def run_phase(self, phase):
+        with self.timed(phase):
+            if self.parallel:
+                with tempfile.TemporaryDirectory(prefix='bringup-') as directory:
+                    scripts = self.write_files(phase, directory)
+                    #all nodes start before we wait for the first one
+                    for node, script in scripts.items():
+                        self.net[node].sendCmd(script)
+                    for node in scripts:
+                        self.output[(phase, node)] = self.net[node].waitOutput()
+            else:
+                for node, commands in self.single_commands(phase).items():
+                    self.output[(phase, node)] = ''.join(self.net[node].cmd(c) for c in commands)
+
+    def run(self):
+        for phase in PHASES:
+            self.run_phase(phase)
+        return self.timings
+
+    def errors(self):
+        #(phase, node, output) for the nodes that printed something
+        return [(phase, node, out.strip()) for (phase, node), out in self.output.items()
+                if out and out.strip()]
+
+    def report(self, verbose=False):
+        mode = 'parallel, batched' if self.parallel else 'serial, one command at a time'
+        nodes = {node for phase in PHASES for node in self.scripts(phase)}
+        print(f'bring-up ({mode}) of {len(nodes)} nodes:')
+        for phase, seconds in self.timings.items():
+            count = sum(len(c) for c in self.single_commands(phase).values()) if phase in PHASES else ''
+            what = f'  ({count} commands)' if count else ''
+            print(f'  {phase:10s} {seconds:8.3f} s{what}')
+        print(f'  {"total":10s} {sum(self.timings.values()):8.3f} s')
+        for phase, node, out in self.errors():
+            if verbose or phase != 'offload':
+                print(f'  {node} ({phase}): {out}')
@@ -0,0 +1,107 @@
+'''
+    #builds a mininet topology from a spec (see topology.py)
+
+    #print the addresses and the static routes of a spec:
+    #   python3 build.py examples/portfolio.yaml
+    #write a mininet script like portfolio-topology.py:
+    #   python3 build.py examples/portfolio.yaml -g portfolio-generated.py
+    #and run it (needs mininet):
+    #   sudo python3 build.py examples/portfolio.yaml --run
+    #the script prints how long every phase of the bring-up took; with
+    #--serial the nodes are configured one command at a time, to compare
+
+    #for scale tests a random spec with 100 routers in a ring with 50 extra
+    #links, one host per router:
+    #   python3 build.py --random 100 --chords 50 --save random100.json -g random100.py
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from generator import generate_script
+from topology import METRICS, SpecError, Topology, load_spec, random_spec, save_spec
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def print_topology(topology):
+    for subnet in topology.subnets:
+        members = '  '.join(f'{node} {subnet.addresses[node].ip} ({subnet.interfaces[node]})' for node in subnet.nodes)
+        via = f' via {subnet.switch}' if subnet.switch else ''
+        print(f'subnet {subnet.name:10s} {str(subnet.prefix):18s}{via}: {members}')
+    print()
+    for host, (gateway, dev) in topology.gateways.items():
+        print(f'{host}: default via {gateway} dev {dev}')
+    print()
+    for router, commands in topology.route_commands().items():
+        for command in commands:
+            print(f'{router}: {command}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='mininet topology from a JSON/YAML spec with computed static routes', epilog='end of help')
+    parser.add_argument('spec', nargs='?', help='the spec, .json or .yaml')
+    parser.add_argument('--metric', choices=METRICS, default='hops', help='shortest paths by number of hops or by link delay')
+    parser.add_argument('-g', '--generate', type=str, help='write a mininet script to this file')
+    parser.add_argument('--run', action='store_true', help='generate the script and run it with mininet')
+    parser.add_argument('--no-ping', action='store_true', help='do not pingAll() in the generated script')
+    parser.add_argument('--serial', action='store_true', help='configure the nodes one command at a time, to compare the bring-up time')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    parser.add_argument('--random', type=check_positive, help='make a random spec with this many routers instead')
+    parser.add_argument('--chords', type=int, help='extra links in the random spec, default half the routers')
+    parser.add_argument('--hosts', type=int, default=1, help='hosts per router in the random spec')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', type=str, help='write the (random) spec to this .json or .yaml file')
+    args = parser.parse_args()
+
+    if (args.spec is None) == (args.random is None):
+        parser.error('give either a spec or --random')
+    try:
+        if args.random:
+            spec = random_spec(args.random, args.chords, args.hosts, args.seed)
+            source = f'--random {args.random} --seed {args.seed}'
+        else:
+            spec = load_spec(args.spec)
+            source = os.path.basename(args.spec)
+        start = time.perf_counter()
+        topology = Topology(spec, args.metric)
+        elapsed = time.perf_counter() - start
+    except (OSError, SpecError, KeyError) as e:
+        print(f'the spec is not valid: {e}')
+        sys.exit(1)
+    if args.save:
+        save_spec(spec, args.save)
+
+    if not args.quiet:
+        print_topology(topology)
+        print()
+    print(f'{topology.summary()} (computed in {elapsed * 1000:.1f} ms)')
+
+    script = generate_script(topology, source, ping=not args.no_ping, parallel=not args.serial)
+    if args.generate:
+        with open(args.generate, 'w') as f:
+            f.write(script)
+        print(f'wrote {args.generate}')
+    if args.run:
+        with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+            f.write(script)
+        try:
+            subprocess.run([sys.executable, f.name])
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    main()
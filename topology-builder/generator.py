@@ -0,0 +1,130 @@
+'''
+    #writes a mininet script for a Topology, in the same form as
+    #portfolio-topology.py: a Topo class with addHost/addNode/addLink, the
+    #static routes with ip route add, and a CLI at the end. the routes and
+    #ethtool commands are applied with bringup.Bringup, batched per node and
+    #on all nodes at the same time
+'''
+
+import os
+
+# the generated script imports bringup.py from here
+BUILDER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEADER = """'''
+    #generated by topology-builder/build.py from {source}, do not edit by hand:
+    #change the spec and generate it again
+
+    #{summary}
+'''
+
+import sys
+
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.node import Node
+from mininet.log import setLogLevel, info
+from mininet.cli import CLI
+from mininet.link import TCLink
+
+sys.path.insert(0, {builder_dir!r})
+from bringup import Bringup
+
+
+class LinuxRouter( Node ):
+    \"\"\"A Node with IP forwarding enabled.
+    Means that every packet that is in this node, comunicate freely with its interfaces.\"\"\"
+
+    def config( self, **params ):
+        super( LinuxRouter, self).config( **params )
+        self.cmd( 'sysctl net.ipv4.ip_forward=1' )
+
+    def terminate( self ):
+        self.cmd( 'sysctl net.ipv4.ip_forward=0' )
+        super( LinuxRouter, self ).terminate()
+
+
+class {name}( Topo ):
+
+    def build( self, **_opts ):
+"""
+
+FOOTER = """
+
+topo = {name}()
+net = Mininet( topo=topo, link=TCLink )
+#the commands of every node are collected and run as one batch per node,
+#on all nodes at once; Bringup(net, parallel=False) runs them one by one
+bringup = Bringup(net{serial})
+with bringup.timed('start'):
+    net.start()
+
+#ip route add ipA via ipB dev INTERFACE
+#every packet going to ipA must first go to ipB using INTERFACE
+{routes}
+{offload}
+bringup.run()
+bringup.report()
+
+{ping}CLI( net )
+net.stop()
+"""
+
+
+def link_params(params):
+    return ''.join(f', {key}={value!r}' for key, value in params.items())
+
+
+def build_lines(topology):
+    lines = []
+    for host in topology.hosts:
+        address = topology.address(host)
+        gateway = topology.gateways.get(host)
+        route = f", defaultRoute='via {gateway[0]}'" if gateway else ''
+        ip = f'"{address}"' if address else 'None'
+        lines.append(f'        {host}=self.addHost("{host}",ip={ip}{route})')
+    for router in topology.routers:
+        address = topology.address(router)
+        ip = f"'{address}'" if address else 'None'
+        lines.append(f'        {router}=self.addNode("{router}",cls=LinuxRouter,ip={ip})')
+    for subnet in topology.subnets:
+        lines.append('')
+        lines.append(f'        #subnet {subnet.name}: {subnet.prefix}')
+        params = link_params(subnet.params)
+        if subnet.switch is None:
+            a, b = subnet.nodes
+            lines.append(f"        self.addLink({a},{b},intfName1='{subnet.interfaces[a]}', "
+                         f"params1={{ 'ip' : '{subnet.addresses[a]}' }}, intfName2='{subnet.interfaces[b]}', "
+                         f"params2={{ 'ip' : '{subnet.addresses[b]}' }}{params})")
+            continue
+        lines.append(f'        {subnet.switch} = self.addSwitch("{subnet.switch}")')
+        for node in subnet.nodes:
+            lines.append(f"        self.addLink({node},{subnet.switch},intfName1='{subnet.interfaces[node]}', "
+                         f"params1={{ 'ip' : '{subnet.addresses[node]}' }}{params})")
+    return lines
+
+
+def offload_lines(topology):
+    #tso, gso, lro, gro and ufo off on every interface, as portfolio-topology.py
+    if topology.offload:
+        return []
+    interfaces = {}
+    for node, interface in topology.interfaces():
+        interfaces.setdefault(node, []).append(interface)
+    return [f'bringup.offload("{node}", {names!r})' for node, names in interfaces.items()]
+
+
+def generate_script(topology, source='a spec', ping=True, parallel=True):
+    lines = [HEADER.format(source=source, summary=topology.summary(), name=topology.name,
+                           builder_dir=BUILDER_DIR)]
+    lines.extend(line + '\n' for line in build_lines(topology))
+    routes = []
+    for node, commands in topology.route_commands().items():
+        routes.extend(f'bringup.route("{node}", "{command[len("ip route add "):]}")' for command in commands)
+        if commands:
+            routes.append('')
+    lines.append(FOOTER.format(name=topology.name, routes='\n'.join(routes),
+                               offload='\n'.join(offload_lines(topology)) + '\n',
+                               ping='net.pingAll()\n' if ping else '',
+                               serial='' if parallel else ', parallel=False'))
+    return ''.join(lines)
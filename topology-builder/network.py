@@ -0,0 +1,159 @@
+'''
+    #starts a Topology (see topology.py) in mininet from python, without
+    #writing a script first: the same nodes, links, addresses and routes as
+    #the script from generator.py, configured with bringup.Bringup
+
+    #   net, bringup = start_network(Topology(load_spec('examples/portfolio.yaml')))
+    #   print(net['h1'].cmd('ping -c 3', net['h9'].IP()))
+    #   net.stop()
+
+    #the switches are OVSBridges (no controller), so several networks can run
+    #at the same time, as long as their node names differ (see prefixed() in
+    #experiments/sweep.py)
+
+    #with rip the routers get no static routes, they run the RIP daemon of
+    #dynamic-routing/ripd.py instead, rip holds its arguments ('' for the
+    #defaults) and the daemon logs to /tmp/ripd-<router>.log:
+    #   net, bringup = start_network(topology, rip='--update 5 --timeout 30 --garbage 20')
+
+    #with dhcp the hosts get their addresses from the DHCP server of
+    #dhcp/dhcpd.py instead: the first router on a subnet with hosts (the
+    #gateway of the hosts) serves it, the addresses of the other routers on
+    #it are not given out. dhcp holds the arguments of the server ('' for
+    #the defaults), the server logs to /tmp/dhcpd-<router>.log and the
+    #clients (dhcp/client.py, they renew their leases in the background) to
+    #/tmp/dhcp-<host>.log:
+    #   net, bringup = start_network(topology, dhcp='--lease-time 600')
+'''
+
+import os
+
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.node import Node, OVSBridge
+from mininet.link import TCLink
+
+from bringup import Bringup
+
+
+RIPD = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dynamic-routing', 'ripd.py')
+RIPD_LOG = '/tmp/ripd-{name}.log'
+DHCPD = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dhcp', 'dhcpd.py')
+DHCPD_LOG = '/tmp/dhcpd-{name}.log'
+DHCP_CLIENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dhcp', 'client.py')
+DHCP_CLIENT_LOG = '/tmp/dhcp-{name}.log'
+
+
+class LinuxRouter( Node ):
+    """A Node with IP forwarding enabled.
+    Means that every packet that is in this node, comunicate freely with its interfaces."""
+
+    def config( self, rip=None, dhcp=None, **params ):
+        super( LinuxRouter, self).config( **params )
+        self.cmd( 'sysctl net.ipv4.ip_forward=1' )
+        self.ripd = None
+        if rip is not None:
+            #the links and addresses are there already, the daemon finds them
+            log = RIPD_LOG.format(name=self.name)
+            self.cmd( f'rm -f {log}' )
+            self.ripd = self.cmd( f'python3 {RIPD} {rip} --log {log} > {log}.out 2>&1 & echo $!' ).strip()
+        self.dhcpd = None
+        if dhcp is not None:
+            log = DHCPD_LOG.format(name=self.name)
+            leases = f'/tmp/dhcpd-{self.name}.leases'
+            self.cmd( f'rm -f {leases}' )
+            self.dhcpd = self.cmd( f'python3 {DHCPD} {dhcp} --leases {leases} > {log} 2>&1 & echo $!' ).strip()
+
+    def terminate( self ):
+        if self.ripd:
+            self.cmd( f'kill {self.ripd}' )
+        if self.dhcpd:
+            self.cmd( f'kill {self.dhcpd}' )
+        self.cmd( 'sysctl net.ipv4.ip_forward=0' )
+        super( LinuxRouter, self ).terminate()
+
+
+def dhcp_servers(topology):
+    #router -> [(interface, addresses of the other routers)] of the subnets
+    #it gives out addresses on, and host -> the interfaces that lease one
+    servers = {}
+    clients = {}
+    for subnet in topology.subnets:
+        routers = [n for n in subnet.nodes if topology.is_router(n)]
+        hosts = [n for n in subnet.nodes if not topology.is_router(n)]
+        if not routers or not hosts:
+            continue
+        others = [str(subnet.addresses[r].ip) for r in routers[1:]]
+        servers.setdefault(routers[0], []).append((subnet.interfaces[routers[0]], others))
+        for host in hosts:
+            clients.setdefault(host, []).append(subnet.interfaces[host])
+    return servers, clients
+
+
+class SpecTopo( Topo ):
+
+    def build( self, topology=None, rip=None, dhcp=None, **_opts ):
+        nodes = {}
+        servers, clients = dhcp_servers(topology) if dhcp is not None else ({}, {})
+        for host in topology.hosts:
+            address = topology.address(host)
+            gateway = topology.gateways.get(host)
+            params = {'defaultRoute': f'via {gateway[0]}'} if gateway and host not in clients else {}
+            if host in clients:
+                #the first interface leases its address, mininet must not set one
+                address = None
+            nodes[host] = self.addHost(host, ip=str(address) if address else None, **params)
+        for router in topology.routers:
+            address = topology.address(router)
+            params = {'rip': rip} if rip is not None else {}
+            if router in servers:
+                interfaces = ' '.join(interface for interface, _ in servers[router])
+                exclude = sorted({a for _, others in servers[router] for a in others})
+                params['dhcp'] = f'{dhcp} -i {interfaces}' + (f' -x {" ".join(exclude)}' if exclude else '')
+            nodes[router] = self.addNode(router, cls=LinuxRouter, ip=str(address) if address else None, **params)
+        for subnet in topology.subnets:
+            #the interfaces of the hosts that lease their address get none here
+            ips = {node: {} if subnet.interfaces[node] in clients.get(node, ()) else {'ip': str(subnet.addresses[node])}
+                   for node in subnet.nodes}
+            if subnet.switch is None:
+                a, b = subnet.nodes
+                self.addLink(nodes[a], nodes[b],
+                             intfName1=subnet.interfaces[a], params1=ips[a],
+                             intfName2=subnet.interfaces[b], params2=ips[b],
+                             **subnet.params)
+                continue
+            switch = self.addSwitch(subnet.switch)
+            for node in subnet.nodes:
+                self.addLink(nodes[node], switch, intfName1=subnet.interfaces[node],
+                             params1=ips[node], **subnet.params)
+
+
+def start_network(topology, parallel=True, rip=None, dhcp=None):
+    '''
+    builds and starts the network, adds the static routes (or starts ripd
+    on the routers with rip) and turns the offloads off. with dhcp the hosts
+    lease their addresses from dhcpd on the routers. returns the Mininet
+    object and the Bringup with the times
+    '''
+    net = Mininet(topo=SpecTopo(topology=topology, rip=rip, dhcp=dhcp), link=TCLink, switch=OVSBridge,
+                  controller=None)
+    bringup = Bringup(net, parallel)
+    with bringup.timed('start'):
+        net.start()
+    for router, table in (topology.routes.items() if rip is None else ()):
+        bringup.routes(router, [f'{prefix} via {via} dev {dev}' for prefix, via, dev in table])
+    if not topology.offload:
+        for node, interface in topology.interfaces():
+            bringup.offload(node, [interface])
+    clients = dhcp_servers(topology)[1] if dhcp is not None else {}
+    for host, interfaces in clients.items():
+        #after the offloads, a lease is there when the command returns
+        log = DHCP_CLIENT_LOG.format(name=host)
+        for interface in interfaces:
+            bringup.command(host, f'python3 {DHCP_CLIENT} -i {interface} --background >> {log} 2>&1')
+    bringup.run()
+    for host, interfaces in clients.items():
+        #so that net[host].IP() shows the leased address
+        for interface in interfaces:
+            net[host].intf(interface).updateIP()
+    return net, bringup
@@ -0,0 +1,311 @@
+'''
+    #a topology built from a spec instead of by hand
+
+    #the spec (JSON or YAML) lists the routers, hosts and subnets. a subnet is
+    #a list of nodes on one link (two nodes) or one switch (more than two),
+    #with the TCLink parameters of its links (bw, delay, max_queue_size).
+    #from the spec Topology works out what portfolio-topology.py writes by hand:
+    #  - an address prefix per subnet (from the pool, or given with prefix),
+    #    the routers get the first addresses of a subnet, then the hosts, in
+    #    the order they are listed
+    #  - interface names: node-eth0, node-eth1, ... in the order of the
+    #    subnets the node is in
+    #  - a default route for every host via the first router on its subnet
+    #  - a static route on every router to every subnet it is not on, via the
+    #    next router on the shortest path (Dijkstra over the routers, every
+    #    subnet costs its cost, default 1, or its delay with metric='delay')
+
+    #an example spec is in examples/portfolio.yaml:
+    #   routers: [r1, r2]
+    #   hosts: [h1, h2]
+    #   subnets:
+    #     - {nodes: [h1, r1]}
+    #     - {nodes: [r1, r2], bw: 40, delay: 10ms, max_queue_size: 67}
+    #     - {nodes: [r2, h2]}
+'''
+
+import heapq
+import ipaddress
+import json
+import re
+
+
+LINK_PARAMS = ('bw', 'delay', 'max_queue_size', 'loss', 'jitter', 'use_htb')
+METRICS = ('hops', 'delay')
+
+
+class SpecError(ValueError):
+    pass
+
+
+def load_spec(path):
+    #a spec from a .json, .yaml or .yml file
+    with open(path) as f:
+        text = f.read()
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise SpecError('YAML specs need PyYAML (pip install pyyaml), or use JSON')
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def save_spec(spec, path):
+    with open(path, 'w') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            yaml.safe_dump(spec, f, sort_keys=False, default_flow_style=None)
+        else:
+            json.dump(spec, f, indent=2)
+
+
+def delay_ms(delay):
+    #'10ms', '1.5ms', '2s', '300us' or a number of ms
+    if delay is None:
+        return 0.0
+    if isinstance(delay, (int, float)):
+        return float(delay)
+    m = re.fullmatch(r'\s*([\d.]+)\s*(us|ms|s)?\s*', str(delay))
+    if not m:
+        raise SpecError(f'cannot read the delay {delay!r}')
+    value = float(m.group(1))
+    return value * {'us': 0.001, 'ms': 1.0, 's': 1000.0, None: 1.0}[m.group(2)]
+
+
+class Subnet:
+
+    def __init__(self, number, spec):
+        self.number = number
+        self.name = str(spec.get('name', number))
+        self.nodes = list(spec['nodes'])
+        self.switch = spec.get('switch')
+        self.prefix = ipaddress.ip_network(spec['prefix']) if spec.get('prefix') else None
+        self.params = {key: spec[key] for key in LINK_PARAMS if key in spec}
+        if 'max_queue_size' in self.params or 'bw' in self.params:
+            self.params.setdefault('use_htb', True)
+        self.cost = spec.get('cost', 1)
+        self.addresses = {}     # node -> ip_interface
+        self.interfaces = {}    # node -> interface name
+
+    def metric(self, metric):
+        if metric == 'delay':
+            #the delay of the path through the subnet, at least a little
+            return max(delay_ms(self.params.get('delay')), 0.001)
+        return self.cost
+
+
+class Topology:
+
+    def __init__(self, spec, metric='hops'):
+        if metric not in METRICS:
+            raise SpecError(f'unknown metric {metric}, expected one of {METRICS}')
+        self.name = spec.get('name', 'GeneratedTopology')
+        self.metric = metric
+        self.routers = list(spec.get('routers', []))
+        self.router_set = set(self.routers)
+        self.hosts = list(spec.get('hosts', []))
+        self.offload = spec.get('offload', False)
+        nodes = self.routers + self.hosts
+        if len(set(nodes)) != len(nodes):
+            raise SpecError('a node name is used twice')
+        self.subnets = [Subnet(i, s) for i, s in enumerate(spec.get('subnets', []))]
+        for subnet in self.subnets:
+            for node in subnet.nodes:
+                if node not in nodes:
+                    raise SpecError(f'subnet {subnet.name}: unknown node {node}')
+            if len(subnet.nodes) < 2:
+                raise SpecError(f'subnet {subnet.name} needs at least two nodes')
+            if len(set(subnet.nodes)) != len(subnet.nodes):
+                raise SpecError(f'subnet {subnet.name} has a node twice')
+        #node -> the subnets it is on, in order
+        self.member = {node: [] for node in nodes}
+        for subnet in self.subnets:
+            for node in subnet.nodes:
+                self.member[node].append(subnet)
+        self.adjacency = self.compute_adjacency()
+        addressing = spec.get('addressing', {})
+        self.assign_switches()
+        self.assign_addresses(ipaddress.ip_network(addressing.get('pool', '10.0.0.0/8')),
+                              addressing.get('prefixlen', 24))
+        self.assign_interfaces()
+        self.routes = self.compute_routes()
+        self.gateways = self.compute_gateways()
+
+    def is_router(self, node):
+        return node in self.router_set
+
+    def assign_switches(self):
+        used = {s.switch for s in self.subnets if s.switch}
+        number = 1
+        for subnet in self.subnets:
+            if subnet.switch or len(subnet.nodes) == 2:
+                continue
+            while f's{number}' in used:
+                number += 1
+            subnet.switch = f's{number}'
+            used.add(subnet.switch)
+
+    def assign_addresses(self, pool, prefixlen):
+        taken = [s.prefix for s in self.subnets if s.prefix]
+        free = (p for p in pool.subnets(new_prefix=prefixlen)
+                if not any(p.overlaps(t) for t in taken))
+        for subnet in self.subnets:
+            if subnet.prefix is None:
+                try:
+                    subnet.prefix = next(free)
+                except StopIteration:
+                    raise SpecError(f'the address pool {pool} is too small for {len(self.subnets)} subnets')
+            members = ([n for n in subnet.nodes if self.is_router(n)] +
+                       [n for n in subnet.nodes if not self.is_router(n)])
+            hosts = subnet.prefix.hosts()
+            for node in members:
+                try:
+                    address = next(hosts)
+                except StopIteration:
+                    raise SpecError(f'subnet {subnet.name} ({subnet.prefix}) is too small')
+                subnet.addresses[node] = ipaddress.ip_interface(f'{address}/{subnet.prefix.prefixlen}')
+
+    def assign_interfaces(self):
+        count = {}
+        for subnet in self.subnets:
+            for node in subnet.nodes:
+                number = count.get(node, 0)
+                subnet.interfaces[node] = f'{node}-eth{number}'
+                count[node] = number + 1
+
+    def subnets_of(self, node):
+        return self.member.get(node, [])
+
+    def address(self, node):
+        #the first address of a node, the one mininet shows for it
+        for subnet in self.subnets_of(node):
+            return subnet.addresses[node]
+        return None
+
+    def compute_adjacency(self):
+        #router -> [(cost, neighbour router, subnet number)] for every router
+        #on a subnet with it
+        adjacency = {router: [] for router in self.routers}
+        for subnet in self.subnets:
+            cost = subnet.metric(self.metric)
+            routers = [n for n in subnet.nodes if self.is_router(n)]
+            for router in routers:
+                for other in routers:
+                    if other != router:
+                        adjacency[router].append((cost, other, subnet.number))
+        return adjacency
+
+    def shortest_paths(self, source):
+        #Dijkstra from source over the routers. returns the distance to every
+        #router and the first hop (neighbour, subnet) on the way to it. ties are
+        #broken by name so the routes are the same on every run
+        dist = {source: 0}
+        first = {source: None}
+        heap = [(0, source, None)]
+        done = set()
+        while heap:
+            d, router, hop = heapq.heappop(heap)
+            if router in done:
+                continue
+            done.add(router)
+            first[router] = hop
+            for cost, other, number in self.adjacency[router]:
+                nd = d + cost
+                if other not in done and nd < dist.get(other, float('inf')):
+                    dist[other] = nd
+                    #the first hop is inherited, except from the source itself
+                    heapq.heappush(heap, (nd, other, hop or (other, number)))
+        return dist, first
+
+    def compute_routes(self):
+        #router -> [(prefix, via address, interface)], sorted by prefix
+        routes = {}
+        #the routers on every subnet
+        on_subnet = [[n for n in s.nodes if self.is_router(n)] for s in self.subnets]
+        for router in self.routers:
+            dist, first = self.shortest_paths(router)
+            attached = {s.number for s in self.subnets_of(router)}
+            table = []
+            for subnet in self.subnets:
+                if subnet.number in attached:
+                    continue
+                #the closest router on the subnet
+                candidates = [(dist[n], n) for n in on_subnet[subnet.number] if n in dist]
+                if not candidates:
+                    continue
+                distance, target = min(candidates)
+                neighbour, via_subnet = first[target]
+                via = self.subnets[via_subnet]
+                table.append((subnet.prefix, via.addresses[neighbour].ip, via.interfaces[router]))
+            routes[router] = sorted(table, key=lambda r: (int(r[0].network_address), r[0].prefixlen))
+        return routes
+
+    def compute_gateways(self):
+        #host -> (gateway address, interface) through the first router next to it
+        gateways = {}
+        for host in self.hosts:
+            for subnet in self.subnets_of(host):
+                routers = [n for n in subnet.nodes if self.is_router(n)]
+                if routers:
+                    gateways[host] = (subnet.addresses[routers[0]].ip, subnet.interfaces[host])
+                    break
+        return gateways
+
+    def route_commands(self):
+        #node -> the ip route commands for it
+        commands = {}
+        for router, table in self.routes.items():
+            commands[router] = [f'ip route add {prefix} via {via} dev {dev}' for prefix, via, dev in table]
+        return commands
+
+    def interfaces(self):
+        #(node, interface name) of every interface, in the order of the subnets
+        return [(node, subnet.interfaces[node]) for subnet in self.subnets for node in subnet.nodes]
+
+    def summary(self):
+        links = sum(len(s.nodes) if s.switch else 1 for s in self.subnets)
+        routes = sum(len(t) for t in self.routes.values())
+        return (f'{self.name}: {len(self.routers)} routers, {len(self.hosts)} hosts, '
+                f'{len(self.subnets)} subnets, {links} links, {routes} static routes')
+
+
+def random_spec(routers, chords=None, hosts_per_router=1, seed=1, bw=100, delay='1ms'):
+    '''
+    a spec for scale tests: routers in a ring, chords extra links between
+    random routers, and hosts_per_router hosts on a switch at every router
+    '''
+    import random
+    rng = random.Random(seed)
+    names = [f'r{i + 1}' for i in range(routers)]
+    hosts = []
+    subnets = []
+    for i, router in enumerate(names):
+        lan = [f'h{i + 1}' if hosts_per_router == 1 else f'h{i + 1}x{j + 1}' for j in range(hosts_per_router)]
+        hosts.extend(lan)
+        if lan:
+            subnets.append({'name': f'lan{i + 1}', 'nodes': lan + [router]})
+    links = set()
+    if routers > 1:
+        for i in range(routers):
+            links.add(tuple(sorted((i, (i + 1) % routers))))
+    if chords is None:
+        chords = routers // 2
+    tries = 0
+    while chords > 0 and tries < 100 * routers and routers > 3:
+        tries += 1
+        a, b = rng.sample(range(routers), 2)
+        link = tuple(sorted((a, b)))
+        if link not in links:
+            links.add(link)
+            chords -= 1
+    for a, b in sorted(links):
+        subnets.append({'name': f'{names[a]}-{names[b]}', 'nodes': [names[a], names[b]],
+                        'bw': bw, 'delay': delay})
+    return {
+        'name': f'Random{routers}',
+        'addressing': {'pool': '10.0.0.0/8', 'prefixlen': 24},
+        'routers': names,
+        'hosts': hosts,
+        'subnets': subnets,
+    }
@@ -0,0 +1,185 @@
+'''
+    #file transfer over the reliable UDP transport in engine.py
+
+    #run the server (receiver) first with:
+    #   python3 application.py -s -i 10.0.7.2 -p 8088 -o received.jpg
+    #and then the client (sender) with:
+    #   python3 application.py -c -i 10.0.7.2 -p 8088 -f photo.jpg -w 16 -m sr
+
+    #with congestion control (reno, cubic or bbr) -w is the largest window, and
+    #--log writes cwnd/ssthresh/rtt for every ack to a csv file:
+    #   python3 application.py -c -i 10.0.7.2 -f photo.jpg -w 256 -m sr --cc cubic --log cubic.csv
+
+    #the retransmission timeout follows the RTT, -t is only the first value.
+    #--timestamps asks the server for the header with a timestamp field
+    #(version 2), so every ack gives an RTT sample. --checksum asks for the
+    #header with timestamps and a CRC32 (version 3), so packets corrupted on
+    #the way are dropped. a server -w above 65535 is sent with a window scale.
+
+    #--pace spreads the packets over the RTT (or sends at --pace-rate Mbit/s)
+    #and sends the packets of one tick with one system call. with --bottleneck
+    #and --queue-size (e.g. 20 and 33 for r3-r4) it also reports how many drops
+    #a drop-tail queue would have had with and without pacing:
+    #   python3 application.py -c -i 10.0.7.2 -f photo.jpg -w 256 --cc reno --pace --bottleneck 20 --queue-size 33
+
+    #--metrics shows the packets, retransmissions, cwnd, RTO and RTT while the
+    #file is on its way, for Prometheus or curl, --snapshot writes them to a
+    #file every --snapshot-interval seconds and --profile samples the stacks
+    #of the transfer for a flame graph (see metrics/):
+    #   python3 application.py -c -i 10.0.7.2 -f photo.jpg -w 64 --cc cubic --metrics :9100 --snapshot cubic.jsonl
+'''
+
+import argparse
+import csv
+import os
+import sys
+from socket import *
+
+import congestion
+import engine
+import files
+import pacing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'metrics'))
+import exporter
+from registry import Registry
+
+
+def check_port(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if not 1024 <= value <= 65535:
+        raise argparse.ArgumentTypeError('the port must be in the range [1024, 65535]')
+    return value
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def print_statistics(title, stats):
+    print(f'\n{title}')
+    for key, value in stats.items():
+        if isinstance(value, float):
+            print(f'  {key:18s} {value:.3f}')
+        else:
+            print(f'  {key:18s} {value}')
+
+
+def server(args):
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.bind((args.ip, args.port))
+    print(f'The server is ready to receive on {args.ip}:{args.port}')
+    #every packet is written at its offset in the file as soon as it arrives
+    registry = Registry()
+    metrics = exporter.start(args, registry)
+    with files.FileWriter(args.output) as f:
+        syn = engine.accept(sock)
+        receiver = engine.Receiver(sock.send, window=args.window, mode=args.mode, write_at=f.write_at,
+                                   metrics=registry)
+        receiver.on_packet(syn, engine.time.monotonic())
+        try:
+            stats = engine.run(receiver, sock)
+        finally:
+            metrics.close()
+        stats.update(f.statistics())
+    sock.close()
+    print_statistics('receiver', stats)
+
+
+def client(args):
+    #the file is mapped into memory, not read
+    with files.MappedFile(args.file) as data:
+        send_file(args, data)
+
+
+def send_file(args, data):
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.connect((args.ip, args.port))
+    cc = None if args.cc == 'none' else congestion.create(args.cc, max_window=args.window)
+    version = 3 if args.checksum else 2 if args.timestamps else 1
+    pacer = send_batch = None
+    #bbr sends at its pacing rate, without a pacer it sends cwnd in bursts
+    if args.pace or (cc is not None and cc.paced):
+        packet_size = engine.header_sizes[version] + engine.DATA_SIZE
+        rate = pacing.mbit_to_packets(args.pace_rate, packet_size) if args.pace_rate else None
+        bottleneck = pacing.mbit_to_packets(args.bottleneck, packet_size) if args.bottleneck else None
+        pacer = pacing.Pacer(rate, bottleneck=bottleneck, queue_size=args.queue_size)
+        send_batch = pacing.batch_sender(sock)
+    registry = Registry()
+    sender = engine.Sender(sock.send, data, args.window, args.mode, args.timeout, cc, trace=bool(args.log),
+                           version=version, adaptive=not args.fixed_timeout,
+                           pacer=pacer, send_batch=send_batch, metrics=registry)
+    metrics = exporter.start(args, registry)
+    try:
+        stats = engine.run(sender, sock)
+    finally:
+        metrics.close()
+    #let go of the memoryview so the map can be closed
+    sender.data.release()
+    sock.close()
+    print_statistics('sender', stats)
+    if args.log:
+        write_trace(args.log, sender.trace)
+
+
+def write_trace(filename, trace):
+    #one row per ack: the queueing delay is rtt minus the smallest rtt
+    samples = [row[3] for row in trace if row[3] is not None]
+    min_rtt = min(samples) if samples else 0.0
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'cwnd', 'ssthresh', 'rtt', 'queueing_delay', 'rto', 'in_flight'])
+        for now, cwnd, ssthresh, rtt, rto, in_flight in trace:
+            delay = '' if rtt is None else f'{rtt - min_rtt:.6f}'
+            writer.writerow([f'{now:.6f}', f'{cwnd:.2f}', f'{ssthresh:.2f}', '' if rtt is None else f'{rtt:.6f}',
+                             delay, f'{rto:.6f}', in_flight])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='reliable file transfer over UDP', epilog='end of help')
+    parser.add_argument('-s', '--server', action='store_true', help='run as the receiver')
+    parser.add_argument('-c', '--client', action='store_true', help='run as the sender')
+    parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=check_port, default=8088)
+    parser.add_argument('-f', '--file', type=str, help='file to send (client)')
+    parser.add_argument('-o', '--output', type=str, default='received', help='where to store the file (server)')
+    parser.add_argument('-w', '--window', type=check_positive, default=5, help='window size in packets')
+    parser.add_argument('-m', '--mode', choices=engine.MODES, default='gbn')
+    parser.add_argument('--cc', choices=('none',) + tuple(congestion.ALGORITHMS), default='none',
+                        help='congestion control, none keeps a fixed window')
+    parser.add_argument('--log', type=str, help='csv file for cwnd/ssthresh/rtt per ack (client)')
+    parser.add_argument('-t', '--timeout', type=float, default=0.5, help='first retransmission timeout in seconds')
+    parser.add_argument('--fixed-timeout', action='store_true', help='do not adapt the timeout to the RTT')
+    parser.add_argument('--timestamps', action='store_true', help='use the header with timestamps (client)')
+    parser.add_argument('--checksum', action='store_true', help='use the header with timestamps and a CRC32 (client)')
+    parser.add_argument('--pace', action='store_true', help='pace the packets instead of sending bursts (client)')
+    parser.add_argument('--pace-rate', type=float, help='fixed pacing rate in Mbit/s, default follows cwnd/rtt')
+    parser.add_argument('--bottleneck', type=float, help='bottleneck rate in Mbit/s for the drop estimate')
+    parser.add_argument('--queue-size', type=check_positive, help='bottleneck queue in packets for the drop estimate')
+    exporter.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.server == args.client:
+        print('you must run either the server (-s) or the client (-c)')
+        sys.exit()
+    if args.client and not args.file:
+        print('the client needs a file to send (-f)')
+        sys.exit()
+
+    if args.server:
+        server(args)
+    else:
+        client(args)
+
+
+if __name__ == '__main__':
+    main()
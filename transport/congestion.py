@@ -0,0 +1,239 @@
+'''
+    #congestion control algorithms for the Sender in engine.py
+
+    #every algorithm keeps a congestion window (cwnd) and a slow start threshold
+    #(ssthresh), both counted in packets. the Sender calls:
+    #   on_ack(acked, rtt, now, in_flight)  when acked new packets arrive
+    #                                       (rtt is None if there is no sample)
+    #   on_loss(now)                        on a loss found by duplicate acks or
+    #                                       by the timer of a single packet
+    #   on_timeout(now)                     when the whole window timed out
+    #and sends at most window() packets at a time.
+
+    #  reno:  slow start and AIMD (additive increase, multiplicative decrease)
+    #  cubic: the window grows as a cubic function of the time since the last loss
+    #  bbr:   a simple BBR: estimates the bottleneck bandwidth and the minimum RTT,
+    #         and keeps about one bandwidth-delay product in flight. it only
+    #         limits cwnd, the rate comes from a Pacer (pacing.py): paced is
+    #         True, and the programs always give it one
+'''
+
+import math
+
+
+class CongestionControl:
+    '''base class: a fixed window that never changes'''
+
+    name = 'fixed'
+    # True if the algorithm needs a Pacer, without one it sends cwnd in bursts
+    paced = False
+
+    def __init__(self, initial_window=1, max_window=10000):
+        self.cwnd = float(initial_window)
+        self.ssthresh = float('inf')
+        self.max_window = max_window
+
+    def window(self):
+        return max(1, min(int(self.cwnd), self.max_window))
+
+    def pacing_rate(self):
+        #packets per second, or None if the algorithm does not pace
+        return None
+
+    def on_ack(self, acked, rtt, now, in_flight):
+        pass
+
+    def on_loss(self, now):
+        pass
+
+    def on_timeout(self, now):
+        pass
+
+
+class Reno(CongestionControl):
+
+    name = 'reno'
+
+    def on_ack(self, acked, rtt, now, in_flight):
+        for _ in range(acked):
+            if self.cwnd < self.ssthresh:
+                #slow start: +1 for every ack, the window doubles every RTT
+                self.cwnd += 1
+            else:
+                #congestion avoidance: +1 every RTT
+                self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    def on_loss(self, now):
+        #multiplicative decrease
+        self.ssthresh = max(self.cwnd / 2, 2)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        self.ssthresh = max(self.cwnd / 2, 2)
+        self.cwnd = 1.0
+
+
+class Cubic(CongestionControl):
+    '''CUBIC as in RFC 8312, with the TCP friendly region'''
+
+    name = 'cubic'
+
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, initial_window=1, max_window=10000):
+        super().__init__(initial_window, max_window)
+        self.w_max = 0.0
+        self.epoch_start = None
+        self.k = 0.0
+        self.origin = 0.0
+        self.min_rtt = None
+
+    def on_ack(self, acked, rtt, now, in_flight):
+        if rtt is not None:
+            self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        for _ in range(acked):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+                continue
+            if self.epoch_start is None:
+                self.epoch_start = now
+                if self.cwnd < self.w_max:
+                    self.k = ((self.w_max - self.cwnd) / self.C) ** (1 / 3)
+                    self.origin = self.w_max
+                else:
+                    self.k = 0.0
+                    self.origin = self.cwnd
+            rtt_estimate = self.min_rtt or 0.1
+            t = now - self.epoch_start + rtt_estimate
+            target = self.origin + self.C * (t - self.k) ** 3
+            #the window standard AIMD would have reached by now
+            friendly = self.w_max * self.BETA + 3 * (1 - self.BETA) / (1 + self.BETA) * t / rtt_estimate
+            if target > self.cwnd:
+                self.cwnd += (target - self.cwnd) / self.cwnd
+            else:
+                self.cwnd += 0.01 / self.cwnd
+            if friendly > self.cwnd:
+                self.cwnd += (friendly - self.cwnd) / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    def on_loss(self, now):
+        self.epoch_start = None
+        if self.cwnd < self.w_max:
+            #fast convergence: release bandwidth to new flows
+            self.w_max = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = self.cwnd
+        self.ssthresh = max(self.cwnd * self.BETA, 2)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        self.on_loss(now)
+        self.cwnd = 1.0
+
+
+class BbrLite(CongestionControl):
+    '''
+    a simple, delay-based BBR. it does not react to single losses, but keeps
+    cwnd at gain * bottleneck bandwidth * minimum RTT
+    '''
+
+    name = 'bbr'
+    paced = True
+
+    STARTUP_GAIN = 2 / math.log(2)
+    PROBE_GAINS = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+    BW_ROUNDS = 10          # max filter of the bandwidth over 10 rounds
+    MIN_RTT_WINDOW = 10.0   # seconds
+
+    def __init__(self, initial_window=4, max_window=10000):
+        super().__init__(max(initial_window, 4), max_window)
+        self.state = 'startup'
+        self.pacing_gain = self.STARTUP_GAIN
+        self.cwnd_gain = self.STARTUP_GAIN
+        self.bw_samples = []        # packets per second, one per round
+        self.min_rtt = None
+        self.min_rtt_time = 0.0
+        self.round_start = None
+        self.round_delivered = 0
+        self.full_bw = 0.0
+        self.full_bw_rounds = 0
+        self.cycle = 0
+
+    def btl_bw(self):
+        return max(self.bw_samples) if self.bw_samples else 0.0
+
+    def bdp(self):
+        if self.min_rtt is None:
+            return 0.0
+        return self.btl_bw() * self.min_rtt
+
+    def pacing_rate(self):
+        bw = self.btl_bw()
+        return self.pacing_gain * bw if bw else None
+
+    def end_round(self, now):
+        elapsed = now - self.round_start
+        if elapsed > 0:
+            self.bw_samples.append(self.round_delivered / elapsed)
+            del self.bw_samples[:-self.BW_ROUNDS]
+        self.round_start = now
+        self.round_delivered = 0
+
+        if self.state == 'startup':
+            #the pipe is full when the bandwidth stops growing by 25% for 3 rounds
+            bw = self.btl_bw()
+            if bw >= self.full_bw * 1.25:
+                self.full_bw = bw
+                self.full_bw_rounds = 0
+            else:
+                self.full_bw_rounds += 1
+                if self.full_bw_rounds >= 3:
+                    self.state = 'drain'
+                    self.pacing_gain = 1 / self.STARTUP_GAIN
+                    self.cwnd_gain = self.STARTUP_GAIN
+        elif self.state == 'probe_bw':
+            self.cycle = (self.cycle + 1) % len(self.PROBE_GAINS)
+            self.pacing_gain = self.PROBE_GAINS[self.cycle]
+
+    def on_ack(self, acked, rtt, now, in_flight):
+        if rtt is not None and (self.min_rtt is None or rtt <= self.min_rtt
+                                or now - self.min_rtt_time > self.MIN_RTT_WINDOW):
+            self.min_rtt = rtt
+            self.min_rtt_time = now
+        if self.round_start is None:
+            self.round_start = now
+        self.round_delivered += acked
+        if self.min_rtt is not None and now - self.round_start >= self.min_rtt:
+            self.end_round(now)
+
+        if self.state == 'drain' and in_flight <= self.bdp():
+            self.state = 'probe_bw'
+            self.cwnd_gain = 2
+            self.cycle = 0
+            self.pacing_gain = self.PROBE_GAINS[0]
+
+        target = self.cwnd_gain * self.bdp()
+        if self.state == 'startup' or target == 0:
+            self.cwnd += acked
+        else:
+            self.cwnd = min(self.cwnd + acked, target)
+        self.cwnd = min(max(self.cwnd, 4), self.max_window)
+        self.ssthresh = self.bdp() or float('inf')
+
+    def on_timeout(self, now):
+        #keep the model, but start again from a small window
+        self.cwnd = 4.0
+
+
+ALGORITHMS = {cls.name: cls for cls in (Reno, Cubic, BbrLite)}
+
+
+def create(name, initial_window=1, max_window=10000):
+    '''returns a new congestion controller by name (see ALGORITHMS)'''
+    try:
+        cls = ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f'unknown congestion control {name}, expected one of {tuple(ALGORITHMS)}')
+    return cls(initial_window, max_window)
@@ -0,0 +1,700 @@
+'''
+    #A reliable transport on top of UDP that uses the header format from
+    #header.py (sequence number, acknowledgement number, flags, receiver window).
+
+    #the sender opens a connection with a three way handshake (SYN, SYN-ACK, ACK),
+    #sends the data in packets of 1460 bytes with a sliding window, and closes
+    #the connection with FIN (FIN, FIN-ACK). two modes are supported:
+    #  gbn: Go-Back-N, cumulative acks and one timer, on a timeout the whole
+    #       window is sent again
+    #  sr:  Selective Repeat, every packet is acked on its own and has its own
+    #       timer, the receiver keeps out-of-order packets in a reassembly buffer
+
+    #the retransmission timeout (RTO) follows the measured RTT (see rtt.py). the
+    #SYN is always sent with the 12 byte header and asks for a header version
+    #and a window scale (see codec.py); version 1 is the default, so a sender
+    #or receiver that only knows the 12 byte header still works.
+    #  version 2: every packet carries a timestamp that the receiver echoes, so
+    #             the sender gets an RTT sample from every ack, also for
+    #             retransmissions
+    #  version 3: a CRC32 as well, corrupted packets (e.g. netem corrupt) are
+    #             dropped and counted instead of delivered
+
+    #with a Pacer (see pacing.py) the sender spreads its packets over the RTT
+    #instead of sending a window back-to-back, and hands the packets of one
+    #tick to send_batch together.
+
+    #Sender and Receiver do not touch sockets or clocks themselves: they get a
+    #send function, and the current time is passed to start(), on_packet() and
+    #on_timer(). run() drives an endpoint over a real UDP socket.
+
+    #with a metrics registry (metrics/registry.py) an endpoint shows its
+    #counters, cwnd, RTO and RTT there (see export_metrics()). the counters
+    #are the ones it keeps anyway, they are read when the metrics are read,
+    #so the only extra work per packet is the RTT histogram.
+'''
+
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'header'))
+
+from codec import (HEADER_SIZE, DATA_SIZE, MAX_PACKET_SIZE, SYN, ACK, FIN,
+                   PacketPool, header_sizes, syn_options_struct,
+                   parse_header_from, parse_timestamps_from, timestamp, timestamp_age,
+                   verify_checksum, window_scale)
+from rtt import RttEstimator, TimerWheel
+
+
+MODES = ('gbn', 'sr')
+VERSIONS = tuple(header_sizes)
+
+
+def syn_options(version, wscale=0):
+    return syn_options_struct.pack(version, wscale)
+
+
+def parse_syn_options(packet):
+    #(version, window scale) in the payload of a SYN or SYN-ACK. without
+    #options it is (1, 0), an old peer may only send the version. a version
+    #this side does not know is taken as 1, which every peer understands
+    size = len(packet) - HEADER_SIZE
+    if size >= syn_options_struct.size:
+        version, wscale = syn_options_struct.unpack_from(packet, HEADER_SIZE)
+    elif size >= 1:
+        version, wscale = packet[HEADER_SIZE], 0
+    else:
+        return 1, 0
+    return (version if version in VERSIONS else 1), wscale
+
+
+class Sender:
+    '''
+    sends data (bytes, bytearray, mmap or anything that supports memoryview)
+    to a Receiver. sequence numbers count packets: the SYN has sequence
+    number 0, the first data packet 1 and the FIN the one after the last
+    data packet.
+
+    window is the largest number of packets in flight. with a congestion
+    controller (cc, see congestion.py) the sender keeps at most cc.window()
+    packets in flight, and never more than window.
+
+    timeout is the first RTO. with adaptive=False it never changes.
+
+    pacer (see pacing.py) spaces out new packets. send_batch(packets), if
+    given, gets the packets of one call to start(), on_packet() or on_timer()
+    at once instead of one send() per packet.
+
+    metrics is a registry (see metrics/registry.py) the sender shows its
+    statistics in, with labels to tell several senders apart.
+    '''
+
+    DUPACK_THRESHOLD = 3
+    #every byte is acked once the FIN is sent: if the FIN-ACK does not come
+    #after this many tries the receiver has already gone (its linger is over)
+    FIN_RETRIES = 5
+
+    def __init__(self, send, data, window=5, mode='gbn', timeout=0.5, cc=None, trace=False,
+                 version=1, adaptive=True, pacer=None, send_batch=None, metrics=None, labels=None):
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode}, expected one of {MODES}')
+        if version not in VERSIONS:
+            raise ValueError(f'unknown header version {version}, expected one of {VERSIONS}')
+        self.send = send
+        self.data = memoryview(data).cast('B')
+        self.total = (len(self.data) + DATA_SIZE - 1) // DATA_SIZE
+        self.window = window
+        self.peer_window = window
+        self.mode = mode
+        self.timeout = timeout
+        self.cc = cc
+        self.rtt = RttEstimator(timeout) if adaptive else None
+        #the version we ask for in the SYN, and the one the receiver picked
+        self.max_version = version
+        self.version = 1
+        self.peer_wscale = 0
+        self.pool = PacketPool(window)
+        self.slot = 0
+        self.pacer = pacer
+        self.pace_timer = None
+        self.send_batch = send_batch
+        self.batch = [] if send_batch is not None else None
+
+        self.state = 'closed'
+        self.done = False
+        self.base = 1           # oldest packet that is not acked
+        self.next_seq = 1       # next packet to send
+        self.highest_sent = 0   # packets up to here have been sent at least once
+        self.acked = set()      # sr: acked packets above base
+        self.sent_at = {}       # packets in flight -> time of the last send
+        self.retransmitted = set()
+        self.timers = TimerWheel()  # sr: one timer per packet in flight
+        self.timer = None       # handshake, FIN and gbn timer
+        self.dupacks = 0
+        self.recovery = 0       # no new window reduction before this packet is acked
+        self.backoff_until = 0.0    # sr: no new backoff before this time
+        self.fin_time = None    # when the FIN was first sent
+        self.fin_retries = 0
+
+        self.packets_sent = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.corrupted = 0
+        self.start_time = None
+        self.end_time = None
+        #(time, cwnd, ssthresh, rtt sample, rto, packets in flight) for every ack
+        self.trace = [] if trace else None
+        #every RTT sample, with metrics
+        self.rtt_histogram = None
+        if metrics is not None:
+            export_metrics(metrics, self, labels)
+
+    @property
+    def rto(self):
+        return self.timeout if self.rtt is None else self.rtt.rto
+
+    def chunk(self, seq):
+        offset = (seq - 1) * DATA_SIZE
+        return self.data[offset:offset + DATA_SIZE]
+
+    def transmit(self, seq, flags=0, data=b'', now=0.0):
+        extra = (timestamp(now), 0) if self.version >= 2 else ()
+        #slots are used in turn, a batch never holds two packets of one slot
+        self.slot = (self.slot + 1) % len(self.pool)
+        packet = self.pool.pack(self.slot, seq, 0, flags, 0, data, extra)
+        self.packets_sent += 1
+        if self.batch is None:
+            self.send(packet)
+            return
+        self.batch.append(packet)
+        if len(self.batch) >= len(self.pool):
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.send_batch(self.batch)
+            self.batch = []
+
+    def send_data(self, seq, now):
+        self.transmit(seq, 0, self.chunk(seq), now)
+        if seq <= self.highest_sent:
+            self.retransmissions += 1
+            self.retransmitted.add(seq)
+        else:
+            self.highest_sent = seq
+        self.sent_at[seq] = now
+        if self.mode == 'sr':
+            self.timers.schedule(seq, now + self.rto)
+
+    def start(self, now):
+        self.state = 'syn_sent'
+        self.start_time = now
+        self.transmit(0, SYN, syn_options(self.max_version))
+        self.timer = now + self.rto
+        self.flush()
+
+    def in_flight(self):
+        return self.next_seq - self.base
+
+    def send_window(self):
+        window = self.window if self.cc is None else min(self.window, self.cc.window())
+        return min(window, self.peer_window)
+
+    def fill(self, now):
+        #sends packets while there is room in the window
+        while self.next_seq <= self.total and self.in_flight() < self.send_window():
+            if self.pacer is not None and not self.pacer.allow(self, self.next_seq, now):
+                #wait for the next tick of the pacer
+                self.pace_timer = self.pacer.next_time(now)
+                break
+            self.send_data(self.next_seq, now)
+            self.next_seq += 1
+        if self.mode == 'gbn' and self.timer is None and self.sent_at:
+            self.timer = now + self.rto
+        if self.base > self.total and self.state == 'established':
+            self.state = 'fin_sent'
+            self.fin_time = now
+            self.transmit(self.total + 1, FIN, b'', now)
+            self.timer = now + self.rto
+
+    def on_packet(self, packet, now):
+        self.handle_packet(packet, now)
+        self.flush()
+
+    def handle_packet(self, packet, now):
+        seq, ack, flags, win = parse_header_from(packet)
+        if self.state == 'syn_sent':
+            if flags & SYN and flags & ACK:
+                self.state = 'established'
+                self.peer_window = win or self.window
+                self.timer = None
+                version, self.peer_wscale = parse_syn_options(packet)
+                #not more than the SYN asked for
+                version = min(version, self.max_version)
+                if version != self.version:
+                    self.version = version
+                    self.pool = PacketPool(self.window, version=version)
+                if self.rtt is not None and self.retransmissions == 0:
+                    self.rtt.sample(now - self.start_time)
+                    if self.rtt_histogram is not None:
+                        self.rtt_histogram.observe(now - self.start_time)
+                self.transmit(0, ACK, b'', now)
+                self.fill(now)
+            return
+        if flags & SYN:
+            if self.state == 'established':
+                #our ACK for the SYN-ACK was lost
+                self.transmit(0, ACK, b'', now)
+            return
+        if self.version >= 3 and not verify_checksum(packet, self.version):
+            self.corrupted += 1
+            return
+        if self.state == 'established':
+            if flags & ACK:
+                #the window in the SYN-ACK is not scaled, in every ack after it it is
+                self.peer_window = (win << self.peer_wscale) or self.peer_window
+                echo = None
+                if self.version >= 2 and len(packet) >= header_sizes[2]:
+                    echo = parse_timestamps_from(packet)[1] or None
+                self.on_ack(ack, now, echo)
+        elif self.state == 'fin_sent':
+            if flags & FIN and flags & ACK:
+                self.state = 'closed'
+                self.timer = None
+                self.end_time = now
+                self.done = True
+
+    def rtt_sample(self, seq, now, echo):
+        sent = self.sent_at.pop(seq, None)
+        if self.mode == 'sr':
+            self.timers.cancel(seq)
+        if echo is not None:
+            #the echoed timestamp tells which transmission was acked
+            self.retransmitted.discard(seq)
+            return timestamp_age(now, echo)
+        #Karn: no sample from a packet that was sent more than once
+        if sent is None or seq in self.retransmitted:
+            self.retransmitted.discard(seq)
+            return None
+        return now - sent
+
+    def on_ack(self, ack, now, echo=None):
+        rtt = None
+        base = self.base
+        if self.mode == 'gbn':
+            #cumulative: everything up to and including ack has arrived
+            if ack < self.base:
+                if ack == self.base - 1:
+                    self.on_dupack(now)
+                return
+            rtt = self.rtt_sample(ack, now, echo)
+            for seq in range(self.base, ack):
+                self.sent_at.pop(seq, None)
+                self.retransmitted.discard(seq)
+            acked = ack + 1 - self.base
+            self.base = ack + 1
+            #packets sent before a go back can still be acked
+            self.next_seq = max(self.next_seq, self.base)
+            self.dupacks = 0
+        else:
+            #selective: only this packet has arrived
+            if ack < self.base or ack > self.highest_sent or ack in self.acked:
+                return
+            rtt = self.rtt_sample(ack, now, echo)
+            self.acked.add(ack)
+            acked = 1
+            while self.base in self.acked:
+                self.acked.remove(self.base)
+                self.base += 1
+            self.next_seq = max(self.next_seq, self.base)
+        if self.rtt is not None:
+            if rtt is not None:
+                self.rtt.sample(rtt)
+            elif self.base > base:
+                self.rtt.on_new_ack()
+        if rtt is not None and self.rtt_histogram is not None:
+            self.rtt_histogram.observe(rtt)
+        if self.mode == 'gbn':
+            self.timer = now + self.rto if self.sent_at else None
+        if self.cc is not None:
+            self.cc.on_ack(acked, rtt, now, self.in_flight())
+        if self.trace is not None:
+            self.record(now, rtt)
+        self.fill(now)
+
+    def on_dupack(self, now):
+        #gbn: the same cumulative ack again, a packet after it is missing
+        self.dupacks += 1
+        if self.dupacks == self.DUPACK_THRESHOLD and self.base < self.next_seq:
+            #fast retransmit
+            self.send_data(self.base, now)
+            if self.cc is not None and self.base >= self.recovery:
+                self.cc.on_loss(now)
+                self.recovery = self.next_seq
+
+    def record(self, now, rtt):
+        cwnd = self.cc.cwnd if self.cc is not None else self.window
+        ssthresh = self.cc.ssthresh if self.cc is not None else float('inf')
+        self.trace.append((now - self.start_time, cwnd, ssthresh, rtt, self.rto, self.in_flight()))
+
+    def retransmission_deadline(self):
+        if self.mode == 'sr' and self.state == 'established':
+            return self.timers.next_deadline()
+        return self.timer
+
+    def next_deadline(self):
+        deadline = self.retransmission_deadline()
+        if self.pace_timer is not None and (deadline is None or self.pace_timer < deadline):
+            return self.pace_timer
+        return deadline
+
+    def on_timer(self, now):
+        if self.pace_timer is not None and self.pace_timer <= now:
+            self.pace_timer = None
+            if self.state == 'established':
+                self.fill(now)
+        deadline = self.retransmission_deadline()
+        if deadline is not None and deadline <= now:
+            self.on_retransmission_timer(now)
+        self.flush()
+
+    def on_retransmission_timer(self, now):
+        self.timeouts += 1
+        if self.state == 'syn_sent':
+            self.backoff()
+            self.transmit(0, SYN, syn_options(self.max_version))
+            self.retransmissions += 1
+            self.timer = now + self.rto
+        elif self.state == 'fin_sent':
+            if self.fin_retries >= self.FIN_RETRIES:
+                self.state = 'closed'
+                self.timer = None
+                self.end_time = self.fin_time
+                self.done = True
+                return
+            self.fin_retries += 1
+            self.backoff()
+            self.transmit(self.total + 1, FIN, b'', now)
+            self.retransmissions += 1
+            self.timer = now + self.rto
+        elif self.mode == 'gbn':
+            #go back n: everything after base is sent again, as the window allows
+            self.backoff()
+            if self.cc is not None:
+                self.cc.on_timeout(now)
+            self.recovery = self.next_seq
+            self.sent_at.clear()
+            self.next_seq = self.base
+            self.dupacks = 0
+            self.timer = None
+            self.fill(now)
+        else:
+            #selective repeat: only the packets whose timer has expired
+            expired = self.timers.expire(now)
+            if not expired:
+                return
+            #every packet has its own timer, so only back off when a
+            #retransmission is lost again, and at most once per RTO
+            if now >= self.backoff_until and any(seq in self.retransmitted for seq in expired):
+                self.backoff()
+                self.backoff_until = now + self.rto
+            if self.cc is not None and max(expired) >= self.recovery:
+                if len(self.timers) == 0:
+                    self.cc.on_timeout(now)
+                else:
+                    self.cc.on_loss(now)
+                self.recovery = self.next_seq
+            for seq in expired:
+                self.send_data(seq, now)
+
+    def backoff(self):
+        if self.rtt is not None:
+            self.rtt.on_timeout()
+
+    def statistics(self, now=None):
+        #now is the time of an unfinished transfer, by default the clock of run()
+        end = self.end_time if self.end_time is not None else now if now is not None else time.monotonic()
+        elapsed = end - self.start_time
+        size = len(self.data)
+        stats = {
+            'bytes': size,
+            'packets': self.total,
+            'packets_sent': self.packets_sent,
+            'retransmissions': self.retransmissions,
+            'timeouts': self.timeouts,
+            'elapsed': elapsed,
+            'throughput_mbps': size * 8 / elapsed / 1e6 if elapsed > 0 else 0.0,
+            'header_version': self.version,
+            'corrupted': self.corrupted,
+        }
+        if self.rtt is not None and self.rtt.srtt is not None:
+            stats['srtt'] = self.rtt.srtt
+            stats['rttvar'] = self.rtt.rttvar
+        stats['rto'] = self.rto
+        if self.cc is not None:
+            stats['cc'] = self.cc.name
+            stats['cwnd'] = self.cc.cwnd
+            stats['ssthresh'] = self.cc.ssthresh
+        if self.pacer is not None:
+            stats.update(self.pacer.statistics())
+        return stats
+
+
+class Receiver:
+    '''
+    receives data from a Sender and hands it in order to deliver(data).
+    deliver must use (or copy) the data before it returns, the memory is
+    reused for the next packet. version is the highest header version the
+    receiver accepts. window can be larger than the 16 bit win field, it is
+    then advertised with a window scale.
+
+    with write_at(seq, data) instead of deliver every new packet is handed
+    over as soon as it arrives, in sr mode also out of order, and the
+    receiver only keeps the sequence numbers of the packets it has (see
+    files.FileWriter).
+
+    metrics is a registry (see metrics/registry.py) the receiver shows its
+    statistics in, like the Sender.
+    '''
+
+    def __init__(self, send, deliver=None, window=5, mode='gbn', linger=1.0, version=max(VERSIONS),
+                 write_at=None, metrics=None, labels=None):
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode}, expected one of {MODES}')
+        if (deliver is None) == (write_at is None):
+            raise ValueError('a Receiver needs either deliver or write_at')
+        self.send = send
+        self.deliver = deliver
+        self.write_at = write_at
+        self.window = window
+        self.mode = mode
+        self.linger = linger
+        self.max_version = version
+        self.version = 1
+        self.header_size = HEADER_SIZE
+        self.wscale = 0
+        self.pool = PacketPool(1)
+
+        self.state = 'listen'
+        self.done = False
+        self.expected = 1       # next in-order packet
+        self.buffer = {}        # sr: out-of-order packets, seq -> data (or its length with write_at)
+        self.timer = None
+        self.echo = 0           # timestamp of the last packet, sent back in the acks
+
+        self.bytes_received = 0
+        self.packets_received = 0
+        self.duplicates = 0
+        self.corrupted = 0
+        self.start_time = None
+        self.end_time = None
+        if metrics is not None:
+            export_metrics(metrics, self, labels)
+
+    def reply(self, ack, flags, now, data=b''):
+        extra = (timestamp(now), self.echo) if self.version >= 2 else ()
+        if flags & SYN:
+            win = min(self.window, 0xffff)
+        else:
+            win = min(self.window >> self.wscale, 0xffff)
+        self.send(self.pool.pack(0, 0, ack, flags, win, data, extra))
+
+    def start(self, now):
+        pass
+
+    def on_packet(self, packet, now):
+        seq, ack, flags, win = parse_header_from(packet)
+        if flags & SYN:
+            if self.state in ('listen', 'syn_rcvd'):
+                self.state = 'syn_rcvd'
+                self.start_time = now
+                #the SYN-ACK is always sent with the 12 byte header
+                self.version = 1
+                self.pool = PacketPool(1)
+                version = min(parse_syn_options(packet)[0], self.max_version)
+                #only scale if the sender knows about window scaling
+                size = len(packet) - HEADER_SIZE
+                self.wscale = window_scale(self.window) if size >= syn_options_struct.size else 0
+                self.reply(0, SYN | ACK, now, syn_options(version, self.wscale))
+                self.version = version
+                self.header_size = header_sizes[version]
+                self.pool = PacketPool(1, version=version)
+            return
+        if self.version >= 3 and not verify_checksum(packet, self.version):
+            #corrupted on the way: drop it, the sender sends it again
+            self.corrupted += 1
+            return
+        if self.version >= 2 and len(packet) >= self.header_size:
+            self.echo = parse_timestamps_from(packet)[0]
+        if flags & FIN:
+            if self.state in ('established', 'time_wait') and seq == self.expected:
+                if self.state == 'established':
+                    self.end_time = now
+                self.state = 'time_wait'
+                self.reply(seq, FIN | ACK, now)
+                #wait a little in case our FIN-ACK is lost and the FIN comes again
+                self.timer = now + self.linger
+            return
+        if flags & ACK:
+            if self.state == 'syn_rcvd':
+                self.state = 'established'
+            return
+        if self.state == 'syn_rcvd':
+            #the ACK of the handshake was lost, data means it is established
+            self.state = 'established'
+        if self.state != 'established':
+            return
+        self.packets_received += 1
+        data = packet[self.header_size:]
+        if self.mode == 'gbn':
+            if seq == self.expected:
+                self.accept(seq, data)
+            else:
+                self.duplicates += 1
+            #cumulative ack for the last in-order packet
+            self.reply(self.expected - 1, ACK, now)
+        else:
+            if seq == self.expected:
+                self.accept(seq, data)
+                while self.expected in self.buffer:
+                    self.accept_buffered(self.buffer.pop(self.expected))
+            elif self.expected < seq < self.expected + self.window:
+                if seq in self.buffer:
+                    self.duplicates += 1
+                elif self.write_at is not None:
+                    #written to its place now, only its length is kept
+                    self.write_at(seq, data)
+                    self.buffer[seq] = len(data)
+                else:
+                    self.buffer[seq] = bytes(data)
+            elif seq >= self.expected + self.window:
+                #outside of our window, drop it without an ack
+                return
+            else:
+                self.duplicates += 1
+            self.reply(seq, ACK, now)
+
+    def accept(self, seq, data):
+        if self.write_at is not None:
+            self.write_at(seq, data)
+        else:
+            self.deliver(data)
+        self.bytes_received += len(data)
+        self.expected += 1
+
+    def accept_buffered(self, data):
+        #an out-of-order packet that is now in order
+        if self.write_at is not None:
+            self.bytes_received += data
+        else:
+            self.deliver(data)
+            self.bytes_received += len(data)
+        self.expected += 1
+
+    def next_deadline(self):
+        return self.timer
+
+    def on_timer(self, now):
+        if self.state == 'time_wait' and self.timer is not None and self.timer <= now:
+            self.state = 'closed'
+            self.timer = None
+            self.done = True
+
+    def statistics(self, now=None):
+        end = self.end_time if self.end_time is not None else now if now is not None else time.monotonic()
+        elapsed = end - (self.start_time or 0)
+        return {
+            'bytes': self.bytes_received,
+            'packets_received': self.packets_received,
+            'duplicates': self.duplicates,
+            'corrupted': self.corrupted,
+            'elapsed': elapsed,
+            'throughput_mbps': self.bytes_received * 8 / elapsed / 1e6 if elapsed > 0 else 0.0,
+            'header_version': self.version,
+        }
+
+
+def export_metrics(registry, endpoint, labels=None):
+    '''
+    shows the statistics of a Sender or Receiver in a metrics registry
+    (metrics/registry.py), with the label role=sender or role=receiver and
+    labels. the values are read from the endpoint when the registry is read
+    '''
+    def metric(kind, name, help, function):
+        kind(name, help, labels=labels, function=function)
+
+    if isinstance(endpoint, Sender):
+        labels = dict(labels or {}, role='sender')
+        sender = endpoint
+        metric(registry.counter, 'transport_packets_sent_total', 'packets sent, the retransmissions too',
+               lambda: sender.packets_sent)
+        metric(registry.counter, 'transport_retransmissions_total', 'packets sent again',
+               lambda: sender.retransmissions)
+        metric(registry.counter, 'transport_timeouts_total', 'retransmission timeouts', lambda: sender.timeouts)
+        metric(registry.counter, 'transport_acked_bytes_total', 'bytes the receiver has acked in order',
+               lambda: min((sender.base - 1) * DATA_SIZE, len(sender.data)))
+        metric(registry.counter, 'transport_corrupted_total', 'packets dropped because of a wrong CRC',
+               lambda: sender.corrupted)
+        metric(registry.gauge, 'transport_in_flight_packets', 'packets sent and not acked',
+               lambda: sender.in_flight() if sender.state == 'established' else 0)
+        metric(registry.gauge, 'transport_cwnd_packets', 'congestion window (the fixed window without cc)',
+               lambda: sender.cc.cwnd if sender.cc is not None else sender.window)
+        metric(registry.gauge, 'transport_rto_seconds', 'retransmission timeout', lambda: sender.rto)
+        metric(registry.gauge, 'transport_srtt_seconds', 'smoothed RTT',
+               lambda: sender.rtt.srtt if sender.rtt is not None else None)
+        sender.rtt_histogram = registry.histogram('transport_rtt_seconds', 'RTT samples', labels=labels)
+    else:
+        labels = dict(labels or {}, role='receiver')
+        receiver = endpoint
+        metric(registry.counter, 'transport_packets_received_total', 'data packets received',
+               lambda: receiver.packets_received)
+        metric(registry.counter, 'transport_received_bytes_total', 'bytes handed over in order',
+               lambda: receiver.bytes_received)
+        metric(registry.counter, 'transport_duplicates_total', 'packets received twice or out of the window',
+               lambda: receiver.duplicates)
+        metric(registry.counter, 'transport_corrupted_total', 'packets dropped because of a wrong CRC',
+               lambda: receiver.corrupted)
+
+
+def accept(sock):
+    '''
+    waits for a SYN on a bound UDP socket, and connects the socket to the
+    client. returns the SYN packet
+    '''
+    buffer = bytearray(MAX_PACKET_SIZE)
+    while True:
+        n, address = sock.recvfrom_into(buffer)
+        if n >= HEADER_SIZE and parse_header_from(buffer)[2] & SYN:
+            sock.connect(address)
+            return bytes(buffer[:n])
+
+
+def run(endpoint, sock, clock=time.monotonic):
+    '''
+    drives a Sender or Receiver over a connected UDP socket until it is done
+    '''
+    buffer = bytearray(MAX_PACKET_SIZE)
+    view = memoryview(buffer)
+    endpoint.start(clock())
+    while not endpoint.done:
+        deadline = endpoint.next_deadline()
+        if deadline is None:
+            sock.settimeout(None)
+        else:
+            #settimeout(0) would make the socket non-blocking
+            sock.settimeout(max(deadline - clock(), 1e-4))
+        try:
+            n = sock.recv_into(buffer)
+        except (socket.timeout, ConnectionRefusedError):
+            endpoint.on_timer(clock())
+            continue
+        if n < HEADER_SIZE:
+            continue
+        now = clock()
+        endpoint.on_packet(view[:n], now)
+        deadline = endpoint.next_deadline()
+        if deadline is not None and deadline <= now:
+            endpoint.on_timer(now)
+    return endpoint.statistics()
@@ -0,0 +1,96 @@
+'''
+    #file access for application.py that keeps memory flat however large the
+    #file is
+
+    #MappedFile maps the file to send into memory. the Sender slices it into
+    #memoryviews of 1460 bytes that are copied once, straight into the packet
+    #(see PacketPool.pack), the file is never read into a bytes object and the
+    #kernel pages it in and out as needed. the pages that were sent count in
+    #the RSS of the sender (RssFile), but they are clean page cache that the
+    #kernel can drop at any time, the heap (RssAnon) stays at a few MB.
+
+    #FileWriter writes the payload of every packet at its place in the file,
+    #(seq - 1) * 1460, with os.pwrite as soon as it arrives, also when it
+    #arrives out of order. the Receiver only remembers which packets it has,
+    #not their data.
+'''
+
+import mmap
+import os
+
+from engine import DATA_SIZE
+
+
+class MappedFile:
+    '''
+    with MappedFile(path) as data: data supports memoryview, and is empty
+    (b'') for an empty file, which cannot be mapped
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            return b''
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        #we read the file from the start to the end once
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        return self.map
+
+    def __exit__(self, *exc):
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                #a memoryview of it is still alive, the map goes with it
+                pass
+        self.file.close()
+
+
+class FileWriter:
+    '''
+    writes packets to a file at the offset of their sequence number
+    (data packets start at sequence number 1). offset is where packet 1
+    goes, so several writers can fill their own part of one file; then
+    the file must not be truncated
+    '''
+
+    def __init__(self, path, packet_size=DATA_SIZE, offset=0, truncate=True):
+        self.path = path
+        self.packet_size = packet_size
+        self.offset = offset
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+        self.fd = os.open(path, flags, 0o644)
+        self.size = 0           # end of the data written so far
+        self.writes = 0
+        self.out_of_order = 0
+        self.last_seq = 0
+
+    def write_at(self, seq, data):
+        offset = self.offset + (seq - 1) * self.packet_size
+        written = os.pwrite(self.fd, data, offset)
+        while written < len(data):
+            written += os.pwrite(self.fd, data[written:], offset + written)
+        self.size = max(self.size, offset + len(data))
+        self.writes += 1
+        if seq != self.last_seq + 1:
+            self.out_of_order += 1
+        self.last_seq = seq
+
+    def close(self):
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def statistics(self):
+        return {'file_writes': self.writes, 'written_out_of_order': self.out_of_order}
@@ -0,0 +1,251 @@
+'''
+    #file transfer over N parallel flows of the transport in engine.py
+
+    #one window-limited flow over a long lossy path (e.g. h1 -> h9, three
+    #bottlenecks) cannot fill the links: after every loss it backs off, and
+    #its window is limited. N flows share the path and back off one at a time.
+    #the file is split into N stripes of whole packets, every stripe is sent
+    #by its own Sender on its own UDP socket (and with --processes in its own
+    #process), and the receiver writes every packet at its offset in the
+    #file (stripe start + (seq - 1) * 1460), so the stripes are reassembled in
+    #place whatever order they finish in.
+
+    #the client first tells the server the size of the file and the number
+    #of streams over a TCP control connection (port -p), the server answers
+    #with the UDP ports of the streams, and at the end sends back what every
+    #stream received. both sides print the goodput per stream and in total.
+
+    #run the server (receiver) first with:
+    #   python3 multistream.py -s -i 10.0.7.2 -p 8088 -o received.bin -w 64 -m sr
+    #and then the client (sender) with:
+    #   python3 multistream.py -c -i 10.0.7.2 -p 8088 -f big.bin -n 4 -w 64 -m sr --cc reno
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from socket import *
+
+import congestion
+import engine
+import files
+import pacing
+from application import check_port, check_positive
+
+
+def stripes(size, streams):
+    #(start, end) byte ranges of whole packets, as even as possible
+    packets = (size + engine.DATA_SIZE - 1) // engine.DATA_SIZE
+    streams = max(1, min(streams, packets))
+    ranges = []
+    start = 0
+    for i in range(streams):
+        count = packets // streams + (i < packets % streams)
+        end = min(size, start + count * engine.DATA_SIZE)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def goodput(nbytes, seconds):
+    return nbytes * 8 / seconds / 1e6 if seconds > 0 else 0.0
+
+
+def start_workers(target, jobs, processes):
+    '''
+    runs target(*job) for every job in its own thread or process and
+    returns a function that waits for all of them and returns the results
+    in the order of the jobs. the sockets in a job are inherited by a
+    forked process, they are not pickled
+    '''
+    if processes:
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=worker, args=(target, i, job, results)) for i, job in enumerate(jobs)]
+    else:
+        results = queue.Queue()
+        workers = [threading.Thread(target=worker, args=(target, i, job, results)) for i, job in enumerate(jobs)]
+    for w in workers:
+        w.start()
+
+    def wait():
+        collected = {}
+        for i in range(len(workers)):
+            number, result = results.get()
+            collected[number] = result
+        for w in workers:
+            w.join()
+        return [collected[i] for i in range(len(workers))]
+
+    return wait
+
+
+def worker(target, number, job, results):
+    try:
+        result = target(*job)
+    except Exception as e:
+        result = {'error': str(e)}
+    results.put((number, result))
+
+
+def receive_stream(sock, path, start, args):
+    #one stream of the server: its packets go to start + (seq - 1) * 1460
+    with files.FileWriter(path, offset=start, truncate=False) as f:
+        syn = engine.accept(sock)
+        receiver = engine.Receiver(sock.send, window=args.window, mode=args.mode, write_at=f.write_at)
+        receiver.on_packet(syn, engine.time.monotonic())
+        stats = engine.run(receiver, sock)
+        stats.update(f.statistics())
+    sock.close()
+    stats['start_time'] = receiver.start_time
+    stats['end_time'] = receiver.end_time
+    return stats
+
+
+def send_stream(sock, data, args):
+    #one stream of the client: a Sender for its stripe of the file
+    cc = None if args.cc == 'none' else congestion.create(args.cc, max_window=args.window)
+    version = 3 if args.checksum else 2 if args.timestamps else 1
+    #bbr sends at its pacing rate, without a pacer it sends cwnd in bursts
+    pacer = pacing.Pacer() if cc is not None and cc.paced else None
+    sender = engine.Sender(sock.send, data, args.window, args.mode, args.timeout, cc, version=version, pacer=pacer)
+    stats = engine.run(sender, sock)
+    sender.data.release()
+    sock.close()
+    stats['start_time'] = sender.start_time
+    stats['end_time'] = sender.end_time
+    return stats
+
+
+def report(title, ranges, results, key):
+    #per stream and aggregate goodput. the aggregate is all bytes over the
+    #time from the first stream starting to the last one finishing
+    print(f'\n{title}')
+    print(f'{"stream":>6}{"offset":>14}{"bytes":>14}{"seconds":>10}{"Mbps":>10}{"retrans":>9}')
+    total = 0
+    starts, ends = [], []
+    for i, ((start, end), stats) in enumerate(zip(ranges, results)):
+        if 'error' in stats:
+            print(f'{i:>6}  failed: {stats["error"]}')
+            continue
+        nbytes = stats.get(key, end - start)
+        seconds = stats['elapsed']
+        total += nbytes
+        if stats['start_time'] is not None and stats['end_time'] is not None:
+            starts.append(stats['start_time'])
+            ends.append(stats['end_time'])
+        print(f'{i:>6}{start:>14}{nbytes:>14}{seconds:>10.3f}{goodput(nbytes, seconds):>10.2f}'
+              f'{stats.get("retransmissions", ""):>9}')
+    if starts:
+        seconds = max(ends) - min(starts)
+        print(f'{"all":>6}{"":>14}{total:>14}{seconds:>10.3f}{goodput(total, seconds):>10.2f}')
+
+
+def read_line(conn):
+    line = b''
+    while not line.endswith(b'\n'):
+        data = conn.recv(4096)
+        if not data:
+            raise ConnectionError('the control connection was closed')
+        line += data
+    return json.loads(line)
+
+
+def send_line(conn, message):
+    conn.sendall(json.dumps(message).encode() + b'\n')
+
+
+def server(args):
+    control = socket(AF_INET, SOCK_STREAM)
+    control.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    control.bind((args.ip, args.port))
+    control.listen(1)
+    print(f'The server is ready to receive on {args.ip}:{args.port}')
+    conn, addr = control.accept()
+    with conn:
+        setup = read_line(conn)
+        ranges = stripes(setup['size'], setup['streams'])
+        #the file gets its final size now, the streams fill it in any order
+        with open(args.output, 'wb') as f:
+            f.truncate(setup['size'])
+        socks = []
+        for _ in ranges:
+            sock = socket(AF_INET, SOCK_DGRAM)
+            sock.bind((args.ip, 0))
+            socks.append(sock)
+        wait = start_workers(receive_stream, [(sock, args.output, start, args) for sock, (start, end) in zip(socks, ranges)],
+                             args.processes)
+        send_line(conn, {'ports': [sock.getsockname()[1] for sock in socks]})
+        print(f'receiving {setup["size"]} bytes in {len(ranges)} streams from {addr[0]}')
+        results = wait()
+        for sock in socks:
+            sock.close()
+        send_line(conn, {'streams': results})
+    control.close()
+    report('receiver', ranges, results, 'bytes')
+
+
+def client(args):
+    size = os.path.getsize(args.file)
+    ranges = stripes(size, args.streams)
+    control = socket(AF_INET, SOCK_STREAM)
+    try:
+        control.connect((args.ip, args.port))
+    except OSError:
+        print('ConnectionError')
+        sys.exit()
+    with control, files.MappedFile(args.file) as data:
+        send_line(control, {'size': size, 'streams': len(ranges)})
+        ports = read_line(control)['ports']
+        view = memoryview(data)
+        jobs = []
+        for port, (start, end) in zip(ports, ranges):
+            sock = socket(AF_INET, SOCK_DGRAM)
+            sock.connect((args.ip, port))
+            jobs.append((sock, view[start:end], args))
+        results = start_workers(send_stream, jobs, args.processes)()
+        del jobs
+        view.release()
+        received = read_line(control)['streams']
+    report('sender', ranges, results, 'bytes')
+    report('receiver', ranges, received, 'bytes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='file transfer over parallel streams of the UDP transport', epilog='end of help')
+    parser.add_argument('-s', '--server', action='store_true', help='run as the receiver')
+    parser.add_argument('-c', '--client', action='store_true', help='run as the sender')
+    parser.add_argument('-i', '--ip', type=str, default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=check_port, default=8088, help='TCP control port')
+    parser.add_argument('-f', '--file', type=str, help='file to send (client)')
+    parser.add_argument('-o', '--output', type=str, default='received', help='where to store the file (server)')
+    parser.add_argument('-n', '--streams', type=check_positive, default=4, help='number of parallel streams (client)')
+    parser.add_argument('--processes', action='store_true', help='one process per stream instead of one thread')
+    parser.add_argument('-w', '--window', type=check_positive, default=5, help='window size in packets, per stream')
+    parser.add_argument('-m', '--mode', choices=engine.MODES, default='gbn')
+    parser.add_argument('--cc', choices=('none',) + tuple(congestion.ALGORITHMS), default='none',
+                        help='congestion control per stream, none keeps a fixed window')
+    parser.add_argument('-t', '--timeout', type=float, default=0.5, help='first retransmission timeout in seconds')
+    parser.add_argument('--timestamps', action='store_true', help='use the header with timestamps (client)')
+    parser.add_argument('--checksum', action='store_true', help='use the header with timestamps and a CRC32 (client)')
+    args = parser.parse_args()
+
+    if args.server == args.client:
+        print('you must run either the server (-s) or the client (-c)')
+        sys.exit()
+    if args.client and not args.file:
+        print('the client needs a file to send (-f)')
+        sys.exit()
+
+    if args.server:
+        server(args)
+    else:
+        client(args)
+
+
+if __name__ == '__main__':
+    main()
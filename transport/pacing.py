@@ -0,0 +1,204 @@
+'''
+    #pacing for the Sender in engine.py
+
+    #a window of packets sent back-to-back arrives at the bottleneck as one
+    #burst, and a short router queue (max_queue_size=33 on r3-r4) drops the tail
+    #of it even if the average rate is fine. the Pacer spreads the packets out
+    #with a token bucket: the rate is cwnd / srtt times a gain (or the pacing
+    #rate of the congestion control, e.g. bbr), and every tick releases the
+    #packets that fit in the bucket as one batch.
+
+    #send_batch() sends such a batch with as few system calls as it can: on
+    #Linux with UDP GSO (UDP_SEGMENT) up to 44 packets of 1472 bytes go down in
+    #one sendmsg, otherwise it falls back to one send per packet.
+
+    #QueueModel is a drop-tail queue in front of a link of a given rate. the
+    #Pacer feeds it the times the packets were sent, and the times they would
+    #have been sent without pacing, to estimate how many drops pacing avoided.
+'''
+
+import socket
+import struct
+import sys
+
+
+# linux/udp.h, not exported by every Python version
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+# the kernel sends at most 64 segments and 64 KB per GSO call
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65000
+
+# ethernet + IP + UDP around every packet, to turn Mbit/s into packets/s
+WIRE_OVERHEAD = 14 + 20 + 8
+
+
+class TokenBucket:
+    '''rate in packets per second, burst is the size of the bucket in packets'''
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = None
+
+    def refill(self, now):
+        if self.last is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def consume(self, now):
+        #takes one token if there is one
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def next_token(self, now):
+        #when the next token is there
+        self.refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+
+class QueueModel:
+    '''a drop-tail queue of capacity packets, served at rate packets per second'''
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.busy_until = 0.0
+        self.last = 0.0
+        self.packets = 0
+        self.drops = 0
+
+    def arrive(self, now):
+        now = max(now, self.last)
+        self.last = now
+        self.packets += 1
+        backlog = max(0.0, self.busy_until - now) * self.rate
+        if backlog >= self.capacity:
+            self.drops += 1
+            return False
+        self.busy_until = max(self.busy_until, now) + 1 / self.rate
+        return True
+
+
+class Pacer:
+    '''
+    decides when the Sender may send its next packet. rate (packets/sec)
+    fixes the rate, otherwise it follows the congestion control: its pacing
+    rate if it has one, else gain * cwnd / srtt. until there is an RTT
+    sample the packets are not paced.
+
+    with bottleneck (packets/sec) and queue_size the pacer also estimates
+    the drops at a drop-tail bottleneck with and without pacing.
+    '''
+
+    def __init__(self, rate=None, gain=1.25, tick=0.001, bottleneck=None, queue_size=None):
+        self.fixed_rate = rate
+        self.gain = gain
+        self.tick = tick
+        self.bucket = TokenBucket(rate or 1.0, 1.0)
+        self.paced = QueueModel(bottleneck, queue_size) if bottleneck and queue_size else None
+        self.unpaced = QueueModel(bottleneck, queue_size) if self.paced else None
+        self.ready = {}         # seq -> when the window first allowed it
+        self.delayed = 0        # packets that had to wait for a token
+
+    def rate(self, sender):
+        if self.fixed_rate:
+            return self.fixed_rate
+        if sender.cc is not None:
+            rate = sender.cc.pacing_rate()
+            if rate:
+                return rate
+        if sender.rtt is None or sender.rtt.srtt is None or sender.rtt.srtt <= 0:
+            return None
+        return self.gain * sender.send_window() / sender.rtt.srtt
+
+    def update(self, sender):
+        rate = self.rate(sender)
+        if rate is None:
+            return False
+        #one tick worth of packets may leave together, the bucket holds two
+        #ticks so a timer that fires late does not lower the rate
+        self.bucket.rate = rate
+        self.bucket.burst = max(2.0, 2 * rate * self.tick)
+        return True
+
+    def allow(self, sender, seq, now):
+        #True if seq may be sent now
+        self.ready.setdefault(seq, now)
+        if not self.update(sender) or self.bucket.consume(now):
+            self.sent(seq, now)
+            return True
+        self.delayed += 1
+        return False
+
+    def sent(self, seq, now):
+        ready = self.ready.pop(seq, now)
+        if self.paced is not None:
+            self.paced.arrive(now)
+            self.unpaced.arrive(ready)
+
+    def next_time(self, now):
+        #when allow() can say yes again, at least one tick from now
+        return max(self.bucket.next_token(now), now + self.tick)
+
+    def statistics(self):
+        stats = {'pacing_rate': self.bucket.rate, 'paced_waits': self.delayed}
+        if self.paced is not None:
+            stats['model_drops_paced'] = self.paced.drops
+            stats['model_drops_unpaced'] = self.unpaced.drops
+            stats['drops_avoided'] = self.unpaced.drops - self.paced.drops
+        return stats
+
+
+def mbit_to_packets(mbit, packet_size):
+    #a link rate in Mbit/s as packets of packet_size bytes per second
+    return mbit * 1e6 / 8 / (packet_size + WIRE_OVERHEAD)
+
+
+def batch_sender(sock):
+    '''
+    returns a function that sends a list of packets on a connected UDP socket.
+    packets of the same size go down together with UDP GSO if the system
+    supports it
+    '''
+    gso = [sys.platform.startswith('linux')]
+
+    def send_each(packets):
+        for packet in packets:
+            sock.send(packet)
+
+    def send_batch(packets):
+        if not gso[0] or len(packets) < 2:
+            send_each(packets)
+            return
+        i = 0
+        while i < len(packets):
+            size = len(packets[i])
+            count = min(GSO_MAX_SEGMENTS, max(1, GSO_MAX_BYTES // size))
+            j = i + 1
+            #all but the last segment must have the same size
+            while j < len(packets) and j - i < count and len(packets[j - 1]) == size:
+                j += 1
+            if len(packets[j - 1]) > size:
+                j -= 1
+            try:
+                if j - i == 1:
+                    sock.send(packets[i])
+                else:
+                    sock.sendmsg(packets[i:j], [(socket.SOL_UDP, UDP_SEGMENT, struct.pack('@H', size))])
+            except ConnectionRefusedError:
+                #the receiver is not there (yet), as if the packets were lost
+                return
+            except OSError:
+                #no GSO on this system or interface
+                gso[0] = False
+                send_each(packets[i:])
+                return
+            i = j
+
+    return send_batch
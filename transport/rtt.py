@@ -0,0 +1,145 @@
+'''
+    #retransmission timer for the Sender in engine.py
+
+    #RttEstimator: smoothed RTT (SRTT) and RTT variation (RTTVAR) as in
+    #Jacobson/Karels (RFC 6298), RTO = SRTT + max(min_rto, 4 * RTTVAR). the
+    #variance term has a floor as in Linux: with a sample on every ack RTTVAR
+    #goes to about 0, and an RTO just above SRTT times out on any queueing
+    #delay. the RTO is doubled on every timeout (exponential backoff, at most
+    #MAX_BACKOFF times) until a new sample arrives or new data is acked: with
+    #Karn's rule and no timestamps a lossy path may give no sample for a long
+    #time, the backoff is only kept until the retransmissions get through.
+
+    #TimerWheel: a hashed timing wheel. thousands of packets in flight share
+    #one list of slots instead of each having its own timer object: scheduling
+    #and cancelling a timer is O(1), and expire() only looks at the slots
+    #between the last call and now.
+'''
+
+
+class RttEstimator:
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    MAX_BACKOFF = 64
+
+    def __init__(self, initial_rto=1.0, min_rto=0.05, max_rto=60.0):
+        self.srtt = None
+        self.rttvar = None
+        self.initial_rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.backoff = 1
+        self.base_rto = initial_rto
+        self.samples = 0
+
+    @property
+    def rto(self):
+        return min(self.base_rto * self.backoff, self.max_rto)
+
+    def sample(self, rtt):
+        #a new measurement (in seconds) of a packet that was only sent once,
+        #or of any packet if the RTT comes from an echoed timestamp
+        if rtt < 0:
+            return
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.base_rto = self.srtt + max(self.min_rto, self.K * self.rttvar)
+        self.backoff = 1
+        self.samples += 1
+
+    def on_timeout(self):
+        #exponential backoff
+        if self.rto < self.max_rto and self.backoff < self.MAX_BACKOFF:
+            self.backoff *= 2
+
+    def on_new_ack(self):
+        #new data is cumulatively acked, the path works again (RFC 6298 5.7)
+        self.backoff = 1
+
+
+class TimerWheel:
+    '''
+    timers are keyed (e.g. by sequence number). a timer lands in the slot of
+    its deadline tick, timers more than one turn of the wheel away stay in
+    their slot until their turn comes.
+    '''
+
+    def __init__(self, tick=0.001, slots=1024):
+        self.tick = tick
+        self.slots = slots
+        self.wheel = [{} for _ in range(slots)]
+        self.deadlines = {}
+        self.current = None     # the next tick that expire() will look at
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, deadline):
+        #sets (or moves) the timer of key
+        self.cancel(key)
+        tick = int(deadline / self.tick)
+        if self.current is None or tick < self.current:
+            self.current = tick
+        self.wheel[tick % self.slots][key] = deadline
+        self.deadlines[key] = deadline
+
+    def cancel(self, key):
+        deadline = self.deadlines.pop(key, None)
+        if deadline is not None:
+            del self.wheel[int(deadline / self.tick) % self.slots][key]
+
+    def clear(self):
+        for key in list(self.deadlines):
+            self.cancel(key)
+
+    def expire(self, now):
+        #removes and returns the keys of all timers with deadline <= now,
+        #in the order of their ticks
+        expired = []
+        if not self.deadlines:
+            self.current = None
+            return expired
+        end = int(now / self.tick)
+        #a full turn looks at every slot once
+        last = min(end, self.current + self.slots - 1)
+        for tick in range(self.current, last + 1):
+            slot = self.wheel[tick % self.slots]
+            if not slot:
+                continue
+            due = [key for key, deadline in slot.items() if deadline <= now]
+            for key in due:
+                del slot[key]
+                del self.deadlines[key]
+            expired.extend(due)
+        #timers in the slot of now with a deadline after now stay in it
+        self.current = end
+        if not self.deadlines:
+            self.current = None
+        return expired
+
+    def next_deadline(self):
+        #the earliest deadline, or None if there are no timers
+        if not self.deadlines:
+            return None
+        for tick in range(self.current, self.current + self.slots):
+            slot = self.wheel[tick % self.slots]
+            if slot:
+                due = [d for d in slot.values() if int(d / self.tick) == tick]
+                if due:
+                    #no timer is due before this tick (cancelled timers leave
+                    #empty slots behind), the next call can start here
+                    self.current = tick
+                    return min(due)
+        #every timer is more than one turn away
+        deadline = min(self.deadlines.values())
+        self.current = int(deadline / self.tick)
+        return deadline
@@ -0,0 +1,133 @@
+'''
+    #a multi-process version of udpserver.py
+
+    #N worker processes each bind their own socket to port 12000 with
+    #SO_REUSEPORT, and the kernel spreads the clients over the sockets, so the
+    #server uses N cores instead of one. every worker receives with
+    #recvmsg_into into one preallocated buffer and works on bytes: the message
+    #is upper-cased with bytes.upper() instead of decode().upper().encode()
+    #(only a-z change, the same as for the lowercase sentences of udpclient.py).
+
+    #the main process prints packets/sec for every worker.
+
+    #run it with:
+    #   python3 udpserver-reuseport.py -n 4 --pin
+    #   python3 udpserver-reuseport.py -n 2 --cpus 2,3 -i 5
+'''
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from socket import *
+
+
+def check_positive(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('the value must be a positive number')
+    return value
+
+
+def check_cpus(val):
+    try:
+        cpus = [int(cpu) for cpu in val.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a list of cpu numbers, e.g. 0,1,2')
+    available = os.sched_getaffinity(0)
+    for cpu in cpus:
+        if cpu not in available:
+            raise argparse.ArgumentTypeError(f'cpu {cpu} is not available, use one of {sorted(available)}')
+    return cpus
+
+
+def worker(number, ip, port, cpu, counters, buffer_size):
+    '''
+    one server process: receives on its own SO_REUSEPORT socket and sends
+    the upper-cased message back
+    '''
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    serverSocket = socket(AF_INET, SOCK_DGRAM)
+    serverSocket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    serverSocket.bind((ip, port))
+    #wake up once a second so the counter is published when it is quiet
+    serverSocket.settimeout(1.0)
+
+    buffer = bytearray(buffer_size)
+    buffers = [buffer]
+    recvmsg_into = serverSocket.recvmsg_into
+    sendto = serverSocket.sendto
+    count = 0
+    while True:
+        try:
+            n, ancdata, flags, clientAddress = recvmsg_into(buffers)
+        except timeout:
+            counters[number] = count
+            continue
+        sendto(buffer[:n].upper(), clientAddress)
+        count += 1
+        #the shared counter is only written every 256 packets
+        if count & 0xff == 0:
+            counters[number] = count
+
+
+def report(counters, processes, interval):
+    #prints packets/sec per worker until ctrl-c
+    last = list(counters)
+    while True:
+        time.sleep(interval)
+        now = list(counters)
+        rates = [(new - old) / interval for new, old in zip(now, last)]
+        last = now
+        line = '  '.join(f'w{i}: {rate:10,.0f}' for i, rate in enumerate(rates))
+        print(f'{line}  total: {sum(rates):12,.0f} packets/sec', flush=True)
+        if not all(p.is_alive() for p in processes):
+            print('a worker has stopped')
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='multi-process UDP upper-case server with SO_REUSEPORT', epilog='end of help')
+    parser.add_argument('-n', '--workers', type=check_positive, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-a', '--ip', type=str, default='', help='address to bind to, default all')
+    parser.add_argument('-p', '--port', type=check_positive, default=12000)
+    parser.add_argument('--pin', action='store_true', help='pin worker i to cpu i (modulo the available cpus)')
+    parser.add_argument('--cpus', type=check_cpus, help='pin the workers to these cpus, e.g. 0,1,2')
+    parser.add_argument('-i', '--interval', type=float, default=1.0, help='seconds between the packets/sec reports')
+    parser.add_argument('-b', '--buffer', type=check_positive, default=2048, help='receive buffer per worker in bytes')
+    args = parser.parse_args()
+
+    if 'SO_REUSEPORT' not in globals():
+        print('SO_REUSEPORT is not supported on this system')
+        sys.exit()
+
+    cpus = args.cpus
+    if cpus is None and args.pin:
+        cpus = sorted(os.sched_getaffinity(0))
+
+    #one unsigned 64 bit counter per worker, written only by that worker
+    counters = multiprocessing.Array('Q', args.workers, lock=False)
+    processes = []
+    for number in range(args.workers):
+        cpu = cpus[number % len(cpus)] if cpus else None
+        p = multiprocessing.Process(target=worker, daemon=True,
+                                    args=(number, args.ip, args.port, cpu, counters, args.buffer))
+        p.start()
+        processes.append(p)
+
+    print(f'The server is ready to receive with {args.workers} workers on port {args.port}')
+    try:
+        report(counters, processes, args.interval)
+    except KeyboardInterrupt:
+        pass
+    for p in processes:
+        p.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,70 @@
+'''
+    #the UDP server: sends every message back in upper case
+
+    #it counts the messages, the bytes and the time to answer a message (see
+    #metrics/registry.py). --metrics serves the counts for Prometheus,
+    #--snapshot writes them to a file as JSON lines and --profile samples
+    #the stacks for a flame graph (see metrics/):
+    #   python3 udpserver.py --metrics :9100 --snapshot udp.jsonl
+    #   curl -s localhost:9100/metrics
+'''
+
+import argparse
+import os
+import sys
+import time
 from socket import *
-serverPort = 12000
-serverSocket = socket(AF_INET, SOCK_DGRAM)
-serverSocket.bind(('', serverPort))
-print ('The server is ready to receive')
-while True:
-    message, clientAddress = serverSocket.recvfrom(2048)
-    modifiedMessage = message.decode().upper()
-    serverSocket.sendto(modifiedMessage.encode(),clientAddress)
\ No newline at end of file
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'metrics'))
+import exporter
+from registry import Registry
+
+
+registry = Registry()
+messages = registry.counter('server_messages_total', 'messages answered')
+received = registry.counter('server_received_bytes_total', 'bytes received from the clients')
+sent = registry.counter('server_sent_bytes_total', 'bytes sent to the clients')
+latency = registry.histogram('server_reply_seconds', 'time from a recvfrom to the end of the sendto of its reply')
+
+
+def check_port(val):
+    try:
+        value = int(val)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected an integer but you entered a string')
+    if not 1 <= value <= 65535:
+        raise argparse.ArgumentTypeError('it is not a valid port')
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP upper-case echo server', epilog='end of help')
+    parser.add_argument('-p', '--port', type=check_port, default=12000)
+    exporter.add_arguments(parser)
+    args = parser.parse_args()
+
+    serverPort = args.port
+    serverSocket = socket(AF_INET, SOCK_DGRAM)
+    serverSocket.bind(('', serverPort))
+    print ('The server is ready to receive')
+    metrics = exporter.start(args, registry)
+    try:
+        while True:
+            message, clientAddress = serverSocket.recvfrom(2048)
+            started = time.perf_counter()
+            #bytes, a datagram that is not UTF-8 must not stop the server
+            modifiedMessage = message.upper()
+            serverSocket.sendto(modifiedMessage,clientAddress)
+            messages.inc()
+            received.inc(len(message))
+            sent.inc(len(modifiedMessage))
+            latency.observe(time.perf_counter() - started)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics.close()
+    serverSocket.close()
+
+
+if __name__ == '__main__':
+    main()